@@ -10,17 +10,19 @@ from google.api_core import exceptions
 import pandas as pd
 from datetime import datetime
 
+from table_layout import TABLE_LAYOUTS, parse_date_column, replace_from_staging, staging_table_ref
+
 PROJECT_ID = 'operaciones-br'
 DATASET_ID = 'sales_intelligence'
 
-def load_csv_to_bigquery(csv_path, table_id, outcome=None):
+def read_csv_normalized(csv_path, outcome=None):
     """
-    Carrega CSV para o BigQuery
-    
+    Lê o CSV com nomes de colunas normalizados + metadata (None se não der
+    para ler)
+
     Args:
         csv_path: Caminho do arquivo CSV
-        table_id: ID da tabela (ex: 'pipeline')
-        outcome: 'WON' ou 'LOST' para closed_deals (opcional)
+        outcome: 'WON' ou 'LOST' para closed deals (opcional)
     """
     print(f"📂 Lendo {csv_path}...")
     
@@ -32,13 +34,12 @@ def load_csv_to_bigquery(csv_path, table_id, outcome=None):
             df = pd.read_csv(csv_path, encoding='latin-1')
         except Exception as e:
             print(f"❌ Erro ao ler CSV: {e}")
-            return False
+            return None
     
     print(f"   • {len(df)} linhas encontradas")
     
     if len(df) == 0:
-        print("⚠️ CSV vazio, pulando...")
-        return True
+        return df
     
     # Normalizar nomes de colunas (BigQuery não aceita caracteres especiais)
     import re
@@ -69,6 +70,27 @@ def load_csv_to_bigquery(csv_path, table_id, outcome=None):
         df['outcome'] = outcome
         print(f"   • Outcome: {outcome}")
     
+    return df
+
+def load_dataframe_to_bigquery(df, table_id):
+    """
+    Carrega o DataFrame em <tabela>__staging e só então substitui a tabela
+    final (replace_from_staging): se a carga falhar, a tabela atual fica
+    intacta.
+
+    Tabelas de TABLE_LAYOUTS saem com a data como DATE, particionadas por
+    mês e clusterizadas por Vendedor/Fiscal_Q.
+    """
+    # Coluna de partição: datas em formatos mistos -> ISO (tipada como DATE na troca)
+    date_column, cluster_columns = TABLE_LAYOUTS.get(table_id, (None, []))
+    if date_column in df.columns:
+        dates = parse_date_column(df[date_column])
+        invalid = int(df[date_column].notna().sum() - dates.notna().sum())
+        df[date_column] = dates.map(lambda d: d.isoformat() if pd.notna(d) else None)
+        print(f"   • {date_column} convertida para DATE ({invalid} valores vazios/inválidos viraram NULL)")
+        if dates.isna().all():
+            date_column = None
+
     # Limpar dados
     # Converter datas para string ISO
     for col in df.columns:
@@ -81,13 +103,15 @@ def load_csv_to_bigquery(csv_path, table_id, outcome=None):
     # Conectar ao BigQuery
     client = bigquery.Client(project=PROJECT_ID)
     table_ref = f"{PROJECT_ID}.{DATASET_ID}.{table_id}"
+    staging_ref = staging_table_ref(table_ref)
     
-    # Configurar job
+    # Configurar job (staging descartável: substituída a cada carga)
     job_config = bigquery.LoadJobConfig(
         write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
         autodetect=True,
         source_format=bigquery.SourceFormat.CSV
     )
+    client.delete_table(staging_ref, not_found_ok=True)
     
     # Salvar temporariamente como CSV
     temp_csv = f"/tmp/{table_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
@@ -97,7 +121,7 @@ def load_csv_to_bigquery(csv_path, table_id, outcome=None):
     
     try:
         with open(temp_csv, 'rb') as f:
-            job = client.load_table_from_file(f, table_ref, job_config=job_config)
+            job = client.load_table_from_file(f, staging_ref, job_config=job_config)
         
         # Aguardar conclusão
         job.result()
@@ -105,6 +129,8 @@ def load_csv_to_bigquery(csv_path, table_id, outcome=None):
         # Limpar arquivo temporário
         os.remove(temp_csv)
         
+        replace_from_staging(client, staging_ref, table_ref, date_column, cluster_columns, df.columns)
+        
         print(f"✅ {len(df)} linhas carregadas com sucesso")
         return True
         
@@ -114,6 +140,23 @@ def load_csv_to_bigquery(csv_path, table_id, outcome=None):
             os.remove(temp_csv)
         return False
 
+def load_csv_to_bigquery(csv_path, table_id, outcome=None):
+    """
+    Carrega CSV para o BigQuery
+    
+    Args:
+        csv_path: Caminho do arquivo CSV
+        table_id: ID da tabela (ex: 'pipeline')
+        outcome: 'WON' ou 'LOST' para closed deals (opcional)
+    """
+    df = read_csv_normalized(csv_path, outcome)
+    if df is None:
+        return False
+    if len(df) == 0:
+        print("⚠️ CSV vazio, pulando...")
+        return True
+    return load_dataframe_to_bigquery(df, table_id)
+
 def main():
     print("=" * 60)
     print("  Carregando dados dos CSVs para BigQuery")
@@ -138,75 +181,31 @@ def main():
     success = True
     
     # Carregar pipeline
-    print("\n[1/2] Carregando Pipeline...")
+    print("\n[1/4] Carregando Pipeline...")
     if not load_csv_to_bigquery(csvs['pipeline'], 'pipeline'):
         success = False
     
-    # Carregar closed deals (combinar WON + LOST)
-    print("\n[2/2] Carregando Closed Deals...")
-    
-    # Carregar WON
-    print("\n  → Carregando WON...")
-    df_won = pd.read_csv(csvs['won'])
-    
-    # Carregar LOST
-    print("  → Carregando LOST...")
-    df_lost = pd.read_csv(csvs['lost'])
-    
-    # Normalizar colunas
-    import re
-    def normalize_columns(df):
-        normalized_cols = []
-        for col in df.columns:
-            col_clean = re.sub(r'[^\w\s_-]', '', col, flags=re.ASCII)
-            col_clean = col_clean.strip().replace(' ', '_').replace('-', '_')
-            col_clean = re.sub(r'_+', '_', col_clean)
-            col_clean = col_clean.strip('_')
-            if not col_clean:
-                col_clean = f'column_{len(normalized_cols)}'
-            normalized_cols.append(col_clean)
-        df.columns = normalized_cols
-        return df
-    
-    df_won = normalize_columns(df_won)
-    df_lost = normalize_columns(df_lost)
-    
-    df_won['outcome'] = 'WON'
-    df_lost['outcome'] = 'LOST'
-    
-    # Combinar
-    df_closed = pd.concat([df_won, df_lost], ignore_index=True)
-    df_closed['data_carga'] = datetime.now().isoformat()
-    
-    print(f"\n  → Total: {len(df_won)} WON + {len(df_lost)} LOST = {len(df_closed)} deals")
-    
-    # Salvar temporariamente
-    temp_csv = f"/tmp/closed_deals_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    df_closed.to_csv(temp_csv, index=False)
-    
-    # Carregar
-    client = bigquery.Client(project=PROJECT_ID)
-    table_ref = f"{PROJECT_ID}.{DATASET_ID}.closed_deals"
-    
-    job_config = bigquery.LoadJobConfig(
-        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-        autodetect=True,
-        source_format=bigquery.SourceFormat.CSV
-    )
+    # Carregar closed deals (uma tabela por resultado, como a API lê)
+    print("\n[2/4] Carregando Closed Deals (WON)...")
+    if not load_csv_to_bigquery(csvs['won'], 'closed_deals_won', outcome='WON'):
+        success = False
     
-    print(f"📤 Carregando para {table_ref}...")
+    print("\n[3/4] Carregando Closed Deals (LOST)...")
+    if not load_csv_to_bigquery(csvs['lost'], 'closed_deals_lost', outcome='LOST'):
+        success = False
     
-    try:
-        with open(temp_csv, 'rb') as f:
-            job = client.load_table_from_file(f, table_ref, job_config=job_config)
-        job.result()
-        os.remove(temp_csv)
-        print(f"✅ {len(df_closed)} linhas carregadas com sucesso")
-    except Exception as e:
-        print(f"❌ Erro ao carregar: {e}")
-        if os.path.exists(temp_csv):
-            os.remove(temp_csv)
+    # closed_deals combinada (WON + LOST): lida pelos modelos de ML
+    # (bigquery/modelos-ml) e por enrich_closed_deals.py
+    print("\n[4/4] Carregando Closed Deals (WON + LOST)...")
+    df_won = read_csv_normalized(csvs['won'], outcome='WON')
+    df_lost = read_csv_normalized(csvs['lost'], outcome='LOST')
+    if df_won is None or df_lost is None:
         success = False
+    else:
+        df_closed = pd.concat([df_won, df_lost], ignore_index=True)
+        print(f"   • Total: {len(df_won)} WON + {len(df_lost)} LOST = {len(df_closed)} deals")
+        if not load_dataframe_to_bigquery(df_closed, 'closed_deals'):
+            success = False
     
     print()
     print("=" * 60)
@@ -9,6 +9,8 @@ from google.cloud import bigquery
 from datetime import datetime
 import sys
 
+from table_layout import replace_from_staging, staging_table_ref
+
 # ========== CONFIGURAÇÃO ==========
 PROJECT_ID = "operaciones-br"
 DATASET_ID = "sales_intelligence"
@@ -117,22 +119,26 @@ def load_pipeline_data(csv_path: str, client: bigquery.Client):
     # Adicionar coluna de carga
     df['data_carga'] = datetime.utcnow()
     
-    # Truncar strings muito longas para evitar erros
-    string_columns = df.select_dtypes(include=['object']).columns
+    # Truncar strings muito longas para evitar erros (datas ficam como DATE)
+    string_columns = df.select_dtypes(include=['object']).columns.drop('data_prevista', errors='ignore')
     for col in string_columns:
         df[col] = df[col].astype(str).str[:10000]  # Limitar a 10K chars
     
-    # Carregar para BigQuery
+    # Carregar para BigQuery (partição mensal por data_prevista, cluster vendedor/fiscal_q)
     table_id = f"{PROJECT_ID}.{DATASET_ID}.pipeline"
     job_config = bigquery.LoadJobConfig(
         write_disposition="WRITE_TRUNCATE",  # Substitui dados existentes
+        schema=[bigquery.SchemaField('data_prevista', 'DATE')],
         schema_update_options=[
             bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
         ]
     )
+    staging_id = staging_table_ref(table_id)
+    client.delete_table(staging_id, not_found_ok=True)
     
-    job = client.load_table_from_dataframe(df, table_id, job_config=job_config)
+    job = client.load_table_from_dataframe(df, staging_id, job_config=job_config)
     job.result()  # Aguarda conclusão
+    replace_from_staging(client, staging_id, table_id, 'data_prevista', ['vendedor', 'fiscal_q'], df.columns)
     
     print(f"   ✅ {len(df)} linhas carregadas em {table_id}")
 
@@ -195,8 +201,8 @@ def load_closed_data(csv_path: str, outcome: str, client: bigquery.Client):
     # Adicionar coluna de carga
     df['data_carga'] = datetime.utcnow()
     
-    # Truncar strings muito longas
-    string_columns = df.select_dtypes(include=['object']).columns
+    # Truncar strings muito longas (datas ficam como DATE)
+    string_columns = df.select_dtypes(include=['object']).columns.drop('data_fechamento', errors='ignore')
     for col in string_columns:
         df[col] = df[col].astype(str).str[:10000]
     
@@ -210,10 +216,11 @@ def load_closed_data(csv_path: str, outcome: str, client: bigquery.Client):
     ]
     df = df[[col for col in schema_columns if col in df.columns]]
     
-    # Carregar para BigQuery
-    table_id = f"{PROJECT_ID}.{DATASET_ID}.closed_deals"
+    # Carregar na staging de closed_deals (main troca a tabela depois de WON + LOST)
+    table_id = staging_table_ref(f"{PROJECT_ID}.{DATASET_ID}.closed_deals")
     job_config = bigquery.LoadJobConfig(
         write_disposition="WRITE_APPEND",  # Adiciona aos dados existentes
+        schema=[bigquery.SchemaField('data_fechamento', 'DATE')],
         schema_update_options=[
             bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
         ]
@@ -244,11 +251,13 @@ def main():
             client
         )
         
-        # Limpar tabela closed_deals antes de carregar (primeira vez)
-        print(f"\n🗑️  Limpando tabela closed_deals...")
-        query = f"DELETE FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals` WHERE TRUE"
-        client.query(query).result()
-        print("   ✅ Tabela limpa")
+        # WON e LOST vão para a staging de closed_deals; a tabela em uso só é
+        # trocada depois das duas cargas
+        closed_table_id = f"{PROJECT_ID}.{DATASET_ID}.closed_deals"
+        closed_staging_id = staging_table_ref(closed_table_id)
+        print(f"\n🗑️  Limpando staging de closed_deals...")
+        client.delete_table(closed_staging_id, not_found_ok=True)
+        print("   ✅ Staging limpa")
         
         # Carregar Ganhas
         load_closed_data(
@@ -264,6 +273,14 @@ def main():
             client
         )
         
+        # Partição mensal por data_fechamento, cluster vendedor/fiscal_q
+        staging_columns = [field.name for field in client.get_table(closed_staging_id).schema]
+        replace_from_staging(
+            client, closed_staging_id, closed_table_id,
+            'data_fechamento', ['vendedor', 'fiscal_q'], staging_columns
+        )
+        print(f"   ✅ {closed_table_id} substituída")
+        
         # Verificar resultado
         print("\n" + "=" * 60)
         print("  ✅ Carga Completa!")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Pré-calcula os resumos IA dos comentários longos de atividades
+
+Roda fora do horário de uso (ex.: Cloud Scheduler / cron diário) para que
+/api/weekly-agenda só leia resumos prontos (ACTIVITY_SUMMARY_ON_DEMAND=false).
+
+- Lê do BigQuery os comentários com mais de 300 caracteres do período
+- Identifica textos novos/alterados pelo hash do conteúdo (mesma chave da API)
+- Gera em paralelo pelo mesmo pipeline da API (cache → Firestore → Gemini com
+  limite de taxa → gravação em lote no Firestore)
+- Grava checkpoint após cada lote: uma execução interrompida continua de onde parou
+
+Usa as mesmas variáveis de ambiente do serviço (GCP_PROJECT, BQ_DATASET,
+GEMINI_API_KEY, GEMINI_MODEL, ACTIVITY_SUMMARY_FIRESTORE_COLLECTION, ...).
+
+Uso:
+    cd bigquery/scripts-dados
+    python precompute_activity_summaries.py --days 14
+    python precompute_activity_summaries.py --days 90 --concurrency 8 --dry-run
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# O pipeline de resumos vive na API (cloud-run/app): mesma chave, prompt e store
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cloud-run', 'app')
+
+MIN_TEXT_LENGTH = 300
+
+
+def fetch_long_activity_texts(client, project_id, dataset_id, days, activity_date_sql):
+    """Comentários distintos dos últimos N dias (mesmo TRIM/COALESCE e mesma
+    expressão de data das queries da agenda: weekly_agenda.ACTIVITY_DATE_SQL)"""
+    from google.cloud import bigquery
+
+    query = f"""
+    SELECT DISTINCT TRIM(COALESCE(Comentarios_completos, Comentarios, '')) AS comentarios
+    FROM `{project_id}.{dataset_id}.atividades`
+    WHERE LENGTH(TRIM(COALESCE(Comentarios_completos, Comentarios, ''))) > {MIN_TEXT_LENGTH}
+      AND {activity_date_sql} >= DATE_SUB(CURRENT_DATE(), INTERVAL @days DAY)
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter('days', 'INT64', days)]
+    )
+    texts = [str(row['comentarios'] or '').strip() for row in client.query(query, job_config=job_config).result()]
+    return [text for text in texts if len(text) > MIN_TEXT_LENGTH]
+
+
+def load_checkpoint(path, profile):
+    """Hashes já resumidos em execuções anteriores (mesmo perfil de prompt)"""
+    if not path or not os.path.exists(path):
+        return set()
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('profile') != profile:
+            return set()
+        return set(data.get('done') or [])
+    except Exception as e:
+        print(f"⚠️ Checkpoint ilegível ({e}), começando do zero")
+        return set()
+
+
+def save_checkpoint(path, profile, done):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'profile': profile, 'updated_at': time.time(), 'done': sorted(done)}, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-calcula resumos IA das atividades")
+    parser.add_argument('--days', type=int, default=14, help="Janela de atividades (dias)")
+    parser.add_argument('--profile', default='bdm', choices=['bdm', 'cs_ce'], help="Perfil do prompt")
+    parser.add_argument('--chunk-size', type=int, default=50, help="Textos por lote (checkpoint a cada lote)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Chamadas simultâneas ao Gemini")
+    parser.add_argument('--rate-per-minute', type=float, default=120, help="Limite de chamadas ao Gemini por minuto")
+    parser.add_argument('--checkpoint', default='.activity_summaries_checkpoint.json', help="Arquivo de checkpoint ('' desativa)")
+    parser.add_argument('--limit', type=int, default=0, help="Máximo de textos novos nesta execução (0 = todos)")
+    parser.add_argument('--dry-run', action='store_true', help="Só conta os textos pendentes")
+    args = parser.parse_args()
+
+    # Lidos pelo módulo da API na importação
+    os.environ['ACTIVITY_SUMMARY_CONCURRENCY'] = str(max(1, args.concurrency))
+    os.environ['ACTIVITY_SUMMARY_RATE_PER_MINUTE'] = str(args.rate_per_minute)
+    sys.path.insert(0, APP_DIR)
+    import api.endpoints.weekly_agenda as agenda
+
+    if not agenda._firestore_enabled() and not args.dry_run:
+        print("❌ ACTIVITY_SUMMARY_FIRESTORE_COLLECTION não configurada: os resumos não seriam persistidos")
+        return 1
+    if not agenda.GEMINI_API_KEY and not args.dry_run:
+        print("❌ GEMINI_API_KEY não configurada")
+        return 1
+
+    print(f"🔎 Buscando comentários longos dos últimos {args.days} dias...")
+    texts = fetch_long_activity_texts(
+        agenda.get_bq_client(), agenda.PROJECT_ID, agenda.DATASET_ID, args.days, agenda.ACTIVITY_DATE_SQL,
+    )
+    profile = agenda._summary_profile(args.profile)
+    key_by_text = {text: agenda._summary_key(text, profile) for text in texts}
+    print(f"   • {len(key_by_text)} textos distintos")
+
+    done = load_checkpoint(args.checkpoint, profile)
+    pending = [text for text, key in key_by_text.items() if key not in done]
+
+    # Já persistidos (ex.: gerados sob demanda pela API): um multi-get por lote
+    persisted = set()
+    for start in range(0, len(pending), 500):
+        chunk_keys = [key_by_text[text] for text in pending[start:start + 500]]
+        persisted.update(agenda._firestore_get_summaries(chunk_keys))
+    done.update(persisted)
+    pending = [text for text in pending if key_by_text[text] not in persisted]
+    if args.limit > 0:
+        pending = pending[:args.limit]
+    print(f"   • {len(persisted)} já no Firestore, {len(pending)} a resumir")
+
+    if args.dry_run:
+        print("ℹ️ Dry-run: nada gerado")
+        return 0
+    if not pending:
+        save_checkpoint(args.checkpoint, profile, done)
+        print("✅ Nada a gerar")
+        return 0
+
+    started = time.time()
+    generated = failed = 0
+    for start in range(0, len(pending), max(1, args.chunk_size)):
+        chunk = pending[start:start + max(1, args.chunk_size)]
+        summaries = agenda._summarize_activity_texts(chunk, prompt_profile=profile)
+        for text in chunk:
+            if text in summaries:
+                done.add(key_by_text[text])
+                generated += 1
+            else:
+                failed += 1
+        save_checkpoint(args.checkpoint, profile, done)
+        print(f"   • {start + len(chunk)}/{len(pending)} processados ({generated} ok, {failed} falhas) em {time.time() - started:.0f}s")
+
+    print(f"✅ {generated} resumos gerados; {failed} falharam (serão tentados na próxima execução)")
+    return 0 if not failed else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Layout físico das tabelas de deals no BigQuery (usado pelos loaders)
+
+- Coluna de data gravada como DATE (não string), para a API filtrar sem
+  SAFE.PARSE_DATE e o BigQuery podar partições.
+- Particionamento mensal pela coluna de data: as tabelas têm poucos
+  milhares de linhas e a API filtra por ano/trimestre/mês.
+- Clustering por vendedor e Fiscal Q (filtros mais comuns depois do período).
+- Carga em <tabela>__staging e troca única no fim: carga que falha não
+  apaga nem esvazia a tabela em uso.
+"""
+
+import pandas as pd
+
+# Mesmos formatos, na mesma ordem, que build_flexible_date_expr da API
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d']
+
+# Tabelas lidas pela API: coluna de partição e colunas de clustering
+TABLE_LAYOUTS = {
+    'pipeline': ('Data_Prevista', ['Vendedor', 'Fiscal_Q']),
+    'closed_deals_won': ('Data_Fechamento', ['Vendedor', 'Fiscal_Q']),
+    'closed_deals_lost': ('Data_Fechamento', ['Vendedor', 'Fiscal_Q']),
+}
+
+
+def parse_date_column(series):
+    """Converte uma coluna de datas (string/mista) em objetos date (None se inválida)"""
+    text = series.astype('string').str.strip().str[:10]
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    for fmt in DATE_FORMATS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors='coerce')
+    return parsed.dt.date.where(parsed.notna(), None)
+
+
+def staging_table_ref(table_ref):
+    """Tabela de staging da carga (descartável, substituída a cada carga)"""
+    return f"{table_ref}__staging"
+
+
+def replace_from_staging(client, staging_ref, table_ref, date_column, cluster_columns, columns):
+    """
+    Substitui table_ref pelo conteúdo da staging numa única instrução
+    (CREATE OR REPLACE TABLE ... AS SELECT) e apaga a staging.
+
+    A tabela atual só é trocada depois que a carga deu certo, e a troca
+    aceita partição/clustering diferentes dos atuais (o BigQuery não altera
+    partição de tabela existente). A coluna de data é convertida
+    explicitamente para DATE em vez de depender do autodetect.
+    """
+    select = '*'
+    layout = []
+    if date_column and date_column in columns:
+        select = f"* REPLACE (SAFE_CAST(`{date_column}` AS DATE) AS `{date_column}`)"
+        layout.append(f"PARTITION BY DATE_TRUNC(`{date_column}`, MONTH)")
+    clustering = [col for col in cluster_columns if col in columns]
+    if clustering:
+        layout.append('CLUSTER BY ' + ', '.join(f'`{col}`' for col in clustering))
+    query = (
+        f"CREATE OR REPLACE TABLE `{table_ref}`\n"
+        + ''.join(f"{clause}\n" for clause in layout)
+        + f"AS SELECT {select} FROM `{staging_ref}`"
+    )
+    client.query(query).result()
+    client.delete_table(staging_ref, not_found_ok=True)
@@ -0,0 +1,201 @@
+"""Admission control for API requests (per Cloud Run instance).
+
+Caps how many requests run at once, globally and per endpoint, so a burst
+does not open dozens of BigQuery jobs in parallel and trip the 429/backoff
+path. Requests over the cap wait in a FIFO queue; a request that is not
+admitted before its deadline is shed (the caller answers 503).
+
+All state is touched from the event loop thread only (the middleware is
+async), so no locks are needed.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+def parse_endpoint_limits(raw: str) -> Dict[str, int]:
+    """Parse "/api/dashboard=4,/api/weekly-agenda=2" into a dict."""
+    limits: Dict[str, int] = {}
+    for item in (raw or "").split(","):
+        path, sep, value = item.strip().rpartition("=")
+        if not sep or not path:
+            continue
+        try:
+            limits[path.strip()] = max(0, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("endpoint", "future", "enqueued_at")
+
+    def __init__(self, endpoint: str, future: "asyncio.Future[None]") -> None:
+        self.endpoint = endpoint
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        *,
+        max_concurrent: int,
+        endpoint_limits: Optional[Dict[str, int]] = None,
+        default_endpoint_limit: int = 0,
+        queue_timeout_seconds: float = 10.0,
+        max_queue: int = 100,
+        wait_samples: int = 1000,
+    ) -> None:
+        self.max_concurrent = max(0, int(max_concurrent))
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self.default_endpoint_limit = max(0, int(default_endpoint_limit))
+        self.queue_timeout_seconds = float(queue_timeout_seconds)
+        self.max_queue = max(0, int(max_queue))
+        self._active = 0
+        self._active_by_endpoint: Dict[str, int] = {}
+        self._queue: Deque[_Waiter] = deque()
+        self._waits_ms: Deque[float] = deque(maxlen=max(1, wait_samples))
+        self._per_endpoint: Dict[str, Dict[str, int]] = {}
+        self._counters = {
+            "admitted": 0,
+            "queued": 0,
+            "shed_timeout": 0,
+            "shed_queue_full": 0,
+            "max_queue_depth": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0 or self.default_endpoint_limit > 0 or bool(self.endpoint_limits)
+
+    def endpoint_limit(self, endpoint: str) -> int:
+        return self.endpoint_limits.get(endpoint, self.default_endpoint_limit)
+
+    async def acquire(self, endpoint: str) -> float:
+        """Wait for a slot; return the queue wait in ms or raise AdmissionRejected."""
+        # Queued waiters are always blocked by a cap (release() dispatches
+        # eligible ones immediately), so free capacity can be taken right away.
+        if self._has_capacity(endpoint):
+            self._grant(endpoint)
+            self._record_wait(endpoint, 0.0)
+            return 0.0
+
+        if self.max_queue and len(self._queue) >= self.max_queue:
+            self._counters["shed_queue_full"] += 1
+            self._endpoint_counter(endpoint, "shed")
+            raise AdmissionRejected("queue_full")
+
+        waiter = _Waiter(endpoint, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        self._counters["queued"] += 1
+        self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], len(self._queue))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Granted right at the deadline: keep the slot
+                pass
+            else:
+                self._discard(waiter)
+                self._counters["shed_timeout"] += 1
+                self._endpoint_counter(endpoint, "shed")
+                raise AdmissionRejected("queue_timeout")
+        except BaseException:
+            # Client went away while queued
+            if waiter.future.done():
+                self.release(endpoint)
+            else:
+                self._discard(waiter)
+            raise
+
+        wait_ms = (time.perf_counter() - waiter.enqueued_at) * 1000
+        self._record_wait(endpoint, wait_ms)
+        return wait_ms
+
+    def release(self, endpoint: str) -> None:
+        self._active = max(0, self._active - 1)
+        remaining = self._active_by_endpoint.get(endpoint, 0) - 1
+        if remaining > 0:
+            self._active_by_endpoint[endpoint] = remaining
+        else:
+            self._active_by_endpoint.pop(endpoint, None)
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits_ms)
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "default_endpoint_limit": self.default_endpoint_limit,
+            "endpoint_limits": dict(self.endpoint_limits),
+            "queue_timeout_seconds": self.queue_timeout_seconds,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queue_depth": len(self._queue),
+            "wait_ms": {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                "p50": _percentile(waits, 0.50),
+                "p95": _percentile(waits, 0.95),
+                "max": round(waits[-1], 2) if waits else 0.0,
+            },
+            "active_by_endpoint": dict(self._active_by_endpoint),
+            "by_endpoint": {key: dict(value) for key, value in self._per_endpoint.items()},
+            **self._counters,
+        }
+
+    def _has_capacity(self, endpoint: str) -> bool:
+        if self.max_concurrent and self._active >= self.max_concurrent:
+            return False
+        limit = self.endpoint_limit(endpoint)
+        return not limit or self._active_by_endpoint.get(endpoint, 0) < limit
+
+    def _grant(self, endpoint: str) -> None:
+        self._active += 1
+        self._active_by_endpoint[endpoint] = self._active_by_endpoint.get(endpoint, 0) + 1
+        self._counters["admitted"] += 1
+        self._endpoint_counter(endpoint, "admitted")
+
+    def _dispatch(self) -> None:
+        # FIFO, but a waiter blocked by its own endpoint cap does not block others
+        granted: List[_Waiter] = []
+        for waiter in self._queue:
+            if self.max_concurrent and self._active >= self.max_concurrent:
+                break
+            if waiter.future.done() or not self._has_capacity(waiter.endpoint):
+                continue
+            self._grant(waiter.endpoint)
+            waiter.future.set_result(None)
+            granted.append(waiter)
+        for waiter in granted:
+            self._discard(waiter)
+
+    def _discard(self, waiter: _Waiter) -> None:
+        try:
+            self._queue.remove(waiter)
+        except ValueError:
+            pass
+
+    def _record_wait(self, endpoint: str, wait_ms: float) -> None:
+        self._waits_ms.append(wait_ms)
+        bucket = self._per_endpoint.setdefault(endpoint, {"admitted": 0, "shed": 0, "max_wait_ms": 0})
+        bucket["max_wait_ms"] = max(bucket["max_wait_ms"], int(wait_ms))
+
+    def _endpoint_counter(self, endpoint: str, counter: str) -> None:
+        bucket = self._per_endpoint.setdefault(endpoint, {"admitted": 0, "shed": 0, "max_wait_ms": 0})
+        bucket[counter] += 1
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
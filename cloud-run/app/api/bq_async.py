@@ -0,0 +1,150 @@
+"""Awaitable BigQuery execution for async routers.
+
+client.query(...).result() blocks; calling it from an `async def` endpoint
+stalls the whole event loop. These helpers run the job on a bounded thread
+pool (BQ_ASYNC_MAX_WORKERS) and return the rows as a list, so concurrent
+requests on the same instance keep being served while BigQuery works.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from google.cloud import bigquery
+
+from api.query_profiler import record_query
+from api.sql_templates import job_config_for
+
+BQ_ASYNC_MAX_WORKERS = int(os.getenv("BQ_ASYNC_MAX_WORKERS", "16"))
+BQ_ASYNC_QUERY_TIMEOUT_SECONDS = float(os.getenv("BQ_ASYNC_QUERY_TIMEOUT_SECONDS", "120"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, BQ_ASYNC_MAX_WORKERS), thread_name_prefix="bq-async")
+_STATS_LOCK = threading.Lock()
+_STATS = {"submitted": 0, "running": 0, "completed": 0, "failed": 0}
+
+QuerySpec = Union[str, Tuple[str, Optional[bigquery.QueryJobConfig]]]
+
+
+def _tracked(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    with _STATS_LOCK:
+        _STATS["running"] += 1
+    try:
+        result = fn(*args, **kwargs)
+        outcome = "completed"
+        return result
+    except Exception:
+        outcome = "failed"
+        raise
+    finally:
+        with _STATS_LOCK:
+            _STATS["running"] -= 1
+            _STATS[outcome] += 1
+
+
+def _query_rows(
+    client: bigquery.Client,
+    query: str,
+    job_config: Optional[bigquery.QueryJobConfig],
+    timeout_seconds: Optional[float],
+    label: Optional[str] = None,
+) -> List[Any]:
+    job = None
+    started = time.perf_counter()
+    try:
+        job_config = job_config_for(query, job_config)
+        job = client.query(query, job_config=job_config) if job_config is not None else client.query(query)
+        rows = list(job.result(timeout=timeout_seconds))
+    except Exception as exc:
+        record_query(query, job, (time.perf_counter() - started) * 1000, label=label, error=exc)
+        raise
+    record_query(query, job, (time.perf_counter() - started) * 1000, label=label)
+    return rows
+
+
+async def run_blocking(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run any blocking BigQuery-bound callable on the shared pool."""
+    with _STATS_LOCK:
+        _STATS["submitted"] += 1
+    loop = asyncio.get_running_loop()
+    # Run under the caller's context so query profiling attributes jobs to the request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_EXECUTOR, functools.partial(context.run, _tracked, fn, *args, **kwargs))
+
+
+_ITER_DONE = object()
+
+
+async def iterate_blocking(fn: Callable[..., Iterable[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+    """Consume a blocking iterator (e.g. an LLM stream) on the shared pool.
+
+    Items are handed to the event loop as soon as they are produced. If the
+    consumer stops early (client disconnected) the producer stops at its
+    next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def _produce() -> None:
+        try:
+            for item in fn(*args, **kwargs):
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except Exception as exc:
+            loop.call_soon_threadsafe(queue.put_nowait, (_ITER_DONE, exc))
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, (_ITER_DONE, None))
+
+    with _STATS_LOCK:
+        _STATS["submitted"] += 1
+    context = contextvars.copy_context()
+    loop.run_in_executor(_EXECUTOR, functools.partial(context.run, _tracked, _produce))
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _ITER_DONE:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        stopped.set()
+
+
+async def run_query(
+    client: bigquery.Client,
+    query: str,
+    job_config: Optional[bigquery.QueryJobConfig] = None,
+    *,
+    timeout_seconds: Optional[float] = BQ_ASYNC_QUERY_TIMEOUT_SECONDS,
+    label: Optional[str] = None,
+) -> List[Any]:
+    """Await a query and return its rows (bigquery Row objects)."""
+    return await run_blocking(_query_rows, client, query, job_config, timeout_seconds, label)
+
+
+async def run_queries(
+    client: bigquery.Client,
+    queries: Dict[str, QuerySpec],
+    *,
+    timeout_seconds: Optional[float] = BQ_ASYNC_QUERY_TIMEOUT_SECONDS,
+) -> Dict[str, List[Any]]:
+    """Run independent queries concurrently; values are SQL or (SQL, job_config)."""
+    names = list(queries.keys())
+    tasks = []
+    for name in names:
+        spec = queries[name]
+        query, job_config = spec if isinstance(spec, tuple) else (spec, None)
+        tasks.append(run_query(client, query, job_config, timeout_seconds=timeout_seconds, label=name))
+    results = await asyncio.gather(*tasks)
+    return dict(zip(names, results))
+
+
+def stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        return {"max_workers": BQ_ASYNC_MAX_WORKERS, **_STATS}
@@ -0,0 +1,294 @@
+"""Columnar in-process snapshots of the deal tables behind the list endpoints.
+
+/api/pipeline, /api/closed/won and /api/closed/lost read a few thousand
+rows from BigQuery per request. A snapshot keeps the whole projected table
+per instance instead:
+  - numeric columns as float64 arrays (NaN = NULL);
+  - every other column dictionary-encoded (int32 codes + list of values);
+  - a deal id -> row index map for point lookups.
+
+Filters are evaluated once per distinct value and broadcast through the
+codes, sorting/top-N use argpartition/argsort, and only the returned rows
+are turned into dicts. A new snapshot is built off to the side and swapped
+in with a single reference assignment, so readers never see a mix.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+QUARTER_MONTHS = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
+
+
+def _is_number(value: Any) -> bool:
+    # Decimal covers BigQuery NUMERIC columns
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, (int, float)) or type(value).__name__ == "Decimal"
+
+
+class ColumnarTable:
+    def __init__(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        *,
+        key_column: Optional[str] = None,
+        hidden_prefix: str = "_snapshot_",
+        versions: Optional[Dict[str, Optional[int]]] = None,
+    ) -> None:
+        rows = list(rows)
+        self.row_count = len(rows)
+        self.columns: List[str] = list(rows[0].keys()) if rows else []
+        self.output_columns = [c for c in self.columns if not c.startswith(hidden_prefix)]
+        self.versions = dict(versions or {})
+        self.loaded_at = time.time()
+        self._numeric: Dict[str, np.ndarray] = {}
+        self._integer: Dict[str, bool] = {}
+        self._codes: Dict[str, np.ndarray] = {}
+        self._vocab: Dict[str, List[Any]] = {}
+        for column in self.columns:
+            values = [row.get(column) for row in rows]
+            present = [v for v in values if v is not None]
+            if present and all(_is_number(v) for v in present):
+                self._numeric[column] = np.array(
+                    [np.nan if v is None else float(v) for v in values], dtype=np.float64
+                )
+                self._integer[column] = all(isinstance(v, int) for v in present)
+            else:
+                index: Dict[Any, int] = {}
+                self._codes[column] = np.fromiter(
+                    (index.setdefault(v, len(index)) for v in values), dtype=np.int32, count=len(values)
+                )
+                self._vocab[column] = list(index.keys())
+        self._key_index: Dict[Any, int] = {}
+        if key_column and key_column in self.columns:
+            for position, row in enumerate(rows):
+                self._key_index.setdefault(row.get(key_column), position)
+
+    @property
+    def nbytes(self) -> int:
+        return int(
+            sum(a.nbytes for a in self._numeric.values())
+            + sum(a.nbytes for a in self._codes.values())
+        )
+
+    def has_column(self, column: str) -> bool:
+        return column in self._numeric or column in self._codes
+
+    def all(self) -> np.ndarray:
+        return np.ones(self.row_count, dtype=bool)
+
+    def where(self, column: str, predicate: Callable[[Any], bool]) -> np.ndarray:
+        """Rows whose value satisfies predicate (None for NULL)."""
+        if not self.has_column(column):
+            # Only an empty snapshot has no columns; treat as all-NULL
+            return np.full(self.row_count, bool(predicate(None)), dtype=bool)
+        if column in self._codes:
+            allowed = np.array([bool(predicate(v)) for v in self._vocab[column]] or [False], dtype=bool)
+            return allowed[self._codes[column]] if self.row_count else self.all()
+        values = self._numeric[column]
+        distinct, inverse = np.unique(values, return_inverse=True)
+        allowed = np.array([bool(predicate(None if np.isnan(v) else v)) for v in distinct], dtype=bool)
+        return allowed[inverse.reshape(-1)] if self.row_count else self.all()
+
+    def isin(self, column: str, values: Iterable[Any], *, strip: bool = False) -> np.ndarray:
+        wanted = set(values)
+        if strip:
+            return self.where(column, lambda v: v is not None and str(v).strip() in wanted)
+        return self.where(column, lambda v: v in wanted)
+
+    def lookup(self, key: Any) -> Optional[Dict[str, Any]]:
+        position = self._key_index.get(key)
+        return None if position is None else self.materialize(np.array([position]))[0]
+
+    def top_n(self, mask: np.ndarray, sort_column: str, n: int, *, descending: bool = True) -> np.ndarray:
+        """Row positions of the first n masked rows by sort_column (NULLs last)."""
+        positions = np.flatnonzero(mask)
+        if not len(positions) or n <= 0:
+            return positions[:0]
+        keys = self._numeric[sort_column][positions]
+        keys = np.where(np.isnan(keys), -np.inf if descending else np.inf, keys)
+        if descending:
+            keys = -keys
+        if n < len(positions):
+            candidates = np.argpartition(keys, n - 1)[:n]
+            order = candidates[np.argsort(keys[candidates], kind="stable")]
+        else:
+            order = np.argsort(keys, kind="stable")
+        return positions[order]
+
+    def materialize(self, positions: np.ndarray, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        columns = list(columns or self.output_columns)
+        decoded: Dict[str, List[Any]] = {}
+        for column in columns:
+            if column in self._codes:
+                vocab = self._vocab[column]
+                decoded[column] = [vocab[code] for code in self._codes[column][positions].tolist()]
+            else:
+                as_int = self._integer[column]
+                decoded[column] = [
+                    None if v != v else (int(v) if as_int else v)
+                    for v in self._numeric[column][positions].tolist()
+                ]
+        return [
+            {column: decoded[column][i] for column in columns}
+            for i in range(len(positions))
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.row_count,
+            "columns": len(self.output_columns),
+            "dictionary_columns": len(self._codes),
+            "bytes": self.nbytes,
+            "age_seconds": round(time.time() - self.loaded_at, 1),
+            "versions": dict(self.versions),
+        }
+
+
+def deal_list_mask(
+    table: ColumnarTable,
+    *,
+    year: Optional[int],
+    quarter: Optional[int],
+    month: Optional[int],
+    sellers: Optional[List[str]],
+    in_filters: Dict[str, List[str]],
+    fiscal_fallback: bool,
+    strip_columns: Iterable[str] = (),
+    year_column: str = "_snapshot_year",
+    month_column: str = "_snapshot_month",
+) -> np.ndarray:
+    """Same rows as the list endpoints' WHERE clause.
+
+    fiscal_fallback: closed deals also match the period by their Fiscal_Q
+    label (FYyy-Qn), like /api/closed/won|lost.
+    """
+    mask = table.all()
+    fiscal_q_exact = f"FY{str(year)[-2:]}-Q{quarter}" if (fiscal_fallback and year and quarter) else None
+    if year:
+        in_year = table.isin(year_column, [int(year)])
+        mask &= (in_year | table.isin("Fiscal_Q", [fiscal_q_exact])) if fiscal_q_exact else in_year
+    if quarter in QUARTER_MONTHS:
+        start, end = QUARTER_MONTHS[quarter]
+        in_months = table.where(month_column, lambda m: m is not None and start <= m <= end)
+        if fiscal_q_exact:
+            in_months |= table.isin("Fiscal_Q", [fiscal_q_exact])
+        elif fiscal_fallback:
+            suffix = f"-Q{quarter}"
+            in_months |= table.where("Fiscal_Q", lambda fq: str(fq or "").endswith(suffix))
+        mask &= in_months
+    if month:
+        mask &= table.isin(month_column, [int(month)])
+    if sellers:
+        mask &= table.isin("Vendedor", sellers)
+    strip = set(strip_columns)
+    for column, values in in_filters.items():
+        mask &= table.isin(column, values, strip=column in strip)
+    return mask
+
+
+class SnapshotStore:
+    """Per-table snapshots, (re)loaded in the background; get() is None while unavailable.
+
+    A missing or outdated snapshot is rebuilt on a daemon thread (one per
+    table at a time) and requests keep using BigQuery until it is swapped
+    in; a failed load is retried after retry_seconds.
+    """
+
+    def __init__(
+        self,
+        loaders: Dict[str, Callable[[], ColumnarTable]],
+        is_current: Callable[[str, ColumnarTable], bool],
+        *,
+        retry_seconds: float = 60.0,
+    ) -> None:
+        self._loaders = dict(loaders)
+        self._is_current = is_current
+        self.retry_seconds = float(retry_seconds)
+        self._tables: Dict[str, ColumnarTable] = {}
+        self._locks = {name: threading.Lock() for name in self._loaders}
+        self._last_failure: Dict[str, float] = {}
+        self._last_error: Dict[str, str] = {}
+        self._counters = {"hits": 0, "fallbacks": 0, "loads": 0, "load_errors": 0}
+
+    @property
+    def table_names(self) -> List[str]:
+        return list(self._loaders)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._tables
+
+    def get(self, name: str) -> Optional[ColumnarTable]:
+        table = self._tables.get(name)
+        if table is not None and self._is_current(name, table):
+            self._counters["hits"] += 1
+            return table
+        # An outdated snapshot is not served; BigQuery answers until the rebuild lands
+        self.refresh_in_background(name)
+        self._counters["fallbacks"] += 1
+        return None
+
+    def refresh(self, name: str) -> Optional[ColumnarTable]:
+        """Build a new snapshot on this thread and swap it in; None when skipped or failed."""
+        if not self._claim(name):
+            return None
+        return self._load(name)
+
+    def refresh_in_background(self, name: str) -> bool:
+        """Start rebuilding a snapshot on a daemon thread; False when skipped."""
+        if not self._claim(name):
+            return False
+        try:
+            threading.Thread(target=self._load, args=(name,), name=f"snapshot-{name}", daemon=True).start()
+        except Exception:
+            self._locks[name].release()
+            raise
+        return True
+
+    def wait(self, name: str, timeout: float = -1) -> bool:
+        """Block until no load of name is in flight; False on timeout."""
+        lock = self._locks[name]
+        if not lock.acquire(timeout=timeout):
+            return False
+        lock.release()
+        return True
+
+    def _claim(self, name: str) -> bool:
+        if time.time() - self._last_failure.get(name, 0.0) < self.retry_seconds:
+            return False
+        return self._locks[name].acquire(blocking=False)
+
+    def _load(self, name: str) -> Optional[ColumnarTable]:
+        # Runs with the table's lock held (taken by _claim)
+        try:
+            started = time.perf_counter()
+            table = self._loaders[name]()
+            self._tables[name] = table
+            self._counters["loads"] += 1
+            print(f"[SNAPSHOT] {name}: {table.row_count} rows loaded in {int((time.perf_counter() - started) * 1000)}ms")
+            return table
+        except Exception as exc:
+            self._last_failure[name] = time.time()
+            self._last_error[name] = str(exc)[:200]
+            self._counters["load_errors"] += 1
+            print(f"[SNAPSHOT] WARN: {name} load failed, serving from BigQuery: {self._last_error[name]}")
+            return None
+        finally:
+            self._locks[name].release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tables": {
+                name: {
+                    "loaded": name in self._tables,
+                    "loading": self._locks[name].locked(),
+                    "current": bool(name in self._tables and self._is_current(name, self._tables[name])),
+                    "last_error": self._last_error.get(name, ""),
+                    **(self._tables[name].stats() if name in self._tables else {}),
+                }
+                for name in self._loaders
+            },
+            **self._counters,
+        }
@@ -4,15 +4,18 @@ AI Analysis Endpoint - Análise de Vitórias/Perdas com IA
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any
-import google.generativeai as genai
 import os
 
+from api.bq_async import run_blocking
+from api.llm_client import generate_gemini_text_with_status
+
 router = APIRouter()
 
-# Gemini Configuration (optional)
+# Gemini Configuration (optional): Vertex AI first, API key as fallback
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+PROJECT_ID = os.getenv("GCP_PROJECT", "operaciones-br").strip().rstrip("\\/")
+VERTEX_AI_LOCATION = os.getenv("VERTEX_AI_LOCATION", "us-central1")
 
 class DealAnalysisRequest(BaseModel):
     won_deals: List[Dict[str, Any]]
@@ -83,11 +86,20 @@ Você é um analista sênior de vendas B2B de tecnologia. Analise os dados de de
 - Se dados insuficientes, seja honesto
 """
         
-        # Chamar Gemini - usando modelo disponível atualmente
-        model = genai.GenerativeModel('models/gemini-1.0-pro-latest')
-        response = model.generate_content(prompt)
+        # Chamar Gemini (candidatos com fallback, hedging e timeout por tentativa)
+        llm_result = await run_blocking(
+            generate_gemini_text_with_status,
+            prompt,
+            model_name=GEMINI_MODEL,
+            api_key=GEMINI_API_KEY,
+            project_id=PROJECT_ID,
+            location=VERTEX_AI_LOCATION,
+        )
+        if not llm_result.get("ok"):
+            # Mesmo caminho de antes para erro do Gemini: análise baseada em dados
+            raise RuntimeError(llm_result.get("error") or "LLM failed")
         
-        if not response or not response.text:
+        if not llm_result.get("text"):
             return {
                 "success": False,
                 "analysis": "<p>Não foi possível gerar análise no momento. Tente novamente.</p>"
@@ -95,7 +107,7 @@ Você é um analista sênior de vendas B2B de tecnologia. Analise os dados de de
         
         return {
             "success": True,
-            "analysis": response.text,
+            "analysis": llm_result["text"],
             "metadata": {
                 "won_analyzed": len(won_sample),
                 "lost_analyzed": len(lost_sample),
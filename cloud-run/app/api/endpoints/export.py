@@ -1,47 +1,201 @@
 """Export endpoints.
 
 War Room was removed; we keep only pauta semanal exports.
+
+Exports stream page by page from the BigQuery row iterator, so memory stays
+constant regardless of the result size. Formats: csv (default), jsonl and
+parquet (needs pyarrow), optionally gzip-compressed (csv/jsonl).
 """
-from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from google.cloud import bigquery
-from typing import Optional
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
 import os
 import csv
 import io
+import json
+import zlib
+
+from api.bq_async import run_blocking
+from api.sql_templates import bind_value, in_filter, job_config_for
+
+try:
+    import pyarrow as pa  # type: ignore[import-not-found]
+    import pyarrow.parquet as pq  # type: ignore[import-not-found]
+except Exception:
+    pa = None
+    pq = None
 
 router = APIRouter()
 
 PROJECT_ID = os.getenv("GCP_PROJECT", "operaciones-br").strip().rstrip("\\/")
 DATASET_ID = os.getenv("BQ_DATASET", "sales_intelligence")
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "5000"))
+
+# (BigQuery column, exported column)
+PAUTA_EXPORT_COLUMNS: List[Tuple[str, str]] = [
+    ("Oportunidade", "Oportunidade"),
+    ("Vendedor", "Vendedor"),
+    ("Conta", "Conta"),
+    ("Produtos", "Produtos"),
+    ("Gross", "Gross"),
+    ("Net", "Net"),
+    ("Fiscal_Q", "Fiscal_Q"),
+    ("Confianca", "Confianca"),
+    ("Dias_Funil", "Dias_Funil"),
+    ("Atividades", "Atividades"),
+    ("Categoria_Pauta", "Categoria"),
+    ("Risco_Score", "Risco_Score"),
+    ("Risk_Tags", "Risk_Tags"),
+    ("Proxima_Acao_Pipeline", "Proxima_Acao"),
+]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
 
 
 def get_bq_client():
     return bigquery.Client(project=PROJECT_ID)
 
 
+def _page_records(pages: Iterable[Iterable[Any]]) -> Iterator[List[List[Any]]]:
+    for page in pages:
+        yield [[row.get(source) for source, _ in PAUTA_EXPORT_COLUMNS] for row in page]
+
+
+def iter_csv(pages: Iterable[Iterable[Any]]) -> Iterator[bytes]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([name for _, name in PAUTA_EXPORT_COLUMNS])
+    yield output.getvalue().encode("utf-8")
+    for records in _page_records(pages):
+        output.seek(0)
+        output.truncate(0)
+        writer.writerows(records)
+        yield output.getvalue().encode("utf-8")
+
+
+def iter_jsonl(pages: Iterable[Iterable[Any]]) -> Iterator[bytes]:
+    names = [name for _, name in PAUTA_EXPORT_COLUMNS]
+    for records in _page_records(pages):
+        lines = [json.dumps(dict(zip(names, record)), ensure_ascii=False, default=str) for record in records]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose buffered bytes are drained after each row group."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_type(field_type: str):
+    return {
+        "INTEGER": pa.int64(),
+        "INT64": pa.int64(),
+        "FLOAT": pa.float64(),
+        "FLOAT64": pa.float64(),
+        "NUMERIC": pa.float64(),
+        "BIGNUMERIC": pa.float64(),
+        "BOOLEAN": pa.bool_(),
+        "BOOL": pa.bool_(),
+        "DATE": pa.date32(),
+        "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+    }.get(str(field_type or "").upper(), pa.string())
+
+
+def _arrow_schema(bq_schema: Optional[List[Any]]):
+    types = {field.name: _arrow_type(field.field_type) for field in (bq_schema or [])}
+    return pa.schema([(name, types.get(source, pa.string())) for source, name in PAUTA_EXPORT_COLUMNS])
+
+
+def _arrow_value(value: Any, arrow_type: Any) -> Any:
+    if value is None:
+        return None
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    if pa.types.is_string(arrow_type) and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def iter_parquet(pages: Iterable[Iterable[Any]], bq_schema: Optional[List[Any]] = None) -> Iterator[bytes]:
+    schema = _arrow_schema(bq_schema)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for records in _page_records(pages):
+            if not records:
+                continue
+            columns = [
+                pa.array([_arrow_value(record[i], field.type) for record in records], type=field.type)
+                for i, field in enumerate(schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
 @router.get("/export/pauta-semanal-csv")
 async def export_pauta_semanal_csv(
     seller: Optional[str] = Query(None, description="Filtrar por vendedor"),
-    categoria: Optional[str] = Query(None, description="Filtrar por categoria")
+    categoria: Optional[str] = Query(None, description="Filtrar por categoria"),
+    output_format: str = Query("csv", alias="format", pattern="^(csv|jsonl|parquet)$", description="Formato: csv, jsonl ou parquet"),
+    gzip: bool = Query(False, description="Comprimir com gzip (csv/jsonl)"),
 ):
     """
-    Export Weekly Agenda deals as CSV.
+    Export Weekly Agenda deals (streamed in pages; csv, jsonl or parquet).
     """
+    if output_format == "parquet" and pq is None:
+        raise HTTPException(status_code=400, detail="Formato parquet indisponível: pyarrow não instalado")
+
     try:
         client = get_bq_client()
         
         # Build WHERE clause
         filters = []
         if seller:
-            sellers = [s.strip() for s in seller.split(',') if s.strip()]
-            if len(sellers) == 1:
-                filters.append(f"Vendedor = '{sellers[0]}'")
-            elif len(sellers) > 1:
-                sellers_quoted = "', '".join(sellers)
-                filters.append(f"Vendedor IN ('{sellers_quoted}')")
+            seller_filter = in_filter("Vendedor", [s.strip() for s in seller.split(',') if s.strip()], hint="seller")
+            if seller_filter:
+                filters.append(seller_filter)
         
         if categoria:
-            filters.append(f"Categoria_Pauta = '{categoria}'")
+            filters.append(f"Categoria_Pauta = {bind_value(categoria, hint='categoria')}")
         
         where_clause = "WHERE " + " AND ".join(filters) if filters else ""
         
@@ -73,50 +227,30 @@ async def export_pauta_semanal_csv(
           Gross DESC
         """
         
-        results = client.query(query).result()
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Header
-        writer.writerow([
-            'Oportunidade', 'Vendedor', 'Conta', 'Produtos', 'Gross', 'Net',
-            'Fiscal_Q', 'Confianca', 'Dias_Funil', 'Atividades', 'Categoria',
-            'Risco_Score', 'Risk_Tags', 'Proxima_Acao'
-        ])
-        
-        # Data rows
-        for row in results:
-            writer.writerow([
-                row.Oportunidade,
-                row.Vendedor,
-                row.Conta,
-                row.Produtos,
-                row.Gross,
-                row.Net,
-                row.Fiscal_Q,
-                row.Confianca,
-                row.Dias_Funil,
-                row.Atividades,
-                row.Categoria_Pauta,
-                row.Risco_Score,
-                row.Risk_Tags,
-                row.Proxima_Acao_Pipeline
-            ])
-        
-        csv_content = output.getvalue()
-        output.close()
-        
-        filename = f"pauta_semanal_{seller if seller else 'all'}.csv".replace(" ", "_")
-        
-        return Response(
-            content=csv_content,
-            media_type="text/csv",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
+        job = await run_blocking(client.query, query, job_config=job_config_for(query))
+        row_iterator = await run_blocking(job.result, page_size=EXPORT_PAGE_SIZE)
+
+        if output_format == "parquet":
+            chunks = iter_parquet(row_iterator.pages, getattr(row_iterator, "schema", None))
+        elif output_format == "jsonl":
+            chunks = iter_jsonl(row_iterator.pages)
+        else:
+            chunks = iter_csv(row_iterator.pages)
+
+        filename = f"pauta_semanal_{seller if seller else 'all'}.{output_format}".replace(" ", "_")
+        media_type = EXPORT_MEDIA_TYPES[output_format]
+        if gzip and output_format != "parquet":
+            chunks = gzip_stream(chunks)
+            filename += ".gz"
+            media_type = "application/gzip"
+
+        return StreamingResponse(
+            chunks,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
-    
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao exportar CSV: {str(e)}")
@@ -9,16 +9,24 @@ import copy
 from fastapi import APIRouter, Query
 from google.cloud import bigquery
 
+from api.bq_async import iterate_blocking, run_blocking, run_queries
+from api.response_cache import ResponseCache
+from api.sse import sse_event, sse_response
+from api.sql_templates import job_config_for, register_query_template
+from api.tiered_cache import TieredCache
 from api.rag import (
     apply_similarity_threshold,
     build_closed_filters,
     build_filters,
+    build_index_filters,
     build_quality_metrics,
     build_pipeline_filters,
+    embeddings_freshness,
     enrich_similarity_scores,
     generate_ai_insights,
     rerank_deals_by_context,
     retrieve_similar_deals,
+    stream_ai_insights,
     summarize_deals_stats,
 )
 
@@ -30,7 +38,34 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
 VERTEX_AI_LOCATION = os.getenv("VERTEX_AI_LOCATION", "us-central1")
 INSIGHTS_CACHE_TTL_SECONDS = int(os.getenv("INSIGHTS_CACHE_TTL_SECONDS", "180"))
-_INSIGHTS_CACHE: Dict[str, Dict[str, Any]] = {}
+INSIGHTS_CACHE_MAX_BYTES = int(os.getenv("INSIGHTS_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+_INSIGHTS_CACHE = TieredCache(
+    "insights_rag",
+    ResponseCache(max_bytes=INSIGHTS_CACHE_MAX_BYTES, max_entries=500),
+)
+
+
+_PIPELINE_STATS_SQL = register_query_template("insights_rag.pipeline_stats", f"""
+        SELECT
+          COUNT(*) AS total,
+          ROUND(AVG(SAFE_CAST(Idle_Dias AS FLOAT64)), 1) AS avg_idle_days
+        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
+        {{where}}
+        """)
+_WON_STATS_SQL = register_query_template("insights_rag.won_stats", f"""
+        SELECT
+          COUNT(*) AS total,
+          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) AS avg_cycle_days
+        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
+        {{where}}
+        """)
+_LOST_STATS_SQL = register_query_template("insights_rag.lost_stats", f"""
+        SELECT
+          COUNT(*) AS total,
+          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) AS avg_cycle_days
+        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
+        {{where}}
+        """)
 
 
 def get_bq_client():
@@ -45,69 +80,15 @@ def _build_cache_key(params: Dict[str, Any]) -> str:
 
 
 def _get_cache(key: str) -> Optional[Dict[str, Any]]:
-    cached = _INSIGHTS_CACHE.get(key)
-    if not cached:
-        return None
-    if cached.get("expires_at", 0) <= time.time():
-        _INSIGHTS_CACHE.pop(key, None)
-        return None
-    return cached.get("payload")
+    return _INSIGHTS_CACHE.get(key)
 
 
 def _set_cache(key: str, payload: Dict[str, Any]) -> None:
-    _INSIGHTS_CACHE[key] = {
-        "payload": payload,
-        "expires_at": time.time() + INSIGHTS_CACHE_TTL_SECONDS,
-    }
+    _INSIGHTS_CACHE.set(key, payload, INSIGHTS_CACHE_TTL_SECONDS)
 
 
 def get_embeddings_freshness(client: bigquery.Client) -> dict:
-    try:
-        query = f"""
-        SELECT
-          table_id,
-          TIMESTAMP_MILLIS(last_modified_time) AS last_modified
-        FROM `{PROJECT_ID}.{DATASET_ID}.__TABLES__`
-        WHERE table_id IN ('pipeline', 'closed_deals_won', 'closed_deals_lost', 'deal_embeddings')
-        """
-        rows = list(client.query(query).result())
-        if not rows:
-            return {}
-
-        by_table = {
-            str(row.get("table_id")): row.get("last_modified")
-            for row in rows
-        }
-
-        embeddings_ts = by_table.get("deal_embeddings")
-        source_latest = max(
-            [
-                ts
-                for name, ts in by_table.items()
-                if name != "deal_embeddings" and ts is not None
-            ],
-            default=None,
-        )
-
-        lag_hours = 0.0
-        if embeddings_ts and source_latest:
-            lag_hours = max(
-                0.0,
-                (source_latest - embeddings_ts).total_seconds() / 3600.0,
-            )
-
-        return {
-            "deal_embeddings_last_modified": embeddings_ts.isoformat() if embeddings_ts else None,
-            "sources_last_modified": {
-                "pipeline": by_table.get("pipeline").isoformat() if by_table.get("pipeline") else None,
-                "closed_deals_won": by_table.get("closed_deals_won").isoformat() if by_table.get("closed_deals_won") else None,
-                "closed_deals_lost": by_table.get("closed_deals_lost").isoformat() if by_table.get("closed_deals_lost") else None,
-            },
-            "embeddings_lag_hours": round(lag_hours, 2),
-            "embeddings_stale": lag_hours >= 24.0,
-        }
-    except Exception:
-        return {}
+    return embeddings_freshness(client, project_id=PROJECT_ID, dataset_id=DATASET_ID)
 
 
 def _extend_where(where_clause: str, *extra_conditions: str) -> str:
@@ -121,6 +102,10 @@ def _extend_where(where_clause: str, *extra_conditions: str) -> str:
     return "WHERE " + extra_sql
 
 
+def _query_rows(client: bigquery.Client, query: str) -> list:
+        return [dict(row) for row in client.query(query, job_config=job_config_for(query)).result()]
+
+
 def get_business_highlights(
         client: bigquery.Client,
         *,
@@ -248,20 +233,247 @@ def get_business_highlights(
                 LIMIT 6
                 """
 
-                highlights["top_wins"] = [dict(row) for row in client.query(top_wins_query).result()]
-                highlights["top_losses"] = [dict(row) for row in client.query(top_losses_query).result()]
-                highlights["top_pipeline"] = [dict(row) for row in client.query(top_pipeline_query).result()]
-                highlights["top_gain_causes"] = [dict(row) for row in client.query(top_gain_causes_query).result()]
-                highlights["top_loss_causes"] = [dict(row) for row in client.query(top_loss_causes_query).result()]
-                highlights["win_tags"] = [dict(row) for row in client.query(win_tags_query).result()]
-                highlights["win_by_segment"] = [dict(row) for row in client.query(win_by_segment_query).result()]
-                highlights["win_by_family"] = [dict(row) for row in client.query(win_by_family_query).result()]
+                highlights["top_wins"] = _query_rows(client, top_wins_query)
+                highlights["top_losses"] = _query_rows(client, top_losses_query)
+                highlights["top_pipeline"] = _query_rows(client, top_pipeline_query)
+                highlights["top_gain_causes"] = _query_rows(client, top_gain_causes_query)
+                highlights["top_loss_causes"] = _query_rows(client, top_loss_causes_query)
+                highlights["win_tags"] = _query_rows(client, win_tags_query)
+                highlights["win_by_segment"] = _query_rows(client, win_by_segment_query)
+                highlights["win_by_family"] = _query_rows(client, win_by_family_query)
         except Exception:
                 return highlights
 
         return highlights
 
 
+async def _retrieve_ranked_deals(
+    client: bigquery.Client,
+    *,
+    query: str,
+    year: Optional[str],
+    quarter: Optional[str],
+    seller: Optional[str],
+    phase: Optional[str],
+    source: Optional[str],
+    top_k: int,
+    min_similarity: float,
+    timings_ms: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Vector retrieval + context rerank + similarity threshold."""
+    where_clause = build_filters(year, quarter, seller, source, phase)
+    effective_top_k = min(top_k, 40)
+
+    retrieval_start = time.perf_counter()
+    deals = await run_blocking(
+        retrieve_similar_deals,
+        client,
+        project_id=PROJECT_ID,
+        dataset_id=DATASET_ID,
+        query_text=query,
+        top_k=effective_top_k,
+        where_clause=where_clause,
+        index_filters=build_index_filters(year, quarter, seller, source, phase),
+    )
+    raw_retrieved_count = len(deals)
+    timings_ms["retrieval"] = int((time.perf_counter() - retrieval_start) * 1000)
+
+    ranking_start = time.perf_counter()
+    deals = enrich_similarity_scores(deals)
+
+    fiscal_q = f"FY{year[-2:]}-Q{quarter}" if year and quarter else None
+    deals = rerank_deals_by_context(
+        deals,
+        query_text=query,
+        seller=seller,
+        source=source,
+        fiscal_q=fiscal_q,
+    )
+
+    thresholded_deals = apply_similarity_threshold(deals, min_similarity=min_similarity)
+    threshold_relaxed = False
+    if not thresholded_deals and deals:
+        thresholded_deals = deals[: min(10, len(deals))]
+        threshold_relaxed = True
+    deals = thresholded_deals
+    timings_ms["ranking"] = int((time.perf_counter() - ranking_start) * 1000)
+
+    return {
+        "deals": deals,
+        "raw_retrieved_count": raw_retrieved_count,
+        "threshold_relaxed": threshold_relaxed,
+    }
+
+
+async def _collect_stats(
+    client: bigquery.Client,
+    deals: list,
+    *,
+    year: Optional[str],
+    quarter: Optional[str],
+    month: Optional[str],
+    date_start: Optional[str],
+    date_end: Optional[str],
+    seller: Optional[str],
+    phase: Optional[str],
+    timings_ms: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Deal stats, won/lost/pipeline totals (adaptive date range) and business highlights."""
+    stats_start = time.perf_counter()
+    stats = summarize_deals_stats(deals)
+
+    pipeline_where = build_pipeline_filters(year, quarter, month, date_start, date_end, seller, phase)
+    won_where = build_closed_filters(year, quarter, month, date_start, date_end, seller, "Data_Fechamento")
+    lost_where = build_closed_filters(year, quarter, month, date_start, date_end, seller, "Data_Fechamento")
+
+    pipeline_query = _PIPELINE_STATS_SQL.render(where=pipeline_where)
+    won_query = _WON_STATS_SQL.render(where=won_where)
+    lost_query = _LOST_STATS_SQL.render(where=lost_where)
+
+    stats_rows = await run_queries(
+        client,
+        {"pipeline": pipeline_query, "won": won_query, "lost": lost_query},
+    )
+    pipeline_rows = stats_rows["pipeline"]
+    wins_rows = stats_rows["won"]
+    losses_rows = stats_rows["lost"]
+
+    pipeline_stats = dict(pipeline_rows[0]) if pipeline_rows else {"total": 0, "avg_idle_days": 0}
+    wins_stats = dict(wins_rows[0]) if wins_rows else {"total": 0, "avg_cycle_days": 0}
+    losses_stats = dict(losses_rows[0]) if losses_rows else {"total": 0, "avg_cycle_days": 0}
+
+    adaptive_context = {
+        "enabled": False,
+        "reason": "",
+        "mode": "",
+    }
+
+    won_where_for_highlights = won_where
+    lost_where_for_highlights = lost_where
+
+    wins_total = int(float(wins_stats.get("total") or 0))
+    losses_total = int(float(losses_stats.get("total") or 0))
+
+    if (date_start or date_end) and wins_total == 0 and losses_total == 0:
+        fallback_won_where = build_closed_filters(year, quarter, month, None, None, seller, "Data_Fechamento")
+        fallback_lost_where = build_closed_filters(year, quarter, month, None, None, seller, "Data_Fechamento")
+
+        fallback_rows = await run_queries(client, {
+            "won": _WON_STATS_SQL.render(where=fallback_won_where),
+            "lost": _LOST_STATS_SQL.render(where=fallback_lost_where),
+        })
+        fallback_wins_rows = fallback_rows["won"]
+        fallback_losses_rows = fallback_rows["lost"]
+
+        fallback_wins_stats = dict(fallback_wins_rows[0]) if fallback_wins_rows else {"total": 0, "avg_cycle_days": 0}
+        fallback_losses_stats = dict(fallback_losses_rows[0]) if fallback_losses_rows else {"total": 0, "avg_cycle_days": 0}
+
+        fallback_wins_total = int(float(fallback_wins_stats.get("total") or 0))
+        fallback_losses_total = int(float(fallback_losses_stats.get("total") or 0))
+
+        if fallback_wins_total > 0 or fallback_losses_total > 0:
+            wins_stats = fallback_wins_stats
+            losses_stats = fallback_losses_stats
+            won_where_for_highlights = fallback_won_where
+            lost_where_for_highlights = fallback_lost_where
+            adaptive_context = {
+                "enabled": True,
+                "reason": "No won/lost records in selected date range",
+                "mode": "expanded_without_date_range",
+            }
+
+    stats["pipeline"] = pipeline_stats
+    stats["wins_stats"] = wins_stats
+    stats["losses_stats"] = losses_stats
+    stats["by_source"] = {
+        "won": int(float(wins_stats.get("total") or 0)),
+        "lost": int(float(losses_stats.get("total") or 0)),
+        "pipeline": int(float(pipeline_stats.get("total") or 0)),
+    }
+    for bucket in (stats, wins_stats, losses_stats):
+        bucket["top_sellers"] = []
+        bucket["top_accounts"] = []
+    timings_ms["stats"] = int((time.perf_counter() - stats_start) * 1000)
+
+    business_highlights = await run_blocking(
+        get_business_highlights,
+        client,
+        won_where=won_where_for_highlights,
+        lost_where=lost_where_for_highlights,
+        pipeline_where=pipeline_where,
+    )
+    return {
+        "stats": stats,
+        "wins_stats": wins_stats,
+        "losses_stats": losses_stats,
+        "adaptive": adaptive_context,
+        "business_highlights": business_highlights,
+    }
+
+
+def _insights_llm_kwargs(collected: Dict[str, Any], filters: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "gemini_api_key": GEMINI_API_KEY,
+        "gemini_model": GEMINI_MODEL,
+        "gcp_project": PROJECT_ID,
+        "vertex_location": VERTEX_AI_LOCATION,
+        "business_highlights": collected["business_highlights"],
+        "filters_context": filters,
+    }
+
+
+def _build_response_payload(
+    query: str,
+    filters: Dict[str, Any],
+    retrieval: Dict[str, Any],
+    collected: Dict[str, Any],
+    quality: Dict[str, Any],
+    ai_insights: Dict[str, Any],
+    freshness: dict,
+    timings_ms: Dict[str, Any],
+    min_similarity: float,
+) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "timestamp": datetime.utcnow().isoformat(),
+        "query": query,
+        "rag": {
+            "gemini_enabled": bool(GEMINI_API_KEY),
+            "vertex_auth_enabled": True,
+            "retrieved_count": len(retrieval["deals"]),
+            "min_similarity": min_similarity,
+            "threshold_relaxed": retrieval["threshold_relaxed"],
+            "freshness": freshness,
+            "cache_ttl_seconds": INSIGHTS_CACHE_TTL_SECONDS,
+            "cache_hit": False,
+            "adaptive": collected["adaptive"],
+        },
+        "quality": quality,
+        "latency_ms": timings_ms,
+        "filters": filters,
+        "stats": collected["stats"],
+        "wins_stats": collected["wins_stats"],
+        "losses_stats": collected["losses_stats"],
+        "business_highlights": collected["business_highlights"],
+        "aiInsights": ai_insights,
+        "deals": retrieval["deals"],
+    }
+
+
+def _cached_payload(cache_key: str) -> Optional[Dict[str, Any]]:
+    cached = _get_cache(cache_key)
+    if not cached:
+        return None
+    payload = copy.deepcopy(cached)
+    payload.setdefault("rag", {})
+    payload["rag"]["cache_hit"] = True
+    payload.setdefault("latency_ms", {})
+    payload["latency_ms"]["cache_lookup"] = 1
+    payload["latency_ms"]["served_from_cache"] = True
+    payload["timestamp"] = datetime.utcnow().isoformat()
+    return payload
+
+
 @router.get("/insights-rag")
 async def get_insights_rag(
     query: str = Query("insights de vendas", description="Texto base para a busca semantica"),
@@ -280,31 +492,20 @@ async def get_insights_rag(
     Retrieve similar deals using embeddings and generate insights with Gemini.
     """
     try:
-        cache_key = _build_cache_key(
-            {
-                "query": query,
-                "year": year,
-                "quarter": quarter,
-                "month": month,
-                "date_start": date_start,
-                "date_end": date_end,
-                "seller": seller,
-                "phase": phase,
-                "source": source,
-                "top_k": top_k,
-                "min_similarity": min_similarity,
-            }
-        )
-        cached = _get_cache(cache_key)
+        filters = {
+            "year": year,
+            "quarter": quarter,
+            "month": month,
+            "date_start": date_start,
+            "date_end": date_end,
+            "seller": seller,
+            "phase": phase,
+            "source": source,
+        }
+        cache_key = _build_cache_key({**filters, "query": query, "top_k": top_k, "min_similarity": min_similarity})
+        cached = _cached_payload(cache_key)
         if cached:
-            payload = copy.deepcopy(cached)
-            payload.setdefault("rag", {})
-            payload["rag"]["cache_hit"] = True
-            payload.setdefault("latency_ms", {})
-            payload["latency_ms"]["cache_lookup"] = 1
-            payload["latency_ms"]["served_from_cache"] = True
-            payload["timestamp"] = datetime.utcnow().isoformat()
-            return payload
+            return cached
 
         request_start = time.perf_counter()
         timings_ms = {
@@ -316,171 +517,40 @@ async def get_insights_rag(
         }
 
         client = get_bq_client()
-        where_clause = build_filters(year, quarter, seller, source, phase)
-        effective_top_k = min(top_k, 40)
-
-        retrieval_start = time.perf_counter()
-        deals = retrieve_similar_deals(
+        retrieval = await _retrieve_ranked_deals(
             client,
-            project_id=PROJECT_ID,
-            dataset_id=DATASET_ID,
-            query_text=query,
-            top_k=effective_top_k,
-            where_clause=where_clause,
-        )
-        raw_retrieved_count = len(deals)
-        timings_ms["retrieval"] = int((time.perf_counter() - retrieval_start) * 1000)
-
-        ranking_start = time.perf_counter()
-        deals = enrich_similarity_scores(deals)
-
-        fiscal_q = f"FY{year[-2:]}-Q{quarter}" if year and quarter else None
-        deals = rerank_deals_by_context(
-            deals,
-            query_text=query,
+            query=query,
+            year=year,
+            quarter=quarter,
             seller=seller,
+            phase=phase,
             source=source,
-            fiscal_q=fiscal_q,
+            top_k=top_k,
+            min_similarity=min_similarity,
+            timings_ms=timings_ms,
         )
-
-        thresholded_deals = apply_similarity_threshold(deals, min_similarity=min_similarity)
-        threshold_relaxed = False
-        if not thresholded_deals and deals:
-            thresholded_deals = deals[: min(10, len(deals))]
-            threshold_relaxed = True
-        deals = thresholded_deals
-        timings_ms["ranking"] = int((time.perf_counter() - ranking_start) * 1000)
-
-        stats_start = time.perf_counter()
-        stats = summarize_deals_stats(deals)
-        wins_deals = [d for d in deals if (d.get("source") or "").lower() == "won"]
-        losses_deals = [d for d in deals if (d.get("source") or "").lower() == "lost"]
-
-        pipeline_where = build_pipeline_filters(year, quarter, month, date_start, date_end, seller, phase)
-        won_where = build_closed_filters(year, quarter, month, date_start, date_end, seller, "Data_Fechamento")
-        lost_where = build_closed_filters(year, quarter, month, date_start, date_end, seller, "Data_Fechamento")
-
-        pipeline_query = f"""
-        SELECT
-          COUNT(*) AS total,
-          ROUND(AVG(SAFE_CAST(Idle_Dias AS FLOAT64)), 1) AS avg_idle_days
-        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
-        {pipeline_where}
-        """
-
-        won_query = f"""
-        SELECT
-          COUNT(*) AS total,
-          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) AS avg_cycle_days
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
-        {won_where}
-        """
-
-        lost_query = f"""
-        SELECT
-          COUNT(*) AS total,
-          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) AS avg_cycle_days
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-        {lost_where}
-        """
-
-        pipeline_rows = list(client.query(pipeline_query).result())
-        wins_rows = list(client.query(won_query).result())
-        losses_rows = list(client.query(lost_query).result())
-
-        pipeline_stats = dict(pipeline_rows[0]) if pipeline_rows else {"total": 0, "avg_idle_days": 0}
-        wins_stats = dict(wins_rows[0]) if wins_rows else {"total": 0, "avg_cycle_days": 0}
-        losses_stats = dict(losses_rows[0]) if losses_rows else {"total": 0, "avg_cycle_days": 0}
-
-        adaptive_context = {
-            "enabled": False,
-            "reason": "",
-            "mode": "",
-        }
-
-        won_where_for_highlights = won_where
-        lost_where_for_highlights = lost_where
-
-        wins_total = int(float(wins_stats.get("total") or 0))
-        losses_total = int(float(losses_stats.get("total") or 0))
-
-        if (date_start or date_end) and wins_total == 0 and losses_total == 0:
-            fallback_won_where = build_closed_filters(year, quarter, month, None, None, seller, "Data_Fechamento")
-            fallback_lost_where = build_closed_filters(year, quarter, month, None, None, seller, "Data_Fechamento")
-
-            fallback_wins_rows = list(client.query(f"""
-            SELECT
-              COUNT(*) AS total,
-              ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) AS avg_cycle_days
-            FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
-            {fallback_won_where}
-            """).result())
-
-            fallback_losses_rows = list(client.query(f"""
-            SELECT
-              COUNT(*) AS total,
-              ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) AS avg_cycle_days
-            FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-            {fallback_lost_where}
-            """).result())
-
-            fallback_wins_stats = dict(fallback_wins_rows[0]) if fallback_wins_rows else {"total": 0, "avg_cycle_days": 0}
-            fallback_losses_stats = dict(fallback_losses_rows[0]) if fallback_losses_rows else {"total": 0, "avg_cycle_days": 0}
-
-            fallback_wins_total = int(float(fallback_wins_stats.get("total") or 0))
-            fallback_losses_total = int(float(fallback_losses_stats.get("total") or 0))
-
-            if fallback_wins_total > 0 or fallback_losses_total > 0:
-                wins_stats = fallback_wins_stats
-                losses_stats = fallback_losses_stats
-                won_where_for_highlights = fallback_won_where
-                lost_where_for_highlights = fallback_lost_where
-                adaptive_context = {
-                    "enabled": True,
-                    "reason": "No won/lost records in selected date range",
-                    "mode": "expanded_without_date_range",
-                }
-
-        stats["pipeline"] = pipeline_stats
-        stats["wins_stats"] = wins_stats
-        stats["losses_stats"] = losses_stats
-        stats["by_source"] = {
-            "won": int(float(wins_stats.get("total") or 0)),
-            "lost": int(float(losses_stats.get("total") or 0)),
-            "pipeline": int(float(pipeline_stats.get("total") or 0)),
-        }
-        for bucket in (stats, wins_stats, losses_stats):
-            bucket["top_sellers"] = []
-            bucket["top_accounts"] = []
-        timings_ms["stats"] = int((time.perf_counter() - stats_start) * 1000)
-
-        business_highlights = get_business_highlights(
+        deals = retrieval["deals"]
+        collected = await _collect_stats(
             client,
-            won_where=won_where_for_highlights,
-            lost_where=lost_where_for_highlights,
-            pipeline_where=pipeline_where,
+            deals,
+            year=year,
+            quarter=quarter,
+            month=month,
+            date_start=date_start,
+            date_end=date_end,
+            seller=seller,
+            phase=phase,
+            timings_ms=timings_ms,
         )
 
         insights_start = time.perf_counter()
-        ai_insights = generate_ai_insights(
+        # LLM attempts (with hedging/timeouts) run off the event loop
+        ai_insights = await run_blocking(
+            generate_ai_insights,
             query,
             deals,
-            stats,
-            gemini_api_key=GEMINI_API_KEY,
-            gemini_model=GEMINI_MODEL,
-            gcp_project=PROJECT_ID,
-            vertex_location=VERTEX_AI_LOCATION,
-            business_highlights=business_highlights,
-            filters_context={
-                "year": year,
-                "quarter": quarter,
-                "month": month,
-                "date_start": date_start,
-                "date_end": date_end,
-                "seller": seller,
-                "phase": phase,
-                "source": source,
-            },
+            collected["stats"],
+            **_insights_llm_kwargs(collected, filters),
         )
         timings_ms["insights"] = int((time.perf_counter() - insights_start) * 1000)
         timings_ms["total"] = int((time.perf_counter() - request_start) * 1000)
@@ -489,47 +559,15 @@ async def get_insights_rag(
             deals,
             requested_top_k=top_k,
             min_similarity=min_similarity,
-            threshold_relaxed=threshold_relaxed,
-            raw_retrieved_count=raw_retrieved_count,
+            threshold_relaxed=retrieval["threshold_relaxed"],
+            raw_retrieved_count=retrieval["raw_retrieved_count"],
         )
 
-        freshness = get_embeddings_freshness(client)
-
-        response_payload = {
-            "success": True,
-            "timestamp": datetime.utcnow().isoformat(),
-            "query": query,
-            "rag": {
-                "gemini_enabled": bool(GEMINI_API_KEY),
-                "vertex_auth_enabled": True,
-                "retrieved_count": len(deals),
-                "min_similarity": min_similarity,
-                "threshold_relaxed": threshold_relaxed,
-                "freshness": freshness,
-                "cache_ttl_seconds": INSIGHTS_CACHE_TTL_SECONDS,
-                "cache_hit": False,
-                "adaptive": adaptive_context,
-            },
-            "quality": quality,
-            "latency_ms": timings_ms,
-            "filters": {
-                "year": year,
-                "quarter": quarter,
-                "month": month,
-                "date_start": date_start,
-                "date_end": date_end,
-                "seller": seller,
-                "phase": phase,
-                "source": source
-            },
-            "stats": stats,
-            "wins_stats": wins_stats,
-            "losses_stats": losses_stats,
-            "business_highlights": business_highlights,
-            "aiInsights": ai_insights,
-            "deals": deals
-        }
+        freshness = await run_blocking(get_embeddings_freshness, client)
 
+        response_payload = _build_response_payload(
+            query, filters, retrieval, collected, quality, ai_insights, freshness, timings_ms, min_similarity,
+        )
         _set_cache(cache_key, response_payload)
         return response_payload
 
@@ -597,3 +635,126 @@ async def get_insights_rag(
             },
             "deals": [],
         }
+
+
+@router.get("/insights-rag/stream")
+async def stream_insights_rag(
+    query: str = Query("insights de vendas", description="Texto base para a busca semantica"),
+    year: Optional[str] = Query(None, description="Ano fiscal (ex: 2026)"),
+    quarter: Optional[str] = Query(None, description="Quarter 1-4"),
+    month: Optional[str] = Query(None, description="Mês 1-12"),
+    date_start: Optional[str] = Query(None, description="Data inicial YYYY-MM-DD"),
+    date_end: Optional[str] = Query(None, description="Data final YYYY-MM-DD"),
+    seller: Optional[str] = Query(None, description="Nome do vendedor ou multiplos separados por virgula"),
+    phase: Optional[str] = Query(None, description="Fase atual do pipeline"),
+    source: Optional[str] = Query(None, description="Filtrar por source: pipeline, won, lost"),
+    top_k: int = Query(30, ge=5, le=200, description="Numero de resultados"),
+    min_similarity: float = Query(0.15, ge=0.0, le=1.0, description="Threshold minimo de similaridade para filtrar resultados"),
+):
+    """
+    Server-Sent Events variant of /insights-rag. Events, in order:
+    `retrieval` (deals + quality), `stats` (stats + business highlights),
+    `token` (LLM text chunks), `insights` (parsed aiInsights) and `done`
+    (the same payload /insights-rag returns); `error` on failure.
+    """
+    filters = {
+        "year": year,
+        "quarter": quarter,
+        "month": month,
+        "date_start": date_start,
+        "date_end": date_end,
+        "seller": seller,
+        "phase": phase,
+        "source": source,
+    }
+    cache_key = _build_cache_key({**filters, "query": query, "top_k": top_k, "min_similarity": min_similarity})
+
+    async def events():
+        try:
+            cached = _cached_payload(cache_key)
+            if cached:
+                yield sse_event("retrieval", {"deals": cached.get("deals", []), "quality": cached.get("quality"), "rag": cached.get("rag")})
+                yield sse_event("stats", {key: cached.get(key) for key in ("stats", "wins_stats", "losses_stats", "business_highlights")})
+                yield sse_event("insights", cached.get("aiInsights"))
+                yield sse_event("done", cached)
+                return
+
+            request_start = time.perf_counter()
+            timings_ms = {"retrieval": 0, "ranking": 0, "stats": 0, "insights": 0, "total": 0}
+            client = get_bq_client()
+
+            retrieval = await _retrieve_ranked_deals(
+                client,
+                query=query,
+                year=year,
+                quarter=quarter,
+                seller=seller,
+                phase=phase,
+                source=source,
+                top_k=top_k,
+                min_similarity=min_similarity,
+                timings_ms=timings_ms,
+            )
+            deals = retrieval["deals"]
+            quality = build_quality_metrics(
+                deals,
+                requested_top_k=top_k,
+                min_similarity=min_similarity,
+                threshold_relaxed=retrieval["threshold_relaxed"],
+                raw_retrieved_count=retrieval["raw_retrieved_count"],
+            )
+            yield sse_event("retrieval", {
+                "deals": deals,
+                "quality": quality,
+                "rag": {"retrieved_count": len(deals), "threshold_relaxed": retrieval["threshold_relaxed"]},
+                "latency_ms": dict(timings_ms),
+            })
+
+            collected = await _collect_stats(
+                client,
+                deals,
+                year=year,
+                quarter=quarter,
+                month=month,
+                date_start=date_start,
+                date_end=date_end,
+                seller=seller,
+                phase=phase,
+                timings_ms=timings_ms,
+            )
+            yield sse_event("stats", {
+                "stats": collected["stats"],
+                "wins_stats": collected["wins_stats"],
+                "losses_stats": collected["losses_stats"],
+                "business_highlights": collected["business_highlights"],
+                "adaptive": collected["adaptive"],
+            })
+
+            insights_start = time.perf_counter()
+            ai_insights: Dict[str, Any] = {}
+            async for event in iterate_blocking(
+                stream_ai_insights,
+                query,
+                deals,
+                collected["stats"],
+                **_insights_llm_kwargs(collected, filters),
+            ):
+                if event.get("type") == "token":
+                    yield sse_event("token", {"text": event.get("text", "")})
+                else:
+                    ai_insights = event.get("data") or {}
+            timings_ms["insights"] = int((time.perf_counter() - insights_start) * 1000)
+            yield sse_event("insights", ai_insights)
+
+            freshness = await run_blocking(get_embeddings_freshness, client)
+            timings_ms["total"] = int((time.perf_counter() - request_start) * 1000)
+            response_payload = _build_response_payload(
+                query, filters, retrieval, collected, quality, ai_insights, freshness, timings_ms, min_similarity,
+            )
+            _set_cache(cache_key, response_payload)
+            yield sse_event("done", response_payload)
+        except Exception as exc:
+            print(f"[INSIGHTS RAG] WARN: stream failed: {str(exc)}")
+            yield sse_event("error", {"success": False, "error": "Insights RAG temporariamente indisponível."})
+
+    return sse_response(events())
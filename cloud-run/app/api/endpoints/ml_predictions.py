@@ -3,6 +3,8 @@ from __future__ import annotations
 from fastapi import APIRouter
 from google.cloud import bigquery
 from pydantic import BaseModel, Field
+
+from api.sql_templates import bind_value, in_filter, job_config_for
 from typing import Any, Dict, List, Optional, Tuple
 import os
 import re
@@ -18,10 +20,6 @@ def get_bq_client() -> bigquery.Client:
     return bigquery.Client(project=PROJECT_ID)
 
 
-def _escape_sql_string(value: str) -> str:
-    return value.replace("'", "''")
-
-
 def _normalize_quarter(quarter: Optional[str]) -> Optional[str]:
     if quarter is None:
         return None
@@ -40,9 +38,9 @@ def _build_fiscal_filter(year: Optional[str], quarter: Optional[str], column_nam
     quarter_norm = _normalize_quarter(quarter)
     if year and quarter_norm:
         fiscal_q = f"FY{str(year)[-2:]}-Q{quarter_norm}"
-        return f"{column_name} = '{_escape_sql_string(fiscal_q)}'"
+        return f"{column_name} = {bind_value(fiscal_q, hint='fiscal_q')}"
     if year:
-        return f"{column_name} LIKE 'FY{_escape_sql_string(str(year)[-2:])}-%'"
+        return f"STARTS_WITH({column_name}, {bind_value(f'FY{str(year)[-2:]}-', hint='fiscal_prefix')})"
     return "1=1"
 
 
@@ -52,15 +50,12 @@ def _build_seller_filter(seller: Optional[str], column_name: str = "Vendedor") -
     sellers = [s.strip() for s in str(seller).split(",") if s.strip()]
     if not sellers:
         return "1=1"
-    if len(sellers) == 1:
-        return f"{column_name} = '{_escape_sql_string(sellers[0])}'"
-    sellers_quoted = "', '".join(_escape_sql_string(s) for s in sellers)
-    return f"{column_name} IN ('{sellers_quoted}')"
+    return in_filter(column_name, sellers, hint="seller")
 
 
 def _query_to_dict(query: str) -> List[Dict[str, Any]]:
     client = get_bq_client()
-    rows = client.query(query).result()
+    rows = client.query(query, job_config=job_config_for(query)).result()
     return [dict(r) for r in rows]
 
 
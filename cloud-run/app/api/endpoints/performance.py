@@ -4,6 +4,7 @@ Performance Endpoint - Índice de Performance do Vendedor (IPV)
 Implementa IPV com capacidade (feriados + férias), consistência semanal e
 consonância entre visão de equipe e individual.
 """
+import asyncio
 from datetime import date, datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 import os
@@ -15,6 +16,9 @@ from fastapi import APIRouter, HTTPException, Query, Request
 from google.cloud import bigquery
 from pydantic import BaseModel, Field
 
+from api.bq_async import run_blocking, run_queries, run_query
+from api.sql_templates import active_query_params, bind_value
+
 router = APIRouter()
 
 PROJECT_ID = os.getenv("GCP_PROJECT", "operaciones-br").strip().rstrip("\\/")
@@ -88,9 +92,9 @@ def normalize_seller_key(value: Optional[str]) -> str:
 def build_fiscal_filter(year: Optional[str], quarter: Optional[str]) -> str:
     quarter_norm = normalize_quarter(quarter)
     if year and quarter_norm:
-        return f"Fiscal_Q = 'FY{year[-2:]}-Q{quarter_norm}'"
+        return f"Fiscal_Q = {bind_value(f'FY{year[-2:]}-Q{quarter_norm}', hint='fiscal_q')}"
     if year:
-        return f"Fiscal_Q LIKE 'FY{year[-2:]}-%'"
+        return f"STARTS_WITH(Fiscal_Q, {bind_value(f'FY{year[-2:]}-', hint='fiscal_prefix')})"
     return "1=1"
 
 
@@ -98,6 +102,9 @@ def build_seller_filter(seller: Optional[str]) -> str:
     if not seller:
         return "1=1"
     sellers = [s.strip() for s in seller.split(",") if s.strip()]
+    params = active_query_params()
+    if params is not None and sellers:
+        return f"LOWER(TRIM(Vendedor)) IN (SELECT LOWER(TRIM(v)) FROM UNNEST({params.array(sellers, hint='seller')}) AS v)"
     sellers_escaped = [s.replace("'", "\\'") for s in sellers]
     if not sellers_escaped:
         return "1=1"
@@ -461,7 +468,7 @@ async def admin_list_vacations(
 ):
     ensure_admin_access(request)
     client = get_bq_client()
-    ensure_vacations_table(client)
+    await run_blocking(ensure_vacations_table, client)
 
     where_year = ""
     if year:
@@ -486,7 +493,7 @@ async def admin_list_vacations(
         params.append(bigquery.ScalarQueryParameter("year", "INT64", year))
 
     job = bigquery.QueryJobConfig(query_parameters=params)
-    rows = [dict(row) for row in client.query(query, job_config=job).result()]
+    rows = [dict(row) for row in await run_query(client, query, job)]
 
     return {"success": True, "items": rows, "total": len(rows)}
 
@@ -499,7 +506,7 @@ async def admin_create_vacation(request: Request, payload: VacationCreateRequest
         raise HTTPException(status_code=400, detail="start_date não pode ser maior que end_date")
 
     client = get_bq_client()
-    ensure_vacations_table(client)
+    await run_blocking(ensure_vacations_table, client)
 
     vacation_id = str(uuid.uuid4())
     query = f"""
@@ -520,7 +527,7 @@ async def admin_create_vacation(request: Request, payload: VacationCreateRequest
             bigquery.ScalarQueryParameter("created_by", "STRING", admin_email),
         ]
     )
-    client.query(query, job_config=job).result()
+    await run_query(client, query, job)
 
     return {"success": True, "id": vacation_id}
 
@@ -530,7 +537,7 @@ async def admin_delete_vacation(request: Request, vacation_id: str):
     ensure_admin_access(request)
 
     client = get_bq_client()
-    ensure_vacations_table(client)
+    await run_blocking(ensure_vacations_table, client)
 
     query = f"""
     UPDATE {VACATIONS_TABLE}
@@ -541,7 +548,7 @@ async def admin_delete_vacation(request: Request, vacation_id: str):
     job = bigquery.QueryJobConfig(
         query_parameters=[bigquery.ScalarQueryParameter("id", "STRING", vacation_id)]
     )
-    client.query(query, job_config=job).result()
+    await run_query(client, query, job)
 
     return {"success": True, "id": vacation_id}
 
@@ -602,9 +609,10 @@ async def get_performance(
         GROUP BY Vendedor
         """
 
-        won_data = {row["Vendedor"]: dict(row) for row in client.query(won_query).result()}
-        lost_data = {row["Vendedor"]: dict(row) for row in client.query(lost_query).result()}
-        pipeline_data = {row["Vendedor"]: dict(row) for row in client.query(pipeline_query).result()}
+        rows = await run_queries(client, {"won": won_query, "lost": lost_query, "pipeline": pipeline_query})
+        won_data = {row["Vendedor"]: dict(row) for row in rows["won"]}
+        lost_data = {row["Vendedor"]: dict(row) for row in rows["lost"]}
+        pipeline_data = {row["Vendedor"]: dict(row) for row in rows["pipeline"]}
 
         all_sellers_set = set(list(won_data.keys()) + list(lost_data.keys()))
 
@@ -631,8 +639,10 @@ async def get_performance(
                 "metadata": {},
             }
 
-        vacations = load_vacations(client, period_start, period_end)
-        weekly_metrics = load_weekly_activity_and_opps(client, all_sellers, period_start, period_end)
+        vacations, weekly_metrics = await asyncio.gather(
+            run_blocking(load_vacations, client, period_start, period_end),
+            run_blocking(load_weekly_activity_and_opps, client, all_sellers, period_start, period_end),
+        )
         capacity_metrics = compute_capacity_and_consistency(all_sellers, period_start, period_end, vacations, weekly_metrics)
 
         seller_performance: List[Dict[str, Any]] = []
@@ -918,7 +928,7 @@ async def get_seller_timeline(
         LIMIT {quarters}
         """
 
-        fiscal_quarters = [row["Fiscal_Q"] for row in client.query(quarters_query).result()]
+        fiscal_quarters = [row["Fiscal_Q"] for row in await run_query(client, quarters_query)]
 
         if not fiscal_quarters:
             return {
@@ -932,11 +942,16 @@ async def get_seller_timeline(
         ipv_sum = 0
         wr_sum = 0
 
-        for fiscal_q in fiscal_quarters:
-            year_part = "20" + fiscal_q.split("-")[0][2:]
-            quarter_part = fiscal_q.split("-Q")[1]
+        results = await asyncio.gather(*[
+            get_performance(
+                year="20" + fiscal_q.split("-")[0][2:],
+                quarter=fiscal_q.split("-Q")[1],
+                seller=seller_name,
+            )
+            for fiscal_q in fiscal_quarters
+        ])
 
-            result = await get_performance(year=year_part, quarter=quarter_part, seller=seller_name)
+        for fiscal_q, result in zip(fiscal_quarters, results):
             key = normalize_seller_key(seller_name)
             seller_data = next((x for x in result.get("ranking", []) if normalize_seller_key(x.get("vendedor")) == key), None)
 
@@ -1030,9 +1045,14 @@ async def get_seller_deals(
         LIMIT {top_n}
         """
 
-        top_wins = [dict(row) for row in client.query(top_wins_query).result()]
-        top_losses = [dict(row) for row in client.query(top_losses_query).result()]
-        pipeline_hot = [dict(row) for row in client.query(pipeline_hot_query).result()]
+        rows = await run_queries(client, {
+            "top_wins": top_wins_query,
+            "top_losses": top_losses_query,
+            "pipeline_hot": pipeline_hot_query,
+        })
+        top_wins = [dict(row) for row in rows["top_wins"]]
+        top_losses = [dict(row) for row in rows["top_losses"]]
+        pipeline_hot = [dict(row) for row in rows["pipeline_hot"]]
 
         return {
             "success": True,
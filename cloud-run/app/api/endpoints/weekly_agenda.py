@@ -12,11 +12,18 @@ import re
 import unicodedata
 import time
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 import google.generativeai as genai
 from google.cloud import firestore
 
+from api.bq_async import run_blocking, run_query
+from api.rate_limit import TokenBucket
+from api.rag import retrieve_similar_deals_batch
+from api.response_cache import ResponseCache
+from api.tiered_cache import TieredCache
+
 try:
     import holidays as pyholidays  # type: ignore[import-not-found]
 except Exception:
@@ -46,11 +53,47 @@ else:
 _ACTIVITY_SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("ACTIVITY_SUMMARY_CACHE_TTL_SECONDS", "86400"))
 _ACTIVITY_SUMMARY_MAX_ITEMS = int(os.getenv("ACTIVITY_SUMMARY_MAX_ITEMS", "600"))
 _ACTIVITY_SUMMARY_MAX_PER_RESPONSE = int(os.getenv("ACTIVITY_SUMMARY_MAX_PER_RESPONSE", "20"))
-_ACTIVITY_SUMMARY_CACHE: Dict[str, Dict[str, Any]] = {}
+# false = requests only read summaries (cache/Firestore) precomputed by the batch job
+_ACTIVITY_SUMMARY_ON_DEMAND = str(os.getenv("ACTIVITY_SUMMARY_ON_DEMAND", "true")).strip().lower() in {"1", "true", "yes", "on"}
+_ACTIVITY_SUMMARY_CACHE = TieredCache(
+    "activity_summary",
+    ResponseCache(max_bytes=0, max_entries=_ACTIVITY_SUMMARY_MAX_ITEMS),
+)
+# Gemini fan-out for summaries: bounded concurrency + per-instance rate limit
+_ACTIVITY_SUMMARY_CONCURRENCY = max(1, int(os.getenv("ACTIVITY_SUMMARY_CONCURRENCY", "6")))
+_ACTIVITY_SUMMARY_RATE_PER_MINUTE = float(os.getenv("ACTIVITY_SUMMARY_RATE_PER_MINUTE", "60"))
+_ACTIVITY_SUMMARY_RATE_WAIT_SECONDS = float(os.getenv("ACTIVITY_SUMMARY_RATE_WAIT_SECONDS", "20"))
+_ACTIVITY_SUMMARY_EXECUTOR = ThreadPoolExecutor(
+    max_workers=_ACTIVITY_SUMMARY_CONCURRENCY, thread_name_prefix="activity-summary"
+)
+_ACTIVITY_SUMMARY_RATE_LIMITER = TokenBucket(
+    _ACTIVITY_SUMMARY_RATE_PER_MINUTE / 60.0, burst=_ACTIVITY_SUMMARY_CONCURRENCY
+)
+# Firestore limit for one batched write
+_FIRESTORE_BATCH_MAX_WRITES = 500
 
 _FIRESTORE_CLIENT: Optional[firestore.Client] = None
 
 
+# Activity date as every agenda query reads it: typed column first, then the
+# text formats found in the sheet loads. Shared with
+# bigquery/scripts-dados/precompute_activity_summaries.py.
+ACTIVITY_DATE_SQL = """COALESCE(
+    SAFE_CAST(Data AS DATE),
+    SAFE_CAST(Data_de_criacao AS DATE),
+    SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data AS STRING)),
+    SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data AS STRING)),
+    SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data AS STRING)),
+    SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data AS STRING)),
+    SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data AS STRING)),
+    SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data_de_criacao AS STRING)),
+    SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data_de_criacao AS STRING)),
+    SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data_de_criacao AS STRING)),
+    SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data_de_criacao AS STRING)),
+    SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data_de_criacao AS STRING))
+)"""
+
+
 def _firestore_enabled() -> bool:
     return bool(ACTIVITY_SUMMARY_FIRESTORE_COLLECTION and ACTIVITY_SUMMARY_FIRESTORE_COLLECTION.strip())
 
@@ -69,96 +112,74 @@ def _get_firestore_client() -> Optional[firestore.Client]:
         return None
 
 
-def _firestore_get_summary(doc_id: str) -> Optional[str]:
-    if not doc_id:
-        return None
+def _firestore_get_summaries(doc_ids: List[str]) -> Dict[str, str]:
+    """Multi-get of persisted summaries (one round trip); missing ids are left out."""
     client = _get_firestore_client()
-    if not client:
-        return None
+    if not client or not doc_ids:
+        return {}
     try:
-        doc = client.collection(ACTIVITY_SUMMARY_FIRESTORE_COLLECTION).document(doc_id).get()
-        if not doc.exists:
-            return None
-        data = doc.to_dict() or {}
-        summary = data.get("summary")
-        return str(summary).strip() if summary else None
+        collection = client.collection(ACTIVITY_SUMMARY_FIRESTORE_COLLECTION)
+        found: Dict[str, str] = {}
+        for doc in client.get_all([collection.document(doc_id) for doc_id in doc_ids]):
+            if not doc.exists:
+                continue
+            summary = (doc.to_dict() or {}).get("summary")
+            if summary:
+                found[doc.id] = str(summary).strip()
+        return found
     except Exception:
-        return None
+        return {}
 
 
-def _firestore_set_summary(doc_id: str, summary: str, *, model: str, text_len: int, prompt_version: str = "v2-meddic-risks-actions") -> None:
-    if not doc_id or not summary:
-        return
+def _firestore_set_summaries(entries: List[Dict[str, Any]]) -> None:
+    """Batched writes of new summaries ({doc_id, summary, model, text_len, prompt_version})."""
     client = _get_firestore_client()
-    if not client:
+    entries = [e for e in entries if e.get("doc_id") and e.get("summary")]
+    if not client or not entries:
         return
     try:
-        client.collection(ACTIVITY_SUMMARY_FIRESTORE_COLLECTION).document(doc_id).set(
-            {
-                "summary": summary,
-                "model": model,
-                "text_len": int(text_len or 0),
-                "created_at": firestore.SERVER_TIMESTAMP,
-                "updated_at": firestore.SERVER_TIMESTAMP,
-                "prompt_version": prompt_version,
-            },
-            merge=True,
-        )
+        collection = client.collection(ACTIVITY_SUMMARY_FIRESTORE_COLLECTION)
+        for start in range(0, len(entries), _FIRESTORE_BATCH_MAX_WRITES):
+            batch = client.batch()
+            for entry in entries[start:start + _FIRESTORE_BATCH_MAX_WRITES]:
+                batch.set(
+                    collection.document(entry["doc_id"]),
+                    {
+                        "summary": entry["summary"],
+                        "model": entry["model"],
+                        "text_len": int(entry.get("text_len") or 0),
+                        "created_at": firestore.SERVER_TIMESTAMP,
+                        "updated_at": firestore.SERVER_TIMESTAMP,
+                        "prompt_version": entry["prompt_version"],
+                    },
+                    merge=True,
+                )
+            batch.commit()
     except Exception:
         return
 
 
 def _cache_get_summary(key: str) -> Optional[str]:
-    item = _ACTIVITY_SUMMARY_CACHE.get(key)
-    if not item:
-        return None
-    if item.get("expires_at", 0) <= time.time():
-        _ACTIVITY_SUMMARY_CACHE.pop(key, None)
-        return None
-    return item.get("summary")
+    return _ACTIVITY_SUMMARY_CACHE.get(key)
 
 
 def _cache_set_summary(key: str, summary: str) -> None:
     if not key:
         return
-    # Simple size guard
-    if len(_ACTIVITY_SUMMARY_CACHE) >= _ACTIVITY_SUMMARY_MAX_ITEMS:
-        # drop ~10% oldest
-        items = sorted(_ACTIVITY_SUMMARY_CACHE.items(), key=lambda kv: kv[1].get("expires_at", 0))
-        for k, _ in items[: max(1, _ACTIVITY_SUMMARY_MAX_ITEMS // 10)]:
-            _ACTIVITY_SUMMARY_CACHE.pop(k, None)
-    _ACTIVITY_SUMMARY_CACHE[key] = {
-        "summary": summary,
-        "expires_at": time.time() + _ACTIVITY_SUMMARY_CACHE_TTL_SECONDS,
-    }
-
+    # LRU bounded by _ACTIVITY_SUMMARY_MAX_ITEMS (L1) + shared L2 when configured
+    _ACTIVITY_SUMMARY_CACHE.set(key, summary, _ACTIVITY_SUMMARY_CACHE_TTL_SECONDS)
 
-def _summarize_activity_text(text: str, *, prompt_profile: str = "bdm") -> Optional[str]:
-    """Summarize a long activity description in Portuguese.
-
-    Fail-safe: returns None if AI is disabled/unavailable.
-    """
-    if not GEMINI_API_KEY:
-        return None
-    cleaned = (text or "").strip()
-    if not cleaned:
-        return None
 
+def _summary_profile(prompt_profile: str) -> str:
     profile = str(prompt_profile or "bdm").strip().lower()
-    if profile not in {"bdm", "cs_ce"}:
-        profile = "bdm"
+    return profile if profile in {"bdm", "cs_ce"} else "bdm"
 
-    h = hashlib.sha256(f"{profile}|{cleaned}".encode("utf-8")).hexdigest()
-    cached = _cache_get_summary(h)
-    if cached:
-        return cached
 
-    # Persistent cache (optional): Firestore lookup by text hash
-    persisted = _firestore_get_summary(h)
-    if persisted:
-        _cache_set_summary(h, persisted)
-        return persisted
+def _summary_key(cleaned: str, profile: str) -> str:
+    return hashlib.sha256(f"{profile}|{cleaned}".encode("utf-8")).hexdigest()
 
+
+def _build_summary_prompt(cleaned: str, profile: str) -> str:
     # Input guardrail: prevent huge payloads to the model
     if len(cleaned) > 6000:
         cleaned = cleaned[:6000]
@@ -194,40 +215,88 @@ IMPORTANTE:
 - Não use markdown complexo, apenas plain text com quebras de linha.
 - Seja completo e detalhado, incluindo TODOS os pontos relevantes.
 """.strip()
+    return prompt
+
 
+def _generate_summary(cleaned: str, profile: str) -> Optional[str]:
+    """Gemini call for one text, within the summary rate limit (None when skipped/failed)."""
+    if not _ACTIVITY_SUMMARY_RATE_LIMITER.acquire(timeout=_ACTIVITY_SUMMARY_RATE_WAIT_SECONDS):
+        print("[WEEKLY_AGENDA] WARN: activity summary skipped, Gemini rate limit reached")
+        return None
     try:
         model = genai.GenerativeModel(GEMINI_MODEL)  # type: ignore[attr-defined]
-        res = model.generate_content(prompt)
+        res = model.generate_content(_build_summary_prompt(cleaned, profile))
         out = (getattr(res, "text", None) or "").strip()
-        if not out:
-            return None
-
         # Clean output: normalize line breaks
-        out = out.replace("\r\n", "\n").strip()
-
-        # Persist (optional) so we don't regenerate for the same activity text
-        _firestore_set_summary(
-            h,
-            out,
-            model=GEMINI_MODEL,
-            text_len=len(cleaned),
-            prompt_version=f"v3-{profile}-meddic-risks-actions",
-        )
-        _cache_set_summary(h, out)
-        return out
+        return out.replace("\r\n", "\n").strip() or None
     except Exception:
         return None
 
 
-def _build_activity_summary_map(
-    activities: List[Dict[str, Any]],
+def _summarize_activity_texts(
+    texts: List[str],
     *,
-    budget: int,
-    prompt_profile: str,
+    prompt_profile: str = "bdm",
+    generate: bool = True,
 ) -> Dict[str, str]:
-    if budget <= 0 or not GEMINI_API_KEY:
-        return {}
+    """Summaries for several texts: cache, one Firestore multi-get, then
+    concurrent (rate-limited) Gemini calls and one batched write for misses.
 
+    generate=False only looks up (summaries precomputed offline by
+    bigquery/scripts-dados/precompute_activity_summaries.py).
+    Returns {text: summary} for the texts that could be summarized.
+    """
+    generate = generate and bool(GEMINI_API_KEY)
+    profile = _summary_profile(prompt_profile)
+    keys: Dict[str, str] = {}
+    for text in texts:
+        cleaned = (text or "").strip()
+        if cleaned:
+            keys.setdefault(cleaned, _summary_key(cleaned, profile))
+
+    summary_by_text: Dict[str, str] = {}
+    missing: Dict[str, str] = {}
+    for cleaned, key in keys.items():
+        cached = _cache_get_summary(key)
+        if cached:
+            summary_by_text[cleaned] = cached
+        else:
+            missing[cleaned] = key
+
+    # Persistent cache (optional): Firestore lookup by text hash
+    if missing:
+        persisted = _firestore_get_summaries(list(dict.fromkeys(missing.values())))
+        for cleaned, key in list(missing.items()):
+            if key in persisted:
+                summary_by_text[cleaned] = persisted[key]
+                _cache_set_summary(key, persisted[key])
+                del missing[cleaned]
+
+    if missing and generate:
+        texts_to_generate = list(missing)
+        generated = _ACTIVITY_SUMMARY_EXECUTOR.map(
+            lambda cleaned: _generate_summary(cleaned, profile), texts_to_generate
+        )
+        new_entries: List[Dict[str, Any]] = []
+        for cleaned, out in zip(texts_to_generate, generated):
+            if not out:
+                continue
+            summary_by_text[cleaned] = out
+            _cache_set_summary(missing[cleaned], out)
+            new_entries.append({
+                "doc_id": missing[cleaned],
+                "summary": out,
+                "model": GEMINI_MODEL,
+                "text_len": min(len(cleaned), 6000),
+                "prompt_version": f"v3-{profile}-meddic-risks-actions",
+            })
+        # Persist (optional) so we don't regenerate for the same activity text
+        _firestore_set_summaries(new_entries)
+    return summary_by_text
+
+
+def _long_activity_texts(activities: List[Dict[str, Any]], *, budget: int) -> List[str]:
+    """Distinct comments longer than 300 chars, at most budget of them."""
     seen_texts: List[str] = []
     seen_set = set()
     for item in activities:
@@ -238,13 +307,7 @@ def _build_activity_summary_map(
             continue
         seen_set.add(raw)
         seen_texts.append(raw)
-
-    summary_by_raw: Dict[str, str] = {}
-    for raw in seen_texts[:budget]:
-        summary = _summarize_activity_text(raw, prompt_profile=prompt_profile)
-        if summary:
-            summary_by_raw[raw] = summary
-    return summary_by_raw
+    return seen_texts[:max(0, budget)]
 
 
 def get_bq_client():
@@ -678,60 +741,40 @@ def get_sabatina_questions(deal: Dict[str, Any]) -> List[str]:
     return parse_audit_questions(deal.get("Perguntas_de_Auditoria_IA"))
 
 
-def search_similar_deals_rag(deal_content: str, top_k: int = 3) -> List[Dict[str, Any]]:
+RAG_SIMILAR_DEAL_COLUMNS = (
+    "deal_id", "source", "Oportunidade", "Vendedor", "Conta", "Gross", "Net", "Fiscal_Q", "content",
+)
+
+
+def search_similar_deals_rag_batch(deal_contents: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
     """
-    Search for similar historical deals using vector embeddings.
+    Similar historical deals for several deals at once (one BigQuery job or
+    one local index pass). One list per input, in the same order.
     """
     try:
         client = get_bq_client()
-        
-        query_sql = f"""
-        WITH query_embedding AS (
-          SELECT text_embedding AS embedding
-          FROM ML.GENERATE_TEXT_EMBEDDING(
-            MODEL `{PROJECT_ID}.{DATASET_ID}.text_embedding_model`,
-            (SELECT @deal_content AS content)
-          )
+        # Only historical deals; local index when loaded, cached query embeddings
+        results = retrieve_similar_deals_batch(
+            client,
+            project_id=PROJECT_ID,
+            dataset_id=DATASET_ID,
+            query_texts=deal_contents,
+            top_k=top_k,
+            where_clause="WHERE source IN ('won', 'lost')",
+            index_filters={"sources": ["won", "lost"]},
         )
-        SELECT
-          base.deal_id,
-          base.source,
-          base.Oportunidade,
-          base.Vendedor,
-          base.Conta,
-          base.Gross,
-          base.Net,
-          base.Fiscal_Q,
-          base.content,
-          distance
-        FROM VECTOR_SEARCH(
-          (
-            SELECT *
-            FROM `{PROJECT_ID}.{DATASET_ID}.deal_embeddings`
-            WHERE source IN ('won', 'lost')  -- Only historical deals
-          ),
-          'embedding',
-          (SELECT embedding FROM query_embedding),
-          top_k => @top_k,
-          distance_type => 'COSINE'
-        )
-        ORDER BY distance ASC
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("deal_content", "STRING", deal_content),
-                bigquery.ScalarQueryParameter("top_k", "INT64", top_k),
+        return [
+            [
+                {**{column: deal.get(column) for column in RAG_SIMILAR_DEAL_COLUMNS}, "distance": deal.get("distance")}
+                for deal in deals
             ]
-        )
-        
-        results = client.query(query_sql, job_config=job_config).result()
-        return [dict(row) for row in results]
+            for deals in results
+        ]
     
     except Exception as e:
         # If RAG fails, return empty (non-blocking)
         print(f"RAG search failed: {e}")
-        return []
+        return [[] for _ in deal_contents]
 
 
 def generate_seller_feedback(metrics: Dict[str, Any]) -> Dict[str, Any]:
@@ -796,7 +839,7 @@ async def get_weekly_agenda(
     start_date: Optional[str] = Query(None, description="Filtro global: data início (yyyy-mm-dd) para oportunidades (Data_Prevista) e atividades"),
     end_date: Optional[str] = Query(None, description="Filtro global: data fim (yyyy-mm-dd) para oportunidades (Data_Prevista) e atividades"),
     cs_names: Optional[str] = Query(None, description="Nomes de Customer Engineer separados por vírgula para consolidar atividades"),
-    include_rag: bool = Query(False, description="Incluir busca RAG de deals similares (pode deixar a resposta mais lenta)"),
+    include_rag: bool = Query(False, description="Incluir busca RAG de deals similares (uma única busca em lote para os deals sinalizados)"),
     max_rag_deals: int = Query(15, ge=0, le=100, description="Máximo de deals para executar RAG (quando include_rag=true)"),
 ):
     """
@@ -859,7 +902,8 @@ async def get_weekly_agenda(
         # Query 1: Get deals from selected quarter (date range does NOT filter opportunities)
         # Use pipeline directly to avoid dependency on external views with fragile date parsing.
         pipeline_table_ref = f"{PROJECT_ID}.{DATASET_ID}.pipeline"
-        pipeline_fields = {field.name for field in client.get_table(pipeline_table_ref).schema}
+        pipeline_table = await run_blocking(client.get_table, pipeline_table_ref)
+        pipeline_fields = {field.name for field in pipeline_table.schema}
 
         created_col_candidates = ["Data_de_criacao", "Data_de_criacao_DE_ONDE_PEGAR", "Created_Date"]
         created_expr_parts: List[str] = []
@@ -945,7 +989,7 @@ async def get_weekly_agenda(
             ]
         )
 
-        deals_results = client.query(deals_query, job_config=deals_job_config).result()
+        deals_results = await run_query(client, deals_query, deals_job_config)
         all_deals = [dict(row) for row in deals_results]
         
         if not all_deals:
@@ -1095,7 +1139,7 @@ async def get_weekly_agenda(
                     bigquery.ScalarQueryParameter("quarter", "STRING", target_quarter)
                 ]
             )
-            all_vendors_result = client.query(all_vendors_query, job_config=all_vendors_job_config).result()
+            all_vendors_result = await run_query(client, all_vendors_query, all_vendors_job_config)
             all_vendor_list = [row["Vendedor"] for row in all_vendors_result]
             print(f"[WEEKLY_AGENDA] Found {len(all_vendor_list)} total vendors across all tables for quarter {target_quarter}")
         except Exception as e:
@@ -1199,7 +1243,7 @@ async def get_weekly_agenda(
         
         try:
             print(f"[WEEKLY_AGENDA] Executing metrics query for {len(vendor_list)} vendors: {vendor_list[:3]}...")
-            metrics_results = client.query(metrics_query, job_config=metrics_job_config).result()
+            metrics_results = await run_query(client, metrics_query, metrics_job_config)
             seller_metrics = {row["Vendedor"]: dict(row) for row in metrics_results}
             print(f"[WEEKLY_AGENDA] Got metrics for {len(seller_metrics)} vendors")
             if seller_metrics:
@@ -1240,7 +1284,7 @@ async def get_weekly_agenda(
                 ]
             )
             
-            lost_results = client.query(lost_deals_query, job_config=lost_job_config).result()
+            lost_results = await run_query(client, lost_deals_query, lost_job_config)
             lost_rows = list(lost_results)
             print(f"[WEEKLY_AGENDA] DEBUG: Lost deals query returned {len(lost_rows)} rows")
             for row in lost_rows:
@@ -1290,7 +1334,7 @@ async def get_weekly_agenda(
                 ]
             )
             
-            closed_result = client.query(closed_deals_query, job_config=closed_job_config).result()
+            closed_result = await run_query(client, closed_deals_query, closed_job_config)
             closed_rows = list(closed_result)
             print(f"[WEEKLY_AGENDA] DEBUG: Closed deals query returned {len(closed_rows)} rows")
             for row in closed_rows:
@@ -1319,7 +1363,7 @@ async def get_weekly_agenda(
         print(f"[WEEKLY_AGENDA] DEBUG: Starting new deals query for period {parsed_start} to {parsed_end}, vendors={len(all_vendor_list)}")
         try:
             pipeline_table_ref = f"{PROJECT_ID}.{DATASET_ID}.pipeline"
-            pipeline_table = client.get_table(pipeline_table_ref)
+            pipeline_table = await run_blocking(client.get_table, pipeline_table_ref)
             pipeline_fields = {field.name for field in pipeline_table.schema}
 
             created_column_candidates = [
@@ -1347,7 +1391,7 @@ async def get_weekly_agenda(
                 f"[WEEKLY_AGENDA] DEBUG: New deals source=pipeline, creation columns={available_created_columns or ['fallback_dias_funil']}"
             )
 
-            source_table = client.get_table(source_table_ref)
+            source_table = await run_blocking(client.get_table, source_table_ref)
             source_fields = {field.name for field in source_table.schema}
 
             def _coalesce_expr(candidates: List[str]) -> str:
@@ -1443,7 +1487,7 @@ async def get_weekly_agenda(
                 ]
             )
             
-            new_deals_result = client.query(new_deals_query, job_config=new_deals_job_config).result()
+            new_deals_result = await run_query(client, new_deals_query, new_deals_job_config)
             new_deals_rows = list(new_deals_result)
             print(f"[WEEKLY_AGENDA] DEBUG: New deals query returned {len(new_deals_rows)} rows")
             for row in new_deals_rows:
@@ -1521,20 +1565,7 @@ async def get_weekly_agenda(
                     SELECT
                         Atribuido AS Vendedor,
                         vm.vend_norm AS VendedorKey,
-                        COALESCE(
-                            SAFE_CAST(Data AS DATE),
-                            SAFE_CAST(Data_de_criacao AS DATE),
-                            SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data_de_criacao AS STRING))
-                        ) AS ActivityDate,
+                        {ACTIVITY_DATE_SQL} AS ActivityDate,
                         EmpresaConta AS EmpresaConta,
                         Tipo_de_Actividad AS TipoAtividade,
                         Comentarios_completos AS ComentariosCompletos,
@@ -1577,20 +1608,7 @@ async def get_weekly_agenda(
                                 ) LIKE CONCAT('%', vm.vend_last, '%')
                             )
                         )
-                    WHERE COALESCE(
-                        SAFE_CAST(Data AS DATE),
-                        SAFE_CAST(Data_de_criacao AS DATE),
-                        SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data AS STRING)),
-                        SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data AS STRING)),
-                        SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data AS STRING)),
-                        SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data AS STRING)),
-                        SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data AS STRING)),
-                        SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data_de_criacao AS STRING)),
-                        SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data_de_criacao AS STRING)),
-                        SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data_de_criacao AS STRING)),
-                        SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data_de_criacao AS STRING)),
-                        SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data_de_criacao AS STRING))
-                    ) BETWEEN (SELECT start_date FROM date_params) AND (SELECT end_date FROM date_params)
+                    WHERE {ACTIVITY_DATE_SQL} BETWEEN (SELECT start_date FROM date_params) AND (SELECT end_date FROM date_params)
                 ),
                 cleaned AS (
                     SELECT
@@ -1675,7 +1693,7 @@ async def get_weekly_agenda(
                 ]
             )
 
-            pulse_results = client.query(pulse_query, job_config=pulse_job_config).result()
+            pulse_results = await run_query(client, pulse_query, pulse_job_config)
             for row in pulse_results:
                 pulse_by_vendor[row["VendedorKey"]] = dict(row)
         except Exception as e:
@@ -1722,20 +1740,7 @@ async def get_weekly_agenda(
                     base AS (
                         SELECT
                             Atribuido,
-                            COALESCE(
-                                SAFE_CAST(Data AS DATE),
-                                SAFE_CAST(Data_de_criacao AS DATE),
-                                SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data AS STRING)),
-                                SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data AS STRING)),
-                                SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data AS STRING)),
-                                SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data AS STRING)),
-                                SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data AS STRING)),
-                                SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data_de_criacao AS STRING)),
-                                SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data_de_criacao AS STRING)),
-                                SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data_de_criacao AS STRING)),
-                                SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data_de_criacao AS STRING)),
-                                SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data_de_criacao AS STRING))
-                            ) AS ActivityDate,
+                            {ACTIVITY_DATE_SQL} AS ActivityDate,
                             Tipo_de_Actividad AS TipoAtividade,
                             Status,
                             EmpresaConta,
@@ -1745,20 +1750,7 @@ async def get_weekly_agenda(
                             Local,
                             TRIM(COALESCE(Comentarios_completos, Comentarios, '')) AS Comentarios
                         FROM `{PROJECT_ID}.{DATASET_ID}.atividades`
-                        WHERE COALESCE(
-                            SAFE_CAST(Data AS DATE),
-                            SAFE_CAST(Data_de_criacao AS DATE),
-                            SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data AS STRING)),
-                            SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%m/%d/%Y', CAST(Data_de_criacao AS STRING)),
-                            SAFE.PARSE_DATE('%m-%d-%Y', CAST(Data_de_criacao AS STRING))
-                        ) BETWEEN @start_date AND @end_date
+                        WHERE {ACTIVITY_DATE_SQL} BETWEEN @start_date AND @end_date
                     ),
                     matched AS (
                         SELECT
@@ -1842,7 +1834,7 @@ async def get_weekly_agenda(
                     ]
                 )
 
-                cs_results = client.query(cs_query, job_config=cs_job_config).result()
+                cs_results = await run_query(client, cs_query, cs_job_config)
                 cs_rows = [dict(r) for r in cs_results]
                 cs_by_norm = {str(r.get("cs_norm") or ""): r for r in cs_rows}
 
@@ -1896,6 +1888,8 @@ async def get_weekly_agenda(
         sellers_data = {}
 
         rag_remaining = max_rag_deals if include_rag else 0
+        # (enriched deal, search text): RAG runs once for all of them after the loop
+        rag_pending: List[tuple] = []
         
         for deal in all_deals:
             # Align risk/category using the opportunity content (not the simplistic view scoring)
@@ -1983,7 +1977,11 @@ async def get_weekly_agenda(
             # Enrich deal with sabatina and RAG
             sabatina = get_sabatina_questions(deal)
             
-            similar_deals = []
+            enriched_deal = {
+                **deal,
+                "sabatina_questions": sabatina,
+                "similar_deals": []
+            }
             if include_rag and rag_remaining > 0 and deal.get("Categoria_Pauta") in {"ZUMBI", "CRITICO", "ALTA_PRIORIDADE"}:
                 deal_search_text = f"""
                 Oportunidade: {deal.get('Oportunidade', '')}
@@ -1996,15 +1994,9 @@ async def get_weekly_agenda(
                 Risco Principal: {deal.get('Risco_Principal', '')}
                 Flags: {deal.get('Flags_de_Risco', '')}
                 """
-                similar_deals = search_similar_deals_rag(deal_search_text, top_k=3)
+                rag_pending.append((enriched_deal, deal_search_text))
                 rag_remaining -= 1
             
-            enriched_deal = {
-                **deal,
-                "sabatina_questions": sabatina,
-                "similar_deals": similar_deals
-            }
-            
             sellers_data[vendedor]["deals"].append(enriched_deal)
             
             # Update seller summary
@@ -2023,6 +2015,32 @@ async def get_weekly_agenda(
             sellers_data[vendedor]["summary"]["total_net_k"] += (deal.get("Net", 0) or 0) / 1000
             sellers_data[vendedor]["summary"]["avg_confianca"] += deal.get("Confianca", 0) or 0
         
+        if rag_pending:
+            similar_by_deal = await run_blocking(
+                search_similar_deals_rag_batch, [text for _, text in rag_pending], top_k=3
+            )
+            for (enriched_deal, _), similar_deals in zip(rag_pending, similar_by_deal):
+                enriched_deal["similar_deals"] = similar_deals
+
+        # IA summaries for long activity comments of every seller on the page:
+        # one cache/Firestore pass and concurrent Gemini calls (bounded per seller)
+        page_summary_by_raw: Dict[str, str] = {}
+        if _ACTIVITY_SUMMARY_MAX_PER_RESPONSE > 0 and (GEMINI_API_KEY or _firestore_enabled()):
+            page_texts: List[str] = []
+            for seller_data in sellers_data.values():
+                seller_activities = pulse_by_vendor.get(_normalize_vendor(seller_data.get("vendedor")), {}).get("last_activities")
+                if isinstance(seller_activities, list):
+                    page_texts.extend(_long_activity_texts(
+                        [dict(a) for a in seller_activities], budget=_ACTIVITY_SUMMARY_MAX_PER_RESPONSE,
+                    ))
+            if page_texts:
+                page_summary_by_raw = await run_blocking(
+                    _summarize_activity_texts, page_texts, prompt_profile="bdm", generate=_ACTIVITY_SUMMARY_ON_DEMAND,
+                )
+                print(f"[WEEKLY_AGENDA] Generated {len(page_summary_by_raw)}/{len(set(page_texts))} IA summaries")
+        elif _ACTIVITY_SUMMARY_MAX_PER_RESPONSE > 0:
+            print("[WEEKLY_AGENDA] Skipping IA summaries: neither GEMINI_API_KEY nor Firestore configured")
+
         # Finalize averages
         for seller_data in sellers_data.values():
             total = seller_data["summary"]["total_deals"]
@@ -2071,33 +2089,12 @@ async def get_weekly_agenda(
             if isinstance(last_activities, list):
                 last_activities = [dict(a) for a in last_activities]
 
-            # Precompute IA summaries for long activity comments (bounded per response)
-            summary_budget = _ACTIVITY_SUMMARY_MAX_PER_RESPONSE
-            summary_by_raw: Dict[str, str] = {}
-            
-            print(f"[WEEKLY_AGENDA] IA Summary check: budget={summary_budget}, GEMINI_API_KEY={'SET' if GEMINI_API_KEY else 'NOT SET'}, activities={len(last_activities)}")
-            
-            if summary_budget > 0 and GEMINI_API_KEY:
-                print(f"[WEEKLY_AGENDA] Processing activity summaries for {vendor_name} (budget: {summary_budget})")
-                summary_by_raw = _build_activity_summary_map(
-                    last_activities,
-                    budget=summary_budget,
-                    prompt_profile="bdm",
-                )
-                print(f"[WEEKLY_AGENDA] Generated {len(summary_by_raw)} IA summaries for {vendor_name}")
-            else:
-                if not GEMINI_API_KEY:
-                    print(f"[WEEKLY_AGENDA] Skipping IA summaries for {vendor_name}: GEMINI_API_KEY not configured")
-                elif summary_budget <= 0:
-                    print(f"[WEEKLY_AGENDA] Skipping IA summaries for {vendor_name}: budget={summary_budget}")
-
-
             last_out = []
             for a in last_activities:
                 d = _coerce_to_date(a.get("data_criacao"))
                 comentarios = a.get("comentarios")
                 raw_text = str(comentarios or "").strip()
-                resumo_ia = summary_by_raw.get(raw_text) if raw_text and len(raw_text) > 300 else None
+                resumo_ia = page_summary_by_raw.get(raw_text) if raw_text and len(raw_text) > 300 else None
                 last_out.append({
                     "data_criacao": d.isoformat() if d else (str(a.get("data_criacao") or "")[:10]),
                     "tipo": a.get("tipo"),
@@ -0,0 +1,133 @@
+"""Table freshness watcher for data-driven cache invalidation.
+
+Polls BigQuery table metadata (__TABLES__.last_modified_time, no data
+scanned) and notifies listeners when a source table was reloaded, so
+cache entries can be tagged with the tables they depend on and dropped
+only when one of those tables changes.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from google.cloud import bigquery
+
+
+def fetch_tables_last_modified(
+    client: bigquery.Client,
+    *,
+    project_id: str,
+    dataset_id: str,
+    tables: Iterable[str],
+) -> Dict[str, int]:
+    table_list = ", ".join(f"'{name}'" for name in tables)
+    query = f"""
+    SELECT table_id, last_modified_time
+    FROM `{project_id}.{dataset_id}.__TABLES__`
+    WHERE table_id IN ({table_list})
+    """
+    return {
+        str(row.get("table_id")): int(row.get("last_modified_time") or 0)
+        for row in client.query(query).result()
+    }
+
+
+class TableFreshnessWatcher:
+    def __init__(
+        self,
+        fetch: Callable[[], Dict[str, int]],
+        *,
+        poll_interval_seconds: float = 60.0,
+    ) -> None:
+        self._fetch = fetch
+        self.poll_interval_seconds = float(poll_interval_seconds)
+        self._versions: Dict[str, int] = {}
+        self._last_success = 0.0
+        self._last_error = ""
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._started = False
+        self._counters = {"polls": 0, "poll_errors": 0, "changes_detected": 0}
+
+    def add_listener(self, listener: Callable[[List[str]], None]) -> None:
+        self._listeners.append(listener)
+
+    def ensure_started(self) -> None:
+        """Start the background poller once (first poll runs in the thread).
+
+        Until that poll succeeds healthy() is False and callers fall back to
+        plain TTLs: no BigQuery call on the request that triggers the start.
+        """
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._thread = threading.Thread(target=self._poll_loop, name="table-freshness", daemon=True)
+            self._thread.start()
+            self._started = True
+
+    def poll(self) -> List[str]:
+        """Fetch current table versions; return tables whose version changed."""
+        try:
+            current = self._fetch()
+        except Exception as exc:
+            with self._lock:
+                self._counters["poll_errors"] += 1
+                self._last_error = str(exc)[:200]
+            return []
+        if not current:
+            with self._lock:
+                self._counters["poll_errors"] += 1
+                self._last_error = "no table metadata returned"
+            return []
+
+        with self._lock:
+            changed = [
+                table for table, version in current.items()
+                if table in self._versions and self._versions[table] != version
+            ]
+            self._versions.update(current)
+            self._last_success = time.time()
+            self._counters["polls"] += 1
+            self._counters["changes_detected"] += len(changed)
+
+        if changed:
+            for listener in list(self._listeners):
+                try:
+                    listener(changed)
+                except Exception:
+                    continue
+        return changed
+
+    def healthy(self) -> bool:
+        max_age = max(self.poll_interval_seconds * 3, 1.0)
+        return self._last_success > 0 and (time.time() - self._last_success) <= max_age
+
+    def snapshot(self, tables: Iterable[str]) -> Dict[str, Optional[int]]:
+        with self._lock:
+            return {table: self._versions.get(table) for table in tables}
+
+    def matches(self, tags: Dict[str, Any]) -> bool:
+        """True when every tagged table still has the version recorded in tags."""
+        with self._lock:
+            return all(
+                version is not None and self._versions.get(table) == version
+                for table, version in tags.items()
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "healthy": self.healthy(),
+                "poll_interval_seconds": self.poll_interval_seconds,
+                "last_success_age_seconds": round(time.time() - self._last_success, 1) if self._last_success else None,
+                "last_error": self._last_error,
+                "versions": dict(self._versions),
+                **self._counters,
+            }
+
+    def _poll_loop(self) -> None:
+        while True:
+            self.poll()
+            time.sleep(self.poll_interval_seconds)
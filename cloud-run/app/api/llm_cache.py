@@ -0,0 +1,129 @@
+"""Content-addressed store for generated LLM text.
+
+Prompts built from aggregated facts are deterministic: same data, same
+prompt. Responses are keyed by model id + prompt version + SHA-256 of the
+prompt, so unchanged data never triggers a new generation, across requests,
+instances and restarts.
+
+L1 is a per-instance LRU (ResponseCache). The persistent tier is
+LLM_RESPONSE_CACHE_URL when set (e.g. sqlite:///data/llm_cache.db, capped at
+LLM_RESPONSE_CACHE_L2_MAX_BYTES) and the shared CACHE_L2_URL otherwise.
+Bump the caller's prompt version whenever its template or parsing changes.
+Only successful generations are stored.
+"""
+import hashlib
+import os
+from typing import Any, Dict, Iterator, Optional
+
+from api.llm_client import generate_gemini_text_with_status, stream_gemini_text
+from api.response_cache import ResponseCache
+from api.single_flight import SingleFlight
+from api.tiered_cache import TieredCache, build_l2_backend
+
+LLM_RESPONSE_CACHE_ENABLED = str(os.getenv("LLM_RESPONSE_CACHE_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+LLM_RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("LLM_RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_RESPONSE_CACHE_MAX_BYTES = int(os.getenv("LLM_RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+LLM_RESPONSE_CACHE_URL = os.getenv("LLM_RESPONSE_CACHE_URL", "").strip()
+LLM_RESPONSE_CACHE_L2_MAX_BYTES = int(os.getenv("LLM_RESPONSE_CACHE_L2_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Fixed key version: a deploy must not invalidate answers for unchanged prompts
+_LLM_RESPONSE_CACHE = TieredCache(
+    "llm_responses",
+    ResponseCache(max_bytes=LLM_RESPONSE_CACHE_MAX_BYTES, max_entries=2000),
+    l2=build_l2_backend(LLM_RESPONSE_CACHE_URL, max_bytes=LLM_RESPONSE_CACHE_L2_MAX_BYTES) if LLM_RESPONSE_CACHE_URL else "shared",
+    version="llm",
+)
+# Same prompt arriving on several requests at once: one generation
+_LLM_FLIGHTS = SingleFlight(wait_timeout_seconds=120.0)
+
+
+def prompt_cache_key(model_id: str, prompt_version: str, prompt: str) -> str:
+    digest = hashlib.sha256(str(prompt or "").encode("utf-8")).hexdigest()
+    return f"{model_id}|{prompt_version}|{digest}"
+
+
+def generate_cached_text(
+    prompt: str,
+    *,
+    prompt_version: str,
+    model_name: str,
+    api_key: Optional[str],
+    project_id: Optional[str],
+    location: Optional[str],
+) -> Dict[str, Any]:
+    """generate_gemini_text_with_status behind the response store.
+
+    Same result dict, plus "cached": True when served from the store.
+    """
+    def _generate() -> Dict[str, Any]:
+        return generate_gemini_text_with_status(
+            prompt,
+            model_name=model_name,
+            api_key=api_key,
+            project_id=project_id,
+            location=location,
+        )
+
+    if not LLM_RESPONSE_CACHE_ENABLED:
+        return _generate()
+
+    key = prompt_cache_key(os.getenv("VERTEX_GEMINI_MODEL") or model_name, prompt_version, prompt)
+    cached = _LLM_RESPONSE_CACHE.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    def _generate_and_store() -> Dict[str, Any]:
+        # A concurrent leader may have stored it while this caller was queued
+        stored = _LLM_RESPONSE_CACHE.get(key)
+        if stored is not None:
+            return {**stored, "cached": True}
+        result = _generate()
+        if result.get("ok") and str(result.get("text") or "").strip():
+            _LLM_RESPONSE_CACHE.set(key, dict(result), LLM_RESPONSE_CACHE_TTL_SECONDS)
+        return result
+
+    return _LLM_FLIGHTS.do(key, _generate_and_store)
+
+
+def stream_cached_text(
+    prompt: str,
+    *,
+    prompt_version: str,
+    model_name: str,
+    api_key: Optional[str],
+    project_id: Optional[str],
+    location: Optional[str],
+) -> Iterator[Dict[str, Any]]:
+    """stream_gemini_text behind the same store as generate_cached_text.
+
+    A stored answer comes back as a single token event; a streamed answer
+    is stored once it completes successfully.
+    """
+    key = prompt_cache_key(os.getenv("VERTEX_GEMINI_MODEL") or model_name, prompt_version, prompt)
+    if LLM_RESPONSE_CACHE_ENABLED:
+        cached = _LLM_RESPONSE_CACHE.get(key)
+        if cached is not None:
+            yield {"type": "token", "text": str(cached.get("text") or "")}
+            yield {"type": "result", **cached, "cached": True}
+            return
+
+    for event in stream_gemini_text(
+        prompt,
+        model_name=model_name,
+        api_key=api_key,
+        project_id=project_id,
+        location=location,
+    ):
+        if event.get("type") == "result" and event.get("ok") and LLM_RESPONSE_CACHE_ENABLED:
+            if str(event.get("text") or "").strip():
+                result = {k: v for k, v in event.items() if k != "type"}
+                _LLM_RESPONSE_CACHE.set(key, result, LLM_RESPONSE_CACHE_TTL_SECONDS)
+        yield event
+
+
+def llm_response_cache_stats() -> dict:
+    return {
+        "enabled": LLM_RESPONSE_CACHE_ENABLED,
+        "flights": _LLM_FLIGHTS.stats(),
+        **_LLM_RESPONSE_CACHE.stats(),
+    }
@@ -1,5 +1,36 @@
 import os
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, Callable, Deque, Iterator, List, Tuple
+
+LLM_CIRCUIT_FAILURE_THRESHOLD = max(1, int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "3")))
+LLM_CIRCUIT_OPEN_SECONDS = float(os.getenv("LLM_CIRCUIT_OPEN_SECONDS", "60"))
+LLM_CIRCUIT_MAX_OPEN_SECONDS = float(os.getenv("LLM_CIRCUIT_MAX_OPEN_SECONDS", "900"))
+LLM_HEALTH_WINDOW = max(1, int(os.getenv("LLM_HEALTH_WINDOW", "20")))
+
+# Hedging: if an attempt is still running after LLM_HEDGE_DELAY_SECONDS the
+# next candidate gets the same prompt in parallel; first answer wins.
+LLM_HEDGE_ENABLED = str(os.getenv("LLM_HEDGE_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+LLM_HEDGE_DELAY_SECONDS = max(0.0, float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "8")))
+LLM_MAX_PARALLEL_ATTEMPTS = max(1, int(os.getenv("LLM_MAX_PARALLEL_ATTEMPTS", "2")))
+LLM_ATTEMPT_TIMEOUT_SECONDS = max(1.0, float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "45")))
+LLM_TOTAL_TIMEOUT_SECONDS = max(1.0, float(os.getenv("LLM_TOTAL_TIMEOUT_SECONDS", "90")))
+
+# Attempts run here so the caller can stop waiting on a hung call. SDK calls
+# cannot be interrupted: an abandoned attempt keeps its worker until the
+# client gives up, hence the dedicated (bounded) pool.
+_LLM_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(2, int(os.getenv("LLM_EXECUTOR_WORKERS", "16"))),
+    thread_name_prefix="llm",
+)
+
+# How often queued attempts are checked for having started
+_QUEUED_POLL_SECONDS = 0.25
+
+# Errors that do not go away on retry (unknown/deprecated model, no access)
+_PERMANENT_ERROR_MARKERS = ("404", "not found", "does not exist", "is not supported", "deprecated", "403", "permission")
 
 
 def _build_model_candidates(model_name: str) -> list[str]:
@@ -40,6 +71,291 @@ def _build_model_candidates(model_name: str) -> list[str]:
     return candidates
 
 
+class _ModelHealth:
+    __slots__ = ("outcomes", "consecutive_failures", "state", "open_until", "open_seconds", "probing", "last_error", "calls")
+
+    def __init__(self) -> None:
+        self.outcomes: Deque[Tuple[bool, float]] = deque(maxlen=LLM_HEALTH_WINDOW)
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.open_until = 0.0
+        self.open_seconds = LLM_CIRCUIT_OPEN_SECONDS
+        self.probing = False
+        self.last_error = ""
+        self.calls = 0
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+    @property
+    def avg_latency_ms(self) -> Optional[float]:
+        latencies = [latency for ok, latency in self.outcomes if ok]
+        return round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None
+
+
+class ModelHealthRegistry:
+    """Process-wide model clients + per-model circuit breakers.
+
+    A model's circuit opens after LLM_CIRCUIT_FAILURE_THRESHOLD consecutive
+    failures (at once, for the max time, on permanent errors); while open
+    the model is skipped. When the open time is over one caller gets a
+    half-open probe: success closes the circuit, failure reopens it for
+    twice as long (up to LLM_CIRCUIT_MAX_OPEN_SECONDS).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._health: Dict[Tuple[str, str], _ModelHealth] = {}
+        self._models: Dict[Tuple[str, ...], Any] = {}
+        self._vertex_target: Optional[Tuple[str, str]] = None
+        self._api_key: Optional[str] = None
+
+    def _entry(self, provider: str, model: str) -> _ModelHealth:
+        key = (provider, model)
+        if key not in self._health:
+            self._health[key] = _ModelHealth()
+        return self._health[key]
+
+    def vertex_model(self, project_id: str, location: str, model_name: str) -> Any:
+        import vertexai
+        from vertexai.generative_models import GenerativeModel
+
+        with self._lock:
+            # vertexai.init is global state: only redo it when the target changes
+            if self._vertex_target != (project_id, location):
+                vertexai.init(project=project_id, location=location)
+                self._vertex_target = (project_id, location)
+                self._models = {k: v for k, v in self._models.items() if k[0] != "vertex_ai"}
+            key = ("vertex_ai", model_name)
+            if key not in self._models:
+                self._models[key] = GenerativeModel(model_name)
+            return self._models[key]
+
+    def api_key_model(self, api_key: str, model_name: str) -> Any:
+        import google.generativeai as genai
+
+        with self._lock:
+            if self._api_key != api_key:
+                genai.configure(api_key=api_key)
+                self._api_key = api_key
+                self._models = {k: v for k, v in self._models.items() if k[0] != "gemini_api_key"}
+            key = ("gemini_api_key", model_name)
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(model_name)
+            return self._models[key]
+
+    def order(self, provider: str, candidates: List[str]) -> List[str]:
+        """Candidates to try now: closed circuits first, then by recent error
+        rate, configured order as tie-break; open circuits are left out.
+
+        When every circuit is open the one closest to its probe is kept, so a
+        request never fails without trying at least one model.
+        """
+        now = time.time()
+        ranked = []
+        with self._lock:
+            for index, model in enumerate(candidates):
+                health = self._entry(provider, model)
+                if health.state == "open" and now >= health.open_until:
+                    health.state = "half_open"
+                if health.state == "open" or (health.state == "half_open" and health.probing):
+                    continue
+                ranked.append((health.state != "closed", round(health.error_rate, 1), index, model))
+            if not ranked and candidates:
+                return [min(candidates, key=lambda m: self._entry(provider, m).open_until)]
+        return [model for *_, model in sorted(ranked)]
+
+    def begin(self, provider: str, model: str) -> None:
+        with self._lock:
+            health = self._entry(provider, model)
+            health.calls += 1
+            if health.state == "half_open":
+                health.probing = True
+
+    def release(self, provider: str, model: str) -> None:
+        """Attempt cancelled before it ran: free the half-open probe slot."""
+        with self._lock:
+            self._entry(provider, model).probing = False
+
+    def record_success(self, provider: str, model: str, latency: float) -> None:
+        with self._lock:
+            health = self._entry(provider, model)
+            health.outcomes.append((True, latency))
+            health.consecutive_failures = 0
+            health.state = "closed"
+            health.probing = False
+            health.open_seconds = LLM_CIRCUIT_OPEN_SECONDS
+
+    def record_failure(self, provider: str, model: str, latency: float, error: str) -> None:
+        permanent = any(marker in error.lower() for marker in _PERMANENT_ERROR_MARKERS)
+        with self._lock:
+            health = self._entry(provider, model)
+            health.outcomes.append((False, latency))
+            health.consecutive_failures += 1
+            health.last_error = error[:200]
+            probe_failed = health.state == "half_open"
+            if probe_failed:
+                health.open_seconds = min(LLM_CIRCUIT_MAX_OPEN_SECONDS, health.open_seconds * 2)
+            if probe_failed or permanent or health.consecutive_failures >= LLM_CIRCUIT_FAILURE_THRESHOLD:
+                open_seconds = LLM_CIRCUIT_MAX_OPEN_SECONDS if permanent else health.open_seconds
+                health.state = "open"
+                health.open_until = time.time() + open_seconds
+                print(f"[LLM] WARN: circuit open for {provider}/{model} ({open_seconds:.0f}s): {health.last_error}")
+            health.probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                f"{provider}/{model}": {
+                    "state": health.state,
+                    "calls": health.calls,
+                    "error_rate": round(health.error_rate, 3),
+                    "avg_latency_ms": health.avg_latency_ms,
+                    "consecutive_failures": health.consecutive_failures,
+                    "reopens_in_seconds": max(0, round(health.open_until - now)) if health.state == "open" else 0,
+                    "last_error": health.last_error,
+                }
+                for (provider, model), health in self._health.items()
+            }
+
+
+LLM_HEALTH = ModelHealthRegistry()
+
+
+# (provider, model, invoke(timeout_seconds) -> response)
+_Attempt = Tuple[str, str, Callable[[float], Any]]
+
+
+def _response_text(response: Any) -> str:
+    # .text raises ValueError on responses/chunks without text parts
+    try:
+        return str(getattr(response, "text", None) or "") if response else ""
+    except ValueError:
+        return ""
+
+
+def _settle_abandoned(provider: str, model: str, started: float, future: Future) -> None:
+    """Hedge loser: cancel it, or record its outcome once it finishes."""
+    registry = LLM_HEALTH
+    if future.cancel():
+        registry.release(provider, model)
+        return
+
+    def _record(done: Future) -> None:
+        latency = time.monotonic() - started
+        try:
+            if _response_text(done.result()):
+                registry.record_success(provider, model, latency)
+                return
+            error = f"{model}: empty response"
+        except Exception as exc:
+            error = f"{model}: {str(exc)}"
+        registry.record_failure(provider, model, latency, error)
+
+    future.add_done_callback(_record)
+
+
+def _run_attempts(attempts: List[_Attempt]) -> Tuple[Optional[Dict[str, Any]], List[Tuple[str, str]]]:
+    """Run attempts in order until one returns text.
+
+    Each attempt has its own deadline (LLM_ATTEMPT_TIMEOUT_SECONDS, counted
+    from when a worker starts it) inside the request budget
+    (LLM_TOTAL_TIMEOUT_SECONDS). A failure or timeout starts the next
+    attempt at once; with hedging, a slow attempt also gets the next one
+    started alongside it after LLM_HEDGE_DELAY_SECONDS. An attempt still
+    queued when the budget runs out (pool busy with abandoned calls) is
+    cancelled without counting against its model. Returns the result dict
+    (or None) and the (provider, error) list.
+    """
+    queue: Deque[_Attempt] = deque(attempts)
+    # future -> (provider, model, submitted_at, timeout, [started_at])
+    in_flight: Dict[Future, Tuple[str, str, float, float, List[float]]] = {}
+    errors: List[Tuple[str, str]] = []
+    budget_deadline = time.monotonic() + LLM_TOTAL_TIMEOUT_SECONDS
+    next_hedge_at = time.monotonic()
+    max_parallel = LLM_MAX_PARALLEL_ATTEMPTS if LLM_HEDGE_ENABLED else 1
+
+    def _fail(provider: str, model: str, started: float, error: str) -> None:
+        LLM_HEALTH.record_failure(provider, model, time.monotonic() - started, error)
+        errors.append((provider, error))
+
+    def _call(invoke: Callable[[float], Any], timeout: float, started: List[float]) -> Any:
+        started.append(time.monotonic())
+        return invoke(timeout)
+
+    def _deadline(submitted: float, timeout: float, started: List[float]) -> float:
+        return min(budget_deadline, started[0] + timeout) if started else budget_deadline
+
+    while True:
+        now = time.monotonic()
+        can_launch = queue and now < budget_deadline and len(in_flight) < max_parallel
+        if can_launch and (not in_flight or now >= next_hedge_at):
+            provider, model, invoke = queue.popleft()
+            LLM_HEALTH.begin(provider, model)
+            timeout = max(0.1, min(LLM_ATTEMPT_TIMEOUT_SECONDS, budget_deadline - now))
+            started: List[float] = []
+            in_flight[_LLM_EXECUTOR.submit(_call, invoke, timeout, started)] = (provider, model, now, timeout, started)
+            next_hedge_at = now + LLM_HEDGE_DELAY_SECONDS
+            continue
+        if not in_flight:
+            break
+
+        wake_at = min(_deadline(*info[2:]) for info in in_flight.values())
+        if any(not info[4] for info in in_flight.values()):
+            # A queued attempt's deadline is only known once it starts
+            wake_at = min(wake_at, now + _QUEUED_POLL_SECONDS)
+        if can_launch:
+            wake_at = min(wake_at, next_hedge_at)
+        done, _ = wait(list(in_flight), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            provider, model, submitted, _, started = in_flight.pop(future)
+            began = started[0] if started else submitted
+            try:
+                text = _response_text(future.result())
+                error = "" if text else f"{model}: empty response"
+            except Exception as exc:
+                text, error = "", f"{model}: {str(exc)}"
+            if text:
+                LLM_HEALTH.record_success(provider, model, time.monotonic() - began)
+                for other, (other_provider, other_model, other_submitted, _, other_started) in in_flight.items():
+                    other_began = other_started[0] if other_started else other_submitted
+                    _settle_abandoned(other_provider, other_model, other_began, other)
+                return {
+                    "ok": True,
+                    "text": text,
+                    "provider": provider,
+                    "model": model,
+                    "error": "",
+                }, errors
+            _fail(provider, model, began, error)
+            next_hedge_at = time.monotonic()
+
+        now = time.monotonic()
+        for future, (provider, model, submitted, timeout, started) in list(in_flight.items()):
+            if now < _deadline(submitted, timeout, started):
+                continue
+            in_flight.pop(future)
+            next_hedge_at = now
+            if future.cancel():
+                # Never ran: not the model's fault
+                LLM_HEALTH.release(provider, model)
+                errors.append((provider, f"{model}: not started, LLM pool busy"))
+            elif started:
+                _fail(provider, model, started[0], f"{model}: timeout after {now - started[0]:.0f}s")
+            else:
+                # Picked up by a worker just now: its outcome is recorded when it ends
+                _settle_abandoned(provider, model, now, future)
+
+    if queue:
+        errors.append((queue[0][0], f"request budget of {LLM_TOTAL_TIMEOUT_SECONDS:.0f}s exhausted"))
+    return None, errors
+
+
 def generate_gemini_text_with_status(
     prompt: str,
     *,
@@ -54,69 +370,51 @@ def generate_gemini_text_with_status(
         os.getenv("VERTEX_GEMINI_MODEL") or model_name or "gemini-2.5-pro"
     )
 
+    attempts: List[_Attempt] = []
     if use_vertex and project_id:
         vertex_location = location or os.getenv("VERTEX_AI_LOCATION", "us-central1")
-        vertex_errors = []
-        for vertex_model in model_candidates:
-            try:
-                import vertexai
-                from vertexai.generative_models import GenerativeModel
-
-                vertexai.init(project=project_id, location=vertex_location)
-                model = GenerativeModel(vertex_model)
-                response = model.generate_content(prompt)
-                if response and getattr(response, "text", None):
-                    return {
-                        "ok": True,
-                        "text": str(response.text),
-                        "provider": "vertex_ai",
-                        "model": vertex_model,
-                        "error": "",
-                    }
-                vertex_errors.append(f"{vertex_model}: empty response")
-            except Exception as exc:
-                vertex_errors.append(f"{vertex_model}: {str(exc)}")
+        # Vertex SDK has no per-call timeout: the deadline is enforced by _run_attempts
+        attempts += [
+            (
+                "vertex_ai",
+                candidate,
+                lambda timeout, candidate=candidate: LLM_HEALTH.vertex_model(
+                    project_id, vertex_location, candidate
+                ).generate_content(prompt),
+            )
+            for candidate in LLM_HEALTH.order("vertex_ai", model_candidates)
+        ]
+    if api_key:
+        attempts += [
+            (
+                "gemini_api_key",
+                candidate,
+                lambda timeout, candidate=candidate: LLM_HEALTH.api_key_model(
+                    api_key, candidate
+                ).generate_content(prompt, request_options={"timeout": timeout}),
+            )
+            for candidate in LLM_HEALTH.order("gemini_api_key", model_candidates)
+        ]
 
+    result, errors = _run_attempts(attempts)
+    if result:
+        return result
+
+    vertex_errors = [error for provider, error in errors if provider == "vertex_ai"]
+    api_errors = [error for provider, error in errors if provider == "gemini_api_key"]
+    if use_vertex and project_id:
         vertex_error = "Vertex AI error: " + " | ".join(vertex_errors[-2:])
     else:
         vertex_error = "Vertex AI disabled or missing project_id"
 
     if api_key:
-        try:
-            import google.generativeai as genai
-
-            genai.configure(api_key=api_key)
-            api_errors = []
-            for api_model in model_candidates:
-                try:
-                    model = genai.GenerativeModel(api_model)
-                    response = model.generate_content(prompt)
-                    if response and getattr(response, "text", None):
-                        return {
-                            "ok": True,
-                            "text": str(response.text),
-                            "provider": "gemini_api_key",
-                            "model": api_model,
-                            "error": "",
-                        }
-                    api_errors.append(f"{api_model}: empty response")
-                except Exception as exc:
-                    api_errors.append(f"{api_model}: {str(exc)}")
-            return {
-                "ok": False,
-                "text": "",
-                "provider": "gemini_api_key",
-                "model": model_name,
-                "error": "Gemini API error: " + " | ".join(api_errors[-2:]),
-            }
-        except Exception as exc:
-            return {
-                "ok": False,
-                "text": "",
-                "provider": "gemini_api_key",
-                "model": model_name,
-                "error": f"Gemini API setup error: {str(exc)}",
-            }
+        return {
+            "ok": False,
+            "text": "",
+            "provider": "gemini_api_key",
+            "model": model_name,
+            "error": "Gemini API error: " + " | ".join(api_errors[-2:] or vertex_errors[-2:]),
+        }
 
     return {
         "ok": False,
@@ -127,6 +425,112 @@ def generate_gemini_text_with_status(
     }
 
 
+def stream_gemini_text(
+    prompt: str,
+    *,
+    model_name: str,
+    api_key: Optional[str],
+    project_id: Optional[str],
+    location: Optional[str],
+) -> Iterator[Dict[str, Any]]:
+    """Streaming variant of generate_gemini_text_with_status.
+
+    Yields {"type": "token", "text": ...} chunks as the model produces them,
+    then one {"type": "result", ...} with the same fields as the non-streaming
+    result (text = full answer). Candidates follow the health order; the next
+    one is tried only if an attempt fails before its first chunk (after that
+    the partial answer is already on the wire). No hedging here: two streams
+    cannot be merged.
+    """
+    use_vertex = str(os.getenv("USE_VERTEX_AI", "true")).strip().lower() in {"1", "true", "yes", "on"}
+    model_candidates = _build_model_candidates(
+        os.getenv("VERTEX_GEMINI_MODEL") or model_name or "gemini-2.5-pro"
+    )
+
+    attempts: List[_Attempt] = []
+    if use_vertex and project_id:
+        vertex_location = location or os.getenv("VERTEX_AI_LOCATION", "us-central1")
+        attempts += [
+            (
+                "vertex_ai",
+                candidate,
+                lambda timeout, candidate=candidate: LLM_HEALTH.vertex_model(
+                    project_id, vertex_location, candidate
+                ).generate_content(prompt, stream=True),
+            )
+            for candidate in LLM_HEALTH.order("vertex_ai", model_candidates)
+        ]
+    if api_key:
+        attempts += [
+            (
+                "gemini_api_key",
+                candidate,
+                lambda timeout, candidate=candidate: LLM_HEALTH.api_key_model(
+                    api_key, candidate
+                ).generate_content(prompt, stream=True, request_options={"timeout": timeout}),
+            )
+            for candidate in LLM_HEALTH.order("gemini_api_key", model_candidates)
+        ]
+    if not attempts:
+        yield {
+            "type": "result",
+            "ok": False,
+            "text": "",
+            "provider": "none",
+            "model": model_name,
+            "error": "Vertex AI disabled or missing project_id",
+        }
+        return
+
+    errors: List[str] = []
+    provider = attempts[-1][0]
+    budget_deadline = time.monotonic() + LLM_TOTAL_TIMEOUT_SECONDS
+    for provider, candidate, invoke in attempts:
+        if time.monotonic() >= budget_deadline:
+            errors.append(f"request budget of {LLM_TOTAL_TIMEOUT_SECONDS:.0f}s exhausted")
+            break
+        LLM_HEALTH.begin(provider, candidate)
+        started = time.monotonic()
+        chunks: List[str] = []
+        settled = False
+        try:
+            for chunk in invoke(min(LLM_ATTEMPT_TIMEOUT_SECONDS, budget_deadline - started)):
+                piece = _response_text(chunk)
+                if piece:
+                    chunks.append(piece)
+                    yield {"type": "token", "text": piece}
+            error = "" if chunks else f"{candidate}: empty response"
+            settled = True
+        except Exception as exc:
+            error = f"{candidate}: {str(exc)}"
+            settled = True
+        finally:
+            # Client went away mid-stream (GeneratorExit): no verdict on the
+            # model, but a half-open probe must not stay taken forever
+            if not settled:
+                LLM_HEALTH.release(provider, candidate)
+        latency = time.monotonic() - started
+        if not error:
+            LLM_HEALTH.record_success(provider, candidate, latency)
+            yield {"type": "result", "ok": True, "text": "".join(chunks), "provider": provider, "model": candidate, "error": ""}
+            return
+        LLM_HEALTH.record_failure(provider, candidate, latency, error)
+        errors.append(error)
+        if chunks:
+            yield {"type": "result", "ok": False, "text": "".join(chunks), "provider": provider, "model": candidate, "error": error}
+            return
+
+    label = "Gemini API error: " if provider == "gemini_api_key" else "Vertex AI error: "
+    yield {
+        "type": "result",
+        "ok": False,
+        "text": "",
+        "provider": provider,
+        "model": model_name,
+        "error": label + " | ".join(errors[-2:]),
+    }
+
+
 def generate_gemini_text(
     prompt: str,
     *,
@@ -0,0 +1,209 @@
+"""Request-scoped BigQuery query profiling.
+
+Every finished job records job id, wall time, slot-ms, bytes processed,
+bytes billed and cache hit:
+  - into the profile of the current request (contextvar), returned on
+    demand as a `_profile` block / Server-Timing header;
+  - into a process-wide aggregate keyed by endpoint + query fingerprint,
+    so the worst queries can be ranked across endpoints.
+
+Worker threads must run under a copy of the request context
+(contextvars.copy_context().run) to attribute queries to the request.
+"""
+import contextvars
+import hashlib
+import heapq
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from api.sql_templates import QUERY_TEMPLATES
+
+QUERY_PROFILE_MAX_FINGERPRINTS = 2000
+QUERY_PROFILE_SLOWEST_KEPT = 50
+BACKGROUND_ENDPOINT = "(background)"
+
+_CURRENT_PROFILE: "contextvars.ContextVar[Optional[RequestProfile]]" = contextvars.ContextVar(
+    "query_profile", default=None
+)
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint_sql(sql: str) -> str:
+    """Stable id of a query shape (literals and whitespace normalized)."""
+    normalized = _SPACE_RE.sub(" ", _LITERAL_RE.sub("?", sql or "")).strip().lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def _int_attr(job: Any, name: str) -> Optional[int]:
+    value = getattr(job, name, None)
+    return int(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class RequestProfile:
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.queries.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = sorted(self.queries, key=lambda q: q["wall_ms"], reverse=True)
+        return {
+            "endpoint": self.endpoint,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "query_count": len(queries),
+            "query_wall_ms_total": round(sum(q["wall_ms"] for q in queries), 1),
+            "slot_ms_total": sum(q["slot_ms"] or 0 for q in queries),
+            "bytes_processed_total": sum(q["bytes_processed"] or 0 for q in queries),
+            "bytes_billed_total": sum(q["bytes_billed"] or 0 for q in queries),
+            "cache_hits": sum(1 for q in queries if q["cache_hit"]),
+            "queries": queries,
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (one metric per query, slowest first)."""
+        parts = []
+        with self._lock:
+            queries = sorted(self.queries, key=lambda q: q["wall_ms"], reverse=True)
+        for index, query in enumerate(queries[:30]):
+            desc = (query["label"] or query["fingerprint"]).replace('"', "")
+            parts.append(f'bq{index};desc="{desc}";dur={query["wall_ms"]}')
+        parts.append(f'bq-total;dur={round(sum(q["wall_ms"] for q in queries), 1)}')
+        return ", ".join(parts)
+
+
+class QueryStatsAggregator:
+    def __init__(
+        self,
+        *,
+        max_fingerprints: int = QUERY_PROFILE_MAX_FINGERPRINTS,
+        slowest_kept: int = QUERY_PROFILE_SLOWEST_KEPT,
+    ) -> None:
+        self.max_fingerprints = max_fingerprints
+        self.slowest_kept = slowest_kept
+        self._by_key: Dict[str, Dict[str, Any]] = {}
+        self._slowest: List[Any] = []
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._seq = 0
+
+    def record(self, endpoint: str, record: Dict[str, Any]) -> None:
+        key = f"{endpoint}|{record['fingerprint']}"
+        with self._lock:
+            bucket = self._by_key.get(key)
+            if bucket is None:
+                if len(self._by_key) >= self.max_fingerprints:
+                    self._dropped += 1
+                    return
+                bucket = {
+                    "endpoint": endpoint,
+                    "fingerprint": record["fingerprint"],
+                    "label": record["label"],
+                    "template_id": record["template_id"],
+                    "sql_sample": record["sql_sample"],
+                    "count": 0,
+                    "errors": 0,
+                    "cache_hits": 0,
+                    "wall_ms_total": 0.0,
+                    "wall_ms_max": 0.0,
+                    "slot_ms_total": 0,
+                    "bytes_processed_total": 0,
+                    "bytes_billed_total": 0,
+                    "last_job_id": None,
+                }
+                self._by_key[key] = bucket
+            bucket["count"] += 1
+            bucket["errors"] += 1 if record["error"] else 0
+            bucket["cache_hits"] += 1 if record["cache_hit"] else 0
+            bucket["wall_ms_total"] += record["wall_ms"]
+            bucket["wall_ms_max"] = max(bucket["wall_ms_max"], record["wall_ms"])
+            bucket["slot_ms_total"] += record["slot_ms"] or 0
+            bucket["bytes_processed_total"] += record["bytes_processed"] or 0
+            bucket["bytes_billed_total"] += record["bytes_billed"] or 0
+            bucket["last_job_id"] = record["job_id"] or bucket["last_job_id"]
+
+            self._seq += 1
+            entry = (record["wall_ms"], self._seq, {"endpoint": endpoint, **record})
+            if len(self._slowest) < self.slowest_kept:
+                heapq.heappush(self._slowest, entry)
+            elif entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def stats(self, *, sort_by: str = "wall_ms_total", limit: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            buckets = [dict(bucket) for bucket in self._by_key.values()]
+            slowest = [item[2] for item in sorted(self._slowest, reverse=True)]
+            dropped = self._dropped
+        for bucket in buckets:
+            count = bucket["count"] or 1
+            bucket["wall_ms_total"] = round(bucket["wall_ms_total"], 1)
+            bucket["wall_ms_avg"] = round(bucket["wall_ms_total"] / count, 1)
+            bucket["cache_hit_ratio"] = round(bucket["cache_hits"] / count, 3)
+        sort_key = sort_by if buckets and sort_by in buckets[0] else "wall_ms_total"
+        buckets.sort(key=lambda b: b.get(sort_key) or 0, reverse=True)
+        return {
+            "sort_by": sort_key,
+            "fingerprints": len(buckets),
+            "dropped_fingerprints": dropped,
+            "queries": buckets[: max(1, limit)],
+            "slowest_jobs": slowest[: max(1, limit)],
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_key.clear()
+            self._slowest = []
+            self._dropped = 0
+
+
+QUERY_STATS = QueryStatsAggregator()
+
+
+def start_profile(endpoint: str) -> "contextvars.Token[Optional[RequestProfile]]":
+    return _CURRENT_PROFILE.set(RequestProfile(endpoint))
+
+
+def end_profile(token: "contextvars.Token[Optional[RequestProfile]]") -> None:
+    _CURRENT_PROFILE.reset(token)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _CURRENT_PROFILE.get()
+
+
+def record_query(
+    sql: str,
+    job: Any,
+    wall_ms: float,
+    *,
+    label: Optional[str] = None,
+    error: Optional[BaseException] = None,
+) -> Dict[str, Any]:
+    template_id = QUERY_TEMPLATES.template_for(sql)
+    record = {
+        "label": label or template_id,
+        "template_id": template_id,
+        "fingerprint": fingerprint_sql(sql),
+        "sql_sample": _SPACE_RE.sub(" ", sql or "").strip()[:200],
+        "job_id": getattr(job, "job_id", None) if isinstance(getattr(job, "job_id", None), str) else None,
+        "wall_ms": round(wall_ms, 1),
+        "slot_ms": _int_attr(job, "slot_millis"),
+        "bytes_processed": _int_attr(job, "total_bytes_processed"),
+        "bytes_billed": _int_attr(job, "total_bytes_billed"),
+        "cache_hit": getattr(job, "cache_hit", None) is True,
+        "error": str(error)[:200] if error else None,
+    }
+    profile = _CURRENT_PROFILE.get()
+    if profile is not None:
+        profile.add(record)
+    QUERY_STATS.record(profile.endpoint if profile else BACKGROUND_ENDPOINT, record)
+    return record
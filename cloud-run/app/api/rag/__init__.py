@@ -1,19 +1,34 @@
-from .filters import build_filters, build_closed_filters, build_pipeline_filters
-from .insight_generator import generate_ai_insights
+from .filters import build_filters, build_closed_filters, build_index_filters, build_pipeline_filters
+from .insight_generator import generate_ai_insights, stream_ai_insights
 from .metrics import build_quality_metrics
-from .ranker import enrich_similarity_scores, apply_similarity_threshold, rerank_deals_by_context
-from .retriever import retrieve_similar_deals
+from .query_embeddings import embedding_cache_stats
+from .ranker import enrich_similarity_scores, apply_similarity_threshold, rerank_cache_stats, rerank_deals_by_context
+from .retriever import (
+    deal_index_stats,
+    embeddings_freshness,
+    retrieve_similar_deals,
+    retrieve_similar_deals_batch,
+    search_deal_index,
+)
 from .stats import summarize_deals_stats
 
 __all__ = [
     "build_filters",
     "build_closed_filters",
+    "build_index_filters",
     "build_pipeline_filters",
     "generate_ai_insights",
+    "stream_ai_insights",
     "build_quality_metrics",
     "enrich_similarity_scores",
     "apply_similarity_threshold",
     "rerank_deals_by_context",
+    "rerank_cache_stats",
+    "embedding_cache_stats",
     "retrieve_similar_deals",
+    "retrieve_similar_deals_batch",
+    "search_deal_index",
+    "deal_index_stats",
+    "embeddings_freshness",
     "summarize_deals_stats",
 ]
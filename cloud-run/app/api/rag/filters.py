@@ -1,4 +1,6 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
+
+from api.sql_templates import bind_value, in_filter
 
 
 def _date_expr(date_field: str) -> str:
@@ -10,18 +12,18 @@ def _date_expr(date_field: str) -> str:
     )
 
 
-def _sql_literal(value: str) -> str:
-    return str(value).replace("'", "''")
+def _csv_values(csv_value: Optional[str]) -> List[str]:
+    return [item.strip() for item in str(csv_value or "").split(",") if item and item.strip()]
 
 
 def _build_in_filter(column_name: str, csv_value: Optional[str]) -> Optional[str]:
-    values = [item.strip() for item in str(csv_value or "").split(",") if item and item.strip()]
-    if not values:
-        return None
-    if len(values) == 1:
-        return f"{column_name} = '{_sql_literal(values[0])}'"
-    quoted = "', '".join(_sql_literal(item) for item in values)
-    return f"{column_name} IN ('{quoted}')"
+    return in_filter(column_name, _csv_values(csv_value))
+
+
+def _fiscal_filter(year: str, quarter: Optional[str]) -> str:
+    if quarter:
+        return f"Fiscal_Q = {bind_value(f'FY{year[-2:]}-Q{quarter}', hint='fiscal_q')}"
+    return f"STARTS_WITH(Fiscal_Q, {bind_value(f'FY{year[-2:]}-', hint='fiscal_prefix')})"
 
 
 def build_filters(
@@ -33,19 +35,15 @@ def build_filters(
 ) -> str:
     conditions = []
 
-    if year and quarter:
-        fiscal_q = f"FY{year[-2:]}-Q{quarter}"
-        conditions.append(f"Fiscal_Q = '{fiscal_q}'")
-    elif year:
-        fiscal_prefix = f"FY{year[-2:]}-"
-        conditions.append(f"STARTS_WITH(Fiscal_Q, '{fiscal_prefix}')")
+    if year:
+        conditions.append(_fiscal_filter(year, quarter))
 
     seller_filter = _build_in_filter("Vendedor", seller)
     if seller_filter:
         conditions.append(seller_filter)
 
     if source:
-        conditions.append(f"source = '{_sql_literal(source)}'")
+        conditions.append(f"source = {bind_value(source, hint='source')}")
 
     phase_filter = _build_in_filter("Fase", phase)
     if phase_filter:
@@ -54,6 +52,29 @@ def build_filters(
     return "WHERE " + " AND ".join(conditions) if conditions else ""
 
 
+def build_index_filters(
+    year: Optional[str],
+    quarter: Optional[str],
+    seller: Optional[str],
+    source: Optional[str],
+    phase: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Same conditions as build_filters, as DealVectorIndex.mask() arguments."""
+    filters: Dict[str, Any] = {}
+    if year:
+        if quarter:
+            filters["fiscal_q"] = f"FY{year[-2:]}-Q{quarter}"
+        else:
+            filters["fiscal_prefix"] = f"FY{year[-2:]}-"
+    if _csv_values(seller):
+        filters["sellers"] = _csv_values(seller)
+    if source:
+        filters["sources"] = [source]
+    if _csv_values(phase):
+        filters["phases"] = _csv_values(phase)
+    return filters
+
+
 def build_closed_filters(
     year: Optional[str],
     quarter: Optional[str],
@@ -67,15 +88,11 @@ def build_closed_filters(
 
     parsed_date_expr = _date_expr(date_field)
 
-    if year and quarter:
-        fiscal_q = f"FY{year[-2:]}-Q{quarter}"
-        filters.append(f"Fiscal_Q = '{fiscal_q}'")
-    elif year:
-        fiscal_prefix = f"FY{year[-2:]}-"
-        filters.append(f"STARTS_WITH(Fiscal_Q, '{fiscal_prefix}')")
+    if year:
+        filters.append(_fiscal_filter(year, quarter))
 
     if month and not quarter:
-        filters.append(f"EXTRACT(MONTH FROM {parsed_date_expr}) = {int(month)}")
+        filters.append(f"EXTRACT(MONTH FROM {parsed_date_expr}) = {bind_value(int(month), 'INT64', 'month')}")
 
     if quarter and not (year and quarter):
         quarter_months = {
@@ -92,9 +109,9 @@ def build_closed_filters(
             )
 
     if date_start:
-        filters.append(f"{parsed_date_expr} >= DATE('{_sql_literal(date_start)}')")
+        filters.append(f"{parsed_date_expr} >= DATE({bind_value(date_start, hint='date_start')})")
     if date_end:
-        filters.append(f"{parsed_date_expr} <= DATE('{_sql_literal(date_end)}')")
+        filters.append(f"{parsed_date_expr} <= DATE({bind_value(date_end, hint='date_end')})")
 
     seller_filter = _build_in_filter("Vendedor", seller)
     if seller_filter:
@@ -116,15 +133,11 @@ def build_pipeline_filters(
 
     parsed_date_expr = _date_expr("Data_Prevista")
 
-    if year and quarter:
-        fiscal_q = f"FY{year[-2:]}-Q{quarter}"
-        filters.append(f"Fiscal_Q = '{fiscal_q}'")
-    elif year:
-        fiscal_prefix = f"FY{year[-2:]}-"
-        filters.append(f"STARTS_WITH(Fiscal_Q, '{fiscal_prefix}')")
+    if year:
+        filters.append(_fiscal_filter(year, quarter))
 
     if month and not quarter:
-        filters.append(f"EXTRACT(MONTH FROM {parsed_date_expr}) = {int(month)}")
+        filters.append(f"EXTRACT(MONTH FROM {parsed_date_expr}) = {bind_value(int(month), 'INT64', 'month')}")
 
     if quarter and not (year and quarter):
         quarter_months = {
@@ -141,9 +154,9 @@ def build_pipeline_filters(
             )
 
     if date_start:
-        filters.append(f"{parsed_date_expr} >= DATE('{_sql_literal(date_start)}')")
+        filters.append(f"{parsed_date_expr} >= DATE({bind_value(date_start, hint='date_start')})")
     if date_end:
-        filters.append(f"{parsed_date_expr} <= DATE('{_sql_literal(date_end)}')")
+        filters.append(f"{parsed_date_expr} <= DATE({bind_value(date_end, hint='date_end')})")
 
     seller_filter = _build_in_filter("Vendedor", seller)
     if seller_filter:
@@ -1,10 +1,13 @@
 import re
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional
 
-from api.llm_client import generate_gemini_text_with_status
+from api.llm_cache import generate_cached_text, stream_cached_text
 
 from .stats import summarize_deals_stats
 
+# Bump when the prompt template or section parsing changes (keys the LLM response store)
+INSIGHTS_PROMPT_VERSION = "insights-rag-v1"
+
 
 def _to_int(value: Any) -> int:
     try:
@@ -131,18 +134,13 @@ def _compact_cause_context(items: List[Dict[str, Any]], limit: int = 4) -> str:
     return " ; ".join([f"{str(item.get('causa') or '-')} ({int(item.get('total') or 0)})" for item in items[:limit]])
 
 
-def generate_ai_insights(
-    query_text: str,
+def _insights_precheck(
     deals: List[Dict[str, Any]],
-    stats: Dict[str, Any],
     *,
     gemini_api_key: str | None,
-    gemini_model: str,
     gcp_project: str | None,
-    vertex_location: str | None,
-    business_highlights: Dict[str, Any] | None = None,
-    filters_context: Dict[str, Any] | None = None,
-) -> Dict[str, Any]:
+) -> Optional[Dict[str, Any]]:
+    """Final insights payload when there is nothing to ask the LLM, else None."""
     if not deals:
         return {
             "status": "empty",
@@ -151,13 +149,6 @@ def generate_ai_insights(
             "recommendations": [],
         }
 
-    wins_deals = [deal for deal in deals if (deal.get("source") or "").lower() == "won"]
-    losses_deals = [deal for deal in deals if (deal.get("source") or "").lower() == "lost"]
-
-    wins_stats = stats.get("wins_stats") or summarize_deals_stats(wins_deals)
-    losses_stats = stats.get("losses_stats") or summarize_deals_stats(losses_deals)
-    pipeline_stats = stats.get("pipeline") or {}
-
     if not gemini_api_key and not gcp_project:
         return {
             "status": "llm_unavailable",
@@ -167,6 +158,23 @@ def generate_ai_insights(
             "full": "",
             "error": "No LLM credentials configured",
         }
+    return None
+
+
+def build_insights_prompt(
+    query_text: str,
+    deals: List[Dict[str, Any]],
+    stats: Dict[str, Any],
+    *,
+    business_highlights: Dict[str, Any] | None = None,
+    filters_context: Dict[str, Any] | None = None,
+) -> str:
+    wins_deals = [deal for deal in deals if (deal.get("source") or "").lower() == "won"]
+    losses_deals = [deal for deal in deals if (deal.get("source") or "").lower() == "lost"]
+
+    wins_stats = stats.get("wins_stats") or summarize_deals_stats(wins_deals)
+    losses_stats = stats.get("losses_stats") or summarize_deals_stats(losses_deals)
+    pipeline_stats = stats.get("pipeline") or {}
 
     facts = _build_data_facts(wins_stats, losses_stats, pipeline_stats)
     highlights = business_highlights or {}
@@ -184,7 +192,7 @@ def generate_ai_insights(
     gain_causes_ctx = _compact_cause_context(gain_causes)
     loss_causes_ctx = _compact_cause_context(loss_causes)
 
-    prompt = f"""
+    return f"""
 Voce e um assistente de inteligencia comercial. Gere insights COMPLETOS e detalhados.
 
 Consulta: {query_text}
@@ -236,16 +244,13 @@ RECOMENDACOES:
 - ...
 """
 
-    llm_result = generate_gemini_text_with_status(
-        prompt,
-        model_name=gemini_model,
-        api_key=gemini_api_key,
-        project_id=gcp_project,
-        location=vertex_location,
-    )
+
+def parse_insights_result(llm_result: Dict[str, Any]) -> Dict[str, Any]:
+    """LLM result dict -> insights payload (sections parsed from the text)."""
     text = str(llm_result.get("text") or "")
 
-    if not text or not str(text).strip():
+    # ok=False with text = stream cut mid-answer: partial sections are not parsed
+    if not text or not str(text).strip() or llm_result.get("ok") is False:
         return {
             "status": "llm_failed",
             "wins": "LLM falhou ao gerar insights de vitórias.",
@@ -271,6 +276,7 @@ RECOMENDACOES:
         "full": text,
         "provider": llm_result.get("provider"),
         "model": llm_result.get("model"),
+        "cached": bool(llm_result.get("cached")),
         "data_basis": "executive_metrics",
     }
 
@@ -288,3 +294,79 @@ RECOMENDACOES:
         }
 
     return parsed
+
+
+def generate_ai_insights(
+    query_text: str,
+    deals: List[Dict[str, Any]],
+    stats: Dict[str, Any],
+    *,
+    gemini_api_key: str | None,
+    gemini_model: str,
+    gcp_project: str | None,
+    vertex_location: str | None,
+    business_highlights: Dict[str, Any] | None = None,
+    filters_context: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    precheck = _insights_precheck(deals, gemini_api_key=gemini_api_key, gcp_project=gcp_project)
+    if precheck is not None:
+        return precheck
+
+    prompt = build_insights_prompt(
+        query_text,
+        deals,
+        stats,
+        business_highlights=business_highlights,
+        filters_context=filters_context,
+    )
+    llm_result = generate_cached_text(
+        prompt,
+        prompt_version=INSIGHTS_PROMPT_VERSION,
+        model_name=gemini_model,
+        api_key=gemini_api_key,
+        project_id=gcp_project,
+        location=vertex_location,
+    )
+    return parse_insights_result(llm_result)
+
+
+def stream_ai_insights(
+    query_text: str,
+    deals: List[Dict[str, Any]],
+    stats: Dict[str, Any],
+    *,
+    gemini_api_key: str | None,
+    gemini_model: str,
+    gcp_project: str | None,
+    vertex_location: str | None,
+    business_highlights: Dict[str, Any] | None = None,
+    filters_context: Dict[str, Any] | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """generate_ai_insights as events: {"type": "token", "text"} chunks, then
+    {"type": "insights", "data": <same payload as generate_ai_insights>}."""
+    precheck = _insights_precheck(deals, gemini_api_key=gemini_api_key, gcp_project=gcp_project)
+    if precheck is not None:
+        yield {"type": "insights", "data": precheck}
+        return
+
+    prompt = build_insights_prompt(
+        query_text,
+        deals,
+        stats,
+        business_highlights=business_highlights,
+        filters_context=filters_context,
+    )
+    llm_result: Dict[str, Any] = {}
+    for event in stream_cached_text(
+        prompt,
+        prompt_version=INSIGHTS_PROMPT_VERSION,
+        model_name=gemini_model,
+        api_key=gemini_api_key,
+        project_id=gcp_project,
+        location=vertex_location,
+    ):
+        if event.get("type") == "token":
+            yield event
+        else:
+            llm_result = event
+    yield {"type": "insights", "data": parse_insights_result(llm_result)}
@@ -0,0 +1,65 @@
+"""Query text -> embedding cache for ML.GENERATE_TEXT_EMBEDDING.
+
+L1 is a per-instance LRU (ResponseCache), L2 the shared backend from
+CACHE_L2_URL when configured. Keys hold the embedding model id and the
+normalized text; vectors are stored as float32 arrays.
+RAG_EMBEDDING_MODEL_VERSION must change whenever text_embedding_model is
+recreated on another endpoint, so old vectors are never mixed with new ones.
+"""
+import os
+import re
+import unicodedata
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from api.response_cache import ResponseCache
+from api.tiered_cache import TieredCache
+
+RAG_EMBEDDING_CACHE_ENABLED = str(os.getenv("RAG_EMBEDDING_CACHE_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+RAG_EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("RAG_EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RAG_EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RAG_EMBEDDING_MODEL_VERSION = os.getenv("RAG_EMBEDDING_MODEL_VERSION", "1").strip()
+
+# Fixed key version: vectors depend on the model, not on the app revision
+_EMBEDDING_CACHE = TieredCache(
+    "rag_query_embeddings",
+    ResponseCache(max_bytes=RAG_EMBEDDING_CACHE_MAX_BYTES, max_entries=5000),
+    version="embeddings",
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query_text(text: str) -> str:
+    """NFC + collapsed whitespace; also the text sent to the model."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", str(text or ""))).strip()
+
+
+def embedding_model_id(project_id: str, dataset_id: str) -> str:
+    return f"{project_id}.{dataset_id}.text_embedding_model@{RAG_EMBEDDING_MODEL_VERSION}"
+
+
+def _cache_key(model_id: str, text: str) -> str:
+    return f"{model_id}|{normalize_query_text(text)}"
+
+
+def get_cached_embedding(model_id: str, text: str) -> Optional[List[float]]:
+    if not RAG_EMBEDDING_CACHE_ENABLED:
+        return None
+    vector = _EMBEDDING_CACHE.get(_cache_key(model_id, text))
+    return None if vector is None else vector.tolist()
+
+
+def set_cached_embedding(model_id: str, text: str, vector: Optional[Sequence[float]]) -> None:
+    if not RAG_EMBEDDING_CACHE_ENABLED or not vector:
+        return
+    _EMBEDDING_CACHE.set(
+        _cache_key(model_id, text),
+        np.asarray(vector, dtype=np.float32),
+        RAG_EMBEDDING_CACHE_TTL_SECONDS,
+    )
+
+
+def embedding_cache_stats() -> dict:
+    return {"enabled": RAG_EMBEDDING_CACHE_ENABLED, **_EMBEDDING_CACHE.stats()}
@@ -1,5 +1,34 @@
+"""Similarity enrichment, threshold and hybrid (vector + lexical + context) rerank.
+
+The rerank score is 0.72 * similarity + 0.28 * lexical overlap + context
+boosts (seller 0.12, source 0.08, fiscal quarter 0.08). Each deal's token set
+is tokenized once and kept as a sorted int32 array of vocabulary ids, cached
+by (deal_id, content hash); a request then scores every candidate with one
+searchsorted + bincount over the concatenated ids instead of per-deal regex
+and Python sets.
+"""
+import hashlib
+import os
 import re
-from typing import Any, Dict, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+RAG_RERANK_TOKEN_CACHE_ENTRIES = int(os.getenv("RAG_RERANK_TOKEN_CACHE_ENTRIES", "50000"))
+# Vocabulary is reset (with the token cache) past this size
+_VOCAB_MAX_TOKENS = 4 * max(1, RAG_RERANK_TOKEN_CACHE_ENTRIES)
+
+_SEARCHABLE_FIELDS = ("Oportunidade", "Produtos", "Segmento", "Portfolio", "content")
+_TOKEN_SPLIT = re.compile(r"[^\wÀ-ÿ]+")
+
+_TOKEN_LOCK = threading.Lock()
+# Vocabulary generation: a request keeps the vocabulary it started with, so a
+# concurrent reset never mixes ids from two vocabularies in one scoring pass
+_VOCAB_STATE: Dict[str, Any] = {"vocab": {}, "generation": 0}
+_DEAL_TOKENS: "OrderedDict[Tuple[int, str, bytes], np.ndarray]" = OrderedDict()
+_TOKEN_STATS = {"hits": 0, "misses": 0, "resets": 0}
 
 
 def enrich_similarity_scores(deals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -20,6 +49,80 @@ def apply_similarity_threshold(deals: List[Dict[str, Any]], min_similarity: floa
     return [deal for deal in deals if float(deal.get("similarity") or 0.0) >= threshold]
 
 
+def _searchable_text(deal: Dict[str, Any]) -> str:
+    return " ".join([str(deal.get(field) or "") for field in _SEARCHABLE_FIELDS])
+
+
+def _current_vocab() -> Tuple[Dict[str, int], int]:
+    with _TOKEN_LOCK:
+        if len(_VOCAB_STATE["vocab"]) > _VOCAB_MAX_TOKENS:
+            _VOCAB_STATE["vocab"] = {}
+            _VOCAB_STATE["generation"] += 1
+            _DEAL_TOKENS.clear()
+            _TOKEN_STATS["resets"] += 1
+        return _VOCAB_STATE["vocab"], _VOCAB_STATE["generation"]
+
+
+def _deal_token_ids(deal: Dict[str, Any], vocab: Dict[str, int], generation: int) -> np.ndarray:
+    """Sorted unique vocabulary ids of the deal's searchable text (cached)."""
+    text = _searchable_text(deal)
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=12).digest()
+    key = (generation, str(deal.get("deal_id") or ""), digest)
+    with _TOKEN_LOCK:
+        ids = _DEAL_TOKENS.get(key)
+        if ids is not None:
+            _DEAL_TOKENS.move_to_end(key)
+            _TOKEN_STATS["hits"] += 1
+            return ids
+        _TOKEN_STATS["misses"] += 1
+        ids = np.fromiter(
+            sorted({vocab.setdefault(token, len(vocab)) for token in _tokenize(text)}),
+            dtype=np.int32,
+        )
+        _DEAL_TOKENS[key] = ids
+        while len(_DEAL_TOKENS) > RAG_RERANK_TOKEN_CACHE_ENTRIES:
+            _DEAL_TOKENS.popitem(last=False)
+        return ids
+
+
+def _lexical_overlap_scores(query_tokens: List[str], deals: List[Dict[str, Any]]) -> np.ndarray:
+    """Per deal: query tokens (with repeats) found in the deal / distinct query tokens."""
+    scores = np.zeros(len(deals), dtype=np.float64)
+    if not query_tokens or not deals:
+        return scores
+
+    vocab, generation = _current_vocab()
+    token_arrays = [_deal_token_ids(deal, vocab, generation) for deal in deals]
+    counts: Dict[int, int] = {}
+    with _TOKEN_LOCK:
+        for token in query_tokens:
+            token_id = vocab.get(token, -1)
+            if token_id >= 0:
+                counts[token_id] = counts.get(token_id, 0) + 1
+    if not counts:
+        return scores
+
+    query_vocab = np.fromiter(sorted(counts), dtype=np.int32)
+    query_weights = np.array([counts[token_id] for token_id in query_vocab.tolist()], dtype=np.float64)
+    lengths = np.array([len(ids) for ids in token_arrays], dtype=np.int64)
+    if not lengths.sum():
+        return scores
+    flat = np.concatenate(token_arrays)
+    owner = np.repeat(np.arange(len(deals)), lengths)
+
+    positions = np.minimum(np.searchsorted(query_vocab, flat), len(query_vocab) - 1)
+    matched = query_vocab[positions] == flat
+    overlap = np.bincount(owner[matched], weights=query_weights[positions[matched]], minlength=len(deals))
+    return overlap / max(1, len(set(query_tokens)))
+
+
+def _field_matches(deals: List[Dict[str, Any]], field: str, value: str, upper: bool = False) -> np.ndarray:
+    if not value:
+        return np.zeros(len(deals), dtype=bool)
+    normalize = str.upper if upper else str.lower
+    return np.array([normalize(str(deal.get(field) or "").strip()) == value for deal in deals], dtype=bool)
+
+
 def rerank_deals_by_context(
     deals: List[Dict[str, Any]],
     *,
@@ -28,55 +131,43 @@ def rerank_deals_by_context(
     source: Optional[str] = None,
     fiscal_q: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
+    if not deals:
+        return []
     query_tokens = _tokenize(query_text)
     normalized_seller = str(seller or "").strip().lower()
     normalized_source = str(source or "").strip().lower()
     normalized_fiscal_q = str(fiscal_q or "").strip().upper()
 
-    reranked: List[Dict[str, Any]] = []
-    for deal in deals:
-        similarity = float(deal.get("similarity") or 0.0)
-
-        searchable_text = " ".join(
-            [
-                str(deal.get("Oportunidade") or ""),
-                str(deal.get("Produtos") or ""),
-                str(deal.get("Segmento") or ""),
-                str(deal.get("Portfolio") or ""),
-                str(deal.get("content") or ""),
-            ]
-        )
-        lexical_score = _lexical_overlap_score(query_tokens, searchable_text)
-
-        contextual_boost = 0.0
+    similarity = np.array([float(deal.get("similarity") or 0.0) for deal in deals], dtype=np.float64)
+    lexical_score = _lexical_overlap_scores(query_tokens, deals)
 
-        if normalized_seller and str(deal.get("Vendedor") or "").strip().lower() == normalized_seller:
-            contextual_boost += 0.12
+    # Same addition order as the per-deal formula so scores match bit for bit
+    contextual_boost = np.zeros(len(deals), dtype=np.float64)
+    contextual_boost += np.where(_field_matches(deals, "Vendedor", normalized_seller), 0.12, 0.0)
+    contextual_boost += np.where(_field_matches(deals, "source", normalized_source), 0.08, 0.0)
+    contextual_boost += np.where(_field_matches(deals, "Fiscal_Q", normalized_fiscal_q, upper=True), 0.08, 0.0)
 
-        if normalized_source and str(deal.get("source") or "").strip().lower() == normalized_source:
-            contextual_boost += 0.08
+    rank_score = (0.72 * similarity) + (0.28 * lexical_score) + contextual_boost
 
-        if normalized_fiscal_q and str(deal.get("Fiscal_Q") or "").strip().upper() == normalized_fiscal_q:
-            contextual_boost += 0.08
-
-        rank_score = (0.72 * similarity) + (0.28 * lexical_score) + contextual_boost
-        deal["rag_rank_score"] = round(rank_score, 4)
-        deal["rag_lexical_score"] = round(lexical_score, 4)
-        reranked.append(deal)
+    for deal, rank, lexical in zip(deals, rank_score.tolist(), lexical_score.tolist()):
+        deal["rag_rank_score"] = round(rank, 4)
+        deal["rag_lexical_score"] = round(lexical, 4)
 
+    reranked = list(deals)
     reranked.sort(key=lambda item: float(item.get("rag_rank_score") or 0.0), reverse=True)
     return reranked
 
 
-def _tokenize(text: str) -> List[str]:
-    return [token for token in re.split(r"[^\wÀ-ÿ]+", str(text or "").lower()) if len(token) > 2]
+def rerank_cache_stats() -> Dict[str, Any]:
+    with _TOKEN_LOCK:
+        return {
+            "entries": len(_DEAL_TOKENS),
+            "max_entries": RAG_RERANK_TOKEN_CACHE_ENTRIES,
+            "vocabulary": len(_VOCAB_STATE["vocab"]),
+            "generation": _VOCAB_STATE["generation"],
+            **_TOKEN_STATS,
+        }
 
 
-def _lexical_overlap_score(query_tokens: List[str], candidate_text: str) -> float:
-    if not query_tokens:
-        return 0.0
-    candidate_tokens = set(_tokenize(candidate_text))
-    if not candidate_tokens:
-        return 0.0
-    overlap = sum(1 for token in query_tokens if token in candidate_tokens)
-    return overlap / max(1, len(set(query_tokens)))
+def _tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_SPLIT.split(str(text or "").lower()) if len(token) > 2]
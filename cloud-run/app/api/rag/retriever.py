@@ -1,7 +1,238 @@
-from typing import Any, Dict, List
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from google.cloud import bigquery
 
+from api.columnar_snapshot import SnapshotStore
+from api.sql_templates import job_config_for
+
+from .query_embeddings import (
+    embedding_model_id,
+    get_cached_embedding,
+    normalize_query_text,
+    set_cached_embedding,
+)
+from .vector_index import INDEX_METADATA_COLUMNS, DealVectorIndex
+
+RAG_VECTOR_INDEX_ENABLED = str(os.getenv("RAG_VECTOR_INDEX_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+RAG_VECTOR_INDEX_INT8 = str(os.getenv("RAG_VECTOR_INDEX_INT8", "false")).strip().lower() in {"1", "true", "yes", "on"}
+RAG_VECTOR_INDEX_CHECK_SECONDS = int(os.getenv("RAG_VECTOR_INDEX_CHECK_SECONDS", "300"))
+RAG_VECTOR_INDEX_RETRY_SECONDS = int(os.getenv("RAG_VECTOR_INDEX_RETRY_SECONDS", "120"))
+
+# deal_embeddings columns returned by every VECTOR_SEARCH (same as the local index)
+_BASE_COLUMNS_SQL = ",\n      ".join(f"base.{column} AS {column}" for column in INDEX_METADATA_COLUMNS)
+
+# One local index per (project, dataset), shared by every endpoint
+_INDEX_STORES: Dict[Tuple[str, str], SnapshotStore] = {}
+_INDEX_STORES_LOCK = threading.Lock()
+
+
+def embeddings_freshness(client: bigquery.Client, *, project_id: str, dataset_id: str) -> Dict[str, Any]:
+    """Last modification of deal_embeddings vs. its source tables ({} on failure)."""
+    try:
+        query = f"""
+        SELECT
+          table_id,
+          TIMESTAMP_MILLIS(last_modified_time) AS last_modified
+        FROM `{project_id}.{dataset_id}.__TABLES__`
+        WHERE table_id IN ('pipeline', 'closed_deals_won', 'closed_deals_lost', 'deal_embeddings')
+        """
+        rows = list(client.query(query).result())
+        if not rows:
+            return {}
+
+        by_table = {
+            str(row.get("table_id")): row.get("last_modified")
+            for row in rows
+        }
+
+        embeddings_ts = by_table.get("deal_embeddings")
+        source_latest = max(
+            [
+                ts
+                for name, ts in by_table.items()
+                if name != "deal_embeddings" and ts is not None
+            ],
+            default=None,
+        )
+
+        lag_hours = 0.0
+        if embeddings_ts and source_latest:
+            lag_hours = max(
+                0.0,
+                (source_latest - embeddings_ts).total_seconds() / 3600.0,
+            )
+
+        return {
+            "deal_embeddings_last_modified": embeddings_ts.isoformat() if embeddings_ts else None,
+            "sources_last_modified": {
+                "pipeline": by_table.get("pipeline").isoformat() if by_table.get("pipeline") else None,
+                "closed_deals_won": by_table.get("closed_deals_won").isoformat() if by_table.get("closed_deals_won") else None,
+                "closed_deals_lost": by_table.get("closed_deals_lost").isoformat() if by_table.get("closed_deals_lost") else None,
+            },
+            "embeddings_lag_hours": round(lag_hours, 2),
+            "embeddings_stale": lag_hours >= 24.0,
+        }
+    except Exception:
+        return {}
+
+
+def embed_query_text(client: bigquery.Client, *, project_id: str, dataset_id: str, query_text: str) -> List[float]:
+    """Query embedding from the same remote model that built deal_embeddings (cached)."""
+    model_id = embedding_model_id(project_id, dataset_id)
+    cached = get_cached_embedding(model_id, query_text)
+    if cached is not None:
+        return cached
+    query_sql = f"""
+    SELECT text_embedding AS embedding
+    FROM ML.GENERATE_TEXT_EMBEDDING(
+      MODEL `{project_id}.{dataset_id}.text_embedding_model`,
+      (SELECT @query_text AS content)
+    )
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("query_text", "STRING", normalize_query_text(query_text)),
+        ]
+    )
+    rows = list(client.query(query_sql, job_config=job_config).result())
+    if not rows or not rows[0].get("embedding"):
+        raise ValueError("text_embedding_model returned no embedding")
+    vector = [float(v) for v in rows[0]["embedding"]]
+    set_cached_embedding(model_id, query_text, vector)
+    return vector
+
+
+def embed_query_texts(
+    client: bigquery.Client,
+    *,
+    project_id: str,
+    dataset_id: str,
+    query_texts: Sequence[str],
+) -> List[List[float]]:
+    """embed_query_text for several texts: cache first, one model call for the rest."""
+    model_id = embedding_model_id(project_id, dataset_id)
+    vectors: List[Optional[List[float]]] = [get_cached_embedding(model_id, text) for text in query_texts]
+    missing = sorted({normalize_query_text(text) for text, vector in zip(query_texts, vectors) if vector is None})
+    if missing:
+        query_sql = f"""
+        SELECT query_id, text_embedding AS embedding
+        FROM ML.GENERATE_TEXT_EMBEDDING(
+          MODEL `{project_id}.{dataset_id}.text_embedding_model`,
+          (SELECT query_id, content FROM UNNEST(@query_texts) AS content WITH OFFSET AS query_id)
+        )
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("query_texts", "STRING", missing)]
+        )
+        generated: Dict[str, List[float]] = {}
+        for row in client.query(query_sql, job_config=job_config).result():
+            if row.get("embedding"):
+                text = missing[int(row["query_id"])]
+                generated[text] = [float(v) for v in row["embedding"]]
+                set_cached_embedding(model_id, text, generated[text])
+        for position, text in enumerate(query_texts):
+            if vectors[position] is None:
+                vectors[position] = generated.get(normalize_query_text(text))
+    if any(vector is None for vector in vectors):
+        raise ValueError("text_embedding_model returned no embedding")
+    return vectors  # type: ignore[return-value]
+
+
+def load_deal_index(client: bigquery.Client, *, project_id: str, dataset_id: str) -> DealVectorIndex:
+    # Version read before the rows: a concurrent rewrite only causes an extra reload
+    version = embeddings_freshness(client, project_id=project_id, dataset_id=dataset_id).get(
+        "deal_embeddings_last_modified"
+    )
+    query_sql = f"""
+    SELECT {", ".join(INDEX_METADATA_COLUMNS)}, embedding
+    FROM `{project_id}.{dataset_id}.deal_embeddings`
+    WHERE ARRAY_LENGTH(embedding) > 0
+    """
+    rows = (dict(row) for row in client.query(query_sql).result())
+    return DealVectorIndex(rows, quantize=RAG_VECTOR_INDEX_INT8, version=version)
+
+
+def _index_is_current(client: bigquery.Client, project_id: str, dataset_id: str, index: DealVectorIndex) -> bool:
+    if time.time() - index.checked_at < RAG_VECTOR_INDEX_CHECK_SECONDS:
+        return True
+    version = embeddings_freshness(client, project_id=project_id, dataset_id=dataset_id).get(
+        "deal_embeddings_last_modified"
+    )
+    index.checked_at = time.time()
+    # Freshness unavailable: keep serving the loaded index
+    return version is None or version == index.version
+
+
+def get_deal_index(client: bigquery.Client, *, project_id: str, dataset_id: str) -> Optional[DealVectorIndex]:
+    """Shared local index, (re)loaded when deal_embeddings changes; None while unavailable."""
+    if not RAG_VECTOR_INDEX_ENABLED:
+        return None
+    key = (project_id, dataset_id)
+    with _INDEX_STORES_LOCK:
+        store = _INDEX_STORES.get(key)
+        if store is None:
+            store = SnapshotStore(
+                {"deal_embeddings": lambda: load_deal_index(client, project_id=project_id, dataset_id=dataset_id)},
+                lambda name, index: _index_is_current(client, project_id, dataset_id, index),
+                retry_seconds=RAG_VECTOR_INDEX_RETRY_SECONDS,
+            )
+            _INDEX_STORES[key] = store
+    return store.get("deal_embeddings")
+
+
+def deal_index_stats() -> Dict[str, Any]:
+    return {
+        "enabled": RAG_VECTOR_INDEX_ENABLED,
+        "indexes": {f"{project}.{dataset}": store.stats() for (project, dataset), store in _INDEX_STORES.items()},
+    }
+
+
+def search_deal_index(
+    client: bigquery.Client,
+    *,
+    project_id: str,
+    dataset_id: str,
+    query_text: str,
+    top_k: int,
+    filters: Dict[str, Any],
+    columns: Optional[Sequence[str]] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """Filtered cosine top-k over the local index; None means use VECTOR_SEARCH."""
+    index = get_deal_index(client, project_id=project_id, dataset_id=dataset_id)
+    if index is None:
+        return None
+    try:
+        vector = embed_query_text(client, project_id=project_id, dataset_id=dataset_id, query_text=query_text)
+        return index.search(vector, top_k, index.mask(**filters), columns=columns)
+    except Exception as e:
+        print(f"[RAG] WARN: local vector search failed, using VECTOR_SEARCH: {e}")
+        return None
+
+
+def search_deal_index_batch(
+    client: bigquery.Client,
+    *,
+    project_id: str,
+    dataset_id: str,
+    query_texts: Sequence[str],
+    top_k: int,
+    filters: Dict[str, Any],
+    columns: Optional[Sequence[str]] = None,
+) -> Optional[List[List[Dict[str, Any]]]]:
+    """search_deal_index for several texts in one index pass; None means use VECTOR_SEARCH."""
+    index = get_deal_index(client, project_id=project_id, dataset_id=dataset_id)
+    if index is None:
+        return None
+    try:
+        vectors = embed_query_texts(client, project_id=project_id, dataset_id=dataset_id, query_texts=query_texts)
+        return index.search_many(vectors, top_k, index.mask(**filters), columns=columns)
+    except Exception as e:
+        print(f"[RAG] WARN: local batch vector search failed, using VECTOR_SEARCH: {e}")
+        return None
+
 
 def retrieve_similar_deals(
     client: bigquery.Client,
@@ -11,31 +242,50 @@ def retrieve_similar_deals(
     query_text: str,
     top_k: int,
     where_clause: str,
+    index_filters: Optional[Dict[str, Any]] = None,
 ) -> List[Dict[str, Any]]:
-    query_sql = f"""
-    WITH query_embedding AS (
+    """Top-k deals by cosine distance.
+
+    index_filters (rag.filters.build_index_filters) must describe the same
+    rows as where_clause; with it the search runs on the local index and
+    only the query embedding is computed in BigQuery.
+    """
+    if index_filters is not None:
+        deals = search_deal_index(
+            client,
+            project_id=project_id,
+            dataset_id=dataset_id,
+            query_text=query_text,
+            top_k=top_k,
+            filters=index_filters,
+        )
+        if deals is not None:
+            return deals
+
+    model_id = embedding_model_id(project_id, dataset_id)
+    cached_vector = get_cached_embedding(model_id, query_text)
+    if cached_vector is not None:
+        # Known text: skip the model call, bind the vector
+        query_embedding_sql = "SELECT @query_embedding AS embedding"
+        text_parameter = bigquery.ArrayQueryParameter("query_embedding", "FLOAT64", cached_vector)
+        echo_embedding = ""
+    else:
+        query_embedding_sql = f"""
       SELECT text_embedding AS embedding
       FROM ML.GENERATE_TEXT_EMBEDDING(
         MODEL `{project_id}.{dataset_id}.text_embedding_model`,
         (SELECT @query_text AS content)
-      )
+      )"""
+        text_parameter = bigquery.ScalarQueryParameter("query_text", "STRING", normalize_query_text(query_text))
+        # Returned once (first row) so the vector can be cached
+        echo_embedding = ",\n      IF(ROW_NUMBER() OVER (ORDER BY distance ASC) = 1, query.embedding, NULL) AS query_embedding"
+
+    query_sql = f"""
+    WITH query_embedding AS ({query_embedding_sql}
     )
     SELECT
-      base.deal_id AS deal_id,
-      base.source AS source,
-      base.Oportunidade AS Oportunidade,
-      base.Vendedor AS Vendedor,
-      base.Conta AS Conta,
-      base.Segmento AS Segmento,
-      base.Portfolio AS Portfolio,
-      base.Gross AS Gross,
-      base.Net AS Net,
-      base.Fiscal_Q AS Fiscal_Q,
-      base.Produtos AS Produtos,
-      base.Familia_Produto AS Familia_Produto,
-      base.Fase AS Fase,
-      base.content AS content,
-      distance
+      {_BASE_COLUMNS_SQL},
+      distance{echo_embedding}
     FROM VECTOR_SEARCH(
       (
         SELECT *
@@ -52,10 +302,126 @@ def retrieve_similar_deals(
 
     job_config = bigquery.QueryJobConfig(
         query_parameters=[
-            bigquery.ScalarQueryParameter("query_text", "STRING", query_text),
+            text_parameter,
             bigquery.ScalarQueryParameter("top_k", "INT64", top_k),
         ]
     )
 
-    results = client.query(query_sql, job_config=job_config).result()
-    return [dict(row) for row in results]
+    # where_clause may reference request-scoped parameters (api.sql_templates)
+    results = client.query(query_sql, job_config=job_config_for(query_sql, job_config)).result()
+    deals = [dict(row) for row in results]
+    for deal in deals:
+        vector = deal.pop("query_embedding", None)
+        if vector:
+            set_cached_embedding(model_id, query_text, [float(v) for v in vector])
+    return deals
+
+
+def retrieve_similar_deals_batch(
+    client: bigquery.Client,
+    *,
+    project_id: str,
+    dataset_id: str,
+    query_texts: Sequence[str],
+    top_k: int,
+    where_clause: str,
+    index_filters: Optional[Dict[str, Any]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """retrieve_similar_deals for N texts: one local index pass or one VECTOR_SEARCH job.
+
+    Returns one list of deals per text, in the same order.
+    """
+    query_texts = list(query_texts)
+    if not query_texts:
+        return []
+    if index_filters is not None:
+        results = search_deal_index_batch(
+            client,
+            project_id=project_id,
+            dataset_id=dataset_id,
+            query_texts=query_texts,
+            top_k=top_k,
+            filters=index_filters,
+        )
+        if results is not None:
+            return results
+
+    model_id = embedding_model_id(project_id, dataset_id)
+    # Distinct normalized texts; query_id = position in this list
+    distinct = list(dict.fromkeys(normalize_query_text(text) for text in query_texts))
+    cached = {position: get_cached_embedding(model_id, text) for position, text in enumerate(distinct)}
+    uncached_ids = [position for position, vector in cached.items() if vector is None]
+
+    parts = []
+    parameters: List[Any] = [bigquery.ScalarQueryParameter("top_k", "INT64", top_k)]
+    if uncached_ids:
+        parts.append(f"""
+      SELECT query_id, text_embedding AS embedding
+      FROM ML.GENERATE_TEXT_EMBEDDING(
+        MODEL `{project_id}.{dataset_id}.text_embedding_model`,
+        (
+          SELECT query_id, content
+          FROM UNNEST(@query_texts) AS content WITH OFFSET AS query_id
+          WHERE query_id IN UNNEST(@uncached_ids)
+        )
+      )""")
+        parameters += [
+            bigquery.ArrayQueryParameter("query_texts", "STRING", distinct),
+            bigquery.ArrayQueryParameter("uncached_ids", "INT64", uncached_ids),
+        ]
+    if len(uncached_ids) < len(distinct):
+        # Known texts: vectors bound as parameters, no model call
+        parts.append("""
+      SELECT query_id, embedding FROM UNNEST(@cached_embeddings)""")
+        parameters.append(bigquery.ArrayQueryParameter("cached_embeddings", "STRUCT", [
+            bigquery.StructQueryParameter(
+                None,
+                bigquery.ScalarQueryParameter("query_id", "INT64", position),
+                bigquery.ArrayQueryParameter("embedding", "FLOAT64", vector),
+            )
+            for position, vector in cached.items()
+            if vector is not None
+        ]))
+    # Generated embeddings come back once per query (first row) to be cached
+    echo_embedding = (
+        ",\n      IF(query.query_id IN UNNEST(@uncached_ids)"
+        " AND ROW_NUMBER() OVER (PARTITION BY query.query_id ORDER BY distance ASC) = 1,"
+        " query.embedding, NULL) AS query_embedding"
+        if uncached_ids else ""
+    )
+
+    query_embeddings_sql = "\n      UNION ALL".join(parts)
+    query_sql = f"""
+    WITH query_embeddings AS ({query_embeddings_sql}
+    )
+    SELECT
+      query.query_id AS query_id,
+      {_BASE_COLUMNS_SQL},
+      distance{echo_embedding}
+    FROM VECTOR_SEARCH(
+      (
+        SELECT *
+        FROM `{project_id}.{dataset_id}.deal_embeddings`
+        {where_clause}
+      ),
+      'embedding',
+      (SELECT query_id, embedding FROM query_embeddings),
+      top_k => @top_k,
+      distance_type => 'COSINE'
+    )
+    ORDER BY query_id, distance ASC
+    """
+
+    job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+    # where_clause may reference request-scoped parameters (api.sql_templates)
+    results = client.query(query_sql, job_config=job_config_for(query_sql, job_config)).result()
+    by_query: Dict[int, List[Dict[str, Any]]] = {position: [] for position in range(len(distinct))}
+    for row in results:
+        deal = dict(row)
+        query_id = int(deal.pop("query_id"))
+        vector = deal.pop("query_embedding", None)
+        if vector:
+            set_cached_embedding(model_id, distinct[query_id], [float(v) for v in vector])
+        by_query.setdefault(query_id, []).append(deal)
+    position_of = {text: position for position, text in enumerate(distinct)}
+    return [list(by_query[position_of[normalize_query_text(text)]]) for text in query_texts]
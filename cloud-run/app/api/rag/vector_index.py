@@ -0,0 +1,159 @@
+"""In-process cosine index over deal_embeddings.
+
+The embedding matrix is kept L2-normalized as float32 (or int8 with one
+scale per row), metadata columns as a ColumnarTable. A search is a
+filtered matrix-vector product plus argpartition, with the same output
+as the VECTOR_SEARCH query (metadata + COSINE distance = 1 - cosine).
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from api.columnar_snapshot import ColumnarTable
+
+INDEX_METADATA_COLUMNS = (
+    "deal_id",
+    "source",
+    "Oportunidade",
+    "Vendedor",
+    "Conta",
+    "Segmento",
+    "Portfolio",
+    "Gross",
+    "Net",
+    "Fiscal_Q",
+    "Produtos",
+    "Familia_Produto",
+    "Fase",
+    "content",
+)
+
+
+class DealVectorIndex:
+    def __init__(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        *,
+        quantize: bool = False,
+        version: Optional[str] = None,
+    ) -> None:
+        kept = [row for row in rows if row.get("embedding") is not None and len(row["embedding"]) > 0]
+        dims = {len(row["embedding"]) for row in kept}
+        if len(dims) > 1:
+            raise ValueError(f"deal_embeddings has mixed dimensions: {sorted(dims)}")
+        self.dimension = dims.pop() if dims else 0
+        matrix = np.asarray([row["embedding"] for row in kept], dtype=np.float32).reshape(len(kept), self.dimension)
+        norms = np.linalg.norm(matrix, axis=1)
+        # Zero vectors have no cosine similarity: never returned
+        valid = norms > 0
+        matrix = matrix[valid] / norms[valid, None]
+        kept = [row for row, ok in zip(kept, valid.tolist()) if ok]
+
+        self.quantized = bool(quantize)
+        if self.quantized:
+            self._scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+            safe = np.where(self._scales > 0, self._scales, 1.0)
+            self._matrix = np.rint(matrix / safe[:, None]).astype(np.int8)
+        else:
+            self._scales = None
+            self._matrix = matrix
+
+        self.metadata = ColumnarTable(
+            [{column: row.get(column) for column in INDEX_METADATA_COLUMNS} for row in kept],
+            key_column="deal_id",
+        )
+        self.row_count = len(kept)
+        self.version = version
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+
+    @property
+    def nbytes(self) -> int:
+        scales = self._scales.nbytes if self._scales is not None else 0
+        return int(self._matrix.nbytes + scales + self.metadata.nbytes)
+
+    def mask(
+        self,
+        *,
+        fiscal_q: Optional[str] = None,
+        fiscal_prefix: Optional[str] = None,
+        sellers: Optional[List[str]] = None,
+        sources: Optional[List[str]] = None,
+        phases: Optional[List[str]] = None,
+    ) -> np.ndarray:
+        """Rows matching the same conditions rag.filters.build_filters writes in SQL."""
+        table = self.metadata
+        mask = table.all()
+        if fiscal_q:
+            mask &= table.isin("Fiscal_Q", [fiscal_q])
+        elif fiscal_prefix:
+            mask &= table.where("Fiscal_Q", lambda v: isinstance(v, str) and v.startswith(fiscal_prefix))
+        if sellers:
+            mask &= table.isin("Vendedor", sellers)
+        if sources:
+            mask &= table.isin("source", sources)
+        if phases:
+            mask &= table.isin("Fase", phases)
+        return mask
+
+    def similarities(self, query_vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        """Cosine similarity of each query (rows) against every indexed deal (columns)."""
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+        if queries.shape[1] != self.dimension:
+            raise ValueError(f"query embedding has {queries.shape[1]} dimensions, index has {self.dimension}")
+        norms = np.linalg.norm(queries, axis=1)
+        # A zero query matches nothing better than anything else
+        queries = queries / np.where(norms > 0, norms, 1.0)[:, None]
+        if self._scales is None:
+            return queries @ self._matrix.T
+        return (queries @ self._matrix.astype(np.float32).T) * self._scales
+
+    def search(
+        self,
+        query_vector: Sequence[float],
+        top_k: int,
+        mask: Optional[np.ndarray] = None,
+        *,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top-k rows by cosine distance (ascending), restricted to mask."""
+        return self.search_many([query_vector], top_k, mask, columns=columns)[0]
+
+    def search_many(
+        self,
+        query_vectors: Sequence[Sequence[float]],
+        top_k: int,
+        mask: Optional[np.ndarray] = None,
+        *,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """search() for several queries with a single matrix product."""
+        if not len(query_vectors):
+            return []
+        positions = np.flatnonzero(mask) if mask is not None else np.arange(self.row_count)
+        if not self.row_count or top_k <= 0 or not len(positions):
+            return [[] for _ in query_vectors]
+        distances = 1.0 - self.similarities(query_vectors)[:, positions]
+        results = []
+        for row_distances in distances:
+            if top_k < len(positions):
+                best = np.argpartition(row_distances, top_k - 1)[:top_k]
+            else:
+                best = np.arange(len(positions))
+            best = best[np.argsort(row_distances[best], kind="stable")]
+            rows = self.metadata.materialize(positions[best], columns)
+            for row, distance in zip(rows, row_distances[best].tolist()):
+                row["distance"] = distance
+            results.append(rows)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.row_count,
+            "dimension": self.dimension,
+            "quantized": self.quantized,
+            "bytes": self.nbytes,
+            "version": self.version,
+            "age_seconds": round(time.time() - self.loaded_at, 1),
+        }
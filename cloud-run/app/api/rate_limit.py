@@ -0,0 +1,62 @@
+"""Token-bucket rate limiter shared by threads of one Cloud Run instance.
+
+Used to keep fan-out calls to the LLM (e.g. activity summaries) under the
+per-minute quota: each call takes one token, tokens refill continuously at
+rate_per_second up to burst. A caller that cannot get a token within its
+timeout skips the call (fail-safe, like every other AI path).
+"""
+import threading
+import time
+from typing import Any, Dict
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: int) -> None:
+        self.rate_per_second = max(0.0, float(rate_per_second))
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = {"acquired": 0, "waited": 0, "rejected": 0}
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate_per_second <= 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take one token, waiting up to timeout seconds; False if none came."""
+        if self.unlimited:
+            with self._lock:
+                self._counters["acquired"] += 1
+            return True
+        deadline = time.monotonic() + max(0.0, timeout)
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    self._counters["acquired"] += 1
+                    self._counters["waited"] += int(waited)
+                    return True
+                wait = (1.0 - self._tokens) / self.rate_per_second
+                if now + wait > deadline:
+                    self._counters["rejected"] += 1
+                    return False
+            waited = True
+            time.sleep(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate_per_second": self.rate_per_second,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                **self._counters,
+            }
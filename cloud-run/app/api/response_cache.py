@@ -0,0 +1,218 @@
+"""Bounded in-memory response cache (per Cloud Run instance).
+
+LRU eviction driven by an approximate memory budget, lazy + periodic
+removal of expired entries and hit/miss/eviction counters.
+
+Entries have a soft TTL (fresh) and an optional stale window after it
+(hard TTL). get() only returns fresh data; lookup() also returns stale
+data so callers can serve it while revalidating.
+
+Entries can carry tags (e.g. source table -> version). An optional
+validator rejects entries whose tags are outdated, and invalidate_tags()
+drops every entry depending on a given tag.
+"""
+from collections import OrderedDict
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Approximate deep size in bytes of a JSON-like payload."""
+    size = sys.getsizeof(value)
+    if _depth > 32:
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key, _depth + 1) + estimate_size(item, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        *,
+        max_bytes: int,
+        max_entries: int = 0,
+        sweep_interval_seconds: float = 60.0,
+        validator: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_entries = max(0, int(max_entries))
+        self.sweep_interval_seconds = float(sweep_interval_seconds)
+        self.validator = validator
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._current_bytes = 0
+        self._sweeper: Optional[threading.Thread] = None
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "rejected_oversize": 0,
+            "invalidations": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        data, _ = self.lookup(key, allow_stale=False)
+        return data
+
+    def lookup(self, key: str, *, allow_stale: bool = True) -> Tuple[Optional[Any], Optional[str]]:
+        """Return (data, state) with state "fresh", "stale" or None (miss)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None, None
+            if entry["expires_at"] <= now:
+                self._remove(key)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None, None
+            if not self.is_valid(entry):
+                self._remove(key)
+                self._counters["invalidations"] += 1
+                self._counters["misses"] += 1
+                return None, None
+            if entry["stale_at"] <= now:
+                if not allow_stale:
+                    self._counters["misses"] += 1
+                    return None, None
+                self._entries.move_to_end(key)
+                self._counters["stale_hits"] += 1
+                return entry["data"], "stale"
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry["data"], "fresh"
+
+    def set(
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        stale_ttl_seconds: float = 0,
+        *,
+        tags: Optional[Dict[str, Any]] = None,
+        created_at: Optional[float] = None,
+    ) -> None:
+        size = estimate_size(data) + sys.getsizeof(key)
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes and size > self.max_bytes:
+                self._counters["rejected_oversize"] += 1
+                return
+            self._entries[key] = {
+                "data": data,
+                "stale_at": now + ttl_seconds,
+                "expires_at": now + ttl_seconds + max(0.0, stale_ttl_seconds),
+                "size": size,
+                "tags": dict(tags) if tags else {},
+                "created_at": created_at if created_at is not None else now,
+            }
+            self._current_bytes += size
+            self._counters["sets"] += 1
+            self._evict_to_budget()
+        self._ensure_sweeper()
+
+    def pop(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._remove(key)
+        return entry["data"] if entry else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def is_valid(self, entry: Dict[str, Any]) -> bool:
+        if self.validator is None:
+            return True
+        try:
+            return bool(self.validator(entry))
+        except Exception:
+            return False
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry tagged with any of the given tags."""
+        targets = set(tags)
+        with self._lock:
+            affected = [
+                key for key, entry in self._entries.items()
+                if targets.intersection(entry["tags"])
+            ]
+            for key in affected:
+                self._remove(key)
+            self._counters["invalidations"] += len(affected)
+        return len(affected)
+
+    def sweep_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if entry["expires_at"] <= now]
+            for key in expired:
+                self._remove(key)
+            self._counters["expirations"] += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["stale_hits"] + self._counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hit_ratio": round((self._counters["hits"] + self._counters["stale_hits"]) / lookups, 4) if lookups else 0.0,
+                **self._counters,
+            }
+
+    def _remove(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._current_bytes -= entry["size"]
+        return entry
+
+    def _evict_to_budget(self) -> None:
+        while self._entries and (
+            (self.max_bytes and self._current_bytes > self.max_bytes)
+            or (self.max_entries and len(self._entries) > self.max_entries)
+        ):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._counters["evictions"] += 1
+
+    def _ensure_sweeper(self) -> None:
+        if self.sweep_interval_seconds <= 0:
+            return
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop,
+                name="response-cache-sweeper",
+                daemon=True,
+            )
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval_seconds)
+            try:
+                self.sweep_expired()
+            except Exception:
+                continue
@@ -0,0 +1,516 @@
+"""In-memory rollup cube for the additive sales aggregates.
+
+/api/metrics and /api/dashboard recompute the same counts and sums
+(deals, Gross, Net, ...) from pipeline / closed_deals_won /
+closed_deals_lost on every cache miss. The cube loads those aggregates
+once per data version, grouped by a few low-cardinality dimensions
+(calendar year/month, fiscal quarter, seller, phase, forecast), and keeps
+them as NumPy arrays: one int32 code column per dimension and one float64
+matrix of additive measures. Averages are stored as (sum, count) pairs so
+any filter on the cube's dimensions can be answered by masking cells and
+summing.
+
+Requests that filter on dimensions the cube does not cover keep going to
+BigQuery (the caller decides); a failed load also degrades to BigQuery.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+QUARTER_MONTHS = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
+
+PIPELINE_DIMS = ("year", "month", "seller", "phase", "forecast", "has_date")
+PIPELINE_MEASURES = (
+    "deals", "gross", "net",
+    "idle_sum", "idle_n", "meddic_sum", "meddic_n", "bant_sum", "bant_n", "conf_sum", "conf_n",
+    "idle_high", "idle_medium",
+    "hc_deals", "hc_gross", "hc_net", "hc_conf_sum",
+)
+CLOSED_DIMS = ("year", "month", "fiscal_q", "seller", "phase", "has_date")
+CLOSED_MEASURES = ("deals", "gross", "net", "cycle_sum", "cycle_n", "act_sum", "act_n", "evitavel")
+
+_ACTIVITIES_EXPR = (
+    "SAFE_CAST(REPLACE(REGEXP_EXTRACT(CAST(Atividades AS STRING), "
+    "r'-?[0-9]+(?:[\\.,][0-9]+)?'), ',', '.') AS FLOAT64)"
+)
+
+
+class RollupCube:
+    """Additive measures per cell of a set of categorical dimensions."""
+
+    def __init__(self, dims: Sequence[str], measures: Sequence[str], rows: Iterable[Dict[str, Any]]) -> None:
+        self.dims = tuple(dims)
+        self.measures = tuple(measures)
+        rows = list(rows)
+        self._vocab: Dict[str, List[Any]] = {}
+        self._codes: Dict[str, np.ndarray] = {}
+        for dim in self.dims:
+            index: Dict[Any, int] = {}
+            codes = np.fromiter(
+                (index.setdefault(_dim_value(row.get(dim)), len(index)) for row in rows),
+                dtype=np.int32,
+                count=len(rows),
+            )
+            self._vocab[dim] = list(index.keys())
+            self._codes[dim] = codes
+        self._values = np.zeros((len(rows), len(self.measures)), dtype=np.float64)
+        for col, measure in enumerate(self.measures):
+            self._values[:, col] = [float(row.get(measure) or 0.0) for row in rows]
+
+    @property
+    def cells(self) -> int:
+        return int(self._values.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._values.nbytes + sum(codes.nbytes for codes in self._codes.values()))
+
+    def all(self) -> np.ndarray:
+        return np.ones(self.cells, dtype=bool)
+
+    def where(self, dim: str, predicate: Callable[[Any], bool]) -> np.ndarray:
+        """Mask of cells whose dimension value satisfies predicate (evaluated once per distinct value)."""
+        allowed = np.array([bool(predicate(value)) for value in self._vocab[dim]] or [False], dtype=bool)
+        return allowed[self._codes[dim]] if self.cells else self.all()
+
+    def isin(self, dim: str, values: Iterable[Any]) -> np.ndarray:
+        wanted = {_dim_value(value) for value in values}
+        return self.where(dim, lambda value: value in wanted)
+
+    def eq(self, dim: str, value: Any) -> np.ndarray:
+        wanted = _dim_value(value)
+        return self.where(dim, lambda current: current == wanted)
+
+    def totals(self, mask: np.ndarray) -> Dict[str, float]:
+        sums = self._values[mask].sum(axis=0) if self.cells else np.zeros(len(self.measures))
+        return {measure: float(sums[col]) for col, measure in enumerate(self.measures)}
+
+    def group_by(self, dims: Sequence[str], mask: np.ndarray) -> List[Tuple[Tuple[Any, ...], Dict[str, float]]]:
+        """Sum measures per distinct combination of dims among the masked cells."""
+        if not self.cells or not mask.any():
+            return []
+        shape = tuple(len(self._vocab[dim]) for dim in dims)
+        keys = np.ravel_multi_index(tuple(self._codes[dim][mask] for dim in dims), shape)
+        groups, inverse = np.unique(keys, return_inverse=True)
+        values = self._values[mask]
+        sums = np.stack(
+            [np.bincount(inverse, weights=values[:, col], minlength=len(groups)) for col in range(len(self.measures))],
+            axis=1,
+        )
+        result = []
+        for group_index, flat_key in enumerate(groups):
+            codes = np.unravel_index(int(flat_key), shape)
+            key = tuple(self._vocab[dim][int(code)] for dim, code in zip(dims, codes))
+            result.append((key, {measure: float(sums[group_index, col]) for col, measure in enumerate(self.measures)}))
+        return result
+
+
+def _dim_value(value: Any) -> Any:
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _round(value: Optional[float], digits: int) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def _avg(totals: Dict[str, float], prefix: str) -> Optional[float]:
+    count = totals.get(f"{prefix}_n") or 0
+    return round(totals[f"{prefix}_sum"] / count, 1) if count else None
+
+
+def _money(totals: Dict[str, float], measure: str, count_measure: str = "deals") -> Optional[float]:
+    # SUM() over zero rows is NULL in BigQuery
+    if not totals.get(count_measure) and not totals[measure]:
+        return None
+    return _round(totals[measure], 2)
+
+
+class SalesRollup:
+    """Pipeline / won / lost cubes plus the metric blocks derived from them."""
+
+    def __init__(
+        self,
+        pipeline: RollupCube,
+        won: RollupCube,
+        lost: RollupCube,
+        *,
+        closed_phase_columns: Optional[Dict[str, Optional[str]]] = None,
+        versions: Optional[Dict[str, Optional[int]]] = None,
+    ) -> None:
+        self.pipeline = pipeline
+        self.won = won
+        self.lost = lost
+        self.closed_phase_columns = dict(closed_phase_columns or {})
+        self.versions = dict(versions or {})
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(
+        cls,
+        run_query: Callable[[str, str], List[Dict[str, Any]]],
+        *,
+        project_id: str,
+        dataset_id: str,
+        date_expr: Callable[[str, str], str],
+        closed_phase_columns: Dict[str, Optional[str]],
+        versions: Optional[Dict[str, Optional[int]]] = None,
+    ) -> "SalesRollup":
+        """Build the cubes with one GROUP BY query per table (run_query(sql, label) -> rows)."""
+        pipeline_rows = run_query(_pipeline_cube_sql(project_id, dataset_id, date_expr("Data_Prevista", "pipeline")), "rollup_cube.pipeline")
+        won_rows = run_query(
+            _closed_cube_sql(project_id, dataset_id, "closed_deals_won", date_expr("Data_Fechamento", "closed_deals_won"),
+                             closed_phase_columns.get("closed_deals_won"), with_evitavel=False),
+            "rollup_cube.won",
+        )
+        lost_rows = run_query(
+            _closed_cube_sql(project_id, dataset_id, "closed_deals_lost", date_expr("Data_Fechamento", "closed_deals_lost"),
+                             closed_phase_columns.get("closed_deals_lost"), with_evitavel=True),
+            "rollup_cube.lost",
+        )
+        return cls(
+            RollupCube(PIPELINE_DIMS, PIPELINE_MEASURES, pipeline_rows),
+            RollupCube(CLOSED_DIMS, CLOSED_MEASURES, won_rows),
+            RollupCube(CLOSED_DIMS, CLOSED_MEASURES, lost_rows),
+            closed_phase_columns=closed_phase_columns,
+            versions=versions,
+        )
+
+    # ---- /api/metrics ----
+
+    def metrics_blocks(
+        self,
+        *,
+        year: Optional[int],
+        quarter: Optional[int],
+        month: Optional[int],
+        sellers: Optional[List[str]],
+        phases: Optional[List[str]],
+    ) -> Dict[str, Dict[str, Any]]:
+        """Same rows as the pipeline / total / won / lost / high-confidence queries of get_metrics."""
+        pipeline_mask = self._calendar_mask(self.pipeline, year, quarter, month)
+        if sellers:
+            pipeline_mask &= self.pipeline.isin("seller", sellers)
+        if phases:
+            pipeline_mask &= self.pipeline.isin("phase", phases)
+
+        pipeline = self.pipeline.totals(pipeline_mask)
+        pipeline_total = self.pipeline.totals(self.pipeline.all())
+        won = self.won.totals(self._metrics_closed_mask(self.won, "closed_deals_won", year, quarter, month, sellers, phases))
+        lost = self.lost.totals(self._metrics_closed_mask(self.lost, "closed_deals_lost", year, quarter, month, sellers, phases))
+
+        return {
+            "pipeline": {
+                "deals_count": int(pipeline["deals"]),
+                "gross": _money(pipeline, "gross"),
+                "net": _money(pipeline, "net"),
+                "avg_idle_days": _avg(pipeline, "idle"),
+                "avg_meddic": _avg(pipeline, "meddic"),
+                "avg_bant": _avg(pipeline, "bant"),
+                "avg_confidence": _avg(pipeline, "conf"),
+                "high_risk_idle": int(pipeline["idle_high"]),
+                "medium_risk_idle": int(pipeline["idle_medium"]),
+            },
+            "pipeline_total": _deal_totals(pipeline_total),
+            "won": {
+                **_deal_totals(won),
+                "avg_cycle_days": _avg(won, "cycle"),
+                "avg_activities": _avg(won, "act"),
+            },
+            "lost": {
+                **_deal_totals(lost),
+                "avg_cycle_days": _avg(lost, "cycle"),
+                "avg_activities": _avg(lost, "act"),
+                "evitavel_count": int(lost["evitavel"]),
+                "evitavel_pct": round(lost["evitavel"] / lost["deals"] * 100, 1) if lost["deals"] else None,
+            },
+            "high_confidence": _high_confidence(pipeline),
+        }
+
+    # ---- /api/dashboard ----
+
+    def dashboard_blocks(
+        self,
+        *,
+        year: Optional[int],
+        quarter: Optional[int],
+        month: Optional[int],
+        sellers: Optional[List[str]],
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Rows for the additive dashboard queries, keyed like get_dashboard's query batch."""
+        pipeline = self.pipeline
+        dated_pipeline = pipeline.eq("has_date", True)
+        filtered_mask = dated_pipeline & self._calendar_mask(pipeline, year, quarter, month)
+        closed_masks = {}
+        for name, cube in (("won", self.won), ("lost", self.lost)):
+            mask = cube.eq("has_date", True) & self._calendar_mask(cube, year, quarter, month)
+            if sellers:
+                mask &= cube.isin("seller", sellers)
+            closed_masks[name] = mask
+        if sellers:
+            filtered_mask &= pipeline.isin("seller", sellers)
+
+        all_totals = pipeline.totals(pipeline.all())
+        won = self.won.totals(closed_masks["won"])
+        lost = self.lost.totals(closed_masks["lost"])
+
+        by_month = [
+            {"year": key[0], "month": key[1], **_deal_totals(totals)}
+            for key, totals in pipeline.group_by(("year", "month"), dated_pipeline)
+        ]
+        by_month.sort(key=lambda row: (row["year"] is not None, row["year"] or 0, row["month"] is not None, row["month"] or 0))
+
+        forecast_order = {"COMMIT": 1, "UPSIDE": 2, "PIPELINE": 3}
+        by_forecast = [
+            {
+                "category": key[0],
+                "count": int(totals["deals"]),
+                "total_gross": _money(totals, "gross"),
+                "total_net": _money(totals, "net"),
+            }
+            for key, totals in pipeline.group_by(("forecast",), pipeline.where("forecast", lambda v: v is not None))
+        ]
+        by_forecast.sort(key=lambda row: forecast_order.get(row["category"], 4))
+
+        by_seller = [
+            {"seller": key[0], **_deal_totals(totals), "avg_confidence": _avg(totals, "conf")}
+            for key, totals in pipeline.group_by(("seller",), pipeline.where("seller", lambda v: v is not None))
+        ]
+        by_seller.sort(key=lambda row: (row["gross"] is not None, row["gross"] or 0), reverse=True)
+
+        return {
+            "pipeline_all": [_deal_totals(all_totals)],
+            "pipeline_2026": [_deal_totals(pipeline.totals(pipeline.eq("year", 2026)))],
+            "pipeline_filtered": [_deal_totals(pipeline.totals(filtered_mask))],
+            "pipeline_by_month": by_month,
+            "pipeline_by_forecast": by_forecast,
+            "pipeline_by_seller": by_seller,
+            "high_confidence": [_high_confidence(all_totals)],
+            "closed_won": [{**_deal_totals(won), "avg_cycle_days": _avg(won, "cycle")}],
+            "closed_lost": [{
+                "deals_count": int(lost["deals"]),
+                "gross": _money(lost, "gross"),
+                "avg_cycle_days": _avg(lost, "cycle"),
+            }],
+            "win_rate_by_seller": self._win_rate_by_seller(closed_masks["won"], closed_masks["lost"]),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        cubes = {"pipeline": self.pipeline, "closed_deals_won": self.won, "closed_deals_lost": self.lost}
+        return {
+            "age_seconds": round(time.time() - self.loaded_at, 1),
+            "versions": dict(self.versions),
+            "cells": {name: cube.cells for name, cube in cubes.items()},
+            "bytes": sum(cube.nbytes for cube in cubes.values()),
+        }
+
+    def _calendar_mask(self, cube: RollupCube, year: Optional[int], quarter: Optional[int], month: Optional[int]) -> np.ndarray:
+        mask = cube.all()
+        if year:
+            mask &= cube.eq("year", int(year))
+        if quarter:
+            if quarter in QUARTER_MONTHS:
+                start, end = QUARTER_MONTHS[quarter]
+                mask &= cube.where("month", lambda m: m is not None and start <= m <= end)
+        elif month:
+            mask &= cube.eq("month", int(month))
+        return mask
+
+    def _metrics_closed_mask(
+        self,
+        cube: RollupCube,
+        table: str,
+        year: Optional[int],
+        quarter: Optional[int],
+        month: Optional[int],
+        sellers: Optional[List[str]],
+        phases: Optional[List[str]],
+    ) -> np.ndarray:
+        # get_metrics also accepts closed deals by fiscal quarter label
+        fiscal_q_exact = f"FY{str(year)[-2:]}-Q{quarter}" if (year and quarter) else None
+        mask = cube.all()
+        if year:
+            in_year = cube.eq("year", int(year))
+            mask &= (in_year | cube.eq("fiscal_q", fiscal_q_exact)) if fiscal_q_exact else in_year
+        if quarter:
+            if quarter in QUARTER_MONTHS:
+                start, end = QUARTER_MONTHS[quarter]
+                in_months = cube.where("month", lambda m: m is not None and start <= m <= end)
+                if fiscal_q_exact:
+                    mask &= in_months | cube.eq("fiscal_q", fiscal_q_exact)
+                else:
+                    suffix = f"-Q{quarter}"
+                    mask &= in_months | cube.where("fiscal_q", lambda fq: str(fq or "").endswith(suffix))
+        elif month:
+            mask &= cube.eq("month", int(month))
+        if sellers:
+            mask &= cube.isin("seller", sellers)
+        if phases and self.closed_phase_columns.get(table):
+            mask &= cube.isin("phase", phases)
+        return mask
+
+    def _win_rate_by_seller(self, won_mask: np.ndarray, lost_mask: np.ndarray) -> List[Dict[str, Any]]:
+        won = {key[0]: int(totals["deals"]) for key, totals in self.won.group_by(("seller",), won_mask)}
+        lost = {key[0]: int(totals["deals"]) for key, totals in self.lost.group_by(("seller",), lost_mask)}
+        # FULL OUTER JOIN on Vendedor: NULL sellers never match each other
+        pairs = [(seller, count, lost.get(seller, 0) if seller is not None else 0) for seller, count in won.items()]
+        pairs += [(seller, 0, count) for seller, count in lost.items() if seller is None or seller not in won]
+        rows = [
+            {
+                "seller": seller,
+                "won": won_count,
+                "lost": lost_count,
+                "win_rate": round(won_count / (won_count + lost_count) * 100, 1) if won_count + lost_count else None,
+            }
+            for seller, won_count, lost_count in pairs
+        ]
+        rows.sort(key=lambda row: (row["win_rate"] is not None, row["win_rate"] or 0), reverse=True)
+        return rows
+
+
+def _deal_totals(totals: Dict[str, float]) -> Dict[str, Any]:
+    return {"deals_count": int(totals["deals"]), "gross": _money(totals, "gross"), "net": _money(totals, "net")}
+
+
+def _high_confidence(totals: Dict[str, float]) -> Dict[str, Any]:
+    deals = totals["hc_deals"]
+    return {
+        "deals_count": int(deals),
+        "gross": _money(totals, "hc_gross", "hc_deals"),
+        "net": _money(totals, "hc_net", "hc_deals"),
+        "avg_confidence": round(totals["hc_conf_sum"] / deals, 1) if deals else None,
+    }
+
+
+def _pipeline_cube_sql(project_id: str, dataset_id: str, date_expr: str) -> str:
+    idle = "SAFE_CAST(Idle_Dias AS FLOAT64)"
+    conf = "SAFE_CAST(Confianca AS FLOAT64)"
+    return f"""
+    SELECT
+      EXTRACT(YEAR FROM {date_expr}) AS year,
+      EXTRACT(MONTH FROM {date_expr}) AS month,
+      Vendedor AS seller,
+      Fase_Atual AS phase,
+      Forecast_SF AS forecast,
+      Data_Prevista IS NOT NULL AS has_date,
+      COUNT(*) AS deals,
+      SUM(Gross) AS gross,
+      SUM(Net) AS net,
+      SUM({idle}) AS idle_sum,
+      COUNT({idle}) AS idle_n,
+      SUM(SAFE_CAST(MEDDIC_Score AS FLOAT64)) AS meddic_sum,
+      COUNT(SAFE_CAST(MEDDIC_Score AS FLOAT64)) AS meddic_n,
+      SUM(SAFE_CAST(BANT_Score AS FLOAT64)) AS bant_sum,
+      COUNT(SAFE_CAST(BANT_Score AS FLOAT64)) AS bant_n,
+      SUM({conf}) AS conf_sum,
+      COUNT({conf}) AS conf_n,
+      COUNTIF({idle} > 30) AS idle_high,
+      COUNTIF({idle} BETWEEN 15 AND 30) AS idle_medium,
+      COUNTIF({conf} >= 50) AS hc_deals,
+      SUM(IF({conf} >= 50, Gross, NULL)) AS hc_gross,
+      SUM(IF({conf} >= 50, Net, NULL)) AS hc_net,
+      SUM(IF({conf} >= 50, {conf}, NULL)) AS hc_conf_sum
+    FROM `{project_id}.{dataset_id}.pipeline`
+    WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost')
+    GROUP BY year, month, seller, phase, forecast, has_date
+    """
+
+
+def _closed_cube_sql(
+    project_id: str,
+    dataset_id: str,
+    table: str,
+    date_expr: str,
+    phase_column: Optional[str],
+    *,
+    with_evitavel: bool,
+) -> str:
+    cycle = "SAFE_CAST(Ciclo_dias AS FLOAT64)"
+    phase = f"CAST({phase_column} AS STRING)" if phase_column else "CAST(NULL AS STRING)"
+    evitavel = "COUNTIF(Evitavel = 'Sim')" if with_evitavel else "0"
+    return f"""
+    SELECT
+      EXTRACT(YEAR FROM {date_expr}) AS year,
+      EXTRACT(MONTH FROM {date_expr}) AS month,
+      Fiscal_Q AS fiscal_q,
+      Vendedor AS seller,
+      {phase} AS phase,
+      Data_Fechamento IS NOT NULL AS has_date,
+      COUNT(*) AS deals,
+      SUM(Gross) AS gross,
+      SUM(Net) AS net,
+      SUM({cycle}) AS cycle_sum,
+      COUNT({cycle}) AS cycle_n,
+      SUM({_ACTIVITIES_EXPR}) AS act_sum,
+      COUNT({_ACTIVITIES_EXPR}) AS act_n,
+      {evitavel} AS evitavel
+    FROM `{project_id}.{dataset_id}.{table}`
+    GROUP BY year, month, fiscal_q, seller, phase, has_date
+    """
+
+
+class RollupCubeHolder:
+    """Lazily (re)loaded SalesRollup; callers fall back to BigQuery when get() is None.
+
+    Only one thread loads at a time; concurrent requests do not wait for the
+    load and use BigQuery meanwhile. A failed load is retried after
+    retry_seconds.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], SalesRollup],
+        is_current: Callable[[SalesRollup], bool],
+        *,
+        retry_seconds: float = 60.0,
+    ) -> None:
+        self._loader = loader
+        self._is_current = is_current
+        self.retry_seconds = float(retry_seconds)
+        self._rollup: Optional[SalesRollup] = None
+        self._load_lock = threading.Lock()
+        self._last_failure = 0.0
+        self._last_error = ""
+        self._counters = {"hits": 0, "fallbacks": 0, "loads": 0, "load_errors": 0}
+
+    def get(self) -> Optional[SalesRollup]:
+        rollup = self._rollup
+        if rollup is not None and self._is_current(rollup):
+            self._counters["hits"] += 1
+            return rollup
+        if time.time() - self._last_failure < self.retry_seconds or not self._load_lock.acquire(blocking=False):
+            self._counters["fallbacks"] += 1
+            return None
+        try:
+            started = time.perf_counter()
+            rollup = self._loader()
+            self._rollup = rollup
+            self._counters["loads"] += 1
+            print(f"[CUBE] rollup loaded in {int((time.perf_counter() - started) * 1000)}ms ({rollup.stats()['cells']})")
+        except Exception as exc:
+            self._last_failure = time.time()
+            self._last_error = str(exc)[:200]
+            self._counters["load_errors"] += 1
+            self._counters["fallbacks"] += 1
+            print(f"[CUBE] WARN: rollup load failed, serving from BigQuery: {self._last_error}")
+            return None
+        finally:
+            self._load_lock.release()
+        self._counters["hits"] += 1
+        return rollup
+
+    def invalidate(self) -> None:
+        self._rollup = None
+
+    def stats(self) -> Dict[str, Any]:
+        rollup = self._rollup
+        return {
+            "loaded": rollup is not None,
+            "current": bool(rollup is not None and self._is_current(rollup)),
+            "last_error": self._last_error,
+            **(rollup.stats() if rollup is not None else {}),
+            **self._counters,
+        }
@@ -0,0 +1,77 @@
+"""Single-flight request coalescing (per Cloud Run instance).
+
+Concurrent callers asking for the same key while a computation is running
+wait for that computation instead of starting a duplicate one.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, *, wait_timeout_seconds: float = 120.0) -> None:
+        self.wait_timeout_seconds = float(wait_timeout_seconds)
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "executions": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "wait_timeouts": 0,
+        }
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self._counters["executions"] += 1
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout_seconds):
+                with self._lock:
+                    self._counters["wait_timeouts"] += 1
+                return fn()
+            with self._lock:
+                self._counters["coalesced"] += 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "waiting": sum(flight.waiters for flight in self._flights.values()),
+                **self._counters,
+            }
@@ -0,0 +1,242 @@
+"""Parameterized SQL: request-scoped query parameters + query template registry.
+
+Filter builders bind user values as named BigQuery parameters instead of
+pasting literals into the SQL text, so one filter shape always produces
+the same query text (and the same profiler fingerprint) whatever the
+values, and user input never reaches the SQL text.
+
+A QueryParams binder is active per request (contextvar, set by the API
+middleware or by `parameterized_queries()`); builders fall back to the
+previous literal SQL when none is active. Execution helpers attach the
+parameters referenced by each query via `job_config_for()`.
+
+Query templates are registered once with a stable id and `{slot}`
+placeholders for structural fragments (WHERE clauses). Rendered texts are
+memoized and mapped back to their template id for metrics.
+"""
+import contextlib
+import contextvars
+import functools
+import hashlib
+import inspect
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.cloud import bigquery
+
+QUERY_TEMPLATE_MAX_SHAPES = 256
+
+_PARAM_REF_RE = re.compile(r"@([A-Za-z_][A-Za-z0-9_]*)")
+_HINT_RE = re.compile(r"[^a-z0-9_]+")
+
+_ACTIVE_PARAMS: "contextvars.ContextVar[Optional[QueryParams]]" = contextvars.ContextVar(
+    "query_params", default=None
+)
+
+
+def _sql_literal(value: Any) -> str:
+    return str(value).replace("'", "''")
+
+
+def _param_hint(hint: str) -> str:
+    name = _HINT_RE.sub("_", str(hint or "").lower()).strip("_")
+    if not name or name[0].isdigit():
+        name = f"p_{name}" if name else "p"
+    return name[:48]
+
+
+class QueryParams:
+    """Named parameter binder shared by the queries of one request."""
+
+    def __init__(self) -> None:
+        self._params: Dict[str, Any] = {}
+        self._by_value: Dict[Tuple[str, str, Any], str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._params)
+
+    def scalar(self, value: Any, type_: str = "STRING", hint: str = "p") -> str:
+        return self._bind(hint, type_, value, is_array=False)
+
+    def array(self, values: Iterable[Any], type_: str = "STRING", hint: str = "p") -> str:
+        return self._bind(hint, type_, tuple(values), is_array=True)
+
+    def for_sql(self, sql: str) -> List[Any]:
+        """Parameters referenced by this query text."""
+        referenced = set(_PARAM_REF_RE.findall(sql or ""))
+        with self._lock:
+            return [param for name, param in self._params.items() if name in referenced]
+
+    def _bind(self, hint: str, type_: str, value: Any, *, is_array: bool) -> str:
+        base = _param_hint(hint)
+        value_key = (base, f"{'ARRAY<' if is_array else ''}{type_}", value)
+        with self._lock:
+            name = self._by_value.get(value_key)
+            if name is None:
+                name = base
+                suffix = 1
+                while name in self._params:
+                    name = f"{base}_{suffix}"
+                    suffix += 1
+                if is_array:
+                    self._params[name] = bigquery.ArrayQueryParameter(name, type_, list(value))
+                else:
+                    self._params[name] = bigquery.ScalarQueryParameter(name, type_, value)
+                self._by_value[value_key] = name
+        return f"@{name}"
+
+
+def active_query_params() -> Optional[QueryParams]:
+    return _ACTIVE_PARAMS.get()
+
+
+@contextlib.contextmanager
+def parameterized_queries() -> Iterator[QueryParams]:
+    """Activate a fresh binder for the enclosed code (request, job, script)."""
+    params = QueryParams()
+    token = _ACTIVE_PARAMS.set(params)
+    try:
+        yield params
+    finally:
+        _ACTIVE_PARAMS.reset(token)
+
+
+def parameterized_sql(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorator form of parameterized_queries() for sync and async callables."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            with parameterized_queries():
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with parameterized_queries():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def bind_value(value: Any, type_: str = "STRING", hint: str = "p") -> str:
+    """SQL expression for a single value: @param when a binder is active, else a literal."""
+    params = _ACTIVE_PARAMS.get()
+    if params is not None:
+        return params.scalar(value, type_, hint)
+    if type_ in {"INT64", "FLOAT64", "NUMERIC"}:
+        return str(value)
+    return f"'{_sql_literal(value)}'"
+
+
+def in_filter(column_sql: str, values: List[str], hint: Optional[str] = None) -> Optional[str]:
+    """`column IN UNNEST(@param)` with a binder, the legacy literal `=`/`IN (...)` otherwise."""
+    if not values:
+        return None
+    params = _ACTIVE_PARAMS.get()
+    if params is not None:
+        return f"{column_sql} IN UNNEST({params.array(values, 'STRING', hint or column_sql)})"
+    if len(values) == 1:
+        return f"{column_sql} = '{_sql_literal(values[0])}'"
+    values_quoted = "', '".join(_sql_literal(v) for v in values)
+    return f"{column_sql} IN ('{values_quoted}')"
+
+
+def job_config_for(
+    sql: str,
+    base: Optional[bigquery.QueryJobConfig] = None,
+) -> Optional[bigquery.QueryJobConfig]:
+    """Job config carrying the active binder's parameters referenced by sql (merged into base)."""
+    params = _ACTIVE_PARAMS.get()
+    bound = params.for_sql(sql) if params is not None else []
+    if not bound:
+        return base
+    existing = list(base.query_parameters) if base is not None else []
+    taken = {getattr(param, "name", None) for param in existing}
+    merged = existing + [param for param in bound if param.name not in taken]
+    if base is None:
+        return bigquery.QueryJobConfig(query_parameters=merged)
+    base.query_parameters = merged
+    return base
+
+
+class QueryTemplate:
+    __slots__ = ("template_id", "sql", "version", "_rendered", "_lock", "renders")
+
+    def __init__(self, template_id: str, sql: str) -> None:
+        self.template_id = template_id
+        self.sql = sql
+        self.version = hashlib.sha1(sql.encode("utf-8")).hexdigest()[:8]
+        self._rendered: Dict[Tuple[Tuple[str, str], ...], str] = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    @property
+    def qualified_id(self) -> str:
+        return f"{self.template_id}@{self.version}"
+
+    def render(self, **fragments: Any) -> str:
+        key = tuple(sorted((name, str(value)) for name, value in fragments.items()))
+        with self._lock:
+            self.renders += 1
+            text = self._rendered.get(key)
+        if text is not None:
+            return text
+        text = self.sql.format_map(dict(key))
+        with self._lock:
+            if len(self._rendered) < QUERY_TEMPLATE_MAX_SHAPES:
+                self._rendered[key] = text
+        QUERY_TEMPLATES.remember(text, self.template_id)
+        return text
+
+    def shapes(self) -> int:
+        with self._lock:
+            return len(self._rendered)
+
+
+class QueryTemplateRegistry:
+    def __init__(self) -> None:
+        self._templates: Dict[str, QueryTemplate] = {}
+        self._by_text: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def register(self, template_id: str, sql: str) -> QueryTemplate:
+        with self._lock:
+            existing = self._templates.get(template_id)
+            if existing is not None:
+                if existing.sql != sql:
+                    raise ValueError(f"query template '{template_id}' already registered with different SQL")
+                return existing
+            template = QueryTemplate(template_id, sql)
+            self._templates[template_id] = template
+            return template
+
+    def get(self, template_id: str) -> QueryTemplate:
+        return self._templates[template_id]
+
+    def remember(self, text: str, template_id: str) -> None:
+        with self._lock:
+            if len(self._by_text) < QUERY_TEMPLATE_MAX_SHAPES * 16:
+                self._by_text[text] = template_id
+
+    def template_for(self, sql: str) -> Optional[str]:
+        return self._by_text.get(sql)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            templates = list(self._templates.values())
+        return {
+            template.template_id: {
+                "version": template.version,
+                "renders": template.renders,
+                "shapes": template.shapes(),
+            }
+            for template in sorted(templates, key=lambda t: t.template_id)
+        }
+
+
+QUERY_TEMPLATES = QueryTemplateRegistry()
+
+
+def register_query_template(template_id: str, sql: str) -> QueryTemplate:
+    return QUERY_TEMPLATES.register(template_id, sql)
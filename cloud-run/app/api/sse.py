@@ -0,0 +1,25 @@
+"""Server-Sent Events helpers for streaming endpoints.
+
+Each event is `event: <name>` + one JSON `data:` line. Responses disable
+proxy buffering (X-Accel-Buffering) and caching so the first events reach
+the browser (EventSource / fetch reader) immediately.
+"""
+import json
+from typing import Any, AsyncIterable, Iterable, Union
+
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    payload = json.dumps(data, default=str, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_response(events: Union[Iterable[str], AsyncIterable[str]]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,451 @@
+"""Two-level cache: in-process L1 (ResponseCache) + optional shared L2.
+
+L2 is shared by every Cloud Run instance so autoscaling does not multiply
+cold misses. Backends are selected by CACHE_L2_URL:
+  - redis://host:6379/0  (Redis protocol, needs the `redis` package)
+  - sqlite:///tmp/cache.db (local file store, useful for tests/dev)
+  - empty: L1 only.
+
+Payloads are zlib-compressed JSON: dates, decimals, bytes, tuples, sets
+and numpy arrays (dtype/shape/raw bytes) are tagged with "$t". Nothing read
+from L2 can execute code, so a shared Redis is not a code-execution path;
+values of any other type are simply not written to L2. Keys are prefixed
+with a version (CACHE_KEY_VERSION, or the Cloud Run revision) so a deploy
+never reads entries written by a previous release.
+
+Tagged entries are also listed in a per-tag L2 index, so invalidate_tags()
+drops the shared copies as well as the local ones.
+"""
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from api.response_cache import ResponseCache
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import redis as redis_lib  # type: ignore[import-not-found]
+except Exception:
+    redis_lib = None
+
+CACHE_L2_URL = os.getenv("CACHE_L2_URL", "").strip()
+CACHE_KEY_VERSION = (
+    os.getenv("CACHE_KEY_VERSION") or os.getenv("K_REVISION") or "dev"
+).strip()
+CACHE_L2_TIMEOUT_SECONDS = float(os.getenv("CACHE_L2_TIMEOUT_SECONDS", "0.25"))
+
+
+_PAYLOAD_FORMAT = b"J1"
+
+
+def _encode_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, dict):
+        if "$t" not in value and all(isinstance(k, str) for k in value):
+            return {k: _encode_value(v) for k, v in value.items()}
+        return {"$t": "dict", "v": [[_encode_value(k), _encode_value(v)] for k, v in value.items()]}
+    if isinstance(value, list):
+        return [_encode_value(v) for v in value]
+    if isinstance(value, tuple):
+        return {"$t": "tuple", "v": [_encode_value(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        return {"$t": "set", "v": [_encode_value(v) for v in value]}
+    if isinstance(value, datetime.datetime):
+        return {"$t": "datetime", "v": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$t": "date", "v": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$t": "time", "v": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"$t": "decimal", "v": str(value)}
+    if isinstance(value, bytes):
+        return {"$t": "bytes", "v": base64.b64encode(value).decode("ascii")}
+    if np is not None:
+        if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+            array = np.ascontiguousarray(value)
+            return {
+                "$t": "ndarray",
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "v": base64.b64encode(array.tobytes()).decode("ascii"),
+            }
+        if isinstance(value, np.generic):
+            return _encode_value(value.item())
+    raise TypeError(f"cannot store {type(value).__name__} in the L2 cache")
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode_value(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    kind = value.get("$t")
+    if kind is None:
+        return {k: _decode_value(v) for k, v in value.items()}
+    if kind == "dict":
+        return {_decode_value(k): _decode_value(v) for k, v in value["v"]}
+    if kind == "tuple":
+        return tuple(_decode_value(v) for v in value["v"])
+    if kind == "set":
+        return {_decode_value(v) for v in value["v"]}
+    if kind == "datetime":
+        return datetime.datetime.fromisoformat(value["v"])
+    if kind == "date":
+        return datetime.date.fromisoformat(value["v"])
+    if kind == "time":
+        return datetime.time.fromisoformat(value["v"])
+    if kind == "decimal":
+        return decimal.Decimal(value["v"])
+    if kind == "bytes":
+        return base64.b64decode(value["v"])
+    if kind == "ndarray" and np is not None:
+        raw = base64.b64decode(value["v"])
+        return np.frombuffer(raw, dtype=np.dtype(value["dtype"])).reshape(value["shape"]).copy()
+    raise ValueError(f"unknown L2 value type: {kind}")
+
+
+def encode_payload(
+    data: Any,
+    stale_at: float,
+    expires_at: float,
+    tags: Optional[Dict[str, Any]] = None,
+    created_at: float = 0.0,
+) -> bytes:
+    body = json.dumps(
+        [stale_at, expires_at, _encode_value(data), _encode_value(tags or {}), created_at],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return _PAYLOAD_FORMAT + zlib.compress(body.encode("utf-8"), 3)
+
+
+def decode_payload(blob: bytes) -> Dict[str, Any]:
+    if not blob.startswith(_PAYLOAD_FORMAT):
+        raise ValueError("unknown L2 payload format")
+    stale_at, expires_at, data, tags, created_at = json.loads(
+        zlib.decompress(blob[len(_PAYLOAD_FORMAT):]).decode("utf-8")
+    )
+    return {
+        "data": _decode_value(data),
+        "stale_at": float(stale_at),
+        "expires_at": float(expires_at),
+        "tags": _decode_value(tags),
+        "created_at": float(created_at),
+    }
+
+
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, url: str) -> None:
+        if redis_lib is None:
+            raise RuntimeError("redis package not installed")
+        self._client = redis_lib.Redis.from_url(
+            url,
+            socket_timeout=CACHE_L2_TIMEOUT_SECONDS,
+            socket_connect_timeout=CACHE_L2_TIMEOUT_SECONDS,
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, blob: bytes, ttl_seconds: float) -> None:
+        self._client.set(key, blob, px=max(1, int(ttl_seconds * 1000)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def index(self, index_key: str, key: str, ttl_seconds: float) -> None:
+        ttl_ms = max(1, int(ttl_seconds * 1000))
+        # The index must outlive every entry it lists
+        extend = self._client.pttl(index_key) < ttl_ms
+        pipe = self._client.pipeline()
+        pipe.sadd(index_key, key)
+        if extend:
+            pipe.pexpire(index_key, ttl_ms)
+        pipe.execute()
+
+    def drop_index(self, index_key: str) -> int:
+        """Delete every entry listed in the index, and the index itself."""
+        pipe = self._client.pipeline()
+        pipe.smembers(index_key)
+        pipe.delete(index_key)
+        members, _ = pipe.execute()
+        keys = [m.decode("utf-8") if isinstance(m, bytes) else m for m in members]
+        return int(self._client.delete(*keys)) if keys else 0
+
+
+class SqliteBackend:
+    name = "sqlite"
+
+    # Size check cadence when max_bytes is set (a full SUM scan per write is wasteful)
+    _EVICT_EVERY_WRITES = 32
+
+    def __init__(self, path: str, max_bytes: int = 0) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_tags ("
+            " tag TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (tag, key))"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            if row[1] <= time.time():
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                return None
+            return row[0]
+
+    def set(self, key: str, blob: bytes, ttl_seconds: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(blob), time.time() + ttl_seconds),
+            )
+            self._writes += 1
+            if self.max_bytes and self._writes >= self._EVICT_EVERY_WRITES:
+                self._writes = 0
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired rows, then the soonest-to-expire ones until under max_bytes."""
+        self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute("DELETE FROM cache_tags WHERE expires_at <= ?", (time.time(),))
+        total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, LENGTH(value) FROM cache_entries ORDER BY expires_at ASC"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM cache_entries WHERE key = ?", doomed)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def index(self, index_key: str, key: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_tags (tag, key, expires_at) VALUES (?, ?, ?)",
+                (index_key, key, time.time() + ttl_seconds),
+            )
+
+    def drop_index(self, index_key: str) -> int:
+        """Delete every entry listed in the index, and the index itself."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                removed = self._conn.execute(
+                    "DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_tags WHERE tag = ?)",
+                    (index_key,),
+                ).rowcount
+                self._conn.execute("DELETE FROM cache_tags WHERE tag = ?", (index_key,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return removed
+
+
+def build_l2_backend(url: str = CACHE_L2_URL, *, max_bytes: int = 0):
+    """max_bytes caps the sqlite file store; Redis evicts by its own maxmemory policy."""
+    if not url:
+        return None
+    try:
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            return RedisBackend(url)
+        if url.startswith("sqlite:///"):
+            return SqliteBackend(url[len("sqlite:///"):] or ":memory:", max_bytes=max_bytes)
+        print(f"[CACHE] WARN: unsupported CACHE_L2_URL scheme: {url.split(':', 1)[0]}")
+    except Exception as exc:
+        # Fail-safe: run with L1 only
+        print(f"[CACHE] WARN: L2 cache disabled: {str(exc)}")
+    return None
+
+
+_SHARED_L2 = None
+_SHARED_L2_LOCK = threading.Lock()
+_SHARED_L2_READY = False
+
+
+def get_shared_l2_backend():
+    global _SHARED_L2, _SHARED_L2_READY
+    if _SHARED_L2_READY:
+        return _SHARED_L2
+    with _SHARED_L2_LOCK:
+        if not _SHARED_L2_READY:
+            _SHARED_L2 = build_l2_backend()
+            _SHARED_L2_READY = True
+    return _SHARED_L2
+
+
+class TieredCache:
+    """ResponseCache-compatible facade that writes through to a shared L2."""
+
+    def __init__(
+        self,
+        namespace: str,
+        l1: ResponseCache,
+        *,
+        l2: Any = "shared",
+        version: str = CACHE_KEY_VERSION,
+    ) -> None:
+        self.namespace = namespace
+        self.l1 = l1
+        self.version = version
+        self._l2 = get_shared_l2_backend() if l2 == "shared" else l2
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "errors": 0, "invalidations": 0}
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def l2_key(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
+        return f"si:{self.version}:{self.namespace}:{digest}"
+
+    def l2_tag_key(self, tag: str) -> str:
+        return f"si:{self.version}:{self.namespace}:tag:{tag}"
+
+    def get(self, key: str) -> Optional[Any]:
+        data, _ = self.lookup(key, allow_stale=False)
+        return data
+
+    def lookup(self, key: str, *, allow_stale: bool = True) -> Tuple[Optional[Any], Optional[str]]:
+        data, state = self.l1.lookup(key, allow_stale=allow_stale)
+        if state == "fresh" or self._l2 is None:
+            return data, state
+
+        blob = self._l2_call("get", self.l2_key(key))
+        if not blob:
+            self._count("misses")
+            return data, state
+        try:
+            entry = decode_payload(blob)
+        except Exception:
+            self._count("errors")
+            return data, state
+        if not self.l1.is_valid(entry):
+            self._l2_call("delete", self.l2_key(key))
+            self._count("invalidations")
+            return data, state
+
+        now = time.time()
+        self._count("hits")
+        if entry["stale_at"] > now:
+            self.l1.set(
+                key,
+                entry["data"],
+                entry["stale_at"] - now,
+                stale_ttl_seconds=entry["expires_at"] - entry["stale_at"],
+                tags=entry["tags"],
+                created_at=entry["created_at"],
+            )
+            return entry["data"], "fresh"
+        if allow_stale:
+            return entry["data"], "stale"
+        return None, None
+
+    def set(
+        self,
+        key: str,
+        data: Any,
+        ttl_seconds: float,
+        stale_ttl_seconds: float = 0,
+        *,
+        tags: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        now = time.time()
+        self.l1.set(key, data, ttl_seconds, stale_ttl_seconds=stale_ttl_seconds, tags=tags, created_at=now)
+        if self._l2 is None:
+            return
+        stale_at = now + ttl_seconds
+        hard_ttl = ttl_seconds + max(0.0, stale_ttl_seconds)
+        try:
+            blob = encode_payload(data, stale_at, stale_at + max(0.0, stale_ttl_seconds), tags, now)
+        except Exception:
+            self._count("errors")
+            return
+        if self._l2_call("set", self.l2_key(key), blob, hard_ttl) is not False:
+            self._count("writes")
+            for tag in tags or {}:
+                self._l2_call("index", self.l2_tag_key(tag), self.l2_key(key), hard_ttl)
+
+    def pop(self, key: str) -> Optional[Any]:
+        if self._l2 is not None:
+            self._l2_call("delete", self.l2_key(key))
+        return self.l1.pop(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop tagged entries from L1 and from the shared L2 (returns the L1 count).
+
+        Other instances drop their own L1 copies when their watcher sees the
+        change; until then the validator rejects outdated versions on read.
+        """
+        tags = list(tags)
+        removed = self.l1.invalidate_tags(tags)
+        if self._l2 is not None:
+            for tag in tags:
+                dropped = self._l2_call("drop_index", self.l2_tag_key(tag))
+                if dropped:
+                    with self._lock:
+                        self._counters["invalidations"] += int(dropped)
+        return removed
+
+    def clear(self) -> None:
+        """Clear the local tier (L2 entries expire by TTL / version bump)."""
+        self.l1.clear()
+
+    def sweep_expired(self) -> int:
+        return self.l1.sweep_expired()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            l2_stats = {
+                "backend": getattr(self._l2, "name", None),
+                "version": self.version,
+                **self._counters,
+            }
+        return {**self.l1.stats(), "l2": l2_stats}
+
+    def _l2_call(self, method: str, *args: Any) -> Any:
+        try:
+            return getattr(self._l2, method)(*args)
+        except Exception:
+            # Fail-safe: L2 outages only cost cache hits
+            self._count("errors")
+            return False
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
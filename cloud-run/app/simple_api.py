@@ -2,13 +2,20 @@
 Sales Intelligence API - FastAPI com Filtros Dinâmicos por Data
 Filtros: year (2024-2030), month (1-12), seller
 """
-from fastapi import FastAPI, HTTPException, Request, Body
+from fastapi import FastAPI, HTTPException, Request, Response, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
 from google.cloud import bigquery
 from google.cloud import firestore as _fs_module
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import contextlib
+import functools
+import inspect
+import threading
 import uuid
 import os
 import re
@@ -24,17 +31,45 @@ import google.generativeai as genai
 # Import modular endpoints
 from api.endpoints.ai_analysis import router as ai_router
 from api.endpoints.insights_rag import router as insights_rag_router
-from api.endpoints.performance import router as performance_router
+from api.endpoints.performance import ensure_admin_access, router as performance_router
 from api.endpoints.weekly_agenda import router as weekly_agenda_router
 # War Room REMOVED - functionality merged into Weekly Agenda
 # from api.endpoints.war_room import router as war_room_router
 from api.endpoints.export import router as export_router
 from api.endpoints.ml_predictions import router as ml_predictions_router
+from api.response_cache import ResponseCache
+from api.tiered_cache import TieredCache
+from api.single_flight import SingleFlight
+from api.admission import AdmissionController, AdmissionRejected, parse_endpoint_limits
+from api.bq_async import stats as get_bq_async_stats
+from api.query_profiler import QUERY_STATS, current_profile, end_profile, record_query, start_profile
+from api.sql_templates import (
+    QUERY_TEMPLATES,
+    bind_value,
+    in_filter,
+    job_config_for,
+    parameterized_queries,
+    register_query_template,
+)
+from api.freshness import TableFreshnessWatcher, fetch_tables_last_modified
+from api.rollup_cube import RollupCubeHolder, SalesRollup
+from api.columnar_snapshot import ColumnarTable, SnapshotStore, deal_list_mask
+from api.rag import deal_index_stats, embedding_cache_stats, rerank_cache_stats
+from api.llm_cache import generate_cached_text, llm_response_cache_stats, stream_cached_text
+from api.sse import sse_event, sse_response
+from api.llm_client import LLM_HEALTH
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_sync_threadpool()
+    yield
+
 
 app = FastAPI(
     title="Sales Intelligence API",
     description="BigQuery data with dynamic date filters + AI Analysis + Insights + Performance + Weekly Agenda + War Room + Export",
-    version="2.5.0"
+    version="2.5.0",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -100,6 +135,165 @@ async def global_exception_handler(request: Request, exc: Exception):
         headers=_error_cors_headers(request),
     )
 
+# Admission control: caps concurrent /api requests (global + per endpoint) so a
+# burst queues here instead of flooding BigQuery; queued requests past the
+# deadline are shed with 503.
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "24"))
+ADMISSION_DEFAULT_ENDPOINT_LIMIT = int(os.getenv("ADMISSION_DEFAULT_ENDPOINT_LIMIT", "8"))
+# Streaming routes do their heavy work in the body: same cap as their JSON twin
+ADMISSION_ENDPOINT_LIMITS = parse_endpoint_limits(
+    os.getenv(
+        "ADMISSION_ENDPOINT_LIMITS",
+        "/api/weekly-agenda=4,/api/insights-rag=4,/api/insights-rag/stream=4,"
+        "/api/analyze-patterns/stream=8,/api/export/pauta-semanal-csv=2",
+    )
+)
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "15"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+ADMISSION_EXEMPT_PREFIXES = ("/api/_debug/",)
+# Size of the threadpool running sync (def) endpoints; 0 keeps Starlette's default (40)
+SYNC_ENDPOINT_THREADS = int(os.getenv("SYNC_ENDPOINT_THREADS", "0"))
+ADMISSION = AdmissionController(
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    endpoint_limits=ADMISSION_ENDPOINT_LIMITS,
+    default_endpoint_limit=ADMISSION_DEFAULT_ENDPOINT_LIMIT,
+    queue_timeout_seconds=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    max_queue=ADMISSION_MAX_QUEUE,
+)
+
+
+def _route_template(request: Request) -> str:
+    """Route path template (/api/seller-deals/{seller_name}) used as the endpoint key."""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return request.url.path
+
+
+class AdmissionMiddleware:
+    """Plain ASGI middleware holding the admission slot for the whole response.
+
+    The slot is released on the last body message (or when the app returns,
+    errors or the client disconnects), so streaming bodies (CSV/Parquet
+    export, SSE) stay counted while they are produced. BaseHTTPMiddleware
+    would free it as soon as the headers were sent.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        path = request.url.path
+        if (
+            not ADMISSION.enabled
+            or request.method == "OPTIONS"
+            or not path.startswith("/api/")
+            or path.startswith(ADMISSION_EXEMPT_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = _route_template(request)
+        try:
+            wait_ms = await ADMISSION.acquire(endpoint)
+        except AdmissionRejected as exc:
+            response = JSONResponse(
+                status_code=503,
+                content={"error": "Server busy, retry shortly.", "reason": exc.reason},
+                headers={
+                    "Retry-After": str(max(1, int(ADMISSION_QUEUE_TIMEOUT_SECONDS))),
+                    **_error_cors_headers(request),
+                },
+            )
+            await response(scope, receive, send)
+            return
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                ADMISSION.release(endpoint)
+
+        async def send_with_release(message):
+            if message["type"] == "http.response.start" and wait_ms:
+                MutableHeaders(scope=message)["X-Queue-Wait-Ms"] = str(int(wait_ms))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_with_release)
+        finally:
+            release()
+
+
+app.add_middleware(AdmissionMiddleware)
+
+
+# Query profiling: every /api request collects its BigQuery jobs; admins opt
+# in with ?_profile=1 (or header X-Debug-Profile: 1) to get them back as a
+# `_profile` block (JSON responses) and a Server-Timing header. The block has
+# SQL text, job ids and errors, same as /api/_debug/*: ignored for others.
+QUERY_PROFILE_HEADER = "X-Debug-Profile"
+
+
+def _profile_requested(request: Request) -> bool:
+    flag = request.query_params.get("_profile") or request.headers.get(QUERY_PROFILE_HEADER) or ""
+    if flag.strip().lower() not in {"1", "true", "yes"}:
+        return False
+    try:
+        ensure_admin_access(request)
+    except HTTPException:
+        return False
+    return True
+
+
+@app.middleware("http")
+async def query_profiling(request: Request, call_next):
+    if not request.url.path.startswith("/api/") or request.url.path.startswith("/api/_debug/"):
+        return await call_next(request)
+
+    token = start_profile(_route_template(request))
+    profile = current_profile()
+    try:
+        # Filter builders bind values as query parameters for this request
+        with parameterized_queries():
+            response = await call_next(request)
+    finally:
+        end_profile(token)
+    if profile is None or not _profile_requested(request):
+        return response
+
+    response.headers["Server-Timing"] = profile.server_timing()
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict):
+        payload["_profile"] = {**profile.summary(), "cache_status": response.headers.get(CACHE_STATUS_HEADER)}
+        body = json.dumps(payload, default=str).encode("utf-8")
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    return Response(content=body, status_code=response.status_code, headers=headers, media_type="application/json")
+
+
+def configure_sync_threadpool() -> None:
+    # Called from lifespan(): the limiter belongs to the server's event loop
+    if SYNC_ENDPOINT_THREADS > 0:
+        import anyio.to_thread
+
+        anyio.to_thread.current_default_thread_limiter().total_tokens = SYNC_ENDPOINT_THREADS
+
 # Frontend é servido pelo Firebase Hosting — Cloud Run só expõe a API (/api/**).
 # O mount de /static abaixo só é ativo em dev local (quando public_path existir).
 public_path = Path(__file__).parent / "public"
@@ -152,10 +346,93 @@ def get_fs_client():
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)  # type: ignore[attr-defined]
+# Bump when the /api/analyze-patterns prompt or its parsing changes (keys the LLM response store)
+ANALYZE_PATTERNS_PROMPT_VERSION = "analyze-patterns-v1"
 
-# Short-lived in-memory cache (per Cloud Run instance)
+# Short-lived in-memory cache (per Cloud Run instance), bounded by memory budget (LRU)
 CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "120"))
-CACHE: Dict[str, Dict[str, Any]] = {}
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_SWEEP_INTERVAL_SECONDS = int(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "60"))
+# Stale-while-revalidate: after the soft TTL, entries stay servable (stale) for this window
+CACHE_STALE_TTL_SECONDS = int(os.getenv("CACHE_STALE_TTL_SECONDS", "600"))
+# Data-freshness invalidation: entries are tagged with the source tables they
+# read (table -> last_modified_time) and dropped as soon as BigQuerySync reloads
+# one of them, so tracked endpoints can use a long TTL.
+FRESHNESS_POLL_SECONDS = int(os.getenv("FRESHNESS_POLL_SECONDS", "60"))
+CACHE_FRESHNESS_TTL_SECONDS = int(os.getenv("CACHE_FRESHNESS_TTL_SECONDS", str(6 * 3600)))
+FRESHNESS_TRACKED_TABLES = (
+    "pipeline",
+    "closed_deals_won",
+    "closed_deals_lost",
+    "atividades",
+    "sales_specialist",
+    "meta",
+)
+CACHE_TABLE_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "/api/sellers": ("pipeline", "closed_deals_won", "closed_deals_lost"),
+    "/api/metrics": ("pipeline", "closed_deals_won", "closed_deals_lost", "meta"),
+    "/api/pipeline": ("pipeline",),
+    "/api/filter-options": ("pipeline", "closed_deals_won", "closed_deals_lost"),
+    "/api/closed/won": ("closed_deals_won",),
+    "/api/closed/lost": ("closed_deals_lost",),
+    "/api/actions": ("pipeline",),
+    "/api/sales-specialist": ("sales_specialist",),
+    "/api/priorities": ("pipeline",),
+    "/api/analyze-patterns": ("closed_deals_won", "closed_deals_lost"),
+    "/api/dashboard": ("pipeline", "closed_deals_won", "closed_deals_lost", "sales_specialist"),
+}
+# Rollup cube: additive /api/metrics and /api/dashboard aggregates kept in
+# memory per data version (reloaded when the freshness watcher sees a change,
+# or after ROLLUP_CUBE_MAX_AGE_SECONDS when the watcher is unavailable).
+ROLLUP_CUBE_ENABLED = str(os.getenv("ROLLUP_CUBE_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+ROLLUP_CUBE_MAX_AGE_SECONDS = int(os.getenv("ROLLUP_CUBE_MAX_AGE_SECONDS", "900"))
+ROLLUP_CUBE_RETRY_SECONDS = int(os.getenv("ROLLUP_CUBE_RETRY_SECONDS", "60"))
+# List snapshots: /api/pipeline and /api/closed/* served from a columnar copy
+# of each table kept per instance, rebuilt when the table changes (same
+# freshness rules as the rollup cube).
+LIST_SNAPSHOT_ENABLED = str(os.getenv("LIST_SNAPSHOT_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+LIST_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("LIST_SNAPSHOT_MAX_AGE_SECONDS", "900"))
+LIST_SNAPSHOT_RETRY_SECONDS = int(os.getenv("LIST_SNAPSHOT_RETRY_SECONDS", "60"))
+FRESHNESS_WATCHER = TableFreshnessWatcher(
+    lambda: fetch_tables_last_modified(
+        get_bq_client(),
+        project_id=PROJECT_ID,
+        dataset_id=DATASET_ID,
+        tables=FRESHNESS_TRACKED_TABLES,
+    ),
+    poll_interval_seconds=max(1, FRESHNESS_POLL_SECONDS),
+)
+
+
+def _cache_entry_is_current(entry: Dict[str, Any]) -> bool:
+    tags = entry.get("tags")
+    if not tags:
+        return True
+    if FRESHNESS_WATCHER.healthy():
+        return FRESHNESS_WATCHER.matches(tags)
+    # Watcher unavailable: fall back to the short fixed TTL
+    return time.time() - entry.get("created_at", 0.0) <= CACHE_TTL_SECONDS
+
+
+# L1 in-process + optional shared L2 (CACHE_L2_URL) so instances share results
+CACHE = TieredCache(
+    "api",
+    ResponseCache(
+        max_bytes=CACHE_MAX_BYTES,
+        max_entries=CACHE_MAX_ENTRIES,
+        sweep_interval_seconds=CACHE_SWEEP_INTERVAL_SECONDS,
+        validator=_cache_entry_is_current,
+    ),
+)
+
+
+def _invalidate_changed_tables(tables: List[str]) -> None:
+    removed = CACHE.invalidate_tags(tables)
+    print(f"[CACHE] source tables changed: {', '.join(sorted(tables))} ({removed} entries invalidated)")
+
+
+FRESHNESS_WATCHER.add_listener(_invalidate_changed_tables)
 
 FORCED_ACTIVE_SELLERS = {"rayssa zevolli"}
 SELLER_DISPLAY_OVERRIDES = {
@@ -174,19 +451,107 @@ def build_cache_key(endpoint: str, params: Dict[str, Any]) -> str:
     return f"{endpoint}?{'&'.join(parts)}"
 
 def get_cached_response(cache_key: str) -> Optional[Any]:
-    cached = CACHE.get(cache_key)
-    if not cached:
-        return None
-    if cached["expires_at"] <= time.time():
-        CACHE.pop(cache_key, None)
-        return None
-    return cached["data"]
+    return CACHE.get(cache_key)
+
+def set_cached_response(cache_key: str, data: Any, ttl_seconds: Optional[int] = None) -> None:
+    tags = None
+    tables = CACHE_TABLE_DEPENDENCIES.get(cache_key.split("?", 1)[0])
+    if tables and FRESHNESS_POLL_SECONDS > 0:
+        FRESHNESS_WATCHER.ensure_started()
+        versions = FRESHNESS_WATCHER.snapshot(tables)
+        if FRESHNESS_WATCHER.healthy() and all(v is not None for v in versions.values()):
+            tags = versions
+    if ttl_seconds is None:
+        ttl_seconds = CACHE_FRESHNESS_TTL_SECONDS if tags else CACHE_TTL_SECONDS
+    CACHE.set(cache_key, data, ttl_seconds, stale_ttl_seconds=CACHE_STALE_TTL_SECONDS, tags=tags)
+
+
+# Single-flight: concurrent cache misses for the same key share one computation
+SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS = int(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS", "120"))
+SINGLE_FLIGHT = SingleFlight(wait_timeout_seconds=SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS)
+
+CACHE_STATUS_HEADER = "X-Cache-Status"
+_REVALIDATE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-revalidate")
+_REVALIDATING: set[str] = set()
+_REVALIDATE_LOCK = threading.Lock()
+_REVALIDATE_STATS = {"scheduled": 0, "succeeded": 0, "failed": 0}
+
+
+def _schedule_revalidation(key: str, compute: Callable[[], Any]) -> None:
+    with _REVALIDATE_LOCK:
+        if key in _REVALIDATING:
+            return
+        _REVALIDATING.add(key)
+        _REVALIDATE_STATS["scheduled"] += 1
+
+    def _run() -> None:
+        try:
+            with parameterized_queries():
+                SINGLE_FLIGHT.do(key, compute)
+            outcome = "succeeded"
+        except Exception as exc:
+            print(f"[CACHE] WARN: background revalidation failed for {key}: {str(exc)[:200]}")
+            outcome = "failed"
+        with _REVALIDATE_LOCK:
+            _REVALIDATING.discard(key)
+            _REVALIDATE_STATS[outcome] += 1
+
+    _REVALIDATE_EXECUTOR.submit(_run)
 
-def set_cached_response(cache_key: str, data: Any, ttl_seconds: int = CACHE_TTL_SECONDS) -> None:
-    CACHE[cache_key] = {
-        "data": data,
-        "expires_at": time.time() + ttl_seconds
-    }
+
+def coalesce_requests(endpoint: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Cache front for a sync endpoint keyed by build_cache_key.
+
+    - fresh entry: served directly;
+    - stale entry (between soft and hard TTL): served immediately while one
+      background task recomputes it;
+    - miss: concurrent callers share a single computation.
+
+    The endpoint must store its result with set_cached_response under the
+    same key. Requests with nocache=true always run their own computation.
+    The outcome is reported in the X-Cache-Status response header.
+    """
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, response: Optional[Response] = None, **kwargs: Any) -> Any:
+            def mark(status: str) -> None:
+                if response is not None:
+                    response.headers[CACHE_STATUS_HEADER] = status
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if bound.arguments.get("nocache"):
+                mark("bypass")
+                return fn(*args, **kwargs)
+
+            params = {k: v for k, v in bound.arguments.items() if k != "nocache"}
+            key = build_cache_key(endpoint, params)
+            cached, state = CACHE.lookup(key)
+            if state == "fresh":
+                mark("fresh")
+                return cached
+            if state == "stale":
+                refresh_args = dict(bound.arguments)
+                if "nocache" in refresh_args:
+                    refresh_args["nocache"] = True
+                _schedule_revalidation(key, lambda: fn(**refresh_args))
+                mark("stale")
+                return cached
+
+            mark("miss")
+            return SINGLE_FLIGHT.do(key, lambda: fn(*args, **kwargs))
+
+        wrapper.__signature__ = signature.replace(  # type: ignore[attr-defined]
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter("response", inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+            ]
+        )
+        return wrapper
+
+    return decorator
 
 
 def _append_stagnant_alert_log(entry: Dict[str, Any]) -> None:
@@ -431,38 +796,122 @@ def _extract_request_email(request: Request) -> Optional[str]:
             return normalized
     return None
 
-def query_to_dict(query: str) -> List[Dict[str, Any]]:
+def _is_retryable_bq_error(exc: BaseException) -> bool:
+    message = str(exc or "")
+    return (
+        "rate exceeded" in message.lower()
+        or "too many requests" in message.lower()
+        or "429" in message
+        or "quota" in message.lower()
+        or "backend error" in message.lower()
+        or "internal error" in message.lower()
+        or "service unavailable" in message.lower()
+    )
+
+
+def query_to_dict(
+    query: str,
+    timeout_seconds: Optional[float] = None,
+    label: Optional[str] = None,
+) -> List[Dict[str, Any]]:
     client = get_bq_client()
     max_attempts = 4
     for attempt in range(1, max_attempts + 1):
+        query_job = None
+        started = time.perf_counter()
         try:
-            query_job = client.query(query)
-            results = query_job.result()
-            return [dict(row) for row in results]
+            job_config = job_config_for(query)
+            query_job = client.query(query, job_config=job_config) if job_config is not None else client.query(query)
+            results = query_job.result(timeout=timeout_seconds)
+            rows = [dict(row) for row in results]
+            record_query(query, query_job, (time.perf_counter() - started) * 1000, label=label)
+            return rows
         except Exception as exc:
-            message = str(exc or "")
-            retryable = (
-                "rate exceeded" in message.lower()
-                or "too many requests" in message.lower()
-                or "429" in message
-                or "quota" in message.lower()
-                or "backend error" in message.lower()
-                or "internal error" in message.lower()
-                or "service unavailable" in message.lower()
-            )
-            if not retryable or attempt >= max_attempts:
+            record_query(query, query_job, (time.perf_counter() - started) * 1000, label=label, error=exc)
+            if not _is_retryable_bq_error(exc) or attempt >= max_attempts:
                 raise
             backoff_seconds = min(0.6 * (2 ** (attempt - 1)), 4.0)
             time.sleep(backoff_seconds)
 
 
-def sql_literal(value: str) -> str:
-    return str(value).replace("'", "''")
+# Fan-out of independent queries: every BigQuery job is created up front
+# (client.query() only inserts the job), then results are collected in turn
+BQ_BATCH_QUERY_TIMEOUT_SECONDS = float(os.getenv("BQ_BATCH_QUERY_TIMEOUT_SECONDS", "60"))
 
 
-def build_flexible_date_expr(column_name: str) -> str:
-    """Build a BigQuery DATE expression that works for DATE or STRING sources."""
+def _cancel_bq_job(job: Any) -> None:
+    try:
+        job.cancel()
+    except Exception:
+        pass
+
+
+def query_batch_to_dict(
+    queries: Dict[str, str],
+    timeout_seconds: Optional[float] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Run independent queries concurrently and return their rows by name.
+
+    All jobs run on BigQuery at the same time and the deadline starts when
+    they are submitted: no local thread pool to queue behind. A query that
+    fails with a retryable error is re-run with the retry/backoff of
+    query_to_dict inside what is left of the deadline. The first failure
+    (or timeout) is raised, and the jobs still running are cancelled.
+    """
+    per_query_timeout = float(timeout_seconds or BQ_BATCH_QUERY_TIMEOUT_SECONDS)
+    client = get_bq_client()
+    deadline = time.monotonic() + per_query_timeout
+    jobs: Dict[str, Any] = {}
+    started: Dict[str, float] = {}
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        for name, sql in queries.items():
+            started[name] = time.perf_counter()
+            job_config = job_config_for(sql)
+            try:
+                jobs[name] = client.query(sql, job_config=job_config) if job_config is not None else client.query(sql)
+            except Exception as exc:
+                if not _is_retryable_bq_error(exc):
+                    raise
+                jobs[name] = None  # rate limited on insert: retried below with backoff
+        for name, sql in queries.items():
+            job = jobs[name]
+            remaining = max(0.0, deadline - time.monotonic())
+            if job is None:
+                results[name] = query_to_dict(sql, remaining, name)
+                continue
+            try:
+                rows = [dict(row) for row in job.result(timeout=remaining)]
+            except (TimeoutError, FutureTimeoutError) as exc:
+                record_query(sql, job, (time.perf_counter() - started[name]) * 1000, label=name, error=exc)
+                raise TimeoutError(f"BigQuery query '{name}' exceeded {per_query_timeout:.0f}s")
+            except Exception as exc:
+                record_query(sql, job, (time.perf_counter() - started[name]) * 1000, label=name, error=exc)
+                if not _is_retryable_bq_error(exc):
+                    raise
+                results[name] = query_to_dict(sql, max(0.0, deadline - time.monotonic()), name)
+                continue
+            record_query(sql, job, (time.perf_counter() - started[name]) * 1000, label=name)
+            results[name] = rows
+    except BaseException:
+        # Abandoned jobs would keep running (and billing) on BigQuery
+        for name, job in jobs.items():
+            if job is not None and name not in results:
+                _cancel_bq_job(job)
+        raise
+    return results
+
+
+def build_flexible_date_expr(column_name: str, tables: Union[str, Tuple[str, ...], None] = None) -> str:
+    """Build a BigQuery DATE expression that works for DATE or STRING sources.
+
+    With tables, a column typed DATE in every one of them is returned bare
+    (no parsing, and filters on it can prune partitions).
+    """
     col = str(column_name or "").strip()
+    tables = (tables,) if isinstance(tables, str) else tuple(tables or ())
+    if tables and all(is_date_column(table_name, col) for table_name in tables):
+        return col
     return (
         "COALESCE("
         f"SAFE_CAST({col} AS DATE), "
@@ -481,13 +930,7 @@ def parse_csv_values(value: Optional[str]) -> List[str]:
 
 
 def build_in_filter(column_name: str, raw_value: Optional[str]) -> Optional[str]:
-    values = parse_csv_values(raw_value)
-    if not values:
-        return None
-    if len(values) == 1:
-        return f"{column_name} = '{sql_literal(values[0])}'"
-    values_quoted = "', '".join(sql_literal(v) for v in values)
-    return f"{column_name} IN ('{values_quoted}')"
+    return in_filter(column_name, parse_csv_values(raw_value))
 
 
 def parse_quarter_number(raw_quarter: Optional[str]) -> Optional[int]:
@@ -583,26 +1026,83 @@ def derive_revenue_window(
     return parsed_start, parsed_end
 
 
-def get_dataset_table_columns(dataset_name: str, table_name: str) -> set[str]:
-    cache_key = f"_table_columns_{dataset_name}_{table_name}"
+def get_dataset_table_column_types(dataset_name: str, table_name: str) -> Dict[str, str]:
+    cache_key = f"_table_column_types_{dataset_name}_{table_name}"
     cached = get_cached_response(cache_key)
     if cached is not None:
         return cached
 
     query = f"""
-    SELECT column_name
+    SELECT column_name, data_type
     FROM `{PROJECT_ID}.{dataset_name}.INFORMATION_SCHEMA.COLUMNS`
-    WHERE table_name = '{sql_literal(table_name)}'
+    WHERE table_name = {bind_value(table_name, hint='table_name')}
     """
-    columns = {str(row.get("column_name") or "") for row in query_to_dict(query)}
-    set_cached_response(cache_key, columns, ttl_seconds=300)
-    return columns
+    column_types = {
+        str(row.get("column_name") or ""): str(row.get("data_type") or "").upper()
+        for row in query_to_dict(query)
+    }
+    set_cached_response(cache_key, column_types, ttl_seconds=300)
+    return column_types
+
+
+def get_dataset_table_columns(dataset_name: str, table_name: str) -> set[str]:
+    return set(get_dataset_table_column_types(dataset_name, table_name))
 
 
 def get_table_columns(table_name: str) -> set[str]:
     return get_dataset_table_columns(DATASET_ID, table_name)
 
 
+def is_date_column(table_name: str, column_name: str) -> bool:
+    """True when the column is stored as DATE (typed loaders partition on it)."""
+    try:
+        return get_dataset_table_column_types(DATASET_ID, table_name).get(column_name) == "DATE"
+    except Exception as e:
+        print(f"[BQ] WARN: could not read column types of {table_name}: {e}")
+        return False
+
+
+def build_period_filters(
+    date_expr: str,
+    year: Optional[int] = None,
+    quarter: Optional[int] = None,
+    month: Optional[int] = None,
+    *,
+    month_with_quarter: bool = False,
+    prunable: bool = False,
+) -> List[str]:
+    """Year / quarter / month filters on a DATE expression, ANDed.
+
+    month is ignored when quarter is set unless month_with_quarter. With
+    prunable (date_expr is a bare DATE column), a year plus its month
+    window becomes one DATE range so BigQuery can prune partitions.
+    """
+    quarter_months = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
+    quarter_window = quarter_months.get(quarter) if quarter else None
+    month_window = (month, month) if month and (month_with_quarter or not quarter) else None
+    windows = [window for window in (quarter_window, month_window) if window]
+
+    if prunable and year and 1 <= year <= 9998 and all(1 <= start <= end <= 12 for start, end in windows):
+        start_month = max([1] + [start for start, _ in windows])
+        end_month = min([12] + [end for _, end in windows])
+        if start_month > end_month:
+            return ["FALSE"]
+        upper = date(year + 1, 1, 1) if end_month == 12 else date(year, end_month + 1, 1)
+        return [
+            f"{date_expr} >= DATE '{date(year, start_month, 1).isoformat()}'",
+            f"{date_expr} < DATE '{upper.isoformat()}'",
+        ]
+
+    filters = []
+    if year:
+        filters.append(f"EXTRACT(YEAR FROM {date_expr}) = {year}")
+    if quarter_window:
+        filters.append(f"EXTRACT(MONTH FROM {date_expr}) BETWEEN {quarter_window[0]} AND {quarter_window[1]}")
+    if month_window:
+        filters.append(f"EXTRACT(MONTH FROM {date_expr}) = {month}")
+    return filters
+
+
 def append_pipeline_dimension_filters(
     filters: List[str],
     phase: Optional[str] = None,
@@ -684,7 +1184,8 @@ def append_pipeline_dimension_filters(
             filters.append(billing_city_filter)
     elif billing_cities and "Estado_Cidade_Detectado" in columns:
         city_terms = " OR ".join(
-            f"LOWER(Estado_Cidade_Detectado) LIKE LOWER('%{sql_literal(city)}%')" for city in billing_cities
+            f"LOWER(Estado_Cidade_Detectado) LIKE LOWER(CONCAT('%', {bind_value(city, hint='billing_city')}, '%'))"
+            for city in billing_cities
         )
         filters.append(f"({city_terms})")
 
@@ -695,7 +1196,8 @@ def append_pipeline_dimension_filters(
             filters.append(billing_state_filter)
     elif billing_states and "Estado_Cidade_Detectado" in columns:
         state_terms = " OR ".join(
-            f"LOWER(Estado_Cidade_Detectado) LIKE LOWER('%{sql_literal(state)}%')" for state in billing_states
+            f"LOWER(Estado_Cidade_Detectado) LIKE LOWER(CONCAT('%', {bind_value(state, hint='billing_state')}, '%'))"
+            for state in billing_states
         )
         filters.append(f"({state_terms})")
 
@@ -818,23 +1320,11 @@ def build_pipeline_filters_for_facets(
     exclude_param: Optional[str] = None,
 ) -> List[str]:
     filters: List[str] = []
-    pipeline_date_expr = build_flexible_date_expr("Data_Prevista")
-
-    if year:
-        filters.append(f"EXTRACT(YEAR FROM {pipeline_date_expr}) = {year}")
-
-    if quarter:
-        quarter_months = {
-            1: (1, 3),
-            2: (4, 6),
-            3: (7, 9),
-            4: (10, 12)
-        }
-        if quarter in quarter_months:
-            start_month, end_month = quarter_months[quarter]
-            filters.append(f"EXTRACT(MONTH FROM {pipeline_date_expr}) BETWEEN {start_month} AND {end_month}")
-    elif month:
-        filters.append(f"EXTRACT(MONTH FROM {pipeline_date_expr}) = {month}")
+    pipeline_date_expr = build_flexible_date_expr("Data_Prevista", "pipeline")
+    # Bare column = typed DATE partition column
+    filters.extend(
+        build_period_filters(pipeline_date_expr, year, quarter, month, prunable=pipeline_date_expr == "Data_Prevista")
+    )
 
     if seller and exclude_param != "seller":
         seller_filter = build_seller_filter(seller)
@@ -871,17 +1361,312 @@ def build_seller_filter(seller: Optional[str], column_name: str = "Vendedor") ->
     """
     Helper function to build seller filter supporting multiple sellers.
     Input: seller = "Alex Araujo,Carlos Moll" or "Alex Araujo" or None
-    Output: "Vendedor IN ('Alex Araujo', 'Carlos Moll')" or "Vendedor = 'Alex Araujo'" or None
+    Output: "Vendedor IN UNNEST(@seller)" (parameterized request) or, without
+    an active binder, "Vendedor IN ('Alex Araujo', 'Carlos Moll')" / "Vendedor = 'Alex Araujo'"
     """
     if not seller:
         return None
     
     sellers = [s.strip() for s in seller.split(',')]
-    if len(sellers) == 1:
-        return f"{column_name} = '{sql_literal(sellers[0])}'"
-    else:
-        sellers_quoted = "', '".join(sql_literal(s) for s in sellers)
-        return f"{column_name} IN ('{sellers_quoted}')"
+    return in_filter(column_name, sellers, hint="seller")
+
+
+# =============================================
+# ROLLUP CUBE (/api/metrics, /api/dashboard)
+# =============================================
+
+ROLLUP_CUBE_TABLES = ("pipeline", "closed_deals_won", "closed_deals_lost")
+
+
+def _closed_phase_column(table_name: str) -> Optional[str]:
+    # Same column resolution as append_closed_dimension_filters(phase=...)
+    columns = get_table_columns(table_name)
+    return "Status" if "Status" in columns else ("Fase_Atual" if "Fase_Atual" in columns else None)
+
+
+def _load_sales_rollup() -> SalesRollup:
+    versions: Dict[str, Optional[int]] = {}
+    if FRESHNESS_POLL_SECONDS > 0:
+        FRESHNESS_WATCHER.ensure_started()
+        versions = FRESHNESS_WATCHER.snapshot(ROLLUP_CUBE_TABLES)
+    return SalesRollup.load(
+        lambda sql, label: query_to_dict(sql, label=label),
+        project_id=PROJECT_ID,
+        dataset_id=DATASET_ID,
+        date_expr=build_flexible_date_expr,
+        closed_phase_columns={table: _closed_phase_column(table) for table in ROLLUP_CUBE_TABLES[1:]},
+        versions=versions,
+    )
+
+
+def _sales_rollup_is_current(rollup: SalesRollup) -> bool:
+    versions = rollup.versions
+    if versions and all(v is not None for v in versions.values()) and FRESHNESS_WATCHER.healthy():
+        return FRESHNESS_WATCHER.matches(versions)
+    return time.time() - rollup.loaded_at <= ROLLUP_CUBE_MAX_AGE_SECONDS
+
+
+SALES_ROLLUP = RollupCubeHolder(
+    _load_sales_rollup,
+    _sales_rollup_is_current,
+    retry_seconds=ROLLUP_CUBE_RETRY_SECONDS,
+)
+
+
+def get_sales_rollup(nocache: bool = False) -> Optional[SalesRollup]:
+    """Current rollup cube, or None (disabled, nocache, loading elsewhere or load failed)."""
+    if not ROLLUP_CUBE_ENABLED or nocache:
+        return None
+    return SALES_ROLLUP.get()
+
+
+# =============================================
+# LIST SNAPSHOTS (/api/pipeline, /api/closed/won, /api/closed/lost)
+# =============================================
+
+# SELECT lists shared by the list endpoints and their snapshot loaders
+PIPELINE_LIST_COLUMNS = """Oportunidade, Vendedor, Fase_Atual,
+            Fiscal_Q,
+            Conta, Idle_Dias, SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias, Atividades,
+            Data_Prevista, SAFE_CAST(Confianca AS FLOAT64) as Confianca,
+            SAFE_CAST(MEDDIC_Score AS FLOAT64) as MEDDIC_Score,
+            SAFE_CAST(BANT_Score AS FLOAT64) as BANT_Score,
+            SAFE_CAST(NULL AS FLOAT64) as Risco_Score,
+            Gross, Net, Forecast_SF, Forecast_IA,
+            Perfil, Produtos,
+            COALESCE(CAST(Justificativa_IA AS STRING), '') as Justificativa_IA,
+            COALESCE(CAST(Motivo_Confianca AS STRING), '') as Motivo_Confianca,
+            COALESCE(CAST(Risco_Principal AS STRING), '') as Risco_Principal,
+            COALESCE(CAST(Gaps_Identificados AS STRING), '') as Gaps_Identificados,
+            COALESCE(CAST(Acao_Sugerida AS STRING), '') as Acao_Sugerida,
+            Owner_Preventa, Vertical_IA, Sub_vertical_IA, Sub_sub_vertical_IA,
+            Estado_Cidade_Detectado,
+            COALESCE(CAST(Portfolio AS STRING), '') as Portfolio,
+            COALESCE(CAST(Portfolio_FDM AS STRING), '') as Portfolio_FDM,
+            COALESCE(CAST(Segmento_consolidado AS STRING), '') as Segmento_consolidado,
+            COALESCE(CAST(Subsegmento_de_mercado AS STRING), '') as Subsegmento_de_mercado,
+            COALESCE(CAST(Cidade_de_cobranca AS STRING), '') as Cidade_de_cobranca,
+            COALESCE(CAST(Estado_Provincia_de_cobranca AS STRING), '') as Estado_Provincia_de_cobranca,
+            COALESCE(CAST(Tipo_Oportunidade AS STRING), '') as Tipo_Oportunidade,
+            COALESCE(CAST(Processo AS STRING), '') as Processo"""
+
+CLOSED_WON_LIST_COLUMNS = """Oportunidade, Vendedor, Status, Conta,
+            Fiscal_Q,
+            COALESCE(CAST(Status AS STRING), '') as Fase_Atual,
+            Data_Fechamento, SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias,
+            Gross, Net, Tipo_Resultado, Fatores_Sucesso, Causa_Raiz, Atividades,
+            COALESCE(Produtos, '') as Produtos,
+            COALESCE(Perfil_Cliente, '') as Perfil_Cliente,
+            COALESCE(CAST(Vertical_IA AS STRING), '') as Vertical_IA,
+            COALESCE(CAST(Sub_vertical_IA AS STRING), '') as Sub_vertical_IA,
+            COALESCE(CAST(Sub_sub_vertical_IA AS STRING), '') as Sub_sub_vertical_IA,
+            COALESCE(CAST(Portfolio AS STRING), '') as Portfolio,
+            COALESCE(CAST(Portfolio_FDM AS STRING), '') as Portfolio_FDM,
+            COALESCE(CAST(Segmento_consolidado AS STRING), '') as Segmento_consolidado,
+            COALESCE(CAST(Subsegmento_de_mercado AS STRING), '') as Subsegmento_de_mercado,
+            COALESCE(CAST(Cidade_de_cobranca AS STRING), '') as Cidade_de_cobranca,
+            COALESCE(CAST(Estado_Provincia_de_cobranca AS STRING), CAST(EstadoProvincia_de_cobranca AS STRING), '') as Estado_Provincia_de_cobranca,
+            COALESCE(CAST(Tipo_Oportunidade AS STRING), '') as Tipo_Oportunidade,
+            COALESCE(CAST(Processo AS STRING), '') as Processo,
+            '' as Forecast_SF,
+            '' as Forecast_IA"""
+
+CLOSED_LOST_LIST_COLUMNS = """Oportunidade, Vendedor, Status, Conta,
+            Fiscal_Q,
+            Data_Fechamento, SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias,
+            Gross, Net, Tipo_Resultado, Causa_Raiz, Fatores_Sucesso, Atividades,
+            COALESCE(CAST(Evitavel AS STRING), '') as Evitavel,
+            COALESCE(Justificativa_IA, '') as Justificativa_IA,
+            COALESCE(Owner_Preventa, '') as Owner_Preventa,
+            COALESCE(CAST(Vertical_IA AS STRING), '') as Vertical_IA,
+            COALESCE(CAST(Sub_vertical_IA AS STRING), '') as Sub_vertical_IA,
+            COALESCE(CAST(Sub_sub_vertical_IA AS STRING), '') as Sub_sub_vertical_IA,
+            COALESCE(CAST(Portfolio AS STRING), '') as Portfolio,
+            COALESCE(CAST(Portfolio_FDM AS STRING), '') as Portfolio_FDM,
+            COALESCE(CAST(Segmento_consolidado AS STRING), '') as Segmento_consolidado,
+            COALESCE(CAST(Subsegmento_de_mercado AS STRING), '') as Subsegmento_de_mercado,
+            COALESCE(CAST(Cidade_de_cobranca AS STRING), '') as Cidade_de_cobranca,
+            COALESCE(CAST(Estado_Provincia_de_cobranca AS STRING), CAST(EstadoProvincia_de_cobranca AS STRING), '') as Estado_Provincia_de_cobranca,
+            COALESCE(CAST(Status AS STRING), '') as Fase_Atual,
+            COALESCE(CAST(Tipo_Oportunidade AS STRING), '') as Tipo_Oportunidade,
+            COALESCE(CAST(Processo AS STRING), '') as Processo"""
+
+
+# BigQuery fallback of the list endpoints (snapshot miss): WHERE and LIMIT are the slots
+_PIPELINE_LIST_SQL = register_query_template("list.pipeline", f"""
+        SELECT 
+            {PIPELINE_LIST_COLUMNS}
+        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
+        {{where}}
+        ORDER BY Gross DESC
+        LIMIT {{limit}}
+        """)
+_CLOSED_WON_LIST_SQL = register_query_template("list.closed_won", f"""
+        SELECT
+            {CLOSED_WON_LIST_COLUMNS}
+        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
+        {{where}}
+        ORDER BY Gross DESC
+        LIMIT {{limit}}
+        """)
+_CLOSED_LOST_LIST_SQL = register_query_template("list.closed_lost", f"""
+        SELECT
+            {CLOSED_LOST_LIST_COLUMNS}
+        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
+        {{where}}
+        ORDER BY Gross DESC
+        LIMIT {{limit}}
+        """)
+
+# Per table: projected columns, period column, whether Fiscal_Q also matches
+# the period (closed deals) and the dimension params a snapshot can answer
+# (param -> projected column, same column append_*_dimension_filters uses).
+# Any other non-empty dimension param falls back to BigQuery.
+LIST_SNAPSHOT_SPECS: Dict[str, Dict[str, Any]] = {
+    "pipeline": {
+        "columns": PIPELINE_LIST_COLUMNS,
+        "date_column": "Data_Prevista",
+        "fiscal_fallback": False,
+        "filters": {
+            "phase": "Fase_Atual",
+            "tipo_oportunidade": "Tipo_Oportunidade",
+            "processo": "Processo",
+            "owner_preventa": "Owner_Preventa",
+            "vertical_ia": "Vertical_IA",
+            "sub_vertical_ia": "Sub_vertical_IA",
+            "sub_sub_vertical_ia": "Sub_sub_vertical_IA",
+            "subsegmento_mercado": "Subsegmento_de_mercado",
+            "segmento_consolidado": "Segmento_consolidado",
+            "portfolio": "Portfolio",
+            "portfolio_fdm": "Portfolio_FDM",
+            "billing_city": "Cidade_de_cobranca",
+            "billing_state": "Estado_Provincia_de_cobranca",
+        },
+    },
+    "closed_deals_won": {
+        "columns": CLOSED_WON_LIST_COLUMNS,
+        "date_column": "Data_Fechamento",
+        "fiscal_fallback": True,
+        "filters": {
+            "phase": "Status",
+            "tipo_oportunidade": "Tipo_Oportunidade",
+            "processo": "Processo",
+            "vertical_ia": "Vertical_IA",
+            "sub_vertical_ia": "Sub_vertical_IA",
+            "sub_sub_vertical_ia": "Sub_sub_vertical_IA",
+            "subsegmento_mercado": "Subsegmento_de_mercado",
+            "segmento_consolidado": "Segmento_consolidado",
+            "portfolio": "Portfolio",
+            "portfolio_fdm": "Portfolio_FDM",
+            "perfil_cliente": "Perfil_Cliente",
+            "billing_city": "Cidade_de_cobranca",
+        },
+    },
+    "closed_deals_lost": {
+        "columns": CLOSED_LOST_LIST_COLUMNS,
+        "date_column": "Data_Fechamento",
+        "fiscal_fallback": True,
+        "filters": {
+            "phase": "Status",
+            "tipo_oportunidade": "Tipo_Oportunidade",
+            "processo": "Processo",
+            "owner_preventa": "Owner_Preventa",
+            "vertical_ia": "Vertical_IA",
+            "sub_vertical_ia": "Sub_vertical_IA",
+            "sub_sub_vertical_ia": "Sub_sub_vertical_IA",
+            "subsegmento_mercado": "Subsegmento_de_mercado",
+            "segmento_consolidado": "Segmento_consolidado",
+            "portfolio": "Portfolio",
+            "portfolio_fdm": "Portfolio_FDM",
+            "billing_city": "Cidade_de_cobranca",
+        },
+    },
+}
+# Filtered with TRIM(CAST(... AS STRING)) in SQL
+LIST_SNAPSHOT_TRIMMED_COLUMNS = ("Portfolio", "Portfolio_FDM")
+LIST_SNAPSHOT_BASE_PARAMS = {"year", "quarter", "month", "seller", "limit"}
+
+
+def _load_list_snapshot(table_name: str) -> ColumnarTable:
+    spec = LIST_SNAPSHOT_SPECS[table_name]
+    versions: Dict[str, Optional[int]] = {}
+    if FRESHNESS_POLL_SECONDS > 0:
+        FRESHNESS_WATCHER.ensure_started()
+        versions = FRESHNESS_WATCHER.snapshot((table_name,))
+    date_expr = build_flexible_date_expr(spec["date_column"], table_name)
+    query = f"""
+    SELECT
+        {spec["columns"]},
+        EXTRACT(YEAR FROM {date_expr}) AS _snapshot_year,
+        EXTRACT(MONTH FROM {date_expr}) AS _snapshot_month
+    FROM `{PROJECT_ID}.{DATASET_ID}.{table_name}`
+    """
+    rows = query_to_dict(query, label=f"list_snapshot.{table_name}")
+    return ColumnarTable(rows, key_column="Oportunidade", versions=versions)
+
+
+def _list_snapshot_is_current(table_name: str, table: ColumnarTable) -> bool:
+    versions = table.versions
+    if versions and all(v is not None for v in versions.values()) and FRESHNESS_WATCHER.healthy():
+        return FRESHNESS_WATCHER.matches(versions)
+    return time.time() - table.loaded_at <= LIST_SNAPSHOT_MAX_AGE_SECONDS
+
+
+LIST_SNAPSHOTS = SnapshotStore(
+    {name: functools.partial(_load_list_snapshot, name) for name in LIST_SNAPSHOT_SPECS},
+    _list_snapshot_is_current,
+    retry_seconds=LIST_SNAPSHOT_RETRY_SECONDS,
+)
+
+
+def _refresh_changed_list_snapshots(tables: List[str]) -> None:
+    # Rebuild in the background so the next request finds the new version ready
+    for table_name in tables:
+        if LIST_SNAPSHOT_ENABLED and LIST_SNAPSHOTS.is_loaded(table_name):
+            LIST_SNAPSHOTS.refresh_in_background(table_name)
+
+
+FRESHNESS_WATCHER.add_listener(_refresh_changed_list_snapshots)
+
+
+def list_from_snapshot(table_name: str, params: Dict[str, Any], nocache: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """Rows of a list endpoint served from the in-process snapshot.
+
+    None when the snapshot cannot answer the request (disabled, nocache,
+    unsupported filter, or snapshot unavailable) and BigQuery must be used.
+    """
+    if not LIST_SNAPSHOT_ENABLED or nocache:
+        return None
+    spec = LIST_SNAPSHOT_SPECS[table_name]
+    in_filters: Dict[str, List[str]] = {}
+    for param, value in params.items():
+        if param in LIST_SNAPSHOT_BASE_PARAMS:
+            continue
+        values = parse_csv_values(value)
+        if not values:
+            continue
+        column = spec["filters"].get(param)
+        if column is None:
+            return None
+        in_filters.setdefault(column, values)
+    limit = int(params.get("limit") or 0)
+    if limit < 0:
+        return None
+    table = LIST_SNAPSHOTS.get(table_name)
+    if table is None:
+        return None
+    seller = params.get("seller")
+    mask = deal_list_mask(
+        table,
+        year=params.get("year"),
+        quarter=params.get("quarter"),
+        month=params.get("month"),
+        sellers=[s.strip() for s in seller.split(",")] if seller else None,
+        in_filters=in_filters,
+        fiscal_fallback=spec["fiscal_fallback"],
+        strip_columns=LIST_SNAPSHOT_TRIMMED_COLUMNS,
+    )
+    return table.materialize(table.top_n(mask, "Gross", limit))
 
 
 # =============================================
@@ -903,6 +1688,71 @@ async def health_check():
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
+# /api/_debug/* expose SQL text and LLM errors: admin only (same check as /api/admin/*)
+@app.get("/api/_debug/cache-stats")
+async def get_cache_stats(request: Request):
+    ensure_admin_access(request)
+    return {
+        "success": True,
+        "timestamp": datetime.utcnow().isoformat(),
+        "response_cache": CACHE.stats(),
+        "single_flight": SINGLE_FLIGHT.stats(),
+        "bq_async": get_bq_async_stats(),
+        "rollup_cube": {"enabled": ROLLUP_CUBE_ENABLED, **SALES_ROLLUP.stats()},
+        "list_snapshots": {"enabled": LIST_SNAPSHOT_ENABLED, **LIST_SNAPSHOTS.stats()},
+        "rag_vector_index": deal_index_stats(),
+        "rag_query_embeddings": embedding_cache_stats(),
+        "rag_rerank_tokens": rerank_cache_stats(),
+        "llm_models": LLM_HEALTH.stats(),
+        "llm_responses": llm_response_cache_stats(),
+        "freshness": {
+            "enabled": FRESHNESS_POLL_SECONDS > 0,
+            "freshness_ttl_seconds": CACHE_FRESHNESS_TTL_SECONDS,
+            **FRESHNESS_WATCHER.stats(),
+        },
+        "stale_while_revalidate": {
+            "stale_ttl_seconds": CACHE_STALE_TTL_SECONDS,
+            "in_progress": len(_REVALIDATING),
+            **_REVALIDATE_STATS,
+        },
+    }
+
+@app.get("/api/_debug/query-stats")
+async def get_query_stats(
+    request: Request,
+    sort: str = "wall_ms_total",
+    limit: int = 20,
+):
+    """BigQuery jobs aggregated by endpoint + query fingerprint, worst first.
+
+    sort: wall_ms_total | wall_ms_max | wall_ms_avg | slot_ms_total |
+          bytes_billed_total | bytes_processed_total | count | errors
+    """
+    ensure_admin_access(request)
+    stats = QUERY_STATS.stats(sort_by=sort, limit=max(1, min(limit, 500)))
+    return {
+        "success": True,
+        "timestamp": datetime.utcnow().isoformat(),
+        **stats,
+        "templates": QUERY_TEMPLATES.stats(),
+    }
+
+@app.post("/api/_debug/query-stats/reset")
+async def reset_query_stats(request: Request):
+    ensure_admin_access(request)
+    QUERY_STATS.reset()
+    return {"success": True, "timestamp": datetime.utcnow().isoformat()}
+
+@app.get("/api/_debug/admission-stats")
+async def get_admission_stats(request: Request):
+    ensure_admin_access(request)
+    return {
+        "success": True,
+        "timestamp": datetime.utcnow().isoformat(),
+        "sync_endpoint_threads": SYNC_ENDPOINT_THREADS or None,
+        "admission": ADMISSION.stats(),
+    }
+
 @app.get("/")
 async def root():
     """Serve the dashboard HTML"""
@@ -1059,7 +1909,73 @@ def get_sellers(nocache: bool = False):
 # INDIVIDUAL ENDPOINTS
 # =============================================
 
+# /api/metrics SQL; the WHERE clause is the only slot (Atividades is text:
+# first number, decimal comma accepted)
+_ACTIVITIES_EXPR = "SAFE_CAST(REPLACE(REGEXP_EXTRACT(CAST(Atividades AS STRING), r'-?[0-9]+(?:[\\.,][0-9]+)?'), ',', '.') AS FLOAT64)"
+_METRICS_PIPELINE_SQL = register_query_template("metrics.pipeline", f"""
+        SELECT 
+            COUNT(*) as deals_count,
+            ROUND(SUM(Gross), 2) as gross,
+            ROUND(SUM(Net), 2) as net,
+            ROUND(AVG(SAFE_CAST(Idle_Dias AS FLOAT64)), 1) as avg_idle_days,
+            ROUND(AVG(SAFE_CAST(MEDDIC_Score AS FLOAT64)), 1) as avg_meddic,
+            ROUND(AVG(SAFE_CAST(BANT_Score AS FLOAT64)), 1) as avg_bant,
+            ROUND(AVG(SAFE_CAST(Confianca AS FLOAT64)), 1) as avg_confidence,
+            COUNTIF(SAFE_CAST(Idle_Dias AS FLOAT64) > 30) as high_risk_idle,
+            COUNTIF(SAFE_CAST(Idle_Dias AS FLOAT64) BETWEEN 15 AND 30) as medium_risk_idle
+        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
+        {{where}}
+        """)
+_METRICS_WON_SQL = register_query_template("metrics.won", f"""
+        SELECT 
+          COUNT(*) as deals_count,
+          ROUND(SUM(Gross), 2) as gross,
+          ROUND(SUM(Net), 2) as net,
+          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) as avg_cycle_days,
+          ROUND(AVG({_ACTIVITIES_EXPR}), 1) as avg_activities
+        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
+        {{where}}
+        """)
+_METRICS_LOST_SQL = register_query_template("metrics.lost", f"""
+        SELECT 
+          COUNT(*) as deals_count,
+          ROUND(SUM(Gross), 2) as gross,
+                    ROUND(SUM(Net), 2) as net,
+          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) as avg_cycle_days,
+          ROUND(AVG({_ACTIVITIES_EXPR}), 1) as avg_activities,
+          COUNTIF(Evitavel = 'Sim') as evitavel_count,
+          ROUND(SAFE_DIVIDE(COUNTIF(Evitavel = 'Sim'), COUNT(*)) * 100, 1) as evitavel_pct
+        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
+        {{where}}
+        """)
+_METRICS_HIGH_CONFIDENCE_SQL = register_query_template("metrics.high_confidence", f"""
+        SELECT 
+            COUNT(*) as deals_count,
+            ROUND(SUM(Gross), 2) as gross,
+            ROUND(SUM(Net), 2) as net,
+            ROUND(AVG(SAFE_CAST(Confianca AS FLOAT64)), 1) as avg_confidence
+        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
+        {{where}} AND SAFE_CAST(Confianca AS FLOAT64) >= 50
+        """)
+_METRICS_META_SQL = register_query_template("metrics.meta", f"""
+        SELECT
+            ROUND(SUM(Gross), 2) as gross,
+            ROUND(SUM(Net), 2) as net
+        FROM `{PROJECT_ID}.{DATASET_ID}.meta`
+        {{where}}
+        """)
+_METRICS_PIPELINE_TOTAL_SQL = register_query_template("metrics.pipeline_total", f"""
+        SELECT 
+            COUNT(*) as deals_count,
+            ROUND(SUM(Gross), 2) as gross,
+            ROUND(SUM(Net), 2) as net
+        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
+        WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost')
+        """)
+
+
 @app.get("/api/metrics")
+@coalesce_requests("/api/metrics")
 def get_metrics(
     year: Optional[int] = None, 
     quarter: Optional[int] = None,
@@ -1135,9 +2051,8 @@ def get_metrics(
         pipeline_filters = ["Fase_Atual NOT IN ('Closed Won', 'Closed Lost')"]
         closed_won_filters = []
         closed_lost_filters = []
-        pipeline_date_expr = "COALESCE(SAFE_CAST(Data_Prevista AS DATE), SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data_Prevista AS STRING)), SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data_Prevista AS STRING)), SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data_Prevista AS STRING)), SAFE.PARSE_DATE('%Y/%m/%d', CAST(Data_Prevista AS STRING)))"
-        closed_date_expr = "COALESCE(SAFE_CAST(Data_Fechamento AS DATE), SAFE.PARSE_DATE('%Y-%m-%d', CAST(Data_Fechamento AS STRING)), SAFE.PARSE_DATE('%d-%m-%Y', CAST(Data_Fechamento AS STRING)), SAFE.PARSE_DATE('%d/%m/%Y', CAST(Data_Fechamento AS STRING)), SAFE.PARSE_DATE('%Y/%m/%d', CAST(Data_Fechamento AS STRING)))"
-        activities_expr = "SAFE_CAST(REPLACE(REGEXP_EXTRACT(CAST(Atividades AS STRING), r'-?[0-9]+(?:[\\.,][0-9]+)?'), ',', '.') AS FLOAT64)"
+        pipeline_date_expr = build_flexible_date_expr("Data_Prevista", "pipeline")
+        closed_date_expr = build_flexible_date_expr("Data_Fechamento", ("closed_deals_won", "closed_deals_lost"))
         
         fiscal_q_exact = f"FY{str(year)[-2:]}-Q{quarter}" if (year and quarter) else None
 
@@ -1178,17 +2093,10 @@ def get_metrics(
         
         if seller:
             # Support multiple sellers: "Alex Araujo,Carlos Moll" -> IN ('Alex Araujo', 'Carlos Moll')
-            sellers = [s.strip() for s in seller.split(',')]
-            if len(sellers) == 1:
-                seller_escaped = sql_literal(sellers[0])
-                pipeline_filters.append(f"Vendedor = '{seller_escaped}'")
-                closed_won_filters.append(f"Vendedor = '{seller_escaped}'")
-                closed_lost_filters.append(f"Vendedor = '{seller_escaped}'")
-            else:
-                sellers_quoted = "', '".join(sql_literal(s) for s in sellers)
-                pipeline_filters.append(f"Vendedor IN ('{sellers_quoted}')")
-                closed_won_filters.append(f"Vendedor IN ('{sellers_quoted}')")
-                closed_lost_filters.append(f"Vendedor IN ('{sellers_quoted}')")
+            seller_filter = build_seller_filter(seller)
+            pipeline_filters.append(seller_filter)
+            closed_won_filters.append(seller_filter)
+            closed_lost_filters.append(seller_filter)
 
         append_closed_dimension_filters(
             closed_won_filters,
@@ -1272,57 +2180,16 @@ def get_metrics(
         lost_where = "WHERE " + " AND ".join(closed_lost_filters) if closed_lost_filters else ""
         
         # Pipeline metrics (com idle days, scores MEDDIC/BANT e avg_confidence)
-        pipeline_query = f"""
-        SELECT 
-            COUNT(*) as deals_count,
-            ROUND(SUM(Gross), 2) as gross,
-            ROUND(SUM(Net), 2) as net,
-            ROUND(AVG(SAFE_CAST(Idle_Dias AS FLOAT64)), 1) as avg_idle_days,
-            ROUND(AVG(SAFE_CAST(MEDDIC_Score AS FLOAT64)), 1) as avg_meddic,
-            ROUND(AVG(SAFE_CAST(BANT_Score AS FLOAT64)), 1) as avg_bant,
-            ROUND(AVG(SAFE_CAST(Confianca AS FLOAT64)), 1) as avg_confidence,
-            COUNTIF(SAFE_CAST(Idle_Dias AS FLOAT64) > 30) as high_risk_idle,
-            COUNTIF(SAFE_CAST(Idle_Dias AS FLOAT64) BETWEEN 15 AND 30) as medium_risk_idle
-        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
-        {pipeline_where}
-        """
+        pipeline_query = _METRICS_PIPELINE_SQL.render(where=pipeline_where)
         
         # Won deals (com atividades e ciclo corretos)
-        won_query = f"""
-        SELECT 
-          COUNT(*) as deals_count,
-          ROUND(SUM(Gross), 2) as gross,
-          ROUND(SUM(Net), 2) as net,
-          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) as avg_cycle_days,
-          ROUND(AVG({activities_expr}), 1) as avg_activities
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
-        {won_where}
-        """
+        won_query = _METRICS_WON_SQL.render(where=won_where)
         
         # Lost deals (com evitabilidade e atividades)
-        lost_query = f"""
-        SELECT 
-          COUNT(*) as deals_count,
-          ROUND(SUM(Gross), 2) as gross,
-                    ROUND(SUM(Net), 2) as net,
-          ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) as avg_cycle_days,
-          ROUND(AVG({activities_expr}), 1) as avg_activities,
-          COUNTIF(Evitavel = 'Sim') as evitavel_count,
-          ROUND(SAFE_DIVIDE(COUNTIF(Evitavel = 'Sim'), COUNT(*)) * 100, 1) as evitavel_pct
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-        {lost_where}
-        """
+        lost_query = _METRICS_LOST_SQL.render(where=lost_where)
         
         # High confidence deals (>=50%)
-        high_confidence_query = f"""
-        SELECT 
-            COUNT(*) as deals_count,
-            ROUND(SUM(Gross), 2) as gross,
-            ROUND(SUM(Net), 2) as net,
-            ROUND(AVG(SAFE_CAST(Confianca AS FLOAT64)), 1) as avg_confidence
-        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
-        {pipeline_where} AND SAFE_CAST(Confianca AS FLOAT64) >= 50
-        """
+        high_confidence_query = _METRICS_HIGH_CONFIDENCE_SQL.render(where=pipeline_where)
 
         meta_filters = []
         parsed_meta_month_expr = (
@@ -1351,30 +2218,41 @@ def get_metrics(
             meta_filters.append(f"EXTRACT(MONTH FROM {parsed_meta_month_expr}) = {month}")
 
         meta_where = "WHERE " + " AND ".join(meta_filters) if meta_filters else ""
-        meta_query = f"""
-        SELECT
-            ROUND(SUM(Gross), 2) as gross,
-            ROUND(SUM(Net), 2) as net
-        FROM `{PROJECT_ID}.{DATASET_ID}.meta`
-        {meta_where}
-        """
+        meta_query = _METRICS_META_SQL.render(where=meta_where)
         
         # Pipeline TOTAL (sem filtros - sempre retorna todos os deals)
-        pipeline_total_query = f"""
-        SELECT 
-            COUNT(*) as deals_count,
-            ROUND(SUM(Gross), 2) as gross,
-            ROUND(SUM(Net), 2) as net
-        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
-        WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost')
-        """
+        pipeline_total_query = _METRICS_PIPELINE_TOTAL_SQL.render()
         
-        # Execute queries
-        pipeline_result = query_to_dict(pipeline_query)[0]
-        pipeline_total_result = query_to_dict(pipeline_total_query)[0]
-        won_result = query_to_dict(won_query)[0]
-        lost_result = query_to_dict(lost_query)[0]
-        high_conf_result = query_to_dict(high_confidence_query)[0]
+        # Execute queries (additive blocks come from the rollup cube when every
+        # filter is one of its dimensions: period, seller, phase)
+        rollup = None
+        if not any([
+            tipo_oportunidade, processo, owner_preventa, billing_city, billing_state,
+            vertical_ia, sub_vertical_ia, sub_sub_vertical_ia, subsegmento_mercado,
+            segmento_consolidado, portfolio, portfolio_fdm, perfil_cliente, status_gtm,
+            motivo_status_gtm, status_cliente, flag_aprovacao_previa,
+            sales_specialist_envolvido, elegibilidade_ss, status_governanca_ss,
+        ]):
+            rollup = get_sales_rollup(nocache)
+        if rollup is not None:
+            blocks = rollup.metrics_blocks(
+                year=year,
+                quarter=quarter,
+                month=month,
+                sellers=[s.strip() for s in seller.split(',')] if seller else None,
+                phases=parse_csv_values(phase) or None,
+            )
+            pipeline_result = blocks["pipeline"]
+            pipeline_total_result = blocks["pipeline_total"]
+            won_result = blocks["won"]
+            lost_result = blocks["lost"]
+            high_conf_result = blocks["high_confidence"]
+        else:
+            pipeline_result = query_to_dict(pipeline_query)[0]
+            pipeline_total_result = query_to_dict(pipeline_total_query)[0]
+            won_result = query_to_dict(won_query)[0]
+            lost_result = query_to_dict(lost_query)[0]
+            high_conf_result = query_to_dict(high_confidence_query)[0]
         meta_result = query_to_dict(meta_query)[0]
         
         # Calculate win rate and cycle efficiency
@@ -1495,67 +2373,64 @@ def get_pipeline(
     status_governanca_ss: Optional[str] = None,
     limit: int = 2000,
     nocache: bool = False
-):
-    """Retorna deals do pipeline
-    
-    Filtros disponíveis:
-    - year: ano de Data_Prevista
-    - quarter: 1-4 (Q1=Jan-Mar, Q2=Abr-Jun, Q3=Jul-Set, Q4=Out-Dez)
-    - month: mês específico (1-12)
-    - seller: nome do vendedor
-    """
-    cache_key = build_cache_key(
-        "/api/pipeline",
-        {
-            "year": year,
-            "quarter": quarter,
-            "month": month,
-            "seller": seller,
-            "phase": phase,
-            "tipo_oportunidade": tipo_oportunidade,
-            "processo": processo,
-            "owner_preventa": owner_preventa,
-            "billing_city": billing_city,
-            "billing_state": billing_state,
-            "vertical_ia": vertical_ia,
-            "sub_vertical_ia": sub_vertical_ia,
-            "sub_sub_vertical_ia": sub_sub_vertical_ia,
-            "subsegmento_mercado": subsegmento_mercado,
-            "segmento_consolidado": segmento_consolidado,
-            "portfolio": portfolio,
-            "portfolio_fdm": portfolio_fdm,
-            "perfil_cliente": perfil_cliente,
-            "status_gtm": status_gtm,
-            "motivo_status_gtm": motivo_status_gtm,
-            "status_cliente": status_cliente,
-            "flag_aprovacao_previa": flag_aprovacao_previa,
-            "sales_specialist_envolvido": sales_specialist_envolvido,
-            "elegibilidade_ss": elegibilidade_ss,
-            "status_governanca_ss": status_governanca_ss,
-            "limit": limit,
-        }
-    )
+):
+    """Retorna deals do pipeline
+    
+    Filtros disponíveis:
+    - year: ano de Data_Prevista
+    - quarter: 1-4 (Q1=Jan-Mar, Q2=Abr-Jun, Q3=Jul-Set, Q4=Out-Dez)
+    - month: mês específico (1-12)
+    - seller: nome do vendedor
+    """
+    request_params = {
+        "year": year,
+        "quarter": quarter,
+        "month": month,
+        "seller": seller,
+        "phase": phase,
+        "tipo_oportunidade": tipo_oportunidade,
+        "processo": processo,
+        "owner_preventa": owner_preventa,
+        "billing_city": billing_city,
+        "billing_state": billing_state,
+        "vertical_ia": vertical_ia,
+        "sub_vertical_ia": sub_vertical_ia,
+        "sub_sub_vertical_ia": sub_sub_vertical_ia,
+        "subsegmento_mercado": subsegmento_mercado,
+        "segmento_consolidado": segmento_consolidado,
+        "portfolio": portfolio,
+        "portfolio_fdm": portfolio_fdm,
+        "perfil_cliente": perfil_cliente,
+        "status_gtm": status_gtm,
+        "motivo_status_gtm": motivo_status_gtm,
+        "status_cliente": status_cliente,
+        "flag_aprovacao_previa": flag_aprovacao_previa,
+        "sales_specialist_envolvido": sales_specialist_envolvido,
+        "elegibilidade_ss": elegibilidade_ss,
+        "status_governanca_ss": status_governanca_ss,
+        "limit": limit,
+    }
+    cache_key = build_cache_key("/api/pipeline", request_params)
     if not nocache:
         cached = get_cached_response(cache_key)
         if cached is not None:
             return cached
     try:
-        pipeline_date_expr = build_flexible_date_expr("Data_Prevista")
-        pipeline_filters = []
-        if year:
-            pipeline_filters.append(f"EXTRACT(YEAR FROM {pipeline_date_expr}) = {year}")
-        if quarter:
-            quarter_months = {
-                1: (1, 3),   # Q1: Janeiro-Março
-                2: (4, 6),   # Q2: Abril-Junho
-                3: (7, 9),   # Q3: Julho-Setembro
-                4: (10, 12)  # Q4: Outubro-Dezembro
-            }
-            if quarter in quarter_months:
-                start_month, end_month = quarter_months[quarter]
-                pipeline_filters.append(f"EXTRACT(MONTH FROM {pipeline_date_expr}) BETWEEN {start_month} AND {end_month}")
-        if month:
-            pipeline_filters.append(f"EXTRACT(MONTH FROM {pipeline_date_expr}) = {month}")
+        snapshot_rows = list_from_snapshot("pipeline", request_params, nocache)
+        if snapshot_rows is not None:
+            set_cached_response(cache_key, snapshot_rows)
+            return snapshot_rows
+
+        pipeline_date_expr = build_flexible_date_expr("Data_Prevista", "pipeline")
+        # Q1=Jan-Mar, Q2=Abr-Jun, Q3=Jul-Set, Q4=Out-Dez; month também com quarter
+        pipeline_filters = build_period_filters(
+            pipeline_date_expr,
+            year,
+            quarter,
+            month,
+            month_with_quarter=True,
+            prunable=pipeline_date_expr == "Data_Prevista",
+        )
         if seller:
             # Support multiple sellers
             seller_filter = build_seller_filter(seller)
@@ -1589,37 +2464,7 @@ def get_pipeline(
         
         where_clause = f"WHERE {' AND '.join(pipeline_filters)}" if pipeline_filters else ""
         
-        query = f"""
-        SELECT 
-            Oportunidade, Vendedor, Fase_Atual,
-            Fiscal_Q,
-            Conta, Idle_Dias, SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias, Atividades,
-            Data_Prevista, SAFE_CAST(Confianca AS FLOAT64) as Confianca,
-            SAFE_CAST(MEDDIC_Score AS FLOAT64) as MEDDIC_Score,
-            SAFE_CAST(BANT_Score AS FLOAT64) as BANT_Score,
-            SAFE_CAST(NULL AS FLOAT64) as Risco_Score,
-            Gross, Net, Forecast_SF, Forecast_IA,
-            Perfil, Produtos,
-            COALESCE(CAST(Justificativa_IA AS STRING), '') as Justificativa_IA,
-            COALESCE(CAST(Motivo_Confianca AS STRING), '') as Motivo_Confianca,
-            COALESCE(CAST(Risco_Principal AS STRING), '') as Risco_Principal,
-            COALESCE(CAST(Gaps_Identificados AS STRING), '') as Gaps_Identificados,
-            COALESCE(CAST(Acao_Sugerida AS STRING), '') as Acao_Sugerida,
-            Owner_Preventa, Vertical_IA, Sub_vertical_IA, Sub_sub_vertical_IA,
-            Estado_Cidade_Detectado,
-            COALESCE(CAST(Portfolio AS STRING), '') as Portfolio,
-            COALESCE(CAST(Portfolio_FDM AS STRING), '') as Portfolio_FDM,
-            COALESCE(CAST(Segmento_consolidado AS STRING), '') as Segmento_consolidado,
-            COALESCE(CAST(Subsegmento_de_mercado AS STRING), '') as Subsegmento_de_mercado,
-            COALESCE(CAST(Cidade_de_cobranca AS STRING), '') as Cidade_de_cobranca,
-            COALESCE(CAST(Estado_Provincia_de_cobranca AS STRING), '') as Estado_Provincia_de_cobranca,
-            COALESCE(CAST(Tipo_Oportunidade AS STRING), '') as Tipo_Oportunidade,
-            COALESCE(CAST(Processo AS STRING), '') as Processo
-        FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
-        {where_clause}
-        ORDER BY Gross DESC
-        LIMIT {limit}
-        """
+        query = _PIPELINE_LIST_SQL.render(where=where_clause, limit=limit)
         result = query_to_dict(query)
         set_cached_response(cache_key, result)
         return result
@@ -1782,9 +2627,9 @@ def get_filter_options(
             portfolio_counts: Dict[str, int] = {"1.0": 0, "2.0": 0, "3.0": 0}
 
             table_specs = [
-                ("pipeline", build_flexible_date_expr("Data_Prevista")),
-                ("closed_deals_won", build_flexible_date_expr("Data_Fechamento")),
-                ("closed_deals_lost", build_flexible_date_expr("Data_Fechamento")),
+                ("pipeline", build_flexible_date_expr("Data_Prevista", "pipeline")),
+                ("closed_deals_won", build_flexible_date_expr("Data_Fechamento", "closed_deals_won")),
+                ("closed_deals_lost", build_flexible_date_expr("Data_Fechamento", "closed_deals_lost")),
             ]
 
             for table_name, date_expr in table_specs:
@@ -1953,44 +2798,47 @@ def get_closed_won(
     - month: mês específico (1-12)
     - seller: nome do vendedor
     """
-    cache_key = build_cache_key(
-        "/api/closed/won",
-        {
-            "year": year,
-            "quarter": quarter,
-            "month": month,
-            "seller": seller,
-            "phase": phase,
-            "tipo_oportunidade": tipo_oportunidade,
-            "processo": processo,
-            "owner_preventa": owner_preventa,
-            "billing_city": billing_city,
-            "billing_state": billing_state,
-            "vertical_ia": vertical_ia,
-            "sub_vertical_ia": sub_vertical_ia,
-            "sub_sub_vertical_ia": sub_sub_vertical_ia,
-            "subsegmento_mercado": subsegmento_mercado,
-            "segmento_consolidado": segmento_consolidado,
-            "portfolio": portfolio,
-            "portfolio_fdm": portfolio_fdm,
-            "perfil_cliente": perfil_cliente,
-            "status_gtm": status_gtm,
-            "motivo_status_gtm": motivo_status_gtm,
-            "status_cliente": status_cliente,
-            "flag_aprovacao_previa": flag_aprovacao_previa,
-            "sales_specialist_envolvido": sales_specialist_envolvido,
-            "elegibilidade_ss": elegibilidade_ss,
-            "status_governanca_ss": status_governanca_ss,
-            "limit": limit,
-        }
-    )
+    request_params = {
+        "year": year,
+        "quarter": quarter,
+        "month": month,
+        "seller": seller,
+        "phase": phase,
+        "tipo_oportunidade": tipo_oportunidade,
+        "processo": processo,
+        "owner_preventa": owner_preventa,
+        "billing_city": billing_city,
+        "billing_state": billing_state,
+        "vertical_ia": vertical_ia,
+        "sub_vertical_ia": sub_vertical_ia,
+        "sub_sub_vertical_ia": sub_sub_vertical_ia,
+        "subsegmento_mercado": subsegmento_mercado,
+        "segmento_consolidado": segmento_consolidado,
+        "portfolio": portfolio,
+        "portfolio_fdm": portfolio_fdm,
+        "perfil_cliente": perfil_cliente,
+        "status_gtm": status_gtm,
+        "motivo_status_gtm": motivo_status_gtm,
+        "status_cliente": status_cliente,
+        "flag_aprovacao_previa": flag_aprovacao_previa,
+        "sales_specialist_envolvido": sales_specialist_envolvido,
+        "elegibilidade_ss": elegibilidade_ss,
+        "status_governanca_ss": status_governanca_ss,
+        "limit": limit,
+    }
+    cache_key = build_cache_key("/api/closed/won", request_params)
     if not nocache:
         cached = get_cached_response(cache_key)
         if cached is not None:
             return cached
     try:
+        snapshot_rows = list_from_snapshot("closed_deals_won", request_params, nocache)
+        if snapshot_rows is not None:
+            set_cached_response(cache_key, snapshot_rows)
+            return snapshot_rows
+
         closed_filters = []
-        closed_date_expr = build_flexible_date_expr("Data_Fechamento")
+        closed_date_expr = build_flexible_date_expr("Data_Fechamento", "closed_deals_won")
         fiscal_q_exact = f"FY{str(year)[-2:]}-Q{quarter}" if (year and quarter) else None
         if year:
             if fiscal_q_exact:
@@ -2046,33 +2894,7 @@ def get_closed_won(
         where_clause = f"WHERE {' AND '.join(closed_filters)}" if closed_filters else ""
 
         # closed_deals_won com dimensões para gráficos comparativos
-        query = f"""
-        SELECT
-            Oportunidade, Vendedor, Status, Conta,
-            Fiscal_Q,
-            COALESCE(CAST(Status AS STRING), '') as Fase_Atual,
-            Data_Fechamento, SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias,
-            Gross, Net, Tipo_Resultado, Fatores_Sucesso, Causa_Raiz, Atividades,
-            COALESCE(Produtos, '') as Produtos,
-            COALESCE(Perfil_Cliente, '') as Perfil_Cliente,
-            COALESCE(CAST(Vertical_IA AS STRING), '') as Vertical_IA,
-            COALESCE(CAST(Sub_vertical_IA AS STRING), '') as Sub_vertical_IA,
-            COALESCE(CAST(Sub_sub_vertical_IA AS STRING), '') as Sub_sub_vertical_IA,
-            COALESCE(CAST(Portfolio AS STRING), '') as Portfolio,
-            COALESCE(CAST(Portfolio_FDM AS STRING), '') as Portfolio_FDM,
-            COALESCE(CAST(Segmento_consolidado AS STRING), '') as Segmento_consolidado,
-            COALESCE(CAST(Subsegmento_de_mercado AS STRING), '') as Subsegmento_de_mercado,
-            COALESCE(CAST(Cidade_de_cobranca AS STRING), '') as Cidade_de_cobranca,
-            COALESCE(CAST(Estado_Provincia_de_cobranca AS STRING), CAST(EstadoProvincia_de_cobranca AS STRING), '') as Estado_Provincia_de_cobranca,
-            COALESCE(CAST(Tipo_Oportunidade AS STRING), '') as Tipo_Oportunidade,
-            COALESCE(CAST(Processo AS STRING), '') as Processo,
-            '' as Forecast_SF,
-            '' as Forecast_IA
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
-        {where_clause}
-        ORDER BY Gross DESC
-        LIMIT {limit}
-        """
+        query = _CLOSED_WON_LIST_SQL.render(where=where_clause, limit=limit)
         result = query_to_dict(query)
         set_cached_response(cache_key, result)
         return result
@@ -2117,44 +2939,47 @@ def get_closed_lost(
     - month: mês específico (1-12)
     - seller: nome do vendedor
     """
-    cache_key = build_cache_key(
-        "/api/closed/lost",
-        {
-            "year": year,
-            "quarter": quarter,
-            "month": month,
-            "seller": seller,
-            "phase": phase,
-            "tipo_oportunidade": tipo_oportunidade,
-            "processo": processo,
-            "owner_preventa": owner_preventa,
-            "billing_city": billing_city,
-            "billing_state": billing_state,
-            "vertical_ia": vertical_ia,
-            "sub_vertical_ia": sub_vertical_ia,
-            "sub_sub_vertical_ia": sub_sub_vertical_ia,
-            "subsegmento_mercado": subsegmento_mercado,
-            "segmento_consolidado": segmento_consolidado,
-            "portfolio": portfolio,
-            "portfolio_fdm": portfolio_fdm,
-            "perfil_cliente": perfil_cliente,
-            "status_gtm": status_gtm,
-            "motivo_status_gtm": motivo_status_gtm,
-            "status_cliente": status_cliente,
-            "flag_aprovacao_previa": flag_aprovacao_previa,
-            "sales_specialist_envolvido": sales_specialist_envolvido,
-            "elegibilidade_ss": elegibilidade_ss,
-            "status_governanca_ss": status_governanca_ss,
-            "limit": limit,
-        }
-    )
+    request_params = {
+        "year": year,
+        "quarter": quarter,
+        "month": month,
+        "seller": seller,
+        "phase": phase,
+        "tipo_oportunidade": tipo_oportunidade,
+        "processo": processo,
+        "owner_preventa": owner_preventa,
+        "billing_city": billing_city,
+        "billing_state": billing_state,
+        "vertical_ia": vertical_ia,
+        "sub_vertical_ia": sub_vertical_ia,
+        "sub_sub_vertical_ia": sub_sub_vertical_ia,
+        "subsegmento_mercado": subsegmento_mercado,
+        "segmento_consolidado": segmento_consolidado,
+        "portfolio": portfolio,
+        "portfolio_fdm": portfolio_fdm,
+        "perfil_cliente": perfil_cliente,
+        "status_gtm": status_gtm,
+        "motivo_status_gtm": motivo_status_gtm,
+        "status_cliente": status_cliente,
+        "flag_aprovacao_previa": flag_aprovacao_previa,
+        "sales_specialist_envolvido": sales_specialist_envolvido,
+        "elegibilidade_ss": elegibilidade_ss,
+        "status_governanca_ss": status_governanca_ss,
+        "limit": limit,
+    }
+    cache_key = build_cache_key("/api/closed/lost", request_params)
     if not nocache:
         cached = get_cached_response(cache_key)
         if cached is not None:
             return cached
     try:
+        snapshot_rows = list_from_snapshot("closed_deals_lost", request_params, nocache)
+        if snapshot_rows is not None:
+            set_cached_response(cache_key, snapshot_rows)
+            return snapshot_rows
+
         closed_filters = []
-        closed_date_expr = build_flexible_date_expr("Data_Fechamento")
+        closed_date_expr = build_flexible_date_expr("Data_Fechamento", "closed_deals_lost")
         fiscal_q_exact = f"FY{str(year)[-2:]}-Q{quarter}" if (year and quarter) else None
         if year:
             if fiscal_q_exact:
@@ -2210,32 +3035,7 @@ def get_closed_lost(
         where_clause = f"WHERE {' AND '.join(closed_filters)}" if closed_filters else ""
 
         # closed_deals_lost tem schema completo com campos dimensionais e IA
-        query = f"""
-        SELECT
-            Oportunidade, Vendedor, Status, Conta,
-            Fiscal_Q,
-            Data_Fechamento, SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias,
-            Gross, Net, Tipo_Resultado, Causa_Raiz, Fatores_Sucesso, Atividades,
-            COALESCE(CAST(Evitavel AS STRING), '') as Evitavel,
-            COALESCE(Justificativa_IA, '') as Justificativa_IA,
-            COALESCE(Owner_Preventa, '') as Owner_Preventa,
-            COALESCE(CAST(Vertical_IA AS STRING), '') as Vertical_IA,
-            COALESCE(CAST(Sub_vertical_IA AS STRING), '') as Sub_vertical_IA,
-            COALESCE(CAST(Sub_sub_vertical_IA AS STRING), '') as Sub_sub_vertical_IA,
-            COALESCE(CAST(Portfolio AS STRING), '') as Portfolio,
-            COALESCE(CAST(Portfolio_FDM AS STRING), '') as Portfolio_FDM,
-            COALESCE(CAST(Segmento_consolidado AS STRING), '') as Segmento_consolidado,
-            COALESCE(CAST(Subsegmento_de_mercado AS STRING), '') as Subsegmento_de_mercado,
-            COALESCE(CAST(Cidade_de_cobranca AS STRING), '') as Cidade_de_cobranca,
-            COALESCE(CAST(Estado_Provincia_de_cobranca AS STRING), CAST(EstadoProvincia_de_cobranca AS STRING), '') as Estado_Provincia_de_cobranca,
-            COALESCE(CAST(Status AS STRING), '') as Fase_Atual,
-            COALESCE(CAST(Tipo_Oportunidade AS STRING), '') as Tipo_Oportunidade,
-            COALESCE(CAST(Processo AS STRING), '') as Processo
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-        {where_clause}
-        ORDER BY Gross DESC
-        LIMIT {limit}
-        """
+        query = _CLOSED_LOST_LIST_SQL.render(where=where_clause, limit=limit)
         result = query_to_dict(query)
         set_cached_response(cache_key, result)
         return result
@@ -2406,7 +3206,7 @@ def get_priorities(
         if cached is not None:
             return cached
     try:
-        pipeline_date_expr = build_flexible_date_expr("Data_Prevista")
+        pipeline_date_expr = build_flexible_date_expr("Data_Prevista", "pipeline")
         filters = ["SAFE_CAST(Confianca AS FLOAT64) >= 50"]
         if year:
             if quarter:
@@ -2467,93 +3267,95 @@ def get_priorities(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Priorities error: {str(e)}")
 
-@app.get("/api/analyze-patterns")
-def analyze_patterns(year: Optional[int] = None, quarter: Optional[int] = None, month: Optional[int] = None, seller: Optional[str] = None):
+ANALYZE_PATTERNS_MODEL = 'gemini-2.5-flash-preview-09-2025'
+
+
+def _analyze_patterns_fallback(status: str) -> Dict[str, Any]:
+    return {
+        "win_insights": "Análise temporariamente indisponível.",
+        "loss_insights": "Análise temporariamente indisponível.",
+        "recommendations": [
+            "Focar em qualificação MEDDIC rigorosa",
+            "Engajar champions cedo no ciclo",
+            "Criar cadência de follow-up estruturada",
+        ],
+        "status": status,
+    }
+
+
+def _build_analyze_patterns_prompt(
+    year: Optional[int], quarter: Optional[int], month: Optional[int], seller: Optional[str]
+) -> Tuple[str, Dict[str, int]]:
+    """Prompt de /api/analyze-patterns + quantidade de deals analisados."""
+    client = bigquery.Client(project=PROJECT_ID)
+    
+    # Filtros
+    filters = []
+    closed_date_expr = build_flexible_date_expr("Data_Fechamento", ("closed_deals_won", "closed_deals_lost"))
+    if year:
+        filters.append(f"EXTRACT(YEAR FROM {closed_date_expr}) = {year}")
+    if quarter:
+        quarter_months = {
+            1: (1, 3),
+            2: (4, 6),
+            3: (7, 9),
+            4: (10, 12)
+        }
+        if quarter in quarter_months:
+            start_month, end_month = quarter_months[quarter]
+            filters.append(f"EXTRACT(MONTH FROM {closed_date_expr}) BETWEEN {start_month} AND {end_month}")
+    elif month:
+        filters.append(f"EXTRACT(MONTH FROM {closed_date_expr}) = {month}")
+    if seller:
+        seller_filter = build_seller_filter(seller)
+        if seller_filter:
+            filters.append(seller_filter)
+    
+    where_clause = " AND " + " AND ".join(filters) if filters else ""
+    
+    # Buscar deals ganhos
+    won_query = f"""
+    SELECT 
+        Oportunidade, Vendedor, Tipo_Resultado, Fatores_Sucesso,
+        SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias
+    FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
+    WHERE Fatores_Sucesso IS NOT NULL{where_clause}
+    LIMIT 100
     """
-    Análise avançada de padrões de vitória e perda usando Gemini API
+    won_deals = list(client.query(won_query, job_config=job_config_for(won_query)).result())
+    
+    # Buscar deals perdidos
+    lost_query = f"""
+    SELECT 
+        Oportunidade, Vendedor, Tipo_Resultado, Causa_Raiz,
+        SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias
+    FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
+    WHERE Causa_Raiz IS NOT NULL{where_clause}
+    LIMIT 100
     """
-    try:
-        if not GEMINI_API_KEY:
-            return {
-                "win_insights": "Análise temporariamente indisponível.",
-                "loss_insights": "Análise temporariamente indisponível.",
-                "recommendations": [
-                    "Focar em qualificação MEDDIC rigorosa",
-                    "Engajar champions cedo no ciclo",
-                    "Criar cadência de follow-up estruturada",
-                ],
-                "status": "disabled",
-            }
-
-        client = bigquery.Client(project=PROJECT_ID)
-        
-        # Filtros
-        filters = []
-        closed_date_expr = build_flexible_date_expr("Data_Fechamento")
-        if year:
-            filters.append(f"EXTRACT(YEAR FROM {closed_date_expr}) = {year}")
-        if quarter:
-            quarter_months = {
-                1: (1, 3),
-                2: (4, 6),
-                3: (7, 9),
-                4: (10, 12)
-            }
-            if quarter in quarter_months:
-                start_month, end_month = quarter_months[quarter]
-                filters.append(f"EXTRACT(MONTH FROM {closed_date_expr}) BETWEEN {start_month} AND {end_month}")
-        elif month:
-            filters.append(f"EXTRACT(MONTH FROM {closed_date_expr}) = {month}")
-        if seller:
-            seller_filter = build_seller_filter(seller)
-            if seller_filter:
-                filters.append(seller_filter)
-        
-        where_clause = " AND " + " AND ".join(filters) if filters else ""
-        
-        # Buscar deals ganhos
-        won_query = f"""
-        SELECT 
-            Oportunidade, Vendedor, Tipo_Resultado, Fatores_Sucesso,
-            SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
-        WHERE Fatores_Sucesso IS NOT NULL{where_clause}
-        LIMIT 100
-        """
-        won_deals = list(client.query(won_query).result())
-        
-        # Buscar deals perdidos
-        lost_query = f"""
-        SELECT 
-            Oportunidade, Vendedor, Tipo_Resultado, Causa_Raiz,
-            SAFE_CAST(Ciclo_dias AS FLOAT64) as Ciclo_dias
-        FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-        WHERE Causa_Raiz IS NOT NULL{where_clause}
-        LIMIT 100
-        """
-        lost_deals = list(client.query(lost_query).result())
-        
-        # Preparar dados para análise
-        won_summary = []
-        for deal in won_deals[:20]:  # Limitar para evitar context overflow
-            won_summary.append({
-                "oportunidade": deal.Oportunidade or "N/A",
-                "tipo": deal.Tipo_Resultado or "N/A",
-                "fatores": deal.Fatores_Sucesso[:200] if deal.Fatores_Sucesso else "N/A",
-                "ciclo_dias": deal.Ciclo_dias or 0
-            })
-        
-        lost_summary = []
-        for deal in lost_deals[:20]:  # Limitar para evitar context overflow
-            lost_summary.append({
-                "oportunidade": deal.Oportunidade or "N/A",
-                "tipo": deal.Tipo_Resultado or "N/A",
-                "causa": deal.Causa_Raiz[:200] if deal.Causa_Raiz else "N/A",
-                "ciclo_dias": deal.Ciclo_dias or 0
-            })
-        
-        # Preparar prompt para Gemini
-        prompt = f"""
+    lost_deals = list(client.query(lost_query, job_config=job_config_for(lost_query)).result())
+    
+    # Preparar dados para análise
+    won_summary = []
+    for deal in won_deals[:20]:  # Limitar para evitar context overflow
+        won_summary.append({
+            "oportunidade": deal.Oportunidade or "N/A",
+            "tipo": deal.Tipo_Resultado or "N/A",
+            "fatores": deal.Fatores_Sucesso[:200] if deal.Fatores_Sucesso else "N/A",
+            "ciclo_dias": deal.Ciclo_dias or 0
+        })
+    
+    lost_summary = []
+    for deal in lost_deals[:20]:  # Limitar para evitar context overflow
+        lost_summary.append({
+            "oportunidade": deal.Oportunidade or "N/A",
+            "tipo": deal.Tipo_Resultado or "N/A",
+            "causa": deal.Causa_Raiz[:200] if deal.Causa_Raiz else "N/A",
+            "ciclo_dias": deal.Ciclo_dias or 0
+        })
+    
+    # Preparar prompt para Gemini
+    prompt = f"""
 Você é um especialista em análise de vendas B2B. Analise os dados de vendas abaixo e forneça insights acionáveis.
 
 **DADOS DE VITÓRIAS ({len(won_deals)} deals):**
@@ -2583,49 +3385,98 @@ Você é um especialista em análise de vendas B2B. Analise os dados de vendas a
   ]
 }}
 
-Responda APENAS com o JSON, sem markdown ou texto adicional.
-"""
-        
-        # Chamar Gemini API (usando modelo especificado pelo usuário)
-        model = genai.GenerativeModel('gemini-2.5-flash-preview-09-2025')  # type: ignore[attr-defined]
-        response = model.generate_content(prompt)
-        
-        # Parse response
-        import json
-        try:
-            # Remove markdown code blocks se existirem
-            response_text = response.text.strip()
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-            response_text = response_text.strip()
-            
-            analysis = json.loads(response_text)
-            analysis["status"] = "gemini"
-            analysis["deals_analyzed"] = {"won": len(won_deals), "lost": len(lost_deals)}
-            return analysis
-        except json.JSONDecodeError:
-            # Fallback: retornar texto bruto estruturado
-            return {
-                "win_insights": extract_section(response.text, "win"),
-                "loss_insights": extract_section(response.text, "loss"),
-                "recommendations": extract_bullets(response.text),
-                "status": "gemini_text",
-                "deals_analyzed": {"won": len(won_deals), "lost": len(lost_deals)}
-            }
+Responda APENAS com o JSON, sem markdown ou texto adicional.
+"""
+    return prompt, {"won": len(won_deals), "lost": len(lost_deals)}
+
+
+def _parse_analyze_patterns_text(text: str, deals_analyzed: Dict[str, int]) -> Dict[str, Any]:
+    import json
+    try:
+        # Remove markdown code blocks se existirem
+        response_text = text.strip()
+        if response_text.startswith('```'):
+            response_text = response_text.split('```')[1]
+            if response_text.startswith('json'):
+                response_text = response_text[4:]
+        response_text = response_text.strip()
+
+        analysis = json.loads(response_text)
+        analysis["status"] = "gemini"
+        analysis["deals_analyzed"] = deals_analyzed
+        return analysis
+    except json.JSONDecodeError:
+        # Fallback: retornar texto bruto estruturado
+        return {
+            "win_insights": extract_section(text, "win"),
+            "loss_insights": extract_section(text, "loss"),
+            "recommendations": extract_bullets(text),
+            "status": "gemini_text",
+            "deals_analyzed": deals_analyzed,
+        }
+
+
+def _analyze_patterns_llm_kwargs() -> Dict[str, Any]:
+    return {
+        "prompt_version": ANALYZE_PATTERNS_PROMPT_VERSION,
+        "model_name": ANALYZE_PATTERNS_MODEL,
+        "api_key": GEMINI_API_KEY,
+        "project_id": PROJECT_ID,
+        "location": os.getenv("VERTEX_AI_LOCATION", "us-central1"),
+    }
+
+
+@app.get("/api/analyze-patterns")
+def analyze_patterns(year: Optional[int] = None, quarter: Optional[int] = None, month: Optional[int] = None, seller: Optional[str] = None):
+    """
+    Análise avançada de padrões de vitória e perda usando Gemini API
+    """
+    try:
+        if not GEMINI_API_KEY:
+            return _analyze_patterns_fallback("disabled")
+
+        prompt, deals_analyzed = _build_analyze_patterns_prompt(year, quarter, month, seller)
+
+        # Chamar Gemini (usando modelo especificado pelo usuário); mesmo prompt
+        # para os mesmos dados sai do store de respostas sem nova geração
+        llm_result = generate_cached_text(prompt, **_analyze_patterns_llm_kwargs())
+        if not llm_result.get("ok"):
+            raise RuntimeError(llm_result.get("error") or "LLM failed")
+        return _parse_analyze_patterns_text(llm_result["text"], deals_analyzed)
     except Exception as e:
         # Fallback em caso de erro
-        return {
-            "win_insights": "Análise temporariamente indisponível.",
-            "loss_insights": "Análise temporariamente indisponível.",
-            "recommendations": [
-                "Focar em qualificação MEDDIC rigorosa",
-                "Engajar champions cedo no ciclo",
-                "Criar cadência de follow-up estruturada"
-            ],
-            "status": "error",
-        }
+        return _analyze_patterns_fallback("error")
+
+
+@app.get("/api/analyze-patterns/stream")
+def analyze_patterns_stream(year: Optional[int] = None, quarter: Optional[int] = None, month: Optional[int] = None, seller: Optional[str] = None):
+    """
+    Versão Server-Sent Events de /api/analyze-patterns. Eventos: `deals`
+    (quantidade analisada), `token` (texto do Gemini conforme é gerado) e
+    `done` (mesmo payload de /api/analyze-patterns).
+    """
+    def events():
+        if not GEMINI_API_KEY:
+            yield sse_event("done", _analyze_patterns_fallback("disabled"))
+            return
+        try:
+            prompt, deals_analyzed = _build_analyze_patterns_prompt(year, quarter, month, seller)
+            yield sse_event("deals", {"deals_analyzed": deals_analyzed})
+
+            llm_result: Dict[str, Any] = {}
+            for event in stream_cached_text(prompt, **_analyze_patterns_llm_kwargs()):
+                if event.get("type") == "token":
+                    yield sse_event("token", {"text": event.get("text", "")})
+                else:
+                    llm_result = event
+            if not llm_result.get("ok"):
+                raise RuntimeError(llm_result.get("error") or "LLM failed")
+            yield sse_event("done", _parse_analyze_patterns_text(llm_result["text"], deals_analyzed))
+        except Exception as e:
+            print(f"[ANALYZE PATTERNS] WARN: stream failed: {str(e)}")
+            yield sse_event("done", _analyze_patterns_fallback("error"))
+
+    return sse_response(events())
 
 def format_deals_for_gemini(deals_list: List[Dict]) -> str:
     """Formata lista de deals para o prompt do Gemini"""
@@ -2670,134 +3521,44 @@ def extract_bullets(text: str) -> List[str]:
 # DASHBOARD ENDPOINT
 # =============================================
 
-@app.get("/api/dashboard")
-def get_dashboard(
-    year: Optional[int] = None,
-    quarter: Optional[int] = None,
-    month: Optional[int] = None,
-    seller: Optional[str] = None,
-    nocache: bool = False
-):
-    """
-    Dashboard completo com filtros dinâmicos
-    - year: 2024, 2025, 2026... (optional)
-    - quarter: 1-4 (Q1=jan-mar, Q2=abr-jun, Q3=jul-set, Q4=out-dez) (optional)
-    - month: 1-12 (optional) - se quarter estiver definido, month será ignorado
-    - seller: nome do vendedor (optional)
-    """
-    cache_key = build_cache_key(
-        "/api/dashboard",
-        {"year": year, "quarter": quarter, "month": month, "seller": seller}
-    )
-    if not nocache:
-        cached = get_cached_response(cache_key)
-        if cached is not None:
-            return cached
-    try:
-        # Build filter clauses
-        pipeline_filters = []
-        closed_filters = []
-        specialist_filters = []
-        pipeline_date_expr = build_flexible_date_expr("Data_Prevista")
-        closed_date_expr = build_flexible_date_expr("Data_Fechamento")
-        
-        if year:
-            pipeline_filters.append(f"EXTRACT(YEAR FROM {pipeline_date_expr}) = {year}")
-            closed_filters.append(f"EXTRACT(YEAR FROM {closed_date_expr}) = {year}")
-            specialist_filters.append(f"EXTRACT(YEAR FROM closed_date) = {year}")
-        
-        # Quarter tem prioridade sobre month
-        if quarter:
-            # Converter quarter para range de meses: Q1=1-3, Q2=4-6, Q3=7-9, Q4=10-12
-            quarter_months = {
-                1: (1, 3),   # Q1: Jan-Mar
-                2: (4, 6),   # Q2: Abr-Jun
-                3: (7, 9),   # Q3: Jul-Set
-                4: (10, 12)  # Q4: Out-Dez
-            }
-            if quarter in quarter_months:
-                start_month, end_month = quarter_months[quarter]
-                pipeline_filters.append(f"EXTRACT(MONTH FROM {pipeline_date_expr}) BETWEEN {start_month} AND {end_month}")
-                closed_filters.append(f"EXTRACT(MONTH FROM {closed_date_expr}) BETWEEN {start_month} AND {end_month}")
-                specialist_filters.append(f"EXTRACT(MONTH FROM closed_date) BETWEEN {start_month} AND {end_month}")
-        elif month:
-            # Se quarter não definido, usar month
-            pipeline_filters.append(f"EXTRACT(MONTH FROM {pipeline_date_expr}) = {month}")
-            closed_filters.append(f"EXTRACT(MONTH FROM {closed_date_expr}) = {month}")
-            specialist_filters.append(f"EXTRACT(MONTH FROM closed_date) = {month}")
-        
-        if seller:
-            seller_filter_pipeline = build_seller_filter(seller, "Vendedor")
-            seller_filter_closed = build_seller_filter(seller, "Vendedor")
-            seller_filter_specialist = build_seller_filter(seller, "vendedor")
-            
-            if seller_filter_pipeline:
-                pipeline_filters.append(seller_filter_pipeline)
-            if seller_filter_closed:
-                closed_filters.append(seller_filter_closed)
-            if seller_filter_specialist:
-                # Need to handle LOWER() case for specialist
-                sellers = [s.strip() for s in seller.split(',')]
-                if len(sellers) == 1:
-                    specialist_filters.append(f"LOWER(vendedor) = LOWER('{sellers[0]}')")
-                else:
-                    sellers_quoted = "', '".join(sellers)
-                    specialist_filters.append(f"LOWER(vendedor) IN ({', '.join(['LOWER(' + chr(39) + s + chr(39) + ')' for s in sellers])})")
-        
-        pipeline_where = "WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost') AND Data_Prevista IS NOT NULL"
-        if pipeline_filters:
-            pipeline_where += " AND " + " AND ".join(pipeline_filters)
-        
-        closed_where = "WHERE Data_Fechamento IS NOT NULL"
-        if closed_filters:
-            closed_where += " AND " + " AND ".join(closed_filters)
-        
-        specialist_where = "WHERE closed_date IS NOT NULL"
-        if specialist_filters:
-            specialist_where += " AND " + " AND ".join(specialist_filters)
-        
-        # ========== PIPELINE METRICS ==========
-        
+# /api/dashboard SQL; slots: the WHERE clause of each table and the flexible
+# Data_Prevista expression (depends on the column type)
+_DASHBOARD_SQL = {
+    name: register_query_template(f"dashboard.{name}", sql)
+    for name, sql in {
         # Total Pipeline (sem filtros)
-        pipeline_all = query_to_dict(f"""
+        "pipeline_all": f"""
         SELECT 
           COUNT(*) as deals_count,
           ROUND(SUM(Gross), 2) as gross,
           ROUND(SUM(Net), 2) as net
         FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
         WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost')
-        """)[0]
-        
+        """,
         # Pipeline 2026
-        pipeline_date_expr_for_agg = build_flexible_date_expr("Data_Prevista")
-        pipeline_2026 = query_to_dict(f"""
+        "pipeline_2026": f"""
         SELECT 
           COUNT(*) as deals_count,
           ROUND(SUM(Gross), 2) as gross,
           ROUND(SUM(Net), 2) as net
         FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
                 WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost')
-                    AND EXTRACT(YEAR FROM {pipeline_date_expr_for_agg}) = 2026
-        """)[0]
-        
+                    AND EXTRACT(YEAR FROM {{date_expr}}) = 2026
+        """,
         # Pipeline Filtrado
-        pipeline_filtered_result = query_to_dict(f"""
+        "pipeline_filtered": f"""
         SELECT 
           COUNT(*) as deals_count,
           ROUND(SUM(Gross), 2) as gross,
           ROUND(SUM(Net), 2) as net
         FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
-        {pipeline_where}
-        """)
-        pipeline_filtered = pipeline_filtered_result[0] if pipeline_filtered_result else {
-            'deals_count': 0, 'gross': 0, 'net': 0
-        }
-        
+        {{where}}
+        """,
         # Pipeline por Mês
-        pipeline_by_month = query_to_dict(f"""
+        "pipeline_by_month": f"""
         SELECT 
-                    EXTRACT(YEAR FROM {pipeline_date_expr_for_agg}) as year,
-                    EXTRACT(MONTH FROM {pipeline_date_expr_for_agg}) as month,
+                    EXTRACT(YEAR FROM {{date_expr}}) as year,
+                    EXTRACT(MONTH FROM {{date_expr}}) as month,
           COUNT(*) as deals_count,
           ROUND(SUM(Gross), 2) as gross,
           ROUND(SUM(Net), 2) as net
@@ -2805,10 +3566,9 @@ def get_dashboard(
         WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost') AND Data_Prevista IS NOT NULL
         GROUP BY year, month
         ORDER BY year, month
-        """)
-        
+        """,
         # Pipeline por Forecast Category
-        pipeline_by_forecast = query_to_dict(f"""
+        "pipeline_by_forecast": f"""
         SELECT 
           Forecast_SF as category,
           COUNT(*) as count,
@@ -2823,10 +3583,9 @@ def get_dashboard(
           WHEN 'PIPELINE' THEN 3
           ELSE 4
         END
-        """)
-        
+        """,
         # Pipeline por Vendedor
-        pipeline_by_seller = query_to_dict(f"""
+        "pipeline_by_seller": f"""
         SELECT 
           Vendedor as seller,
           COUNT(*) as deals_count,
@@ -2837,10 +3596,9 @@ def get_dashboard(
         WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost') AND Vendedor IS NOT NULL
         GROUP BY Vendedor
         ORDER BY gross DESC
-        """)
-        
+        """,
         # High Confidence Deals
-        high_confidence_result = query_to_dict(f"""
+        "high_confidence": f"""
         SELECT 
           COUNT(*) as deals_count,
           ROUND(SUM(Gross), 2) as gross,
@@ -2849,26 +3607,16 @@ def get_dashboard(
         FROM `{PROJECT_ID}.{DATASET_ID}.pipeline`
         WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost') 
           AND SAFE_CAST(Confianca AS FLOAT64) >= 50
-        """)
-        high_confidence = high_confidence_result[0] if high_confidence_result else {
-            'deals_count': 0, 'gross': 0, 'net': 0, 'avg_confidence': 0
-        }
-        
-        # ========== SALES SPECIALIST ==========
-        
-        sales_specialist_total_result = query_to_dict(f"""
+        """,
+        "sales_specialist_total": f"""
         SELECT 
           COUNT(*) as deals_count,
           ROUND(SUM(booking_total_gross), 2) as gross,
           ROUND(SUM(booking_total_net), 2) as net
         FROM `{PROJECT_ID}.{DATASET_ID}.sales_specialist`
-        {specialist_where}
-        """)
-        sales_specialist_total = sales_specialist_total_result[0] if sales_specialist_total_result else {
-            'deals_count': 0, 'gross': 0, 'net': 0
-        }
-        
-        sales_specialist_data = query_to_dict(f"""
+        {{where}}
+        """,
+        "sales_specialist_data": f"""
         SELECT 
           EXTRACT(YEAR FROM closed_date) as year,
           EXTRACT(MONTH FROM closed_date) as month,
@@ -2877,53 +3625,39 @@ def get_dashboard(
           ROUND(SUM(booking_total_gross), 2) as gross,
           ROUND(SUM(booking_total_net), 2) as net
         FROM `{PROJECT_ID}.{DATASET_ID}.sales_specialist`
-        {specialist_where}
+        {{where}}
         GROUP BY year, month, forecast_status
         ORDER BY year, month
-        """)
-        
-        # ========== CLOSED DEALS ==========
-        
-        closed_won_result = query_to_dict(f"""
+        """,
+        "closed_won": f"""
         SELECT 
           COUNT(*)  as deals_count,
           ROUND(SUM(Gross), 2) as gross,
           ROUND(SUM(Net), 2) as net,
           ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) as avg_cycle_days
         FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
-        {closed_where}
-        """)
-        closed_won_summary = closed_won_result[0] if closed_won_result else {
-            'deals_count': 0, 'gross': 0, 'net': 0, 'avg_cycle_days': 0
-        }
-        
-        closed_lost_result = query_to_dict(f"""
+        {{where}}
+        """,
+        "closed_lost": f"""
         SELECT 
           COUNT(*) as deals_count,
           ROUND(SUM(Gross), 2) as gross,
           ROUND(AVG(SAFE_CAST(Ciclo_dias AS FLOAT64)), 1) as avg_cycle_days
         FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-        {closed_where}
-        """)
-        closed_lost_summary = closed_lost_result[0] if closed_lost_result else {
-            'deals_count': 0, 'gross': 0, 'avg_cycle_days': 0
-        }
-        
-        total_closed = closed_won_summary["deals_count"] + closed_lost_summary["deals_count"]
-        win_rate = round((closed_won_summary["deals_count"] / total_closed * 100), 1) if total_closed > 0 else 0
-        
+        {{where}}
+        """,
         # Win Rate por Vendedor
-        win_rate_by_seller = query_to_dict(f"""
+        "win_rate_by_seller": f"""
         WITH won AS (
           SELECT Vendedor, COUNT(*) as won_count
           FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`
-          {closed_where}
+          {{where}}
           GROUP BY Vendedor
         ),
         lost AS (
           SELECT Vendedor, COUNT(*) as lost_count
           FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-          {closed_where}
+          {{where}}
           GROUP BY Vendedor
         )
         SELECT 
@@ -2934,54 +3668,207 @@ def get_dashboard(
         FROM won w
         FULL OUTER JOIN lost l ON w.Vendedor = l.Vendedor
         ORDER BY win_rate DESC
-        """)
-        
+        """,
         # Loss Reasons
-        loss_reasons = query_to_dict(f"""
+        "loss_reasons": f"""
         SELECT 
           Causa_Raiz as reason,
           COUNT(*) as count,
           ROUND(SUM(Gross), 2) as total_gross
         FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`
-        {closed_where} AND Causa_Raiz IS NOT NULL
+        {{where}} AND Causa_Raiz IS NOT NULL
         GROUP BY Causa_Raiz
         ORDER BY count DESC
         LIMIT 10
-        """)
-        
-        # ========== WORD CLOUDS ==========
-        
-        win_types = query_to_dict(f"""
+        """,
+        "win_types": f"""
         SELECT TRIM(word) as text, COUNT(*) as value
         FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`,
         UNNEST(SPLIT(Tipo_Resultado, ',')) as word
-        {closed_where} AND Tipo_Resultado IS NOT NULL AND TRIM(word) != ''
+        {{where}} AND Tipo_Resultado IS NOT NULL AND TRIM(word) != ''
         GROUP BY text ORDER BY value DESC LIMIT 20
-        """)
-        
-        win_labels = query_to_dict(f"""
+        """,
+        "win_labels": f"""
         SELECT TRIM(word) as text, COUNT(*) as value
         FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_won`,
         UNNEST(SPLIT(Fatores_Sucesso, ',')) as word
-        {closed_where} AND Fatores_Sucesso IS NOT NULL AND TRIM(word) != ''
+        {{where}} AND Fatores_Sucesso IS NOT NULL AND TRIM(word) != ''
         GROUP BY text ORDER BY value DESC LIMIT 20
-        """)
-        
-        loss_types = query_to_dict(f"""
+        """,
+        "loss_types": f"""
         SELECT TRIM(word) as text, COUNT(*) as value
         FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`,
         UNNEST(SPLIT(Tipo_Resultado, ',')) as word
-        {closed_where} AND Tipo_Resultado IS NOT NULL AND TRIM(word) != ''
+        {{where}} AND Tipo_Resultado IS NOT NULL AND TRIM(word) != ''
         GROUP BY text ORDER BY value DESC LIMIT 20
-        """)
-        
-        loss_labels = query_to_dict(f"""
+        """,
+        "loss_labels": f"""
         SELECT TRIM(word) as text, COUNT(*) as value
         FROM `{PROJECT_ID}.{DATASET_ID}.closed_deals_lost`,
         UNNEST(SPLIT(Causa_Raiz, ',')) as word
-        {closed_where} AND Causa_Raiz IS NOT NULL AND TRIM(word) != ''
+        {{where}} AND Causa_Raiz IS NOT NULL AND TRIM(word) != ''
         GROUP BY text ORDER BY value DESC LIMIT 20
-        """)
+        """,
+    }.items()
+}
+
+
+@app.get("/api/dashboard")
+@coalesce_requests("/api/dashboard")
+def get_dashboard(
+    year: Optional[int] = None,
+    quarter: Optional[int] = None,
+    month: Optional[int] = None,
+    seller: Optional[str] = None,
+    nocache: bool = False
+):
+    """
+    Dashboard completo com filtros dinâmicos
+    - year: 2024, 2025, 2026... (optional)
+    - quarter: 1-4 (Q1=jan-mar, Q2=abr-jun, Q3=jul-set, Q4=out-dez) (optional)
+    - month: 1-12 (optional) - se quarter estiver definido, month será ignorado
+    - seller: nome do vendedor (optional)
+    """
+    cache_key = build_cache_key(
+        "/api/dashboard",
+        {"year": year, "quarter": quarter, "month": month, "seller": seller}
+    )
+    if not nocache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+    try:
+        # Build filter clauses
+        pipeline_filters = []
+        closed_filters = []
+        specialist_filters = []
+        pipeline_date_expr = build_flexible_date_expr("Data_Prevista", "pipeline")
+        closed_date_expr = build_flexible_date_expr("Data_Fechamento", ("closed_deals_won", "closed_deals_lost"))
+        
+        # Quarter tem prioridade sobre month (Q1=1-3, Q2=4-6, Q3=7-9, Q4=10-12).
+        # Coluna sem parsing = DATE particionada: o período vira um range prunável
+        pipeline_filters.extend(
+            build_period_filters(pipeline_date_expr, year, quarter, month, prunable=pipeline_date_expr == "Data_Prevista")
+        )
+        closed_filters.extend(
+            build_period_filters(closed_date_expr, year, quarter, month, prunable=closed_date_expr == "Data_Fechamento")
+        )
+        specialist_filters.extend(build_period_filters("closed_date", year, quarter, month))
+        
+        if seller:
+            seller_filter_pipeline = build_seller_filter(seller, "Vendedor")
+            seller_filter_closed = build_seller_filter(seller, "Vendedor")
+            seller_filter_specialist = build_seller_filter(seller, "vendedor")
+            
+            if seller_filter_pipeline:
+                pipeline_filters.append(seller_filter_pipeline)
+            if seller_filter_closed:
+                closed_filters.append(seller_filter_closed)
+            if seller_filter_specialist:
+                # Need to handle LOWER() case for specialist
+                sellers = [s.strip().lower() for s in seller.split(',')]
+                specialist_filters.append(in_filter("LOWER(vendedor)", sellers, hint="seller"))
+        
+        pipeline_where = "WHERE Fase_Atual NOT IN ('Closed Won', 'Closed Lost') AND Data_Prevista IS NOT NULL"
+        if pipeline_filters:
+            pipeline_where += " AND " + " AND ".join(pipeline_filters)
+        
+        closed_where = "WHERE Data_Fechamento IS NOT NULL"
+        if closed_filters:
+            closed_where += " AND " + " AND ".join(closed_filters)
+        
+        specialist_where = "WHERE closed_date IS NOT NULL"
+        if specialist_filters:
+            specialist_where += " AND " + " AND ".join(specialist_filters)
+        
+        # Todas as consultas do dashboard são independentes: executadas em paralelo
+        pipeline_date_expr_for_agg = build_flexible_date_expr("Data_Prevista", "pipeline")
+        dashboard_fragments = {
+            "pipeline_all": {},
+            "pipeline_2026": {"date_expr": pipeline_date_expr_for_agg},
+            "pipeline_filtered": {"where": pipeline_where},
+            "pipeline_by_month": {"date_expr": pipeline_date_expr_for_agg},
+            "pipeline_by_forecast": {},
+            "pipeline_by_seller": {},
+            "high_confidence": {},
+            "sales_specialist_total": {"where": specialist_where},
+            "sales_specialist_data": {"where": specialist_where},
+            "closed_won": {"where": closed_where},
+            "closed_lost": {"where": closed_where},
+            "win_rate_by_seller": {"where": closed_where},
+            "loss_reasons": {"where": closed_where},
+            "win_types": {"where": closed_where},
+            "win_labels": {"where": closed_where},
+            "loss_types": {"where": closed_where},
+            "loss_labels": {"where": closed_where},
+        }
+        # Additive blocks are answered by the rollup cube; the rest (word
+        # clouds, loss reasons, sales specialist) still runs on BigQuery
+        rollup = get_sales_rollup(nocache)
+        cube_results = rollup.dashboard_blocks(
+            year=year,
+            quarter=quarter,
+            month=month,
+            sellers=[s.strip() for s in seller.split(',')] if seller else None,
+        ) if rollup is not None else {}
+        dashboard_results = query_batch_to_dict({
+            name: _DASHBOARD_SQL[name].render(**fragments)
+            for name, fragments in dashboard_fragments.items()
+            if name not in cube_results
+        })
+        dashboard_results.update(cube_results)
+
+        # ========== PIPELINE METRICS ==========
+
+        pipeline_all = dashboard_results["pipeline_all"][0]
+        pipeline_2026 = dashboard_results["pipeline_2026"][0]
+
+        pipeline_filtered_result = dashboard_results["pipeline_filtered"]
+        pipeline_filtered = pipeline_filtered_result[0] if pipeline_filtered_result else {
+            'deals_count': 0, 'gross': 0, 'net': 0
+        }
+
+        pipeline_by_month = dashboard_results["pipeline_by_month"]
+        pipeline_by_forecast = dashboard_results["pipeline_by_forecast"]
+        pipeline_by_seller = dashboard_results["pipeline_by_seller"]
+
+        high_confidence_result = dashboard_results["high_confidence"]
+        high_confidence = high_confidence_result[0] if high_confidence_result else {
+            'deals_count': 0, 'gross': 0, 'net': 0, 'avg_confidence': 0
+        }
+
+        # ========== SALES SPECIALIST ==========
+
+        sales_specialist_total_result = dashboard_results["sales_specialist_total"]
+        sales_specialist_total = sales_specialist_total_result[0] if sales_specialist_total_result else {
+            'deals_count': 0, 'gross': 0, 'net': 0
+        }
+        sales_specialist_data = dashboard_results["sales_specialist_data"]
+
+        # ========== CLOSED DEALS ==========
+
+        closed_won_result = dashboard_results["closed_won"]
+        closed_won_summary = closed_won_result[0] if closed_won_result else {
+            'deals_count': 0, 'gross': 0, 'net': 0, 'avg_cycle_days': 0
+        }
+
+        closed_lost_result = dashboard_results["closed_lost"]
+        closed_lost_summary = closed_lost_result[0] if closed_lost_result else {
+            'deals_count': 0, 'gross': 0, 'avg_cycle_days': 0
+        }
+
+        total_closed = closed_won_summary["deals_count"] + closed_lost_summary["deals_count"]
+        win_rate = round((closed_won_summary["deals_count"] / total_closed * 100), 1) if total_closed > 0 else 0
+
+        win_rate_by_seller = dashboard_results["win_rate_by_seller"]
+        loss_reasons = dashboard_results["loss_reasons"]
+
+        # ========== WORD CLOUDS ==========
+
+        win_types = dashboard_results["win_types"]
+        win_labels = dashboard_results["win_labels"]
+        loss_types = dashboard_results["loss_types"]
+        loss_labels = dashboard_results["loss_labels"]
         
         # ========== AI ANALYSIS ==========
         
@@ -3101,6 +3988,7 @@ Deals perdidos: {lost_deals} (${lost_gross:,.0f})
 # =============================================
 
 @app.get("/api/revenue/quarter-summary")
+@coalesce_requests("/api/revenue/quarter-summary")
 def get_revenue_quarter_summary(
     fiscal_q: Optional[str] = None,
     year: Optional[str] = None,
@@ -3252,7 +4140,7 @@ def get_revenue_quarter_summary(
             "NOT REGEXP_CONTAINS(LOWER(CONCAT(COALESCE(cliente, ''), ' ', COALESCE(oportunidade, ''), ' ', COALESCE(cuenta_financeira, ''))), r'((c[eé]rtica|certica).*(mexic|colombi|chile)|(mexic|colombi|chile).*(c[eé]rtica|certica))')",
         ]
         if fiscal_q:
-            fqs = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs) == 1:
                 filters.append(f"fiscal_q_derivado = {fqs[0]}")
             elif len(fqs) > 1:
@@ -3267,9 +4155,9 @@ def get_revenue_quarter_summary(
             if 1 <= month_num <= 12:
                 filters.append(f"EXTRACT(MONTH FROM fecha_factura_date) = {month_num}")
         if date_start:
-            filters.append(f"fecha_factura_date >= DATE('{sql_literal(date_start)}')")
+            filters.append(f"fecha_factura_date >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            filters.append(f"fecha_factura_date <= DATE('{sql_literal(date_end)}')")
+            filters.append(f"fecha_factura_date <= DATE({bind_value(date_end, hint='date_end')})")
         if seller:
             f = build_in_filter("vendedor_canonico", seller)
             if f:
@@ -3292,17 +4180,7 @@ def get_revenue_quarter_summary(
             normalized_tokens = [status_aliases.get(token, token) for token in status_tokens]
             if normalized_tokens:
                 status_col_norm = "REPLACE(LOWER(TRIM(COALESCE(estado_pagamento_saneado, ''))), 'ñ', 'n')"
-                if len(normalized_tokens) == 1:
-                    filters.append(
-                        f"{status_col_norm} "
-                        f"= '{sql_literal(normalized_tokens[0])}'"
-                    )
-                else:
-                    status_values_sql = "', '".join(sql_literal(token) for token in normalized_tokens)
-                    filters.append(
-                        f"{status_col_norm} "
-                        f"IN ('{status_values_sql}')"
-                    )
+                filters.append(in_filter(status_col_norm, normalized_tokens, hint="estado_pagamento"))
         if produto:
             f = build_in_filter("COALESCE(NULLIF(TRIM(produto), ''), 'Produto não informado')", produto)
             if f:
@@ -3438,7 +4316,7 @@ def get_revenue_quarter_summary(
 
         meta_filters: List[str] = []
         if fiscal_q:
-            fqs = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs) == 1:
                 meta_filters.append(f"Periodo_Fiscal = {fqs[0]}")
             elif len(fqs) > 1:
@@ -3463,9 +4341,9 @@ def get_revenue_quarter_summary(
                 meta_filters.append(f"EXTRACT(MONTH FROM {parsed_meta_month_expr}) = {month_num}")
                 meta_month_num_applied = month_num
         if date_start:
-            meta_filters.append(f"{parsed_meta_month_expr} >= DATE('{sql_literal(date_start)}')")
+            meta_filters.append(f"{parsed_meta_month_expr} >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            meta_filters.append(f"{parsed_meta_month_expr} <= DATE('{sql_literal(date_end)}')")
+            meta_filters.append(f"{parsed_meta_month_expr} <= DATE({bind_value(date_end, hint='date_end')})")
         if seller:
             seller_bdm_filter = build_in_filter("BDM", seller)
             if seller_bdm_filter:
@@ -3840,7 +4718,7 @@ def get_revenue_quarter_summary_drilldown(
             "NOT REGEXP_CONTAINS(LOWER(CONCAT(COALESCE(cliente, ''), ' ', COALESCE(oportunidade, ''), ' ', COALESCE(cuenta_financeira, ''))), r'((c[eé]rtica|certica).*(mexic|colombi|chile)|(mexic|colombi|chile).*(c[eé]rtica|certica))')",
         ]
         if fiscal_q:
-            fqs = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs) == 1:
                 filters.append(f"fiscal_q_derivado = {fqs[0]}")
             elif len(fqs) > 1:
@@ -3855,9 +4733,9 @@ def get_revenue_quarter_summary_drilldown(
             if 1 <= month_num <= 12:
                 filters.append(f"EXTRACT(MONTH FROM fecha_factura_date) = {month_num}")
         if date_start:
-            filters.append(f"fecha_factura_date >= DATE('{sql_literal(date_start)}')")
+            filters.append(f"fecha_factura_date >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            filters.append(f"fecha_factura_date <= DATE('{sql_literal(date_end)}')")
+            filters.append(f"fecha_factura_date <= DATE({bind_value(date_end, hint='date_end')})")
         if seller:
             f = build_in_filter("vendedor_canonico", seller)
             if f:
@@ -3880,17 +4758,7 @@ def get_revenue_quarter_summary_drilldown(
             normalized_tokens = [status_aliases.get(token, token) for token in status_tokens]
             if normalized_tokens:
                 status_col_norm = "REPLACE(LOWER(TRIM(COALESCE(estado_pagamento_saneado, ''))), 'ñ', 'n')"
-                if len(normalized_tokens) == 1:
-                    filters.append(
-                        f"{status_col_norm} "
-                        f"= '{sql_literal(normalized_tokens[0])}'"
-                    )
-                else:
-                    status_values_sql = "', '".join(sql_literal(token) for token in normalized_tokens)
-                    filters.append(
-                        f"{status_col_norm} "
-                        f"IN ('{status_values_sql}')"
-                    )
+                filters.append(in_filter(status_col_norm, normalized_tokens, hint="estado_pagamento"))
         if produto:
             f = build_in_filter("COALESCE(NULLIF(TRIM(produto), ''), 'Produto não informado')", produto)
             if f:
@@ -3900,8 +4768,8 @@ def get_revenue_quarter_summary_drilldown(
             if f:
                 filters.append(f)
 
-        selected_seller = sql_literal(str(seller_name).strip())
-        filters.append(f"COALESCE(NULLIF(TRIM(vendedor_canonico), ''), 'Sem vendedor') = '{selected_seller}'")
+        selected_seller = bind_value(str(seller_name).strip(), hint="seller")
+        filters.append(f"COALESCE(NULLIF(TRIM(vendedor_canonico), ''), 'Sem vendedor') = {selected_seller}")
         where = "WHERE " + " AND ".join(filters)
 
         window_start_sql = f"DATE('{window_start.isoformat()}')" if window_start else "DATE('1900-01-01')"
@@ -4028,6 +4896,7 @@ def get_revenue_quarter_summary_drilldown(
         raise HTTPException(status_code=500, detail=f"Revenue quarter summary drilldown error: {str(e)}")
 
 @app.get("/api/revenue/weekly")
+@coalesce_requests("/api/revenue/weekly")
 def get_revenue_weekly(
     fiscal_q: Optional[str] = None,
     year: Optional[str] = None,
@@ -4101,7 +4970,7 @@ def get_revenue_weekly(
         # --- build WHERE clauses ---
         filters: List[str] = []
         if fiscal_q:
-            fqs = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs) == 1:
                 filters.append(f"fiscal_q_derivado = {fqs[0]}")
             else:
@@ -4116,9 +4985,9 @@ def get_revenue_weekly(
             if 1 <= month_num <= 12:
                 filters.append(f"EXTRACT(MONTH FROM fecha_factura_date) = {month_num}")
         if date_start:
-            filters.append(f"fecha_factura_date >= DATE('{sql_literal(date_start)}')")
+            filters.append(f"fecha_factura_date >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            filters.append(f"fecha_factura_date <= DATE('{sql_literal(date_end)}')")
+            filters.append(f"fecha_factura_date <= DATE({bind_value(date_end, hint='date_end')})")
         if seller:
             f = build_in_filter("vendedor_canonico", seller)
             if f:
@@ -4181,7 +5050,7 @@ def get_revenue_weekly(
         # attainment — filtra pelo mesmo fiscal_q se fornecido
         att_filters: List[str] = []
         if fiscal_q:
-            fqs_att = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs_att = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs_att) == 1:
                 att_filters.append(f"fiscal_q = {fqs_att[0]}")
             else:
@@ -4196,9 +5065,9 @@ def get_revenue_weekly(
             if 1 <= month_num <= 12:
                 att_filters.append(f"EXTRACT(MONTH FROM mes_inicio) = {month_num}")
         if date_start:
-            att_filters.append(f"mes_inicio >= DATE('{sql_literal(date_start)}')")
+            att_filters.append(f"mes_inicio >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            att_filters.append(f"mes_inicio <= DATE('{sql_literal(date_end)}')")
+            att_filters.append(f"mes_inicio <= DATE({bind_value(date_end, hint='date_end')})")
         att_where = ("WHERE " + " AND ".join(att_filters)) if att_filters else ""
 
         q_attainment = f"""
@@ -4348,18 +5217,32 @@ def get_revenue_weekly(
         ORDER BY net_revenue DESC
         """
 
-        totais_rows    = query_to_dict(q_totais)
-        attainment_row = query_to_dict(q_attainment)
-        semanal_rows   = query_to_dict(q_semanal)
-        mensal_rows    = query_to_dict(q_mensal)
-        produto_rows   = query_to_dict(q_produto)
-        portfolio_rows = query_to_dict(q_portfolio)
-        comercial_rows = query_to_dict(q_comercial)
-        familia_rows   = query_to_dict(q_familia)
-        segmento_rows  = query_to_dict(q_segmento)
-        tipo_opp_line_rows = query_to_dict(q_tipo_oportunidade_line)
-        quarter_rows   = query_to_dict(q_quarter)
-        squad_rows     = query_to_dict(q_squad)
+        weekly_results = query_batch_to_dict({
+            "totais": q_totais,
+            "attainment": q_attainment,
+            "semanal": q_semanal,
+            "mensal": q_mensal,
+            "produto": q_produto,
+            "portfolio": q_portfolio,
+            "comercial": q_comercial,
+            "familia": q_familia,
+            "segmento": q_segmento,
+            "tipo_oportunidade_line": q_tipo_oportunidade_line,
+            "quarter": q_quarter,
+            "squad": q_squad,
+        })
+        totais_rows    = weekly_results["totais"]
+        attainment_row = weekly_results["attainment"]
+        semanal_rows   = weekly_results["semanal"]
+        mensal_rows    = weekly_results["mensal"]
+        produto_rows   = weekly_results["produto"]
+        portfolio_rows = weekly_results["portfolio"]
+        comercial_rows = weekly_results["comercial"]
+        familia_rows   = weekly_results["familia"]
+        segmento_rows  = weekly_results["segmento"]
+        tipo_opp_line_rows = weekly_results["tipo_oportunidade_line"]
+        quarter_rows   = weekly_results["quarter"]
+        squad_rows     = weekly_results["squad"]
 
         totais    = totais_rows[0] if totais_rows else {}
         att       = attainment_row[0] if attainment_row else {}
@@ -4479,7 +5362,7 @@ def get_revenue_drilldown(
 
         filters: List[str] = []
         if fiscal_q:
-            fqs = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs) == 1:
                 filters.append(f"fiscal_q_derivado = {fqs[0]}")
             else:
@@ -4496,9 +5379,9 @@ def get_revenue_drilldown(
                 filters.append(f"EXTRACT(MONTH FROM fecha_factura_date) = {month_num}")
 
         if date_start:
-            filters.append(f"fecha_factura_date >= DATE('{sql_literal(date_start)}')")
+            filters.append(f"fecha_factura_date >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            filters.append(f"fecha_factura_date <= DATE('{sql_literal(date_end)}')")
+            filters.append(f"fecha_factura_date <= DATE({bind_value(date_end, hint='date_end')})")
 
         if seller:
             f = build_in_filter("vendedor_canonico", seller)
@@ -4526,27 +5409,27 @@ def get_revenue_drilldown(
                 filters.append(f)
 
         dim = (dimension or "").strip().lower()
-        val = sql_literal(value or "")
+        val = bind_value(value or "", hint="value")
         if dim == "all":
             pass
         elif dim == "semana":
-            filters.append(f"CAST(semana_inicio AS STRING) = '{val}'")
+            filters.append(f"CAST(semana_inicio AS STRING) = {val}")
         elif dim == "mes":
-            filters.append(f"CAST(mes_inicio AS STRING) = '{val}'")
+            filters.append(f"CAST(mes_inicio AS STRING) = {val}")
         elif dim == "produto":
-            filters.append(f"COALESCE(NULLIF(TRIM(produto), ''), 'Produto não informado') = '{val}'")
+            filters.append(f"COALESCE(NULLIF(TRIM(produto), ''), 'Produto não informado') = {val}")
         elif dim == "comercial":
-            filters.append(f"COALESCE(NULLIF(TRIM(comercial), ''), 'Não informado') = '{val}'")
+            filters.append(f"COALESCE(NULLIF(TRIM(comercial), ''), 'Não informado') = {val}")
         elif dim == "familia":
-            filters.append(f"COALESCE(NULLIF(TRIM(familia), ''), 'Não informado') = '{val}'")
+            filters.append(f"COALESCE(NULLIF(TRIM(familia), ''), 'Não informado') = {val}")
         elif dim == "quarter":
-            filters.append(f"COALESCE(NULLIF(TRIM(fiscal_q_derivado), ''), 'Não informado') = '{val}'")
+            filters.append(f"COALESCE(NULLIF(TRIM(fiscal_q_derivado), ''), 'Não informado') = {val}")
         elif dim == "cliente":
-            filters.append(f"COALESCE(NULLIF(TRIM(cliente), ''), 'Não Informado') = '{val}'")
+            filters.append(f"COALESCE(NULLIF(TRIM(cliente), ''), 'Não Informado') = {val}")
         elif dim == "segmento":
-            filters.append(f"COALESCE(NULLIF(TRIM(segmento), ''), 'Não informado') = '{val}'")
+            filters.append(f"COALESCE(NULLIF(TRIM(segmento), ''), 'Não informado') = {val}")
         elif dim == "tipo_oportunidade_line":
-            filters.append(f"{tipo_opp_expr} = '{val}'")
+            filters.append(f"{tipo_opp_expr} = {val}")
         else:
             raise HTTPException(status_code=400, detail="Dimension inválida para drilldown")
 
@@ -4649,7 +5532,7 @@ def get_attainment(
         mart = f"{PROJECT_ID}.{MART_L10_DATASET}"
         filters: List[str] = []
         if fiscal_q:
-            fqs = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs) == 1:
                 filters.append(f"fiscal_q = {fqs[0]}")
             else:
@@ -4664,9 +5547,9 @@ def get_attainment(
             if 1 <= month_num <= 12:
                 filters.append(f"EXTRACT(MONTH FROM mes_inicio) = {month_num}")
         if date_start:
-            filters.append(f"mes_inicio >= DATE('{sql_literal(date_start)}')")
+            filters.append(f"mes_inicio >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            filters.append(f"mes_inicio <= DATE('{sql_literal(date_end)}')")
+            filters.append(f"mes_inicio <= DATE({bind_value(date_end, hint='date_end')})")
         where = ("WHERE " + " AND ".join(filters)) if filters else ""
 
         q_meses = f"""
@@ -4787,7 +5670,7 @@ def get_revenue_top(
 
         filters: List[str] = ["fecha_factura_date IS NOT NULL"]
         if fiscal_q:
-            fqs = [f"'{sql_literal(q.strip())}'" for q in fiscal_q.split(",") if q.strip()]
+            fqs = [bind_value(q.strip(), hint="fiscal_q") for q in fiscal_q.split(",") if q.strip()]
             if len(fqs) == 1:
                 filters.append(f"fiscal_q_derivado = {fqs[0]}")
             else:
@@ -4802,9 +5685,9 @@ def get_revenue_top(
             if 1 <= month_num <= 12:
                 filters.append(f"EXTRACT(MONTH FROM fecha_factura_date) = {month_num}")
         if date_start:
-            filters.append(f"fecha_factura_date >= DATE('{sql_literal(date_start)}')")
+            filters.append(f"fecha_factura_date >= DATE({bind_value(date_start, hint='date_start')})")
         if date_end:
-            filters.append(f"fecha_factura_date <= DATE('{sql_literal(date_end)}')")
+            filters.append(f"fecha_factura_date <= DATE({bind_value(date_end, hint='date_end')})")
         if squad:
             f = build_in_filter("squad_canonico", squad)
             if f:
@@ -4878,7 +5761,7 @@ def get_revenue_top(
                 LIMIT {lim}
         """
 
-        rows = client.query(q).result()
+        rows = client.query(q, job_config=job_config_for(q)).result()
         items = [dict(row) for row in rows]
         result = {"items": items, "total_items": len(items), "mode": mode}
         set_cached_response(cache_key, result)
@@ -4975,9 +5858,9 @@ def v2_portal_bdmcs_kpi_faturamento(
 
     filters = []
     if fiscal_q:
-        filters.append(f"fiscal_q = '{sql_literal(fiscal_q)}'")
+        filters.append(f"fiscal_q = {bind_value(fiscal_q, hint='fiscal_q')}")
     if owner:
-        filters.append(f"owner_key = '{sql_literal(owner)}'")
+        filters.append(f"owner_key = {bind_value(owner, hint='owner')}")
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
 
     mart = f"{PROJECT_ID}.{MART_L10_DATASET}"
@@ -5014,9 +5897,9 @@ def v2_portal_bdmcs_fila_acoes(
 
     filters = []
     if owner:
-        filters.append(f"owner_key = '{sql_literal(owner)}'")
+        filters.append(f"owner_key = {bind_value(owner, hint='owner')}")
     if fiscal_q:
-        filters.append(f"Fiscal_Q = '{sql_literal(fiscal_q)}'")
+        filters.append(f"Fiscal_Q = {bind_value(fiscal_q, hint='fiscal_q')}")
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
     lim = max(1, min(int(limit or 100), 500))
     mart = f"{PROJECT_ID}.{MART_L10_DATASET}"
@@ -5050,13 +5933,13 @@ def v2_portal_bdmcs_handoff_status(
 
     filters = []
     if owner:
-        filters.append(f"owner_key = '{sql_literal(owner)}'")
+        filters.append(f"owner_key = {bind_value(owner, hint='owner')}")
     if fiscal_q:
-        fq = sql_literal(fiscal_q)
+        fq = bind_value(fiscal_q, hint="fiscal_q")
         filters.append(
             "CONCAT('FY', SUBSTR(CAST(EXTRACT(YEAR FROM SAFE_CAST(Data_Prevista AS DATE)) AS STRING), 3, 2), "
             "'-Q', CAST(EXTRACT(QUARTER FROM SAFE_CAST(Data_Prevista AS DATE)) AS STRING)) = "
-            f"'{fq}'"
+            f"{fq}"
         )
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
     lim = max(1, min(int(limit or 200), 1000))
@@ -5090,9 +5973,9 @@ def v2_portal_ss_kpi_net_gerado(
 
     filters = []
     if fiscal_q:
-        filters.append(f"fiscal_q = '{sql_literal(fiscal_q)}'")
+        filters.append(f"fiscal_q = {bind_value(fiscal_q, hint='fiscal_q')}")
     if ss:
-        filters.append(f"ss_key = '{sql_literal(ss)}'")
+        filters.append(f"ss_key = {bind_value(ss, hint='ss')}")
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
 
     mart = f"{PROJECT_ID}.{MART_L10_DATASET}"
@@ -5129,9 +6012,9 @@ def v2_portal_ss_fila_fechamento(
 
     filters = []
     if ss:
-        filters.append(f"ss_key = '{sql_literal(ss)}'")
+        filters.append(f"ss_key = {bind_value(ss, hint='ss')}")
     if fiscal_q:
-        filters.append(f"Fiscal_Q = '{sql_literal(fiscal_q)}'")
+        filters.append(f"Fiscal_Q = {bind_value(fiscal_q, hint='fiscal_q')}")
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
     lim = max(1, min(int(limit or 200), 1000))
 
@@ -5161,7 +6044,7 @@ def v2_portal_admin_governance_monitor(
 
     filters = []
     if fiscal_q:
-        filters.append(f"Fiscal_Q = '{sql_literal(fiscal_q)}'")
+        filters.append(f"Fiscal_Q = {bind_value(fiscal_q, hint='fiscal_q')}")
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
     lim = max(1, min(int(limit or 500), 2000))
     mart = f"{PROJECT_ID}.{MART_L10_DATASET}"
@@ -5186,7 +6069,7 @@ def v2_portal_admin_slippage_zumbis(
 
     filters = []
     if fiscal_q:
-        filters.append(f"Fiscal_Q = '{sql_literal(fiscal_q)}'")
+        filters.append(f"Fiscal_Q = {bind_value(fiscal_q, hint='fiscal_q')}")
     where = ("WHERE " + " AND ".join(filters)) if filters else ""
     mart = f"{PROJECT_ID}.{MART_L10_DATASET}"
     q = f"""
@@ -0,0 +1,324 @@
+"""Record / replay of BigQuery result sets for the endpoint benchmarks.
+
+RecordingClient wraps a real bigquery.Client and keeps every result set the
+app reads; ReplayClient serves them back as real bigquery Row objects, so
+endpoint code runs unchanged with no network and no credentials.
+
+Queries are matched on whitespace-normalized SQL + query parameters. SQL
+that embeds the current date (default quarter, "this week") changes between
+recording and replay, so a miss falls back to the query shape (literals
+stripped, api.query_profiler.fingerprint_sql). Anything still unmatched
+returns an empty result and is counted in stats()["misses"].
+
+Fixtures are gzipped JSON; DATE / DATETIME / TIMESTAMP / NUMERIC / BYTES
+values are tagged so they come back with their Python types.
+"""
+import base64
+import datetime
+import decimal
+import gzip
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.cloud import bigquery
+from google.cloud.bigquery.table import Row
+
+from api.query_profiler import fingerprint_sql
+
+FIXTURE_FORMAT = 1
+_SPACE_RE = re.compile(r"\s+")
+_JOB_ATTRS = ("total_bytes_processed", "total_bytes_billed", "cache_hit", "slot_millis")
+
+
+# ── Values ────────────────────────────────────────────────────────────────────
+
+def encode_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return {"$t": "datetime", "v": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$t": "date", "v": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$t": "time", "v": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"$t": "decimal", "v": str(value)}
+    if isinstance(value, bytes):
+        return {"$t": "bytes", "v": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, dict):
+        return {str(k): encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    return value
+
+
+def decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        kind = value.get("$t")
+        if kind == "datetime":
+            return datetime.datetime.fromisoformat(value["v"])
+        if kind == "date":
+            return datetime.date.fromisoformat(value["v"])
+        if kind == "time":
+            return datetime.time.fromisoformat(value["v"])
+        if kind == "decimal":
+            return decimal.Decimal(value["v"])
+        if kind == "bytes":
+            return base64.b64decode(value["v"])
+        return {k: decode_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    return value
+
+
+# ── Keys ──────────────────────────────────────────────────────────────────────
+
+def _query_parameters(job_config: Any) -> List[Any]:
+    params = getattr(job_config, "query_parameters", None) or []
+    return [p.to_api_repr() if hasattr(p, "to_api_repr") else repr(p) for p in params]
+
+
+def query_key(sql: str, job_config: Any = None) -> str:
+    normalized = _SPACE_RE.sub(" ", sql or "").strip()
+    payload = json.dumps([normalized, _query_parameters(job_config)], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(str(prompt or "").encode("utf-8")).hexdigest()
+
+
+def table_key(table: Any) -> str:
+    # TableReference / Table str() is project.dataset.table; strings may use ':'
+    return str(getattr(table, "reference", table)).replace(":", ".").strip("`")
+
+
+# ── Fixture files ─────────────────────────────────────────────────────────────
+
+def read_fixture(path: str) -> Dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def write_fixture(path: str, fixture: Dict[str, Any]) -> None:
+    with gzip.open(path, "wt", encoding="utf-8") as handle:
+        json.dump(fixture, handle, ensure_ascii=False, separators=(",", ":"))
+
+
+class FixtureStore:
+    """Recorded queries, table schemas and LLM answers from any number of fixtures."""
+
+    def __init__(self, fixtures: Iterable[Dict[str, Any]] = ()) -> None:
+        self._exact: Dict[str, Dict[str, Any]] = {}
+        self._shape: Dict[str, Dict[str, Any]] = {}
+        self.tables: Dict[str, List[Dict[str, str]]] = {}
+        self.llm: Dict[str, Dict[str, Any]] = {}
+        for fixture in fixtures:
+            self.add(fixture)
+
+    def add(self, fixture: Dict[str, Any]) -> None:
+        if int(fixture.get("format") or 0) != FIXTURE_FORMAT:
+            raise ValueError(f"unsupported fixture format: {fixture.get('format')!r}")
+        for entry in fixture.get("queries") or []:
+            self._exact.setdefault(entry["key"], entry)
+            self._shape.setdefault(entry["shape"], entry)
+        self.tables.update(fixture.get("tables") or {})
+        self.llm.update(fixture.get("llm") or {})
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def find(self, sql: str, job_config: Any = None) -> Tuple[Optional[Dict[str, Any]], str]:
+        entry = self._exact.get(query_key(sql, job_config))
+        if entry is not None:
+            return entry, "exact"
+        entry = self._shape.get(fingerprint_sql(sql))
+        if entry is not None:
+            return entry, "shape"
+        return None, "miss"
+
+
+# ── Result objects ────────────────────────────────────────────────────────────
+
+def _schema_fields(schema: List[Dict[str, str]]) -> List[bigquery.SchemaField]:
+    return [
+        bigquery.SchemaField(field["name"], field.get("type") or "STRING", mode=field.get("mode") or "NULLABLE")
+        for field in schema
+    ]
+
+
+class ReplayRowIterator:
+    """Enough of table.RowIterator for the app: iteration, pages, schema, total_rows."""
+
+    def __init__(self, rows: List[Row], schema: List[bigquery.SchemaField]) -> None:
+        self._rows = rows
+        self.schema = schema
+        self.total_rows = len(rows)
+
+    def __iter__(self) -> Iterator[Row]:
+        return iter(self._rows)
+
+    @property
+    def pages(self) -> Iterator[List[Row]]:
+        return iter([self._rows] if self._rows else [])
+
+
+class ReplayJob:
+    def __init__(self, entry: Optional[Dict[str, Any]], job_id: str) -> None:
+        self.job_id = job_id
+        self._entry = entry or {}
+        for name in _JOB_ATTRS:
+            setattr(self, name, (self._entry.get("job") or {}).get(name))
+
+    def result(self, timeout: Optional[float] = None, **kwargs: Any) -> ReplayRowIterator:
+        schema = self._entry.get("schema") or []
+        field_to_index = {field["name"]: i for i, field in enumerate(schema)}
+        rows = [Row(tuple(values), field_to_index) for values in self._entry.get("_decoded_rows", ())]
+        return ReplayRowIterator(rows, _schema_fields(schema))
+
+
+class ReplayTable:
+    def __init__(self, reference: str, schema: List[Dict[str, str]]) -> None:
+        self.reference = reference
+        self.schema = _schema_fields(schema)
+
+
+class ReplayClient:
+    """Drop-in bigquery.Client serving recorded result sets."""
+
+    def __init__(self, store: FixtureStore, project: str = "replay") -> None:
+        self.project = project
+        self._store = store
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self.missed: List[str] = []
+        self._counters = {
+            "queries": 0, "exact": 0, "shape": 0, "misses": 0, "table_misses": 0, "llm_hits": 0, "llm_misses": 0,
+        }
+
+    def query(self, query: str, job_config: Any = None, **kwargs: Any) -> ReplayJob:
+        entry, how = self._store.find(query, job_config)
+        if entry is not None and "_decoded_rows" not in entry:
+            # Decode once; every replay still builds its own Row objects
+            entry["_decoded_rows"] = [tuple(decode_value(v) for v in values) for values in entry.get("rows") or []]
+        with self._lock:
+            self._jobs += 1
+            self._counters["queries"] += 1
+            self._counters["misses" if how == "miss" else how] += 1
+            if how == "miss":
+                self.missed.append(_SPACE_RE.sub(" ", query or "").strip()[:160])
+            job_id = f"replay-{self._jobs}"
+        return ReplayJob(entry, job_id)
+
+    def get_table(self, table: Any, **kwargs: Any) -> ReplayTable:
+        reference = table_key(table)
+        schema = self._store.tables.get(reference)
+        if schema is None:
+            with self._lock:
+                self._counters["table_misses"] += 1
+        return ReplayTable(reference, schema or [])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._counters = {name: 0 for name in self._counters}
+            self.missed = []
+
+    def replay_llm(self, prompt: str, **kwargs: Any) -> Dict[str, Any]:
+        """Stand-in for llm_client.generate_gemini_text_with_status."""
+        recorded = self._store.llm.get(prompt_key(prompt))
+        with self._lock:
+            self._counters["llm_hits" if recorded else "llm_misses"] += 1
+        if recorded:
+            return dict(recorded)
+        return {"ok": False, "text": "", "provider": "replay", "model": kwargs.get("model_name"), "error": "not recorded"}
+
+
+# ── Recording ─────────────────────────────────────────────────────────────────
+
+def _schema_repr(schema: Any, rows: List[Any]) -> List[Dict[str, str]]:
+    if schema:
+        return [{"name": f.name, "type": f.field_type, "mode": f.mode or "NULLABLE"} for f in schema]
+    return [{"name": name, "type": "STRING", "mode": "NULLABLE"} for name in (rows[0].keys() if rows else [])]
+
+
+class _RecordingJob:
+    def __init__(self, job: Any, recorder: "RecordingClient", sql: str, job_config: Any) -> None:
+        self._job = job
+        self._recorder = recorder
+        self._sql = sql
+        self._job_config = job_config
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._job, name)
+
+    def result(self, timeout: Optional[float] = None, **kwargs: Any) -> ReplayRowIterator:
+        iterator = self._job.result(timeout=timeout, **kwargs)
+        rows = list(iterator)
+        schema = getattr(iterator, "schema", None)
+        self._recorder._add_query({
+            "key": query_key(self._sql, self._job_config),
+            "shape": fingerprint_sql(self._sql),
+            "sql": self._sql,
+            "params": _query_parameters(self._job_config),
+            "schema": _schema_repr(schema, rows),
+            "rows": [encode_value(list(row.values())) for row in rows],
+            "job": {name: getattr(self._job, name, None) for name in _JOB_ATTRS},
+        })
+        return ReplayRowIterator(rows, list(schema or []))
+
+
+class RecordingClient:
+    """Wraps a real client; everything the app reads is kept for the current fixture."""
+
+    def __init__(self, client: Any) -> None:
+        self._client = client
+        self.project = getattr(client, "project", None)
+        self._lock = threading.Lock()
+        self._queries: Dict[str, Dict[str, Any]] = {}
+        self._tables: Dict[str, List[Dict[str, str]]] = {}
+        self._llm: Dict[str, Dict[str, Any]] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def query(self, query: str, job_config: Any = None, **kwargs: Any) -> _RecordingJob:
+        job = self._client.query(query, job_config=job_config, **kwargs)
+        return _RecordingJob(job, self, query, job_config)
+
+    def get_table(self, table: Any, **kwargs: Any) -> Any:
+        result = self._client.get_table(table, **kwargs)
+        with self._lock:
+            self._tables[table_key(table)] = _schema_repr(result.schema, [])
+        return result
+
+    def record_llm(self, generate: Any) -> Any:
+        """Wrap an LLM call so its answers are kept by prompt hash."""
+        def _recording(prompt: str, **kwargs: Any) -> Dict[str, Any]:
+            result = generate(prompt, **kwargs)
+            if result.get("ok"):
+                with self._lock:
+                    self._llm[prompt_key(prompt)] = dict(result)
+            return result
+        return _recording
+
+    def _add_query(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._queries.setdefault(entry["key"], entry)
+
+    def take_fixture(self, **meta: Any) -> Dict[str, Any]:
+        """Everything recorded since the previous call, as a fixture dict."""
+        with self._lock:
+            fixture = {
+                "format": FIXTURE_FORMAT,
+                **meta,
+                "queries": list(self._queries.values()),
+                "tables": dict(self._tables),
+                "llm": dict(self._llm),
+            }
+            self._queries, self._tables, self._llm = {}, {}, {}
+        return fixture
@@ -0,0 +1,59 @@
+"""Shared setup of the endpoint benchmarks (record_fixtures.py / run_benchmarks.py).
+
+CASES lists the benchmarked requests. Change params here, then record again:
+the runner replays each endpoint with the params stored in its fixture.
+"""
+import os
+import sys
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLOUD_RUN_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", ".."))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# Garante que app/ (api.*) e cloud-run/ (app.simple_api) estão no PYTHONPATH
+for _path in (os.path.join(CLOUD_RUN_DIR, "app"), CLOUD_RUN_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+CASES: List[Dict[str, Any]] = [
+    {"name": "dashboard", "path": "/api/dashboard", "params": {"year": 2026}},
+    {"name": "metrics", "path": "/api/metrics", "params": {"year": 2026}},
+    {"name": "weekly_agenda", "path": "/api/weekly-agenda", "params": {"quarter": "FY26-Q1"}},
+    {"name": "performance", "path": "/api/performance", "params": {"year": "2026"}},
+    {"name": "revenue_weekly", "path": "/api/revenue/weekly", "params": {"year": "2026"}},
+    {"name": "insights_rag", "path": "/api/insights-rag", "params": {"query": "perdas por preço", "year": "2026"}},
+]
+
+
+def select_cases(only: str = "") -> List[Dict[str, Any]]:
+    names = {name.strip() for name in (only or "").split(",") if name.strip()}
+    unknown = names - {case["name"] for case in CASES}
+    if unknown:
+        raise SystemExit(f"unknown benchmark case(s): {', '.join(sorted(unknown))}")
+    return [case for case in CASES if not names or case["name"] in names]
+
+
+def configure_environment(project: str = "", dataset: str = "") -> None:
+    """Must run before the app is imported (settings are read at import time)."""
+    if project:
+        os.environ["GCP_PROJECT"] = project
+    if dataset:
+        os.environ["BQ_DATASET"] = dataset
+    # Per-process caches only: a shared L2 would leak results between runs
+    os.environ["CACHE_L2_URL"] = ""
+    os.environ["LLM_RESPONSE_CACHE_URL"] = ""
+
+
+def clear_response_caches() -> None:
+    """Drop endpoint-level response caches so every call does the full work.
+
+    Derived per-item caches (query embeddings, LLM answers, activity
+    summaries) and in-process snapshots stay warm, as on a serving instance.
+    """
+    import app.simple_api as simple_api
+    import api.endpoints.insights_rag as insights_rag
+
+    simple_api.CACHE.clear()
+    insights_rag._INSIGHTS_CACHE.clear()
@@ -0,0 +1,73 @@
+"""Record the BigQuery result sets (and Gemini answers) of each benchmark case.
+
+Runs every case once against the real project and stores what the app read
+in fixtures/<case>.json.gz. Needs application-default credentials with read
+access to the dataset; recorded data is business data, keep it out of
+public forks.
+
+Usage (from cloud-run/):
+    python tests/benchmarks/record_fixtures.py [--only dashboard,metrics]
+"""
+import argparse
+import datetime
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402  (sets sys.path for the app)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="", help="comma-separated case names (default: all)")
+    parser.add_argument("--fixtures", default=harness.FIXTURES_DIR, help="output directory")
+    args = parser.parse_args()
+    cases = harness.select_cases(args.only)
+
+    harness.configure_environment()
+    from google.cloud import bigquery
+    from fastapi.testclient import TestClient
+
+    from bq_replay import RecordingClient, write_fixture
+
+    project = os.environ.get("GCP_PROJECT") or "operaciones-br"
+    recorder = RecordingClient(bigquery.Client(project=project))
+
+    import api.llm_cache as llm_cache
+
+    with patch("google.cloud.bigquery.Client", return_value=recorder), \
+            patch.object(llm_cache, "generate_gemini_text_with_status",
+                         recorder.record_llm(llm_cache.generate_gemini_text_with_status)):
+        import app.simple_api as simple_api
+
+        client = TestClient(simple_api.app, raise_server_exceptions=False)
+        os.makedirs(args.fixtures, exist_ok=True)
+        failures = 0
+        for case in cases:
+            harness.clear_response_caches()
+            recorder.take_fixture()  # drop anything a previous case left running
+            resp = client.get(case["path"], params=case["params"])
+            fixture = recorder.take_fixture(
+                endpoint=case["path"],
+                params=case["params"],
+                project=project,
+                dataset=simple_api.DATASET_ID,
+                recorded_at=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                status_code=resp.status_code,
+            )
+            if resp.status_code != 200:
+                failures += 1
+                print(f"[BENCH] WARN: {case['name']} returned {resp.status_code}; fixture not written")
+                continue
+            path = os.path.join(args.fixtures, f"{case['name']}.json.gz")
+            write_fixture(path, fixture)
+            rows = sum(len(q["rows"]) for q in fixture["queries"])
+            print(f"[BENCH] {case['name']}: {len(fixture['queries'])} queries, {rows} rows, "
+                  f"{len(fixture['llm'])} LLM answers -> {path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Endpoint benchmarks replaying recorded BigQuery result sets.
+
+Each case in harness.CASES is called through the FastAPI TestClient with
+google.cloud.bigquery.Client replaced by a ReplayClient over fixtures/, so
+the numbers are the Python-side cost of the endpoint on realistic data
+(no network, no BigQuery latency). Response caches are cleared before every
+call.
+
+Per endpoint:
+    p50_ms / p95_ms      wall time over --iterations timed calls
+    gc_gen0_per_call     generation-0 collections per call (allocation rate)
+    peak_kib             tracemalloc peak above the pre-call level
+    retained_kib/_blocks memory still allocated after the call
+Memory is measured in separate calls: tracemalloc slows everything down.
+
+Results are compared with baseline.json: p50 / p95 / peak above baseline *
+(1 + tolerance), and above an absolute noise floor, fail the run (exit 1).
+
+Usage (from cloud-run/):
+    python tests/benchmarks/run_benchmarks.py [--only dashboard] [--iterations 30]
+    python tests/benchmarks/run_benchmarks.py --update-baseline
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402  (sets sys.path for the app)
+
+COMPARED_METRICS = ("p50_ms", "p95_ms", "peak_kib")
+# Differences below these are noise whatever the ratio
+NOISE_FLOOR = {"p50_ms": 1.0, "p95_ms": 2.0, "peak_kib": 256.0}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear interpolation between closest ranks (numpy's default)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_timings(timings_ms: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(timings_ms, 50), 3),
+        "p95_ms": round(percentile(timings_ms, 95), 3),
+        "mean_ms": round(sum(timings_ms) / len(timings_ms), 3) if timings_ms else 0.0,
+        "min_ms": round(min(timings_ms), 3) if timings_ms else 0.0,
+        "max_ms": round(max(timings_ms), 3) if timings_ms else 0.0,
+    }
+
+
+def compare_to_baseline(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float,
+) -> List[Dict[str, Any]]:
+    """One row per endpoint/metric present in both; regressed when above tolerance and noise floor."""
+    rows = []
+    for name, current in sorted(results.get("endpoints", {}).items()):
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in current or metric not in previous:
+                continue
+            before, after = float(previous[metric]), float(current[metric])
+            ratio = after / before if before > 0 else None
+            regressed = after > before * (1.0 + tolerance) and after - before > NOISE_FLOOR[metric]
+            rows.append({
+                "endpoint": name,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "ratio": round(ratio, 3) if ratio is not None else None,
+                "regressed": regressed,
+            })
+    return rows
+
+
+def _timed_calls(call: Callable[[], int], iterations: int) -> Dict[str, Any]:
+    timings_ms: List[float] = []
+    errors = 0
+    gen0_before = gc.get_stats()[0]["collections"]
+    for _ in range(iterations):
+        harness.clear_response_caches()
+        started = time.perf_counter()
+        status = call()
+        timings_ms.append((time.perf_counter() - started) * 1000)
+        errors += status != 200
+    gen0 = gc.get_stats()[0]["collections"] - gen0_before
+    return {
+        **summarize_timings(timings_ms),
+        "iterations": iterations,
+        "errors": errors,
+        "gc_gen0_per_call": round(gen0 / max(1, iterations), 2),
+    }
+
+
+def _memory_calls(call: Callable[[], int], iterations: int) -> Dict[str, Any]:
+    peaks, retained, blocks = [], [], []
+    for _ in range(iterations):
+        harness.clear_response_caches()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            start_size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            call()
+            end_size, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        peaks.append((peak - start_size) / 1024)
+        retained.append((end_size - start_size) / 1024)
+        blocks.append(sum(stat.count_diff for stat in after.compare_to(before, "filename")))
+    return {
+        "peak_kib": round(percentile(peaks, 50), 1),
+        "retained_kib": round(percentile(retained, 50), 1),
+        "retained_blocks": int(percentile(blocks, 50)),
+    }
+
+
+def _load_fixtures(cases: List[Dict[str, Any]], fixtures_dir: str) -> Dict[str, Dict[str, Any]]:
+    from bq_replay import read_fixture
+
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.json.gz"))):
+        fixtures[os.path.basename(path)[: -len(".json.gz")]] = read_fixture(path)
+    missing = [case["name"] for case in cases if case["name"] not in fixtures]
+    if missing:
+        raise SystemExit(
+            f"no fixture for: {', '.join(missing)}. Record them first: "
+            "python tests/benchmarks/record_fixtures.py"
+        )
+    return fixtures
+
+
+def run(
+    cases: List[Dict[str, Any]],
+    *,
+    fixtures_dir: str,
+    iterations: int,
+    warmup: int,
+    memory_iterations: int,
+) -> Dict[str, Any]:
+    # Every fixture is loaded whatever --only says: in-process snapshots are
+    # filled by whichever case ran first when recording.
+    fixtures = _load_fixtures(cases, fixtures_dir)
+    first = next(iter(fixtures.values()))
+    harness.configure_environment(project=first.get("project") or "", dataset=first.get("dataset") or "")
+
+    from fastapi.testclient import TestClient
+
+    from bq_replay import FixtureStore, ReplayClient
+
+    replay = ReplayClient(FixtureStore(fixtures.values()), project=first.get("project") or "replay")
+
+    import api.llm_cache as llm_cache
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "memory_iterations": memory_iterations,
+            "fixtures_recorded_at": {name: f.get("recorded_at") for name, f in sorted(fixtures.items())},
+        },
+        "endpoints": {},
+    }
+    with patch("google.cloud.bigquery.Client", return_value=replay), \
+            patch.object(llm_cache, "generate_gemini_text_with_status", replay.replay_llm):
+        import app.simple_api as simple_api
+
+        simple_api._BQ_CLIENT = None
+        client = TestClient(simple_api.app, raise_server_exceptions=False)
+        for case in cases:
+            params = fixtures[case["name"]].get("params") or case["params"]
+
+            def call() -> int:
+                return client.get(case["path"], params=params).status_code
+
+            replay.reset_stats()
+            for _ in range(warmup):
+                harness.clear_response_caches()
+                call()
+            missed = list(replay.missed)
+            replay.reset_stats()
+            endpoint = {"path": case["path"], "params": params}
+            endpoint.update(_timed_calls(call, iterations))
+            missed += replay.missed
+            endpoint["bigquery_per_call"] = {
+                name: round(count / iterations, 2) for name, count in replay.stats().items()
+            }
+            endpoint.update(_memory_calls(call, memory_iterations))
+            if missed:
+                endpoint["unmatched_queries"] = sorted(set(missed))[:10]
+            results["endpoints"][case["name"]] = endpoint
+            print(_format_endpoint(case["name"], endpoint))
+    return results
+
+
+def _format_endpoint(name: str, endpoint: Dict[str, Any]) -> str:
+    bq = endpoint["bigquery_per_call"]
+    line = (
+        f"[BENCH] {name:<15} p50 {endpoint['p50_ms']:>9.2f} ms  p95 {endpoint['p95_ms']:>9.2f} ms  "
+        f"peak {endpoint['peak_kib']:>9.1f} KiB  retained {endpoint['retained_kib']:>8.1f} KiB  "
+        f"gen0/call {endpoint['gc_gen0_per_call']:>5.2f}  queries {bq.get('queries', 0):g}"
+    )
+    if endpoint["errors"]:
+        line += f"  errors {endpoint['errors']}"
+    if bq.get("misses") or bq.get("table_misses") or bq.get("llm_misses"):
+        line += (f"\n[BENCH] WARN: {name}: {bq.get('misses', 0):g} unmatched queries, "
+                 f"{bq.get('table_misses', 0):g} tables, {bq.get('llm_misses', 0):g} LLM prompts "
+                 "per call; fixture may be stale")
+    return line
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="", help="comma-separated case names (default: all)")
+    parser.add_argument("--fixtures", default=harness.FIXTURES_DIR, help="directory with the recorded fixtures")
+    parser.add_argument("--iterations", type=int, default=30, help="timed calls per endpoint")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed calls per endpoint before timing")
+    parser.add_argument("--memory-iterations", type=int, default=3, help="tracemalloc calls per endpoint")
+    parser.add_argument("--baseline", default=harness.BASELINE_PATH, help="baseline JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative increase (0.25 = +25%%)")
+    parser.add_argument("--output", default="", help="also write the results JSON here")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = run(
+        harness.select_cases(args.only),
+        fixtures_dir=args.fixtures,
+        iterations=max(1, args.iterations),
+        warmup=max(1, args.warmup),
+        memory_iterations=max(1, args.memory_iterations),
+    )
+    if args.output:
+        _write_json(args.output, results)
+
+    if args.update_baseline:
+        baseline = _read_json(args.baseline) or {"endpoints": {}}
+        baseline["meta"] = results["meta"]
+        baseline.setdefault("endpoints", {}).update(results["endpoints"])
+        _write_json(args.baseline, baseline)
+        print(f"[BENCH] baseline updated: {args.baseline}")
+        return 0
+
+    baseline = _read_json(args.baseline)
+    if baseline is None:
+        print(f"[BENCH] no baseline at {args.baseline}; run with --update-baseline to create it")
+        return 0
+    rows = compare_to_baseline(results, baseline, args.tolerance)
+    for row in rows:
+        ratio = f"x{row['ratio']:.2f}" if row["ratio"] is not None else "n/a"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"[BENCH] {row['endpoint']:<15} {row['metric']:<9} {row['baseline']:>10.2f} -> "
+              f"{row['current']:>10.2f}  {ratio}{flag}")
+    regressions = [row for row in rows if row["regressed"]]
+    if regressions:
+        print(f"[BENCH] {len(regressions)} regression(s) above +{args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
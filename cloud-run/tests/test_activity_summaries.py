@@ -0,0 +1,134 @@
+"""
+Testes dos resumos de atividades da agenda semanal (weekly_agenda) e do
+limitador de taxa (api/rate_limit.py).
+Verifica que resumos persistidos vêm de um único multi-get no Firestore, que
+os faltantes vão ao Gemini em paralelo e são gravados em um único batch.
+Não requerem credenciais GCP nem chave do Gemini (chamadas simuladas).
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_activity_summaries.py -v
+"""
+
+import sys
+import os
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.rate_limit import TokenBucket
+from api.response_cache import ResponseCache
+from api.tiered_cache import TieredCache
+import api.endpoints.weekly_agenda as weekly_agenda
+
+
+class TestTokenBucket:
+    def test_rajada_e_recarga(self):
+        bucket = TokenBucket(rate_per_second=20, burst=2)
+        assert bucket.acquire() and bucket.acquire()
+        assert bucket.acquire(timeout=0) is False
+        started = time.monotonic()
+        assert bucket.acquire(timeout=1.0)
+        assert time.monotonic() - started >= 0.03
+        stats = bucket.stats()
+        assert stats["acquired"] == 3 and stats["rejected"] == 1 and stats["waited"] == 1
+
+    def test_taxa_zero_nao_limita(self):
+        bucket = TokenBucket(rate_per_second=0, burst=1)
+        assert all(bucket.acquire() for _ in range(50))
+
+
+def _doc(doc_id, summary):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.exists = summary is not None
+    doc.to_dict.return_value = {"summary": summary}
+    return doc
+
+
+@pytest.fixture()
+def ambiente():
+    """Gemini simulado (registra concorrência) + Firestore simulado."""
+    state = {"active": 0, "peak": 0, "calls": 0}
+    lock = threading.Lock()
+
+    def generate_content(prompt):
+        with lock:
+            state["calls"] += 1
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return MagicMock(text="🎯 resumo\r\nok")
+
+    model = MagicMock()
+    model.generate_content.side_effect = generate_content
+    firestore_client = MagicMock()
+    cache = TieredCache("activity_summary", ResponseCache(max_bytes=0, max_entries=100), l2=None)
+
+    with patch.object(weekly_agenda, "GEMINI_API_KEY", "test"), \
+            patch.object(weekly_agenda, "_ACTIVITY_SUMMARY_CACHE", cache), \
+            patch.object(weekly_agenda, "_ACTIVITY_SUMMARY_RATE_LIMITER", TokenBucket(0, 1)), \
+            patch.object(weekly_agenda, "_get_firestore_client", return_value=firestore_client), \
+            patch.object(weekly_agenda.genai, "GenerativeModel", return_value=model):
+        yield state, firestore_client
+
+
+class TestResumosEmLote:
+    def test_multiget_paralelo_e_batch_unico(self, ambiente):
+        state, firestore_client = ambiente
+        texts = [f"atividade {i} " + "x" * 400 for i in range(8)]
+        persisted_key = weekly_agenda._summary_key(texts[0], "bdm")
+        firestore_client.get_all.side_effect = lambda refs: [_doc(persisted_key, "resumo salvo")]
+
+        result = weekly_agenda._summarize_activity_texts(texts + [texts[1]], prompt_profile="bdm")
+
+        assert firestore_client.get_all.call_count == 1
+        assert result[texts[0]] == "resumo salvo"
+        assert all(result[t] == "🎯 resumo\nok" for t in texts[1:])
+        assert state["calls"] == 7 and state["peak"] > 1
+        batch = firestore_client.batch.return_value
+        assert firestore_client.batch.call_count == 1 and batch.commit.call_count == 1
+        assert batch.set.call_count == 7
+
+        # Segunda página: tudo vem do cache local
+        firestore_client.get_all.reset_mock()
+        assert weekly_agenda._summarize_activity_texts(texts, prompt_profile="bdm") == {
+            t: result[t] for t in texts
+        }
+        firestore_client.get_all.assert_not_called()
+        assert state["calls"] == 7
+
+    def test_sem_token_de_taxa_nao_chama_gemini(self, ambiente):
+        state, firestore_client = ambiente
+        firestore_client.get_all.return_value = []
+        exhausted = TokenBucket(rate_per_second=0.001, burst=1)
+        exhausted.acquire()
+        with patch.object(weekly_agenda, "_ACTIVITY_SUMMARY_RATE_LIMITER", exhausted), \
+                patch.object(weekly_agenda, "_ACTIVITY_SUMMARY_RATE_WAIT_SECONDS", 0):
+            assert weekly_agenda._summarize_activity_texts(["y" * 400]) == {}
+        assert state["calls"] == 0
+        firestore_client.batch.assert_not_called()
+
+    def test_sem_geracao_sob_demanda_so_consulta(self, ambiente):
+        state, firestore_client = ambiente
+        texts = ["a" * 400, "b" * 400]
+        firestore_client.get_all.side_effect = lambda refs: [
+            _doc(weekly_agenda._summary_key(texts[0], "bdm"), "pré-calculado"),
+        ]
+        assert weekly_agenda._summarize_activity_texts(texts, generate=False) == {texts[0]: "pré-calculado"}
+        assert state["calls"] == 0
+        firestore_client.batch.assert_not_called()
+
+    def test_orcamento_por_vendedor(self):
+        activities = [{"comentarios": "z" * 301}, {"comentarios": "curto"}, {"comentarios": "z" * 301}]
+        activities += [{"comentarios": f"{i}" + "w" * 400} for i in range(5)]
+        assert len(weekly_agenda._long_activity_texts(activities, budget=3)) == 3
+        assert weekly_agenda._long_activity_texts(activities, budget=10)[0] == "z" * 301
+        assert len(weekly_agenda._long_activity_texts(activities, budget=10)) == 6
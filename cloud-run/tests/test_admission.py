@@ -0,0 +1,139 @@
+"""
+Testes do controle de admissão (api/admission.py).
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_admission.py -v
+"""
+
+import asyncio
+import sys
+import os
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api.admission import AdmissionController, AdmissionRejected, parse_endpoint_limits
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestAdmissionController:
+    def test_parse_limites_por_endpoint(self):
+        assert parse_endpoint_limits("/api/dashboard=4, /api/x=2,lixo,/api/y=abc") == {
+            "/api/dashboard": 4,
+            "/api/x": 2,
+        }
+
+    def test_limite_global_enfileira_e_libera_em_ordem(self):
+        async def scenario():
+            ctrl = AdmissionController(max_concurrent=1, queue_timeout_seconds=2)
+            await ctrl.acquire("/api/a")
+            order = []
+
+            async def worker(name):
+                await ctrl.acquire("/api/a")
+                order.append(name)
+                ctrl.release("/api/a")
+
+            tasks = [asyncio.create_task(worker(n)) for n in ("w1", "w2")]
+            await asyncio.sleep(0.05)
+            assert ctrl.stats()["queue_depth"] == 2
+            ctrl.release("/api/a")
+            await asyncio.gather(*tasks)
+            return order, ctrl.stats()
+
+        order, stats = _run(scenario())
+        assert order == ["w1", "w2"]
+        assert stats["active"] == 0
+        assert stats["admitted"] == 3
+        assert stats["wait_ms"]["max"] > 0
+
+    def test_prazo_estourado_gera_rejeicao(self):
+        async def scenario():
+            ctrl = AdmissionController(max_concurrent=1, queue_timeout_seconds=0.05)
+            await ctrl.acquire("/api/a")
+            with pytest.raises(AdmissionRejected) as info:
+                await ctrl.acquire("/api/a")
+            return info.value.reason, ctrl.stats()
+
+        reason, stats = _run(scenario())
+        assert reason == "queue_timeout"
+        assert stats["shed_timeout"] == 1
+        assert stats["queue_depth"] == 0
+
+    def test_fila_cheia_rejeita_imediatamente(self):
+        async def scenario():
+            ctrl = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout_seconds=1)
+            await ctrl.acquire("/api/a")
+            queued = asyncio.create_task(ctrl.acquire("/api/a"))
+            await asyncio.sleep(0.01)
+            with pytest.raises(AdmissionRejected) as info:
+                await ctrl.acquire("/api/a")
+            queued.cancel()
+            return info.value.reason
+
+        assert _run(scenario()) == "queue_full"
+
+    def test_limite_por_endpoint_nao_bloqueia_outros(self):
+        async def scenario():
+            ctrl = AdmissionController(
+                max_concurrent=10,
+                endpoint_limits={"/api/lento": 1},
+                queue_timeout_seconds=0.5,
+            )
+            await ctrl.acquire("/api/lento")
+            blocked = asyncio.create_task(ctrl.acquire("/api/lento"))
+            await asyncio.sleep(0.01)
+            wait_ms = await ctrl.acquire("/api/rapido")
+            ctrl.release("/api/lento")
+            await blocked
+            return wait_ms, ctrl.stats()
+
+        wait_ms, stats = _run(scenario())
+        assert wait_ms == 0.0
+        assert stats["active_by_endpoint"] == {"/api/lento": 1, "/api/rapido": 1}
+
+
+class TestMiddlewareDeAdmissao:
+    def test_slot_fica_ocupado_durante_o_stream(self):
+        import app.simple_api as simple_api
+
+        ctrl = AdmissionController(max_concurrent=4, queue_timeout_seconds=1)
+        seen = []
+
+        def stream(prompt, **kwargs):
+            seen.append(ctrl.stats()["active"])
+            yield {"type": "token", "text": "{}"}
+            seen.append(ctrl.stats()["active_by_endpoint"])
+            yield {"type": "result", "ok": True, "text": "{}"}
+
+        with patch.object(simple_api, "ADMISSION", ctrl), \
+                patch.object(simple_api, "GEMINI_API_KEY", "k"), \
+                patch.object(simple_api, "_build_analyze_patterns_prompt", return_value=("p", {"won": 0, "lost": 0})), \
+                patch.object(simple_api, "stream_cached_text", stream):
+            client = TestClient(simple_api.app)
+            with client.stream("GET", "/api/analyze-patterns/stream") as resp:
+                body = "".join(resp.iter_text())
+        assert resp.status_code == 200 and "event: done" in body
+        assert seen == [1, {"/api/analyze-patterns/stream": 1}]
+        assert ctrl.stats()["active"] == 0
+
+
+class TestThreadpoolSincrono:
+    def test_lifespan_ajusta_limite_do_threadpool(self):
+        import anyio.to_thread
+        import app.simple_api as simple_api
+
+        with patch.object(simple_api, "SYNC_ENDPOINT_THREADS", 7):
+            with TestClient(simple_api.app) as client:
+                tokens = client.portal.call(lambda: anyio.to_thread.current_default_thread_limiter().total_tokens)
+        assert tokens == 7
@@ -0,0 +1,194 @@
+"""
+Testes do harness de benchmarks (tests/benchmarks/): gravação e replay de
+result sets do BigQuery (bq_replay.py) e estatísticas / comparação com o
+baseline (run_benchmarks.py). Os benchmarks em si não rodam aqui.
+Não requerem credenciais GCP (cliente BigQuery simulado).
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_benchmarks.py -v
+"""
+
+import sys
+import os
+import datetime
+import decimal
+
+import pytest
+from google.cloud import bigquery
+from google.cloud.bigquery.table import Row
+
+# Garante que app/ e tests/benchmarks/ estão no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "benchmarks"))
+
+from bq_replay import (
+    FixtureStore,
+    RecordingClient,
+    ReplayClient,
+    decode_value,
+    encode_value,
+    read_fixture,
+    write_fixture,
+)
+from run_benchmarks import compare_to_baseline, percentile, summarize_timings
+
+SQL = """
+SELECT Vendedor, Gross, Data_Fechamento
+FROM `p.ds.closed_deals_won`
+WHERE Fiscal_Q = 'FY26-Q1'
+"""
+
+
+class _FakeIterator:
+    def __init__(self, rows, schema):
+        self._rows = rows
+        self.schema = schema
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class _FakeJob:
+    total_bytes_processed = 1024
+    cache_hit = False
+
+    def __init__(self, rows, schema):
+        self._rows, self._schema = rows, schema
+
+    def result(self, timeout=None, **kwargs):
+        return _FakeIterator(self._rows, self._schema)
+
+
+class _FakeBigQuery:
+    """Cliente "real" simulado: mesmas linhas para qualquer query."""
+
+    project = "p"
+
+    def __init__(self):
+        self.schema = [
+            bigquery.SchemaField("Vendedor", "STRING"),
+            bigquery.SchemaField("Gross", "NUMERIC"),
+            bigquery.SchemaField("Data_Fechamento", "DATE"),
+        ]
+        index = {"Vendedor": 0, "Gross": 1, "Data_Fechamento": 2}
+        self.rows = [
+            Row(("Ana", decimal.Decimal("1200.50"), datetime.date(2026, 1, 15)), index),
+            Row(("Bruno", None, datetime.date(2026, 2, 3)), index),
+        ]
+        self.queries = []
+
+    def query(self, sql, job_config=None, **kwargs):
+        self.queries.append(sql)
+        return _FakeJob(self.rows, self.schema)
+
+    def get_table(self, ref):
+        return bigquery.Table(ref, schema=self.schema)
+
+
+@pytest.fixture()
+def gravado(tmp_path):
+    """Grava uma query e um get_table, salva em disco e devolve o fixture relido."""
+    recorder = RecordingClient(_FakeBigQuery())
+    rows = list(recorder.query(SQL).result(timeout=30))
+    assert [r["Vendedor"] for r in rows] == ["Ana", "Bruno"]
+    recorder.get_table("p.ds.pipeline")
+    path = str(tmp_path / "caso.json.gz")
+    write_fixture(path, recorder.take_fixture(endpoint="/api/x", params={"year": 2026}))
+    return read_fixture(path)
+
+
+class TestValores:
+    def test_ida_e_volta_preserva_tipos(self):
+        value = {
+            "d": datetime.date(2026, 1, 2),
+            "ts": datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+            "n": decimal.Decimal("1.10"),
+            "b": b"\x00\x01",
+            "lista": [1, 2.5, None, "x"],
+        }
+        assert decode_value(encode_value(value)) == value
+
+
+class TestReplay:
+    def test_linhas_voltam_como_row_do_bigquery(self, gravado):
+        client = ReplayClient(FixtureStore([gravado]))
+        job = client.query(SQL)
+        rows = list(job.result(timeout=10))
+        assert dict(rows[0]) == {"Vendedor": "Ana", "Gross": decimal.Decimal("1200.50"), "Data_Fechamento": datetime.date(2026, 1, 15)}
+        assert rows[1].Vendedor == "Bruno" and rows[1].get("Gross") is None
+        assert job.total_bytes_processed == 1024
+        assert [f.name for f in job.result().schema] == ["Vendedor", "Gross", "Data_Fechamento"]
+        assert client.stats()["exact"] == 1
+
+    def test_espacos_diferentes_ainda_batem(self, gravado):
+        client = ReplayClient(FixtureStore([gravado]))
+        assert len(list(client.query(" ".join(SQL.split())).result())) == 2
+        assert client.stats()["exact"] == 1
+
+    def test_literal_diferente_cai_no_formato_da_query(self, gravado):
+        client = ReplayClient(FixtureStore([gravado]))
+        rows = list(client.query(SQL.replace("FY26-Q1", "FY26-Q3")).result())
+        assert len(rows) == 2
+        assert client.stats()["shape"] == 1
+
+    def test_query_nao_gravada_volta_vazia_e_e_contada(self, gravado):
+        client = ReplayClient(FixtureStore([gravado]))
+        assert list(client.query("SELECT 1 AS x FROM `p.ds.outra`").result()) == []
+        assert client.stats()["misses"] == 1
+        assert client.missed == ["SELECT 1 AS x FROM `p.ds.outra`"]
+
+    def test_parametros_fazem_parte_da_chave(self):
+        fake = _FakeBigQuery()
+        recorder = RecordingClient(fake)
+        config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("q", "STRING", "FY26-Q1")])
+        recorder.query("SELECT * FROM t WHERE Fiscal_Q = @q", job_config=config).result()
+        client = ReplayClient(FixtureStore([recorder.take_fixture()]))
+        other = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("q", "STRING", "FY26-Q2")])
+        client.query("SELECT * FROM t WHERE Fiscal_Q = @q", job_config=config)
+        client.query("SELECT * FROM t WHERE Fiscal_Q = @q", job_config=other)
+        stats = client.stats()
+        assert stats["exact"] == 1 and stats["shape"] == 1
+
+    def test_schema_de_tabela(self, gravado):
+        client = ReplayClient(FixtureStore([gravado]))
+        assert [f.name for f in client.get_table("p.ds.pipeline").schema] == ["Vendedor", "Gross", "Data_Fechamento"]
+        assert client.get_table("p.ds.outra").schema == []
+        assert client.stats()["table_misses"] == 1
+
+    def test_respostas_do_llm_por_hash_do_prompt(self):
+        recorder = RecordingClient(_FakeBigQuery())
+        generate = recorder.record_llm(lambda prompt, **kw: {"ok": True, "text": f"resposta {prompt}"})
+        generate("prompt A", model_name="m")
+        client = ReplayClient(FixtureStore([recorder.take_fixture()]))
+        assert client.replay_llm("prompt A", model_name="m")["text"] == "resposta prompt A"
+        assert client.replay_llm("prompt B", model_name="m")["ok"] is False
+        assert client.stats()["llm_hits"] == 1 and client.stats()["llm_misses"] == 1
+
+    def test_formato_desconhecido_e_rejeitado(self):
+        with pytest.raises(ValueError):
+            FixtureStore([{"format": 99, "queries": []}])
+
+
+class TestEstatisticas:
+    def test_percentis(self):
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 50) == pytest.approx(50.5)
+        assert percentile(values, 95) == pytest.approx(95.05)
+        assert percentile([], 95) == 0.0
+        assert summarize_timings([3.0, 1.0, 2.0])["p50_ms"] == 2.0
+
+    def test_regressao_acima_da_tolerancia(self):
+        baseline = {"endpoints": {"dashboard": {"p50_ms": 20.0, "p95_ms": 30.0, "peak_kib": 4096.0}}}
+        results = {"endpoints": {"dashboard": {"p50_ms": 26.0, "p95_ms": 33.0, "peak_kib": 4100.0}}}
+        rows = {r["metric"]: r for r in compare_to_baseline(results, baseline, tolerance=0.25)}
+        assert rows["p50_ms"]["regressed"] is True and rows["p50_ms"]["ratio"] == 1.3
+        assert rows["p95_ms"]["regressed"] is False
+        assert rows["peak_kib"]["regressed"] is False
+
+    def test_diferenca_pequena_e_ruido(self):
+        baseline = {"endpoints": {"metrics": {"p50_ms": 1.0, "p95_ms": 1.5, "peak_kib": 10.0}}}
+        results = {"endpoints": {"metrics": {"p50_ms": 1.8, "p95_ms": 3.0, "peak_kib": 200.0}, "novo": {"p50_ms": 5.0}}}
+        rows = compare_to_baseline(results, baseline, tolerance=0.25)
+        assert {r["endpoint"] for r in rows} == {"metrics"}
+        assert not any(r["regressed"] for r in rows)
@@ -0,0 +1,263 @@
+"""
+Testes dos helpers de execução BigQuery do simple_api.
+BigQuery é simulado com um client fake (sem credenciais GCP).
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_bigquery_helpers.py -v
+"""
+
+import sys
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+
+class _FakeJob:
+    """Job do BigQuery: roda no servidor a partir de client.query()."""
+
+    def __init__(self, rows, delay, error=None):
+        self._rows = rows
+        self._ready_at = time.monotonic() + delay
+        self._error = error
+        self.cancelled = False
+
+    def result(self, timeout=None):
+        wait = max(0.0, self._ready_at - time.monotonic())
+        if timeout is not None and wait > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("job timeout")
+        time.sleep(wait)
+        if self._error is not None:
+            raise self._error
+        return self._rows
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _FakeClient:
+    def __init__(self, delay=0.2, errors=None):
+        self.delay = delay
+        self.errors = dict(errors or {})
+        self.queries = []
+        self.jobs = []
+
+    def query(self, sql, job_config=None):
+        self.queries.append(sql)
+        job = _FakeJob([{"sql": sql.strip()}], self.delay, self.errors.pop(sql, None))
+        self.jobs.append(job)
+        return job
+
+
+@pytest.fixture()
+def simple_api():
+    with patch("google.cloud.bigquery.Client", return_value=MagicMock()):
+        with patch("google.generativeai.configure"):
+            import simple_api as module
+    return module
+
+
+class TestQueryBatch:
+    def test_consultas_rodam_em_paralelo(self, simple_api):
+        fake = _FakeClient(delay=0.3)
+        queries = {f"q{i}": f"SELECT {i}" for i in range(12)}
+        with patch.object(simple_api, "get_bq_client", return_value=fake):
+            start = time.perf_counter()
+            results = simple_api.query_batch_to_dict(queries)
+            elapsed = time.perf_counter() - start
+
+        assert list(results.keys()) == list(queries.keys())
+        assert results["q3"] == [{"sql": "SELECT 3"}]
+        assert elapsed < 0.3 * 4
+
+    def test_timeout_por_consulta(self, simple_api):
+        fake = _FakeClient(delay=2.0)
+        with patch.object(simple_api, "get_bq_client", return_value=fake):
+            with pytest.raises(TimeoutError):
+                simple_api.query_batch_to_dict({"lenta": "SELECT 1", "outra": "SELECT 2"}, timeout_seconds=0.2)
+        # jobs abandonados são cancelados no BigQuery
+        assert [job.cancelled for job in fake.jobs] == [True, True]
+
+    def test_todos_os_jobs_sao_criados_antes_de_ler(self, simple_api):
+        fake = _FakeClient(delay=0.05)
+        seen = []
+        original = _FakeJob.result
+
+        def result(job, timeout=None):
+            seen.append(len(fake.queries))
+            return original(job, timeout)
+
+        queries = {f"q{i}": f"SELECT {i}" for i in range(40)}
+        with patch.object(simple_api, "get_bq_client", return_value=fake), \
+                patch.object(_FakeJob, "result", result):
+            simple_api.query_batch_to_dict(queries, timeout_seconds=1)
+        # sem fila local: o prazo de cada consulta corre com o job já rodando
+        assert seen == [40] * 40
+
+    def test_erro_cancela_os_demais_jobs(self, simple_api):
+        fake = _FakeClient(delay=0.05, errors={"SELECT 1": ValueError("Syntax error")})
+        with patch.object(simple_api, "get_bq_client", return_value=fake):
+            with pytest.raises(ValueError):
+                simple_api.query_batch_to_dict({"a": "SELECT 1", "b": "SELECT 2", "c": "SELECT 3"})
+        assert [job.cancelled for job in fake.jobs] == [True, True, True]
+
+    def test_erro_transitorio_repete_a_consulta(self, simple_api):
+        fake = _FakeClient(delay=0.01, errors={"SELECT 1": RuntimeError("503 Service Unavailable")})
+        with patch.object(simple_api, "get_bq_client", return_value=fake), \
+                patch.object(simple_api.time, "sleep"):
+            results = simple_api.query_batch_to_dict({"a": "SELECT 1", "b": "SELECT 2"})
+        assert results["a"] == [{"sql": "SELECT 1"}]
+        assert fake.queries.count("SELECT 1") == 2
+
+
+class TestBigQueryAsync:
+    def test_consultas_nao_bloqueiam_event_loop(self):
+        import asyncio
+        from api.bq_async import run_queries
+
+        fake = _FakeClient(delay=0.3)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.05)
+
+        async def scenario():
+            start = time.perf_counter()
+            results, _ = await asyncio.gather(
+                run_queries(fake, {"a": "SELECT 1", "b": ("SELECT 2", None), "c": "SELECT 3"}),
+                ticker(),
+            )
+            return results, time.perf_counter() - start
+
+        results, elapsed = asyncio.run(scenario())
+        assert results["b"] == [{"sql": "SELECT 2"}]
+        assert len(ticks) == 5
+        assert elapsed < 0.3 * 2
+
+    def test_erro_da_consulta_propaga(self):
+        import asyncio
+        from api.bq_async import run_query
+
+        broken = MagicMock()
+        broken.query.side_effect = RuntimeError("bq down")
+        with pytest.raises(RuntimeError):
+            asyncio.run(run_query(broken, "SELECT 1"))
+
+
+class TestQueryProfiler:
+    def test_fingerprint_ignora_literais(self):
+        from api.query_profiler import fingerprint_sql
+
+        assert fingerprint_sql("SELECT * FROM t WHERE a = 'x' AND b = 1") == fingerprint_sql(
+            "select *  from t\n WHERE a = 'y' AND b = 22"
+        )
+
+    def test_profile_do_dashboard(self, simple_api):
+        from fastapi.testclient import TestClient
+
+        job = MagicMock()
+        job.result.return_value = [
+            {"deals_count": 1, "gross": 1.0, "net": 1.0, "seller": "A", "text": "x", "value": 1, "reason": "r", "avg_cycle_days": 1}
+        ]
+        job.job_id = "job-123"
+        job.slot_millis = 250
+        job.total_bytes_processed = 1024
+        job.total_bytes_billed = 10 * 1024 * 1024
+        job.cache_hit = False
+        fake = MagicMock()
+        fake.query.return_value = job
+        simple_api.QUERY_STATS.reset()
+
+        from api.endpoints.performance import ADMIN_ALLOWED_EMAILS
+
+        admin = {"x-user-email": next(iter(ADMIN_ALLOWED_EMAILS))}
+        with patch.object(simple_api, "get_bq_client", return_value=fake):
+            client = TestClient(simple_api.app)
+            resp = client.get("/api/dashboard?year=2026&nocache=true&_profile=1", headers=admin)
+            # Sem e-mail de admin o opt-in é ignorado: nada de SQL, job ids ou erros
+            not_admin = client.get(
+                "/api/dashboard?year=2026&nocache=true&_profile=1",
+                headers={"x-user-email": "vendedor@example.com", simple_api.QUERY_PROFILE_HEADER: "1"},
+            )
+            denied = client.get("/api/_debug/query-stats")
+            stats = client.get("/api/_debug/query-stats?sort=slot_ms_total", headers=admin).json()
+            reset = client.post("/api/_debug/query-stats/reset", headers=admin)
+            after_reset = client.get("/api/_debug/query-stats", headers=admin).json()
+
+        assert resp.status_code == 200
+        profile = resp.json()["_profile"]
+        assert profile["endpoint"] == "/api/dashboard"
+        # 17 consultas do dashboard + tipos de coluna (pipeline, closed_deals_won)
+        # lidos para detectar datas DATE particionadas
+        assert profile["query_count"] == 19
+        assert profile["slot_ms_total"] == 250 * 19
+        assert {q["label"] for q in profile["queries"]} >= {"pipeline_all", "closed_won"}
+        assert profile["queries"][0]["job_id"] == "job-123"
+        assert "bq-total;dur=" in resp.headers["Server-Timing"]
+        assert not_admin.status_code == 200
+        assert "_profile" not in not_admin.json()
+        assert "Server-Timing" not in not_admin.headers
+
+        assert stats["sort_by"] == "slot_ms_total"
+        assert stats["queries"][0]["endpoint"] == "/api/dashboard"
+        assert stats["queries"][0]["bytes_billed_total"] >= 10 * 1024 * 1024
+        # SQL do dashboard registrada como template: o relatório agrega pelo id
+        assert {q["template_id"] for q in stats["queries"]} >= {"dashboard.pipeline_all", "dashboard.closed_won"}
+        assert stats["templates"]["dashboard.closed_won"]["renders"] >= 1
+        assert denied.status_code == 403
+        assert reset.status_code == 200 and after_reset["queries"] == []
+
+    def test_sem_opt_in_nao_altera_resposta(self, simple_api):
+        from fastapi.testclient import TestClient
+
+        job = MagicMock()
+        job.result.return_value = []
+        fake = MagicMock()
+        fake.query.return_value = job
+        with patch.object(simple_api, "get_bq_client", return_value=fake):
+            resp = TestClient(simple_api.app).get("/api/closed/won?nocache=true")
+        assert "_profile" not in resp.text
+        assert "Server-Timing" not in resp.headers
+
+
+class TestDatasTipadas:
+    def test_coluna_date_dispensa_parse(self, simple_api):
+        types = {"pipeline": {"Data_Prevista": "DATE"}, "closed_deals_won": {"Data_Fechamento": "DATE"}}
+        with patch.object(simple_api, "get_dataset_table_column_types", side_effect=lambda ds, t: types.get(t, {})):
+            assert simple_api.build_flexible_date_expr("Data_Prevista", "pipeline") == "Data_Prevista"
+            # closed_deals_lost ainda string: a expressão precisa servir às duas tabelas
+            closed = simple_api.build_flexible_date_expr("Data_Fechamento", ("closed_deals_won", "closed_deals_lost"))
+            assert "SAFE.PARSE_DATE" in closed
+            assert "SAFE.PARSE_DATE" in simple_api.build_flexible_date_expr("Data_Prevista")
+
+    def test_periodo_vira_range_prunavel(self, simple_api):
+        build = simple_api.build_period_filters
+        assert build("d", 2026, 2, None, prunable=True) == ["d >= DATE '2026-04-01'", "d < DATE '2026-07-01'"]
+        assert build("d", 2026, 4, None, prunable=True) == ["d >= DATE '2026-10-01'", "d < DATE '2027-01-01'"]
+        assert build("d", 2026, 1, 2, month_with_quarter=True, prunable=True) == [
+            "d >= DATE '2026-02-01'", "d < DATE '2026-03-01'",
+        ]
+        assert build("d", 2026, 1, 5, month_with_quarter=True, prunable=True) == ["FALSE"]
+        # Sem ano não há range: continua EXTRACT
+        assert build("d", None, None, 3, prunable=True) == ["EXTRACT(MONTH FROM d) = 3"]
+
+    def test_sem_tipo_mantem_extract(self, simple_api):
+        build = simple_api.build_period_filters
+        assert build("d", 2026, 2, 5) == [
+            "EXTRACT(YEAR FROM d) = 2026",
+            "EXTRACT(MONTH FROM d) BETWEEN 4 AND 6",
+        ]
+        assert build("d", 2026, 2, 5, month_with_quarter=True) == [
+            "EXTRACT(YEAR FROM d) = 2026",
+            "EXTRACT(MONTH FROM d) BETWEEN 4 AND 6",
+            "EXTRACT(MONTH FROM d) = 5",
+        ]
+        assert build("d", 2026, 9, 5) == ["EXTRACT(YEAR FROM d) = 2026"]
@@ -0,0 +1,378 @@
+"""
+Testes do cache de respostas por instância (api/response_cache.py).
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_cache.py -v
+"""
+
+import sys
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.response_cache import ResponseCache, estimate_size
+
+
+class TestResponseCache:
+    def test_hit_e_miss(self):
+        cache = ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0)
+        assert cache.get("a") is None
+        cache.set("a", {"x": 1}, ttl_seconds=60)
+        assert cache.get("a") == {"x": 1}
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_expiracao(self):
+        cache = ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0)
+        cache.set("a", [1, 2, 3], ttl_seconds=-1)
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_sweep_remove_expirados(self):
+        cache = ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0)
+        cache.set("velho", "x", ttl_seconds=-1)
+        cache.set("novo", "y", ttl_seconds=60)
+        assert cache.sweep_expired() == 1
+        assert len(cache) == 1
+
+    def test_lru_respeita_orcamento_de_memoria(self):
+        payload = {"rows": ["x" * 100 for _ in range(10)]}
+        entry_size = estimate_size(payload) + 100  # margem para a chave
+        cache = ResponseCache(max_bytes=entry_size * 3, sweep_interval_seconds=0)
+        cache.set("k1", payload, ttl_seconds=60)
+        cache.set("k2", payload, ttl_seconds=60)
+        cache.get("k1")  # k1 passa a ser o mais recente
+        cache.set("k3", payload, ttl_seconds=60)
+        cache.set("k4", payload, ttl_seconds=60)
+        assert cache.get("k2") is None
+        assert cache.get("k1") is not None
+        stats = cache.stats()
+        assert stats["bytes"] <= entry_size * 3
+        assert stats["evictions"] >= 1
+
+    def test_payload_maior_que_orcamento_nao_e_armazenado(self):
+        cache = ResponseCache(max_bytes=100, sweep_interval_seconds=0)
+        cache.set("grande", "x" * 1000, ttl_seconds=60)
+        assert cache.get("grande") is None
+        assert cache.stats()["rejected_oversize"] == 1
+
+    def test_janela_stale_apos_ttl_suave(self):
+        cache = ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0)
+        cache.set("a", {"v": 1}, ttl_seconds=-1, stale_ttl_seconds=60)
+        assert cache.get("a") is None
+        assert cache.lookup("a") == ({"v": 1}, "stale")
+        cache.set("b", {"v": 2}, ttl_seconds=-2, stale_ttl_seconds=1)
+        assert cache.lookup("b") == (None, None)
+
+    def test_limite_de_entradas(self):
+        cache = ResponseCache(max_bytes=0, max_entries=2, sweep_interval_seconds=0)
+        for key in ("a", "b", "c"):
+            cache.set(key, key, ttl_seconds=60)
+        assert len(cache) == 2
+        assert cache.get("a") is None
+
+
+class TestSingleFlight:
+    def test_chamadas_concorrentes_compartilham_execucao(self):
+        import threading
+        from api.single_flight import SingleFlight
+
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"ok": True}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+            for _ in range(4)
+        ]
+        for thread in followers:
+            thread.start()
+        while flight.stats()["waiting"] < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert results == [{"ok": True}] * 5
+        assert flight.stats()["coalesced"] == 4
+        assert flight.stats()["in_flight"] == 0
+
+    def test_erro_do_lider_propaga_e_libera_chave(self):
+        from api.single_flight import SingleFlight
+
+        flight = SingleFlight()
+
+        def boom():
+            raise ValueError("falhou")
+
+        try:
+            flight.do("k", boom)
+        except ValueError:
+            pass
+        assert flight.do("k", lambda: 42) == 42
+        assert flight.stats()["errors"] == 1
+
+
+class TestStaleWhileRevalidate:
+    @pytest.fixture()
+    def api(self):
+        with patch("google.cloud.bigquery.Client", return_value=MagicMock()):
+            with patch("google.generativeai.configure"):
+                import simple_api
+        from fastapi.testclient import TestClient
+
+        simple_api.CACHE.clear()
+        job = MagicMock()
+        job.result.return_value = [
+            {"deals_count": 1, "gross": 1.0, "net": 1.0, "seller": "A", "text": "x", "value": 1, "reason": "r", "avg_cycle_days": 1}
+        ]
+        fake_client = MagicMock()
+        fake_client.query.return_value = job
+        with patch.object(simple_api, "get_bq_client", return_value=fake_client):
+            yield simple_api, TestClient(simple_api.app), fake_client
+
+    def test_header_fresh_stale_e_revalidacao(self, api):
+        simple_api, client, fake_client = api
+        first = client.get("/api/dashboard?year=2026")
+        assert first.status_code == 200
+        assert first.headers["X-Cache-Status"] == "miss"
+        assert client.get("/api/dashboard?year=2026").headers["X-Cache-Status"] == "fresh"
+
+        key = simple_api.build_cache_key(
+            "/api/dashboard", {"year": 2026, "quarter": None, "month": None, "seller": None}
+        )
+        simple_api.CACHE.l1._entries[key]["stale_at"] = time.time() - 1
+        calls_before = fake_client.query.call_count
+
+        stale = client.get("/api/dashboard?year=2026")
+        assert stale.status_code == 200
+        assert stale.headers["X-Cache-Status"] == "stale"
+
+        deadline = time.time() + 5
+        while time.time() < deadline and simple_api.CACHE.lookup(key)[1] != "fresh":
+            time.sleep(0.05)
+        assert simple_api.CACHE.lookup(key)[1] == "fresh"
+        assert fake_client.query.call_count > calls_before
+
+    def test_nocache_ignora_cache(self, api):
+        _, client, _ = api
+        resp = client.get("/api/dashboard?nocache=true")
+        assert resp.headers["X-Cache-Status"] == "bypass"
+
+
+class TestTieredCache:
+    def _make(self, backend, version="v1"):
+        from api.tiered_cache import TieredCache
+
+        return TieredCache(
+            "teste",
+            ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0),
+            l2=backend,
+            version=version,
+        )
+
+    def test_instancias_compartilham_l2(self, tmp_path):
+        from api.tiered_cache import SqliteBackend
+
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        instance_a = self._make(backend)
+        instance_b = self._make(backend)
+        payload = {"rows": [{"Vendedor": "A", "Net": 10.5}], "columns": {"x", "y"}}
+        instance_a.set("/api/metrics?year=2026", payload, ttl_seconds=60)
+
+        assert instance_b.get("/api/metrics?year=2026") == payload
+        assert instance_b.stats()["l2"]["hits"] == 1
+        # promovido para o L1 da instância B
+        assert instance_b.l1.get("/api/metrics?year=2026") == payload
+
+    def test_versao_nova_invalida_chaves_antigas(self, tmp_path):
+        from api.tiered_cache import SqliteBackend
+
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        self._make(backend, version="rev-1").set("k", "antigo", ttl_seconds=60)
+        assert self._make(backend, version="rev-2").get("k") is None
+
+    def test_l2_indisponivel_nao_quebra(self):
+        broken = MagicMock()
+        broken.get.side_effect = ConnectionError("down")
+        broken.set.side_effect = ConnectionError("down")
+        cache = self._make(broken)
+        cache.set("k", 1, ttl_seconds=60)
+        assert cache.get("k") == 1
+        cache.l1.clear()
+        assert cache.get("k") is None
+        assert cache.stats()["l2"]["errors"] >= 2
+
+    def test_payload_l2_preserva_tipos(self):
+        import datetime
+        from decimal import Decimal
+
+        import numpy as np
+        from api.tiered_cache import decode_payload, encode_payload
+
+        data = {
+            "dia": datetime.date(2026, 3, 1),
+            "quando": datetime.datetime(2026, 3, 1, 12, 30),
+            "valor": Decimal("10.50"),
+            "par": (1, "a"),
+            "por_ano": {2026: 3},
+            "vetor": np.arange(6, dtype=np.float32).reshape(2, 3),
+        }
+        entry = decode_payload(encode_payload(data, 1.0, 2.0, {"pipeline": 1}, 0.5))
+        vetor = entry.pop("data").pop("vetor")
+        assert vetor.dtype == np.float32 and vetor.shape == (2, 3)
+        assert vetor.tolist() == data.pop("vetor").tolist()
+        assert entry["tags"] == {"pipeline": 1}
+        assert decode_payload(encode_payload(data, 1.0, 2.0))["data"] == data
+
+    def test_payload_pickle_e_rejeitado(self, tmp_path):
+        import pickle
+        import zlib
+        from api.tiered_cache import SqliteBackend
+
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        cache = self._make(backend)
+        backend.set(cache.l2_key("k"), zlib.compress(pickle.dumps((0, 9e12, "x", {}, 0))), 60)
+        assert cache.get("k") is None
+        assert cache.stats()["l2"]["errors"] == 1
+
+    def test_tipo_desconhecido_nao_vai_para_l2(self, tmp_path):
+        from api.tiered_cache import SqliteBackend
+
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        cache = self._make(backend)
+        cache.set("k", object(), ttl_seconds=60)
+        assert backend.get(cache.l2_key("k")) is None
+        assert cache.stats()["l2"]["errors"] == 1
+
+    def test_invalidate_tags_limpa_l2(self, tmp_path):
+        from api.tiered_cache import SqliteBackend
+
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        instance_a = self._make(backend)
+        instance_b = self._make(backend)
+        instance_a.set("tagged", "v", ttl_seconds=60, tags={"pipeline": 1})
+        instance_a.set("outra", "w", ttl_seconds=60, tags={"sales": 1})
+        assert instance_a.invalidate_tags(["pipeline"]) == 1
+        # sem validador: só a remoção no L2 impede a leitura da cópia antiga
+        assert instance_b.get("tagged") is None
+        assert instance_b.get("outra") == "w"
+        assert instance_a.stats()["l2"]["invalidations"] == 1
+
+
+class TestFreshnessInvalidation:
+    def test_watcher_detecta_tabela_recarregada(self):
+        from api.freshness import TableFreshnessWatcher
+
+        versions = {"pipeline": 1, "closed_deals_won": 1}
+        watcher = TableFreshnessWatcher(lambda: dict(versions), poll_interval_seconds=60)
+        changes = []
+        watcher.add_listener(changes.append)
+
+        assert watcher.poll() == []
+        assert watcher.healthy()
+        versions["pipeline"] = 2
+        assert watcher.poll() == ["pipeline"]
+        assert changes == [["pipeline"]]
+        assert watcher.matches({"pipeline": 2, "closed_deals_won": 1})
+        assert not watcher.matches({"pipeline": 1})
+
+    def test_inicio_concorrente_cria_uma_thread(self):
+        import threading
+        from api.freshness import TableFreshnessWatcher
+
+        calls = []
+        polled = threading.Event()
+
+        def fetch():
+            calls.append(threading.current_thread().name)
+            polled.set()
+            return {"pipeline": 1}
+
+        watcher = TableFreshnessWatcher(fetch, poll_interval_seconds=3600)
+        barrier = threading.Barrier(8)
+        errors = []
+
+        def start():
+            barrier.wait()
+            try:
+                watcher.ensure_started()
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=start) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        # primeiro poll roda na thread de fundo, não na requisição
+        assert polled.wait(5)
+        deadline = time.monotonic() + 5
+        while not watcher.healthy() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert calls == ["table-freshness"]
+        assert watcher.healthy()
+
+    def test_invalida_apenas_entradas_afetadas(self):
+        cache = ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0)
+        cache.set("/api/pipeline", "p", ttl_seconds=3600, tags={"pipeline": 1})
+        cache.set("/api/closed/won", "w", ttl_seconds=3600, tags={"closed_deals_won": 1})
+        cache.set("/api/revenue/weekly", "r", ttl_seconds=60)
+
+        assert cache.invalidate_tags(["pipeline"]) == 1
+        assert cache.get("/api/pipeline") is None
+        assert cache.get("/api/closed/won") == "w"
+        assert cache.get("/api/revenue/weekly") == "r"
+
+    def test_validador_rejeita_versao_antiga(self):
+        from api.freshness import TableFreshnessWatcher
+
+        versions = {"pipeline": 1}
+        watcher = TableFreshnessWatcher(lambda: dict(versions))
+        watcher.poll()
+        cache = ResponseCache(
+            max_bytes=1_000_000,
+            sweep_interval_seconds=0,
+            validator=lambda entry: not entry["tags"] or watcher.matches(entry["tags"]),
+        )
+        cache.set("k", "v", ttl_seconds=3600, tags=watcher.snapshot(["pipeline"]))
+        assert cache.get("k") == "v"
+        versions["pipeline"] = 2
+        watcher.poll()
+        assert cache.lookup("k") == (None, None)
+        assert cache.stats()["invalidations"] == 1
+
+    def test_l2_respeita_tags(self, tmp_path):
+        from api.tiered_cache import SqliteBackend, TieredCache
+
+        current = {"pipeline": 1}
+        validator = lambda entry: all(current.get(t) == v for t, v in entry["tags"].items())
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        writer = TieredCache("t", ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0, validator=validator), l2=backend, version="v1")
+        reader = TieredCache("t", ResponseCache(max_bytes=1_000_000, sweep_interval_seconds=0, validator=validator), l2=backend, version="v1")
+        writer.set("k", "v", ttl_seconds=3600, tags={"pipeline": 1})
+        current["pipeline"] = 2
+        assert reader.get("k") is None
+        assert reader.stats()["l2"]["invalidations"] == 1
@@ -0,0 +1,232 @@
+"""
+Testes dos snapshots colunares das listas (api/columnar_snapshot.py).
+Filtro + ordenação do snapshot são comparados com o cálculo direto sobre
+as linhas, como o WHERE/ORDER BY das queries de /api/pipeline e /api/closed/*.
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_columnar_snapshot.py -v
+"""
+
+import random
+import sys
+import os
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.columnar_snapshot import ColumnarTable, SnapshotStore, deal_list_mask
+
+SELLERS = ["Alex", "Bia", "Carlos", None]
+
+
+def _rows(seed, n):
+    rng = random.Random(seed)
+    rows = []
+    for index in range(n):
+        year = rng.choice([2025, 2026, None])
+        month = rng.randint(1, 12) if year else None
+        rows.append({
+            "Oportunidade": f"OP-{index:04d}",
+            "Vendedor": rng.choice(SELLERS),
+            "Status": rng.choice(["Ganho", "Perdido", None]),
+            "Fiscal_Q": rng.choice(["FY26-Q1", "FY26-Q2", "FY25-Q4", None]),
+            "Portfolio": rng.choice(["Cloud ", "Dados", "", None]),
+            "Data_Fechamento": date(year, month, 1) if year else None,
+            "Gross": rng.choice([None, round(rng.uniform(0, 1000), 2)]),
+            "Atividades": rng.choice([None, rng.randint(0, 40)]),
+            "_snapshot_year": year,
+            "_snapshot_month": month,
+        })
+    return rows
+
+
+def _expected(rows, year, quarter, month, sellers, portfolio, limit, fiscal_fallback):
+    fq = f"FY{str(year)[-2:]}-Q{quarter}" if (fiscal_fallback and year and quarter) else None
+
+    def match(row):
+        if year and not (row["_snapshot_year"] == year or (fq and row["Fiscal_Q"] == fq)):
+            return False
+        if quarter:
+            start = (quarter - 1) * 3 + 1
+            in_months = row["_snapshot_month"] is not None and start <= row["_snapshot_month"] <= start + 2
+            if fiscal_fallback:
+                by_label = row["Fiscal_Q"] == fq if fq else str(row["Fiscal_Q"] or "").endswith(f"-Q{quarter}")
+                in_months = in_months or by_label
+            if not in_months:
+                return False
+        if month and row["_snapshot_month"] != month:
+            return False
+        if sellers and row["Vendedor"] not in sellers:
+            return False
+        if portfolio and str(row["Portfolio"]).strip() not in portfolio:
+            return False
+        return True
+
+    selected = [row for row in rows if match(row)]
+    # ORDER BY Gross DESC: NULLs por último
+    selected.sort(key=lambda row: (row["Gross"] is None, -(row["Gross"] or 0)))
+    return selected[:limit]
+
+
+@pytest.fixture(scope="module")
+def tabela():
+    rows = _rows(7, 600)
+    return rows, ColumnarTable(rows, key_column="Oportunidade", versions={"closed_deals_won": 3})
+
+
+class TestColumnarTable:
+    @pytest.mark.parametrize("year,quarter,month,sellers,portfolio,limit,fiscal", [
+        (None, None, None, None, None, 5000, False),
+        (2026, None, None, None, None, 50, False),
+        (2026, 2, None, ["Alex", "Bia"], None, 5000, True),
+        (None, 3, None, None, ["Cloud"], 20, True),
+        (2025, None, 7, ["Carlos"], None, 5000, True),
+        (2026, 1, 2, None, ["Dados", "Cloud"], 10, False),
+    ])
+    def test_filtro_e_top_n_iguais_ao_calculo_direto(self, tabela, year, quarter, month, sellers, portfolio, limit, fiscal):
+        rows, table = tabela
+        mask = deal_list_mask(
+            table,
+            year=year,
+            quarter=quarter,
+            month=month,
+            sellers=sellers,
+            in_filters={"Portfolio": portfolio} if portfolio else {},
+            fiscal_fallback=fiscal,
+            strip_columns=("Portfolio",),
+        )
+        result = table.materialize(table.top_n(mask, "Gross", limit))
+        expected = _expected(rows, year, quarter, month, sellers, portfolio, limit, fiscal)
+
+        assert len(result) == len(expected)
+        assert [row["Gross"] for row in result] == [row["Gross"] for row in expected]
+        assert {row["Oportunidade"] for row in result if row["Gross"] is not None} == {
+            row["Oportunidade"] for row in expected if row["Gross"] is not None
+        }
+
+    def test_linhas_preservam_tipos_e_escondem_colunas_internas(self, tabela):
+        rows, table = tabela
+        first = table.lookup("OP-0000")
+        assert first == {k: v for k, v in rows[0].items() if not k.startswith("_snapshot_")}
+        assert table.lookup("OP-9999") is None
+        atividades = [row["Atividades"] for row in table.materialize(np.arange(50))]
+        assert all(v is None or isinstance(v, int) for v in atividades)
+
+    def test_decimal_vira_coluna_numerica(self):
+        table = ColumnarTable([{"Gross": Decimal("10.5")}, {"Gross": None}, {"Gross": Decimal("2")}])
+        assert table.materialize(table.top_n(table.all(), "Gross", 10)) == [
+            {"Gross": 10.5}, {"Gross": 2.0}, {"Gross": None},
+        ]
+
+    def test_tabela_vazia(self):
+        table = ColumnarTable([])
+        mask = deal_list_mask(
+            table, year=2026, quarter=1, month=None, sellers=["A"], in_filters={}, fiscal_fallback=True,
+        )
+        assert table.materialize(table.top_n(mask, "Gross", 10)) == []
+
+
+class TestSnapshotStore:
+    def test_recarrega_quando_versao_muda_e_troca_referencia(self):
+        current = {"ok": True}
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return ColumnarTable([{"Oportunidade": "A", "Gross": float(len(loads))}], key_column="Oportunidade")
+
+        store = SnapshotStore({"pipeline": loader}, lambda name, table: current["ok"])
+        assert store.get("pipeline") is None
+        assert store.wait("pipeline", timeout=5)
+        first = store.get("pipeline")
+        assert store.get("pipeline") is first
+        current["ok"] = False
+        # desatualizado: BigQuery responde enquanto o novo snapshot carrega
+        assert store.get("pipeline") is None
+        assert store.wait("pipeline", timeout=5)
+        current["ok"] = True
+        second = store.get("pipeline")
+        assert second is not first and second.lookup("A")["Gross"] == 2.0
+        assert first.lookup("A")["Gross"] == 1.0
+
+    def test_carga_nao_roda_na_thread_da_requisicao(self):
+        release = threading.Event()
+        threads = []
+
+        def loader():
+            threads.append(threading.current_thread().name)
+            release.wait(5)
+            return ColumnarTable([{"Oportunidade": "A", "Gross": 1.0}], key_column="Oportunidade")
+
+        store = SnapshotStore({"pipeline": loader}, lambda name, table: True)
+        started = time.perf_counter()
+        assert store.get("pipeline") is None
+        assert store.get("pipeline") is None
+        assert time.perf_counter() - started < 1
+        assert store.stats()["tables"]["pipeline"]["loading"] is True
+        release.set()
+        assert store.wait("pipeline", timeout=5)
+        assert store.get("pipeline") is not None
+        assert threads == ["snapshot-pipeline"]
+
+    def test_falha_na_carga_cai_para_bigquery_e_espera_retry(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            raise RuntimeError("bq indisponível")
+
+        store = SnapshotStore({"pipeline": loader}, lambda name, table: True, retry_seconds=60)
+        assert store.get("pipeline") is None
+        assert store.wait("pipeline", timeout=5)
+        assert store.get("pipeline") is None
+        assert len(calls) == 1
+        stats = store.stats()
+        assert stats["load_errors"] == 1 and stats["fallbacks"] == 2
+        assert stats["tables"]["pipeline"]["loaded"] is False
+
+
+@pytest.fixture()
+def simple_api():
+    with patch("google.cloud.bigquery.Client", return_value=MagicMock()):
+        with patch("google.generativeai.configure"):
+            import simple_api as module
+    return module
+
+
+class TestListFromSnapshot:
+    def _store(self, rows):
+        table = ColumnarTable(rows, key_column="Oportunidade")
+        store = SnapshotStore({name: (lambda: table) for name in ("pipeline", "closed_deals_won")}, lambda n, t: True)
+        for name in store.table_names:
+            store.refresh(name)
+        return store
+
+    def test_filtro_nao_suportado_usa_bigquery(self, simple_api):
+        store = self._store(_rows(3, 50))
+        with patch.object(simple_api, "LIST_SNAPSHOTS", store):
+            params = {"year": 2026, "seller": "Alex", "status_gtm": "Ativo", "limit": 10}
+            assert simple_api.list_from_snapshot("pipeline", params) is None
+            assert simple_api.list_from_snapshot("pipeline", {**params, "status_gtm": None}) is not None
+            assert simple_api.list_from_snapshot("pipeline", {**params, "status_gtm": None}, nocache=True) is None
+        assert store.stats()["loads"] == 2
+
+    def test_fase_dos_fechados_filtra_status(self, simple_api):
+        rows = _rows(5, 200)
+        store = self._store(rows)
+        with patch.object(simple_api, "LIST_SNAPSHOTS", store):
+            result = simple_api.list_from_snapshot(
+                "closed_deals_won", {"phase": "Ganho", "portfolio": "Cloud", "limit": 5000}
+            )
+        expected = [r for r in rows if r["Status"] == "Ganho" and str(r["Portfolio"]).strip() == "Cloud"]
+        assert sorted(r["Oportunidade"] for r in result) == sorted(r["Oportunidade"] for r in expected)
@@ -0,0 +1,100 @@
+"""
+Testes do export em streaming (api/endpoints/export.py).
+BigQuery é simulado com um client fake (sem credenciais GCP).
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_export.py -v
+"""
+
+import csv
+import gzip
+import io
+import json
+import sys
+import os
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.endpoints import export
+
+
+def _row(i):
+    return {
+        "Oportunidade": f"Deal {i}",
+        "Vendedor": "Ana",
+        "Conta": "ACME",
+        "Produtos": "GWS",
+        "Gross": 1000.0 + i,
+        "Net": 500.0,
+        "Fiscal_Q": "FY26-Q1",
+        "Confianca": 50,
+        "Dias_Funil": 10,
+        "Atividades": 3,
+        "Categoria_Pauta": "CRITICO",
+        "Risco_Score": 4,
+        "Risk_Tags": "tag",
+        "Proxima_Acao_Pipeline": "ligar",
+    }
+
+
+def _fake_client(pages):
+    iterator = SimpleNamespace(pages=pages, schema=[
+        SimpleNamespace(name="Gross", field_type="FLOAT"),
+        SimpleNamespace(name="Confianca", field_type="INTEGER"),
+    ])
+    job = MagicMock()
+    job.result.return_value = iterator
+    client = MagicMock()
+    client.query.return_value = job
+    return client
+
+
+@pytest.fixture()
+def client():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    app.include_router(export.router, prefix="/api")
+    return TestClient(app)
+
+
+PAGES = [[_row(0), _row(1)], [_row(2)]]
+
+
+class TestExportStreaming:
+    def test_csv_paginado(self, client):
+        with patch.object(export, "get_bq_client", return_value=_fake_client(PAGES)):
+            resp = client.get("/api/export/pauta-semanal-csv?seller=Ana")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/csv")
+        rows = list(csv.reader(io.StringIO(resp.text)))
+        assert rows[0][10] == "Categoria"
+        assert [r[0] for r in rows[1:]] == ["Deal 0", "Deal 1", "Deal 2"]
+
+    def test_jsonl_gzip(self, client):
+        with patch.object(export, "get_bq_client", return_value=_fake_client(PAGES)):
+            resp = client.get("/api/export/pauta-semanal-csv?format=jsonl&gzip=true")
+        assert resp.status_code == 200
+        assert resp.headers["content-disposition"].endswith(".jsonl.gz")
+        lines = gzip.decompress(resp.content).decode("utf-8").splitlines()
+        assert json.loads(lines[2])["Proxima_Acao"] == "ligar"
+
+    def test_parquet(self, client):
+        pq = pytest.importorskip("pyarrow.parquet")
+        with patch.object(export, "get_bq_client", return_value=_fake_client(PAGES)):
+            resp = client.get("/api/export/pauta-semanal-csv?format=parquet")
+        assert resp.status_code == 200
+        table = pq.read_table(io.BytesIO(resp.content))
+        assert table.num_rows == 3
+        assert table.column("Gross").to_pylist() == [1000.0, 1001.0, 1002.0]
+
+    def test_formato_invalido(self, client):
+        resp = client.get("/api/export/pauta-semanal-csv?format=xlsx")
+        assert resp.status_code == 422
@@ -0,0 +1,119 @@
+"""
+Testes do store de respostas do LLM (api/llm_cache.py) e do limite de
+tamanho do L2 em arquivo (SqliteBackend).
+Chave = modelo + versão do prompt + hash do prompt: mesmo prompt não gera de
+novo, nem em outra instância (L2 persistente); falhas não são gravadas.
+Não requerem credenciais GCP (geração simulada).
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_llm_cache.py -v
+"""
+
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api import llm_cache
+from api.response_cache import ResponseCache
+from api.single_flight import SingleFlight
+from api.tiered_cache import SqliteBackend, TieredCache
+
+
+def _store(backend=None):
+    return TieredCache("llm_responses", ResponseCache(max_bytes=0, max_entries=100), l2=backend, version="llm")
+
+
+def _ok(text="VITORIAS:\n- a"):
+    return {"ok": True, "text": text, "provider": "vertex_ai", "model": "gemini-2.5-pro", "error": ""}
+
+
+def _generate(prompt, **kwargs):
+    return llm_cache.generate_cached_text(
+        prompt, prompt_version=kwargs.pop("prompt_version", "v1"), model_name="gemini-2.5-pro",
+        api_key=None, project_id="p", location="us-central1",
+    )
+
+
+@pytest.fixture()
+def geracao():
+    calls = []
+
+    def fake(prompt, **kwargs):
+        calls.append(prompt)
+        return _ok(f"resposta {len(calls)}")
+
+    with patch.object(llm_cache, "_LLM_RESPONSE_CACHE", _store()), \
+            patch.object(llm_cache, "_LLM_FLIGHTS", SingleFlight()), \
+            patch.object(llm_cache, "generate_gemini_text_with_status", side_effect=fake):
+        yield calls
+
+
+class TestStoreDeRespostas:
+    def test_mesmo_prompt_nao_gera_de_novo(self, geracao):
+        first = _generate("prompt A")
+        second = _generate("prompt A")
+        assert geracao == ["prompt A"]
+        assert second["text"] == first["text"] and second["cached"] is True
+        assert "cached" not in first
+
+    def test_versao_do_prompt_faz_parte_da_chave(self, geracao):
+        _generate("prompt A")
+        _generate("prompt A", prompt_version="v2")
+        _generate("prompt B")
+        assert len(geracao) == 3
+
+    def test_falha_nao_e_gravada(self, geracao):
+        failed = {"ok": False, "text": "", "provider": "none", "model": "m", "error": "x"}
+        with patch.object(llm_cache, "generate_gemini_text_with_status", return_value=failed) as generate:
+            assert _generate("prompt A")["ok"] is False
+            assert _generate("prompt A")["ok"] is False
+        assert generate.call_count == 2
+
+    def test_chamadas_simultaneas_geram_uma_vez(self, geracao):
+        def slow(prompt, **kwargs):
+            geracao.append(prompt)
+            time.sleep(0.1)
+            return _ok()
+
+        results = []
+        with patch.object(llm_cache, "generate_gemini_text_with_status", side_effect=slow):
+            threads = [threading.Thread(target=lambda: results.append(_generate("prompt C"))) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert geracao == ["prompt C"]
+        assert len(results) == 4 and all(r["ok"] for r in results)
+
+    def test_l2_persistente_entre_instancias(self, tmp_path, geracao):
+        backend = SqliteBackend(str(tmp_path / "llm.db"))
+        with patch.object(llm_cache, "_LLM_RESPONSE_CACHE", _store(backend)):
+            _generate("prompt A")
+        # Nova instância (L1 vazio), mesmo arquivo
+        with patch.object(llm_cache, "_LLM_RESPONSE_CACHE", _store(SqliteBackend(str(tmp_path / "llm.db")))):
+            assert _generate("prompt A")["cached"] is True
+        assert len(geracao) == 1
+
+
+class TestSqliteLimiteDeTamanho:
+    def test_remove_os_que_expiram_primeiro(self, tmp_path):
+        backend = SqliteBackend(str(tmp_path / "cache.db"), max_bytes=2500)
+        backend._EVICT_EVERY_WRITES = 1
+        for i in range(5):
+            backend.set(f"k{i}", b"x" * 1000, ttl_seconds=100 + i)
+        kept = [f"k{i}" for i in range(5) if backend.get(f"k{i}") is not None]
+        assert kept == ["k3", "k4"]
+
+    def test_sem_limite_nao_remove(self, tmp_path):
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        for i in range(5):
+            backend.set(f"k{i}", b"x" * 1000, ttl_seconds=100)
+        assert all(backend.get(f"k{i}") is not None for i in range(5))
@@ -0,0 +1,308 @@
+"""
+Testes do registro de saúde dos modelos Gemini (api/llm_client.py).
+Circuito por modelo: abre após falhas seguidas, pula o modelo enquanto
+aberto, libera uma chamada de teste (half-open) e reordena os candidatos.
+Hedging: tentativa lenta ganha uma paralela, prazo por tentativa (a partir
+do início da execução) e total; tentativa que nem começou não conta como falha.
+Tudo via generate_gemini_text_with_status (lista real de tentativas).
+Não requerem credenciais GCP (modelos simulados).
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_llm_client.py -v
+"""
+
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api import llm_client
+from api.llm_client import ModelHealthRegistry, generate_gemini_text_with_status
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture()
+def registro():
+    clock = _Clock()
+    registry = ModelHealthRegistry()
+    with patch.object(llm_client, "LLM_HEALTH", registry), \
+            patch.object(llm_client.time, "time", clock.time), \
+            patch.dict(os.environ, {"USE_VERTEX_AI": "false", "GEMINI_MODEL_FALLBACKS": ""}):
+        yield registry, clock
+
+
+def _fake_model(behaviour, calls):
+    """get_model simulado: behaviour[modelo] = texto ou exceção."""
+    def get_model(name):
+        model = MagicMock()
+
+        def generate_content(prompt, **kwargs):
+            calls.append(name)
+            outcome = behaviour.get(name, RuntimeError("503 unavailable"))
+            if isinstance(outcome, Exception):
+                raise outcome
+            return MagicMock(text=outcome)
+
+        model.generate_content.side_effect = generate_content
+        return model
+    return get_model
+
+
+def _call(behaviour, calls, candidates=("a", "b")):
+    """generate_gemini_text_with_status só com API key; None quando nenhum modelo responde."""
+    registry = llm_client.LLM_HEALTH
+    get_model = _fake_model(behaviour, calls)
+    with patch.object(llm_client, "_build_model_candidates", return_value=list(candidates)), \
+            patch.object(registry, "api_key_model", lambda key, name: get_model(name)):
+        result = generate_gemini_text_with_status(
+            "prompt", model_name=candidates[0], api_key="k", project_id=None, location=None,
+        )
+    return result if result["ok"] else None
+
+
+class TestCircuitBreaker:
+    def test_modelo_com_erro_cai_para_o_fim_da_fila(self, registro):
+        registry, _ = registro
+        calls = []
+        behaviour = {"a": RuntimeError("429 quota exceeded"), "b": "ok"}
+        assert _call(behaviour, calls)["model"] == "b"
+        calls.clear()
+        assert _call(behaviour, calls)["model"] == "b"
+        assert calls == ["b"]
+        assert registry.order("gemini_api_key", ["a", "b"]) == ["b", "a"]
+
+    def test_abre_apos_falhas_seguidas_e_pula_o_modelo(self, registro):
+        registry, _ = registro
+        calls = []
+        for _ in range(llm_client.LLM_CIRCUIT_FAILURE_THRESHOLD):
+            assert _call({}, calls, candidates=["a"]) is None
+        assert registry.stats()["gemini_api_key/a"]["state"] == "open"
+        calls.clear()
+        assert _call({"b": "ok"}, calls)["model"] == "b"
+        assert calls == ["b"]
+
+    def test_erro_permanente_abre_na_hora(self, registro):
+        registry, _ = registro
+        calls = []
+        behaviour = {"a": RuntimeError("404 model not found"), "b": "ok"}
+        _call(behaviour, calls)
+        stats = registry.stats()["gemini_api_key/a"]
+        assert stats["state"] == "open"
+        assert stats["reopens_in_seconds"] == llm_client.LLM_CIRCUIT_MAX_OPEN_SECONDS
+
+    def test_half_open_dobra_tempo_com_falha_e_fecha_com_sucesso(self, registro):
+        registry, clock = registro
+        calls = []
+        for _ in range(llm_client.LLM_CIRCUIT_FAILURE_THRESHOLD):
+            _call({}, calls, candidates=["a"])
+        clock.now += llm_client.LLM_CIRCUIT_OPEN_SECONDS + 1
+
+        calls.clear()
+        assert _call({}, calls, candidates=["a"]) is None  # teste falha
+        assert calls == ["a"]
+        assert registry.stats()["gemini_api_key/a"]["reopens_in_seconds"] == 2 * llm_client.LLM_CIRCUIT_OPEN_SECONDS
+
+        clock.now += 2 * llm_client.LLM_CIRCUIT_OPEN_SECONDS + 1
+        assert _call({"a": "voltou"}, calls, candidates=["a"])["model"] == "a"
+        assert registry.stats()["gemini_api_key/a"]["state"] == "closed"
+
+    def test_so_um_teste_half_open_por_vez(self, registro):
+        registry, clock = registro
+        for _ in range(llm_client.LLM_CIRCUIT_FAILURE_THRESHOLD):
+            _call({}, [], candidates=["a"])
+        clock.now += llm_client.LLM_CIRCUIT_OPEN_SECONDS + 1
+        assert registry.order("gemini_api_key", ["a", "b"]) == ["b", "a"]
+        registry.begin("gemini_api_key", "a")
+        assert registry.order("gemini_api_key", ["a", "b"]) == ["b"]
+
+    def test_todos_abertos_ainda_tenta_um(self, registro):
+        calls = []
+        for _ in range(llm_client.LLM_CIRCUIT_FAILURE_THRESHOLD):
+            _call({}, calls)
+        calls.clear()
+        assert _call({}, calls) is None
+        assert len(calls) == 1
+
+    def test_resultado_mantem_formato(self, registro):
+        registry, _ = registro
+        with patch.object(registry, "api_key_model", lambda key, name: _fake_model({name: "texto"}, [])(name)):
+            result = generate_gemini_text_with_status(
+                "prompt", model_name="gemini-2.5-pro", api_key="k", project_id=None, location=None,
+            )
+        assert result == {
+            "ok": True, "text": "texto", "provider": "gemini_api_key", "model": "gemini-2.5-pro", "error": "",
+        }
+
+
+class TestClientesEmCache:
+    def test_configura_uma_vez_e_reusa_modelo(self):
+        registry = ModelHealthRegistry()
+        fake_genai = MagicMock()
+        with patch.dict(sys.modules, {"google.generativeai": fake_genai}):
+            import google
+            with patch.object(google, "generativeai", fake_genai, create=True):
+                first = registry.api_key_model("k", "m")
+                second = registry.api_key_model("k", "m")
+        assert first is second
+        assert fake_genai.configure.call_count == 1
+        assert fake_genai.GenerativeModel.call_count == 1
+
+
+def _slow_model(delays, calls, release):
+    """Modelo simulado: modelo em delays dorme (ou trava até release)."""
+    def get_model(name):
+        model = MagicMock()
+
+        def generate_content(prompt, **kwargs):
+            calls.append(name)
+            delay = delays.get(name, 0)
+            if delay is None:
+                release.wait(5)
+                raise RuntimeError("connection reset")
+            time.sleep(delay)
+            return MagicMock(text=f"resposta {name}")
+
+        model.generate_content.side_effect = generate_content
+        return model
+    return get_model
+
+
+def _vertex(candidates, get_model):
+    """generate_gemini_text_with_status só com Vertex (lista de tentativas real)."""
+    registry = llm_client.LLM_HEALTH
+    with patch.object(llm_client, "_build_model_candidates", return_value=list(candidates)), \
+            patch.object(registry, "vertex_model", lambda project, location, name: get_model(name)), \
+            patch.dict(os.environ, {"USE_VERTEX_AI": "true"}):
+        return generate_gemini_text_with_status(
+            "prompt", model_name=candidates[0], api_key=None, project_id="p", location="us-central1",
+        )
+
+
+@pytest.fixture()
+def hedge():
+    release = threading.Event()
+    with patch.object(llm_client, "LLM_HEALTH", ModelHealthRegistry()), \
+            patch.object(llm_client, "LLM_HEDGE_ENABLED", True), \
+            patch.object(llm_client, "LLM_HEDGE_DELAY_SECONDS", 0.05), \
+            patch.object(llm_client, "LLM_ATTEMPT_TIMEOUT_SECONDS", 0.3), \
+            patch.object(llm_client, "LLM_TOTAL_TIMEOUT_SECONDS", 2.0):
+        yield release
+    release.set()
+
+
+class TestHedging:
+    def test_tentativa_lenta_perde_para_a_paralela(self, hedge):
+        calls = []
+        started = time.monotonic()
+        result = _vertex(["a", "b"], _slow_model({"a": None}, calls, hedge))
+        assert result["ok"] and result["model"] == "b" and result["text"] == "resposta b"
+        assert result["provider"] == "vertex_ai"
+        assert time.monotonic() - started < 0.3
+        assert calls == ["a", "b"]
+
+    def test_sem_hedging_espera_o_prazo_da_tentativa(self, hedge):
+        calls = []
+        with patch.object(llm_client, "LLM_HEDGE_ENABLED", False):
+            result = _vertex(["a", "b"], _slow_model({"a": None, "b": None}, calls, hedge))
+        assert result["ok"] is False
+        assert "timeout" in result["error"]
+        assert calls == ["a", "b"]
+        assert llm_client.LLM_HEALTH.stats()["vertex_ai/a"]["consecutive_failures"] == 1
+
+    def test_orcamento_total_encerra_a_requisicao(self, hedge):
+        calls = []
+        with patch.object(llm_client, "LLM_TOTAL_TIMEOUT_SECONDS", 0.2):
+            started = time.monotonic()
+            result = _vertex(["a", "b", "c", "d"], _slow_model({"a": None, "b": None, "c": None, "d": None}, calls, hedge))
+        assert result["ok"] is False
+        assert time.monotonic() - started < 0.6
+        assert "d" not in calls
+
+    def test_perdedor_libera_teste_half_open(self, hedge):
+        registry = llm_client.LLM_HEALTH
+        registry._entry("vertex_ai", "a").state = "half_open"
+        calls = []
+        # "a" em teste vai depois do saudável "b"; entra como paralela e perde
+        result = _vertex(["a", "b"], _slow_model({"a": 0.2, "b": 0.1}, calls, hedge))
+        assert result["model"] == "b" and calls == ["b", "a"]
+        time.sleep(0.3)
+        assert registry.stats()["vertex_ai/a"]["state"] == "closed"
+        assert registry._entry("vertex_ai", "a").probing is False
+
+    def test_vertex_falha_e_cai_para_api_key_com_timeout(self, hedge):
+        registry = llm_client.LLM_HEALTH
+        api_calls = []
+
+        def api_key_model(key, name):
+            model = MagicMock()
+
+            def generate_content(prompt, **kwargs):
+                api_calls.append((name, kwargs))
+                return MagicMock(text="via api key")
+
+            model.generate_content.side_effect = generate_content
+            return model
+
+        failing = _fake_model({}, [])
+        with patch.object(llm_client, "_build_model_candidates", return_value=["a"]), \
+                patch.object(registry, "vertex_model", lambda project, location, name: failing(name)), \
+                patch.object(registry, "api_key_model", api_key_model), \
+                patch.dict(os.environ, {"USE_VERTEX_AI": "true"}):
+            result = generate_gemini_text_with_status(
+                "prompt", model_name="a", api_key="k", project_id="p", location="us-central1",
+            )
+        assert result["provider"] == "gemini_api_key" and result["text"] == "via api key"
+        assert 0 < api_calls[0][1]["request_options"]["timeout"] <= 0.3
+
+
+class TestPoolOcupado:
+    def test_tentativa_que_nao_comecou_nao_conta_como_falha(self, hedge):
+        # Pool tomado por chamadas travadas: as tentativas ficam na fila até o orçamento acabar
+        pool = ThreadPoolExecutor(max_workers=1)
+        pool.submit(hedge.wait, 5)
+        registry = llm_client.LLM_HEALTH
+        registry._entry("vertex_ai", "b").state = "half_open"
+        calls = []
+        try:
+            with patch.object(llm_client, "_LLM_EXECUTOR", pool), \
+                    patch.object(llm_client, "LLM_TOTAL_TIMEOUT_SECONDS", 0.5):
+                result = _vertex(["a", "b"], _slow_model({}, calls, hedge))
+        finally:
+            hedge.set()
+            pool.shutdown(wait=True)
+        assert result["ok"] is False and "pool busy" in result["error"]
+        assert calls == []
+        stats = registry.stats()
+        assert stats["vertex_ai/a"]["state"] == "closed" and stats["vertex_ai/a"]["consecutive_failures"] == 0
+        assert stats["vertex_ai/b"]["consecutive_failures"] == 0
+        assert registry._entry("vertex_ai", "b").probing is False
+
+    def test_prazo_conta_a_partir_do_inicio_da_execucao(self, hedge):
+        # 0.2s na fila + 0.2s de execução: passa do prazo de 0.3s só se a fila contasse
+        blocker = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=1)
+        pool.submit(blocker.wait, 0.2)
+        calls = []
+        try:
+            with patch.object(llm_client, "_LLM_EXECUTOR", pool), \
+                    patch.object(llm_client, "LLM_HEDGE_ENABLED", False):
+                result = _vertex(["a"], _slow_model({"a": 0.2}, calls, hedge))
+        finally:
+            pool.shutdown(wait=True)
+        assert result["ok"] and result["model"] == "a"
+        assert llm_client.LLM_HEALTH.stats()["vertex_ai/a"]["consecutive_failures"] == 0
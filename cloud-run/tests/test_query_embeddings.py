@@ -0,0 +1,87 @@
+"""
+Testes do cache de embeddings das perguntas do RAG (api/rag/query_embeddings.py).
+Verifica que um texto já visto não chama ML.GENERATE_TEXT_EMBEDDING de novo e
+que o vetor vai como parâmetro para o VECTOR_SEARCH.
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_query_embeddings.py -v
+"""
+
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.rag import query_embeddings, retriever
+from api.response_cache import ResponseCache
+from api.tiered_cache import SqliteBackend, TieredCache
+
+VECTOR = [0.25, -0.5, 0.125]
+
+
+def _cache(l2=None):
+    return TieredCache("rag_query_embeddings", ResponseCache(max_bytes=1024 * 1024), l2=l2, version="embeddings")
+
+
+@pytest.fixture(autouse=True)
+def cache_isolado():
+    with patch.object(query_embeddings, "_EMBEDDING_CACHE", _cache()), \
+            patch.object(retriever, "RAG_VECTOR_INDEX_ENABLED", False):
+        yield
+
+
+def _client(rows):
+    client = MagicMock()
+    client.query.return_value.result.return_value = rows
+    return client
+
+
+class TestCacheDeEmbeddings:
+    def test_texto_normalizado_e_modelo_formam_a_chave(self):
+        model = query_embeddings.embedding_model_id("p", "d")
+        query_embeddings.set_cached_embedding(model, "  insights   de vendas\n", VECTOR)
+        assert query_embeddings.get_cached_embedding(model, "insights de vendas") == VECTOR
+        assert query_embeddings.get_cached_embedding(model, "Insights de vendas") is None
+        assert query_embeddings.get_cached_embedding(query_embeddings.embedding_model_id("p", "outro"), "insights de vendas") is None
+
+    def test_l2_persistente_serve_outra_instancia(self, tmp_path):
+        backend = SqliteBackend(str(tmp_path / "cache.db"))
+        model = query_embeddings.embedding_model_id("p", "d")
+        with patch.object(query_embeddings, "_EMBEDDING_CACHE", _cache(backend)):
+            query_embeddings.set_cached_embedding(model, "deal X", VECTOR)
+        with patch.object(query_embeddings, "_EMBEDDING_CACHE", _cache(backend)):
+            assert query_embeddings.get_cached_embedding(model, "deal X") == VECTOR
+
+    def test_embed_query_text_chama_o_modelo_uma_vez(self):
+        client = _client([{"embedding": VECTOR}])
+        for text in ("insights de vendas", " insights  de vendas "):
+            assert retriever.embed_query_text(client, project_id="p", dataset_id="d", query_text=text) == VECTOR
+        assert client.query.call_count == 1
+
+
+class TestVectorSearchComVetorEmCache:
+    def _retrieve(self, client):
+        return retriever.retrieve_similar_deals(
+            client, project_id="p", dataset_id="d", query_text="insights de vendas", top_k=5, where_clause="",
+        )
+
+    def test_segunda_busca_envia_vetor_como_parametro(self):
+        first = _client([
+            {"deal_id": "A", "distance": 0.1, "query_embedding": VECTOR},
+            {"deal_id": "B", "distance": 0.2, "query_embedding": None},
+        ])
+        assert self._retrieve(first) == [{"deal_id": "A", "distance": 0.1}, {"deal_id": "B", "distance": 0.2}]
+        assert "ML.GENERATE_TEXT_EMBEDDING" in first.query.call_args[0][0]
+
+        second = _client([{"deal_id": "A", "distance": 0.1}])
+        assert self._retrieve(second) == [{"deal_id": "A", "distance": 0.1}]
+        sql = second.query.call_args[0][0]
+        params = {p.name: p for p in second.query.call_args[1]["job_config"].query_parameters}
+        assert "ML.GENERATE_TEXT_EMBEDDING" not in sql and "@query_embedding" in sql
+        assert params["query_embedding"].values == VECTOR
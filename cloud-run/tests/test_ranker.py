@@ -0,0 +1,164 @@
+"""
+Testes do rerank híbrido do RAG (api/rag/ranker.py).
+Paridade: a versão vetorizada (ids de tokens em cache + numpy) devolve
+exatamente os mesmos scores e a mesma ordem da fórmula original por deal.
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_ranker.py -v
+"""
+
+import sys
+import os
+import copy
+import random
+import re
+from unittest.mock import patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.rag import ranker
+from api.rag.ranker import rerank_cache_stats, rerank_deals_by_context
+
+
+# ── Fórmula original (referência) ─────────────────────────────────────────────
+
+def _tokenize_ref(text):
+    return [token for token in re.split(r"[^\wÀ-ÿ]+", str(text or "").lower()) if len(token) > 2]
+
+
+def _lexical_ref(query_tokens, candidate_text):
+    if not query_tokens:
+        return 0.0
+    candidate_tokens = set(_tokenize_ref(candidate_text))
+    if not candidate_tokens:
+        return 0.0
+    overlap = sum(1 for token in query_tokens if token in candidate_tokens)
+    return overlap / max(1, len(set(query_tokens)))
+
+
+def rerank_ref(deals, *, query_text, seller=None, source=None, fiscal_q=None):
+    query_tokens = _tokenize_ref(query_text)
+    normalized_seller = str(seller or "").strip().lower()
+    normalized_source = str(source or "").strip().lower()
+    normalized_fiscal_q = str(fiscal_q or "").strip().upper()
+    reranked = []
+    for deal in deals:
+        similarity = float(deal.get("similarity") or 0.0)
+        searchable_text = " ".join([
+            str(deal.get("Oportunidade") or ""),
+            str(deal.get("Produtos") or ""),
+            str(deal.get("Segmento") or ""),
+            str(deal.get("Portfolio") or ""),
+            str(deal.get("content") or ""),
+        ])
+        lexical_score = _lexical_ref(query_tokens, searchable_text)
+        contextual_boost = 0.0
+        if normalized_seller and str(deal.get("Vendedor") or "").strip().lower() == normalized_seller:
+            contextual_boost += 0.12
+        if normalized_source and str(deal.get("source") or "").strip().lower() == normalized_source:
+            contextual_boost += 0.08
+        if normalized_fiscal_q and str(deal.get("Fiscal_Q") or "").strip().upper() == normalized_fiscal_q:
+            contextual_boost += 0.08
+        rank_score = (0.72 * similarity) + (0.28 * lexical_score) + contextual_boost
+        deal["rag_rank_score"] = round(rank_score, 4)
+        deal["rag_lexical_score"] = round(lexical_score, 4)
+        reranked.append(deal)
+    reranked.sort(key=lambda item: float(item.get("rag_rank_score") or 0.0), reverse=True)
+    return reranked
+
+
+# ── Dados sintéticos ──────────────────────────────────────────────────────────
+
+WORDS = [
+    "licença", "migração", "nuvem", "segurança", "renovação", "workspace", "gcp", "dados",
+    "análise", "preço", "concorrência", "orçamento", "educação", "saúde", "varejo", "bigquery",
+    "ia", "treinamento", "suporte", "contrato", "ação", "governo", "São", "Paulo",
+]
+SELLERS = ["Ana Souza", "Bruno Lima", "carla dias", None, ""]
+SOURCES = ["won", "lost", "pipeline", "WON ", None]
+QUARTERS = ["FY26-Q1", "fy26-q2", " FY25-Q4", None]
+
+
+def _text(rng, n):
+    return rng.choice([" ", ", ", "-", " / "]).join(rng.choice(WORDS) for _ in range(n))
+
+
+def _deals(rng, count):
+    deals = []
+    for i in range(count):
+        deals.append({
+            "deal_id": f"d{i}",
+            "similarity": rng.choice([0.0, None, round(rng.random(), 4), 0.5]),
+            "Oportunidade": _text(rng, 3) if rng.random() > 0.1 else None,
+            "Produtos": _text(rng, 2),
+            "Segmento": rng.choice(["Educação", "Saúde", "Varejo", None]),
+            "Portfolio": rng.choice(["GWS", "GCP", ""]),
+            "content": _text(rng, rng.randint(0, 40)),
+            "Vendedor": rng.choice(SELLERS),
+            "source": rng.choice(SOURCES),
+            "Fiscal_Q": rng.choice(QUARTERS),
+        })
+    return deals
+
+
+@pytest.fixture(autouse=True)
+def cache_limpo():
+    with patch.object(ranker, "_VOCAB_STATE", {"vocab": {}, "generation": 0}), \
+            patch.object(ranker, "_DEAL_TOKENS", ranker.OrderedDict()), \
+            patch.object(ranker, "_TOKEN_STATS", {"hits": 0, "misses": 0, "resets": 0}):
+        yield
+
+
+class TestParidade:
+    @pytest.mark.parametrize("seed", range(25))
+    def test_mesmos_scores_e_ordem(self, seed):
+        rng = random.Random(seed)
+        deals = _deals(rng, rng.randint(1, 200))
+        query = _text(rng, rng.randint(0, 6)) + rng.choice(["", " licença licença", " xyz"])
+        kwargs = {
+            "query_text": query,
+            "seller": rng.choice(SELLERS + ["  ANA SOUZA "]),
+            "source": rng.choice(["won", "lost", None]),
+            "fiscal_q": rng.choice(["FY26-Q1", "fy26-q2", None]),
+        }
+        expected = rerank_ref(copy.deepcopy(deals), **kwargs)
+        for _ in range(2):  # segunda rodada: tokens vindos do cache
+            got = rerank_deals_by_context(copy.deepcopy(deals), **kwargs)
+            assert [d["deal_id"] for d in got] == [d["deal_id"] for d in expected]
+            assert [d["rag_rank_score"] for d in got] == [d["rag_rank_score"] for d in expected]
+            assert [d["rag_lexical_score"] for d in got] == [d["rag_lexical_score"] for d in expected]
+
+    def test_lista_vazia_e_consulta_sem_tokens(self):
+        assert rerank_deals_by_context([], query_text="licença") == []
+        deals = _deals(random.Random(1), 5)
+        got = rerank_deals_by_context(copy.deepcopy(deals), query_text="a é")
+        assert all(d["rag_lexical_score"] == 0.0 for d in got)
+
+
+class TestCacheDeTokens:
+    def test_reusa_tokens_e_detecta_conteudo_alterado(self):
+        deals = _deals(random.Random(2), 10)
+        rerank_deals_by_context(copy.deepcopy(deals), query_text="licença nuvem")
+        rerank_deals_by_context(copy.deepcopy(deals), query_text="dados")
+        stats = rerank_cache_stats()
+        assert stats["misses"] == 10 and stats["hits"] == 10
+
+        changed = copy.deepcopy(deals)
+        changed[0]["content"] = "bigquery migração"
+        got = rerank_deals_by_context(changed, query_text="bigquery migração")
+        assert rerank_cache_stats()["misses"] == 11
+        assert next(d for d in got if d["deal_id"] == "d0")["rag_lexical_score"] == 1.0
+
+    def test_limite_de_vocabulario_reinicia_sem_misturar_ids(self):
+        deals = _deals(random.Random(3), 30)
+        with patch.object(ranker, "_VOCAB_MAX_TOKENS", 5):
+            rerank_deals_by_context(copy.deepcopy(deals), query_text="licença")
+            got = rerank_deals_by_context(copy.deepcopy(deals), query_text="licença nuvem")
+        expected = rerank_ref(copy.deepcopy(deals), query_text="licença nuvem")
+        assert [d["rag_rank_score"] for d in got] == [d["rag_rank_score"] for d in expected]
+        assert rerank_cache_stats()["resets"] == 1
@@ -0,0 +1,227 @@
+"""
+Testes do rollup cube de métricas (api/rollup_cube.py).
+Os agregados do cubo são comparados com o cálculo direto sobre os deals.
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_rollup_cube.py -v
+"""
+
+import random
+import sys
+import os
+from collections import defaultdict
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.rollup_cube import (
+    CLOSED_DIMS,
+    CLOSED_MEASURES,
+    PIPELINE_DIMS,
+    PIPELINE_MEASURES,
+    RollupCube,
+    RollupCubeHolder,
+    SalesRollup,
+)
+
+SELLERS = ["Alex", "Bia", "Carlos", None]
+PHASES = ["Qualificar", "Propor", "Negociar"]
+
+
+def _deals(seed, n):
+    rng = random.Random(seed)
+    deals = []
+    for _ in range(n):
+        year = rng.choice([2025, 2026, None])
+        month = rng.randint(1, 12) if year else None
+        deals.append({
+            "year": year,
+            "month": month,
+            "fiscal_q": rng.choice(["FY26-Q1", "FY26-Q2", "FY25-Q4", None]),
+            "seller": rng.choice(SELLERS),
+            "phase": rng.choice(PHASES),
+            "forecast": rng.choice(["COMMIT", "UPSIDE", "PIPELINE", None]),
+            "has_date": year is not None or rng.random() < 0.2,
+            "gross": round(rng.uniform(0, 1000), 2),
+            "net": round(rng.uniform(0, 500), 2),
+            "idle": rng.choice([None, rng.randint(0, 60)]),
+            "conf": rng.choice([None, rng.randint(0, 100)]),
+            "cycle": rng.choice([None, rng.randint(1, 200)]),
+        })
+    return deals
+
+
+def _cells(deals, dims):
+    """GROUP BY dims, como a query de carga faz no BigQuery."""
+    cells = defaultdict(lambda: defaultdict(float))
+    for deal in deals:
+        cell = cells[tuple(deal[d] for d in dims)]
+        cell["deals"] += 1
+        cell["gross"] += deal["gross"]
+        cell["net"] += deal["net"]
+        for name, key in (("idle", "idle"), ("conf", "conf"), ("cycle", "cycle")):
+            if deal[key] is not None:
+                cell[f"{name}_sum"] += deal[key]
+                cell[f"{name}_n"] += 1
+        if deal["idle"] is not None:
+            cell["idle_high"] += deal["idle"] > 30
+            cell["idle_medium"] += 15 <= deal["idle"] <= 30
+        if deal["conf"] is not None and deal["conf"] >= 50:
+            cell["hc_deals"] += 1
+            cell["hc_gross"] += deal["gross"]
+            cell["hc_net"] += deal["net"]
+            cell["hc_conf_sum"] += deal["conf"]
+    return [{**dict(zip(dims, key)), **values} for key, values in cells.items()]
+
+
+@pytest.fixture(scope="module")
+def dados():
+    pipeline = _deals(1, 400)
+    won = _deals(2, 300)
+    lost = _deals(3, 300)
+    rollup = SalesRollup(
+        RollupCube(PIPELINE_DIMS, PIPELINE_MEASURES, _cells(pipeline, PIPELINE_DIMS)),
+        RollupCube(CLOSED_DIMS, CLOSED_MEASURES, _cells(won, CLOSED_DIMS)),
+        RollupCube(CLOSED_DIMS, CLOSED_MEASURES, _cells(lost, CLOSED_DIMS)),
+        closed_phase_columns={"closed_deals_won": "Status", "closed_deals_lost": "Status"},
+    )
+    return pipeline, won, lost, rollup
+
+
+def _avg(values):
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+
+class TestRollupCube:
+    @pytest.mark.parametrize("year,quarter,month,sellers,phases", [
+        (None, None, None, None, None),
+        (2026, None, None, None, None),
+        (2026, 2, None, ["Alex", "Bia"], None),
+        (None, 3, None, None, ["Propor"]),
+        (2025, None, 7, ["Carlos"], ["Qualificar", "Negociar"]),
+    ])
+    def test_metricas_iguais_ao_calculo_direto(self, dados, year, quarter, month, sellers, phases):
+        pipeline, won, lost, rollup = dados
+        blocks = rollup.metrics_blocks(year=year, quarter=quarter, month=month, sellers=sellers, phases=phases)
+
+        def in_period(deal):
+            if year and deal["year"] != year:
+                return False
+            if quarter:
+                start = (quarter - 1) * 3 + 1
+                return deal["month"] is not None and start <= deal["month"] <= start + 2
+            return not month or deal["month"] == month
+
+        def closed_match(deal):
+            fq = f"FY{str(year)[-2:]}-Q{quarter}" if year and quarter else None
+            if year and not (deal["year"] == year or (fq and deal["fiscal_q"] == fq)):
+                return False
+            if quarter:
+                start = (quarter - 1) * 3 + 1
+                in_months = deal["month"] is not None and start <= deal["month"] <= start + 2
+                by_label = deal["fiscal_q"] == fq if fq else str(deal["fiscal_q"] or "").endswith(f"-Q{quarter}")
+                if not (in_months or by_label):
+                    return False
+            elif month and deal["month"] != month:
+                return False
+            return (not sellers or deal["seller"] in sellers) and (not phases or deal["phase"] in phases)
+
+        expected_pipeline = [
+            d for d in pipeline
+            if in_period(d) and (not sellers or d["seller"] in sellers) and (not phases or d["phase"] in phases)
+        ]
+        assert blocks["pipeline"]["deals_count"] == len(expected_pipeline)
+        if expected_pipeline:
+            assert blocks["pipeline"]["gross"] == pytest.approx(round(sum(d["gross"] for d in expected_pipeline), 2))
+        assert blocks["pipeline"]["avg_idle_days"] == _avg(d["idle"] for d in expected_pipeline)
+        assert blocks["pipeline"]["high_risk_idle"] == sum(1 for d in expected_pipeline if (d["idle"] or 0) > 30)
+        assert blocks["high_confidence"]["deals_count"] == sum(
+            1 for d in expected_pipeline if d["conf"] is not None and d["conf"] >= 50
+        )
+        assert blocks["pipeline_total"]["deals_count"] == len(pipeline)
+
+        expected_won = [d for d in won if closed_match(d)]
+        expected_lost = [d for d in lost if closed_match(d)]
+        assert blocks["won"]["deals_count"] == len(expected_won)
+        assert blocks["lost"]["deals_count"] == len(expected_lost)
+        assert blocks["won"]["avg_cycle_days"] == _avg(d["cycle"] for d in expected_won)
+
+    def test_dashboard_agrupamentos(self, dados):
+        pipeline, won, lost, rollup = dados
+        blocks = rollup.dashboard_blocks(year=2026, quarter=None, month=None, sellers=None)
+
+        by_seller = {row["seller"]: row for row in blocks["pipeline_by_seller"]}
+        assert None not in by_seller
+        for seller in ("Alex", "Bia", "Carlos"):
+            deals = [d for d in pipeline if d["seller"] == seller]
+            assert by_seller[seller]["deals_count"] == len(deals)
+            assert by_seller[seller]["avg_confidence"] == _avg(d["conf"] for d in deals)
+        grosses = [row["gross"] for row in blocks["pipeline_by_seller"]]
+        assert grosses == sorted(grosses, reverse=True)
+
+        assert [row["category"] for row in blocks["pipeline_by_forecast"]] == ["COMMIT", "UPSIDE", "PIPELINE"]
+        months = [(row["year"], row["month"]) for row in blocks["pipeline_by_month"]]
+        assert months[0] == (None, None) and months[1:] == sorted(months[1:])
+
+        # NULL não casa com NULL no FULL OUTER JOIN: duas linhas sem vendedor
+        win_rates = blocks["win_rate_by_seller"]
+        assert [row["seller"] for row in win_rates].count(None) == 2
+        alex_won = sum(1 for d in won if d["seller"] == "Alex" and d["has_date"] and d["year"] == 2026)
+        alex_lost = sum(1 for d in lost if d["seller"] == "Alex" and d["has_date"] and d["year"] == 2026)
+        alex = next(row for row in win_rates if row["seller"] == "Alex")
+        assert (alex["won"], alex["lost"]) == (alex_won, alex_lost)
+        assert alex["win_rate"] == round(alex_won / (alex_won + alex_lost) * 100, 1)
+
+    def test_cubo_vazio_devolve_zeros(self):
+        empty = SalesRollup(
+            RollupCube(PIPELINE_DIMS, PIPELINE_MEASURES, []),
+            RollupCube(CLOSED_DIMS, CLOSED_MEASURES, []),
+            RollupCube(CLOSED_DIMS, CLOSED_MEASURES, []),
+        )
+        blocks = empty.metrics_blocks(year=2026, quarter=1, month=None, sellers=["A"], phases=None)
+        assert blocks["pipeline"]["deals_count"] == 0
+        assert blocks["pipeline"]["gross"] is None
+        assert empty.dashboard_blocks(year=None, quarter=None, month=None, sellers=None)["pipeline_by_month"] == []
+
+
+class TestRollupCubeHolder:
+    def _rollup(self):
+        return SalesRollup(
+            RollupCube(PIPELINE_DIMS, PIPELINE_MEASURES, []),
+            RollupCube(CLOSED_DIMS, CLOSED_MEASURES, []),
+            RollupCube(CLOSED_DIMS, CLOSED_MEASURES, []),
+        )
+
+    def test_recarrega_quando_versao_muda(self):
+        current = {"ok": True}
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return self._rollup()
+
+        holder = RollupCubeHolder(loader, lambda rollup: current["ok"])
+        first = holder.get()
+        assert holder.get() is first
+        current["ok"] = False
+        assert holder.get() is not first
+        assert len(loads) == 2
+
+    def test_falha_na_carga_cai_para_bigquery_e_espera_retry(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            raise RuntimeError("bq indisponível")
+
+        holder = RollupCubeHolder(loader, lambda rollup: True, retry_seconds=60)
+        assert holder.get() is None
+        assert holder.get() is None
+        assert len(calls) == 1
+        stats = holder.stats()
+        assert stats["load_errors"] == 1 and stats["fallbacks"] == 2
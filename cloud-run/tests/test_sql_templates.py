@@ -0,0 +1,118 @@
+"""
+Testes de SQL parametrizado e do registro de templates (api/sql_templates.py).
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_sql_templates.py -v
+"""
+
+import sys
+import os
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from google.cloud import bigquery
+
+from api.rag.filters import build_closed_filters, build_filters
+from api.sql_templates import (
+    QueryTemplateRegistry,
+    bind_value,
+    in_filter,
+    job_config_for,
+    parameterized_queries,
+    parameterized_sql,
+    register_query_template,
+)
+
+
+class TestQueryParams:
+    def test_mesmo_valor_reutiliza_parametro(self):
+        with parameterized_queries() as params:
+            first = bind_value("FY26-Q1", hint="fiscal_q")
+            again = bind_value("FY26-Q1", hint="fiscal_q")
+            other = bind_value("FY26-Q2", hint="fiscal_q")
+        assert first == again == "@fiscal_q"
+        assert other == "@fiscal_q_1"
+        assert len(params) == 2
+
+    def test_in_filter_com_binder_usa_unnest(self):
+        with parameterized_queries():
+            sql = in_filter("Vendedor", ["Alex", "Carlos"], hint="seller")
+            config = job_config_for(f"SELECT 1 WHERE {sql}")
+        assert sql == "Vendedor IN UNNEST(@seller)"
+        (param,) = config.query_parameters
+        assert param.name == "seller"
+        assert list(param.values) == ["Alex", "Carlos"]
+
+    def test_sem_binder_mantem_literal_escapado(self):
+        assert in_filter("Vendedor", ["O'Neil"]) == "Vendedor = 'O''Neil'"
+        assert in_filter("Vendedor", ["A", "B"]) == "Vendedor IN ('A', 'B')"
+        assert in_filter("Vendedor", []) is None
+        assert bind_value(3, "INT64") == "3"
+        assert job_config_for("SELECT @x") is None
+
+    def test_job_config_so_leva_parametros_referenciados(self):
+        base = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("top_k", "INT64", 10)]
+        )
+        with parameterized_queries():
+            used = bind_value("won", hint="source")
+            bind_value("2026-01-01", hint="date_start")
+            config = job_config_for(f"SELECT * FROM t WHERE source = {used} LIMIT @top_k", base)
+        assert [p.name for p in config.query_parameters] == ["top_k", "source"]
+
+    def test_decorator_ativa_binder(self):
+        @parameterized_sql
+        def build():
+            return bind_value("x", hint="p")
+
+        assert build() == "@p"
+        assert bind_value("x", hint="p") == "'x'"
+
+
+class TestFiltrosRag:
+    def test_filtros_mesmo_formato_para_valores_diferentes(self):
+        with parameterized_queries():
+            first = build_filters("2026", "1", "Alex,Carlos", "won", None)
+        with parameterized_queries():
+            second = build_filters("2025", "3", "Bia,Duda", "lost", None)
+        assert first == second
+        assert "@fiscal_q" in first and "UNNEST(@vendedor)" in first and "@source" in first
+
+    def test_filtros_fechados_parametrizam_datas_e_mes(self):
+        with parameterized_queries():
+            where = build_closed_filters(None, None, "5", "2026-01-01", "2026-03-31", None, "Data_Fechamento")
+            config = job_config_for(where)
+        assert "'2026-01-01'" not in where
+        values = {p.name: p.value for p in config.query_parameters}
+        assert values == {"month": 5, "date_start": "2026-01-01", "date_end": "2026-03-31"}
+
+
+class TestQueryTemplates:
+    def test_render_memoriza_e_mapeia_template(self):
+        registry = QueryTemplateRegistry()
+        template = registry.register("teste.render", "SELECT * FROM t {where}")
+        text = template.render(where="WHERE a = @a")
+        assert text == "SELECT * FROM t WHERE a = @a"
+        assert template.render(where="WHERE a = @a") is text
+        assert template.shapes() == 1
+        assert len(template.version) == 8
+
+    def test_template_for_identifica_sql_renderizado(self):
+        from api.sql_templates import QUERY_TEMPLATES
+
+        template = register_query_template("teste.lookup", "SELECT {cols} FROM t")
+        text = template.render(cols="a, b")
+        assert QUERY_TEMPLATES.template_for(text) == "teste.lookup"
+        assert QUERY_TEMPLATES.stats()["teste.lookup"]["shapes"] == 1
+
+    def test_id_duplicado_com_sql_diferente_falha(self):
+        registry = QueryTemplateRegistry()
+        registry.register("teste.dup", "SELECT 1")
+        assert registry.register("teste.dup", "SELECT 1") is registry.get("teste.dup")
+        with pytest.raises(ValueError):
+            registry.register("teste.dup", "SELECT 2")
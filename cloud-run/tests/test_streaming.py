@@ -0,0 +1,218 @@
+"""
+Testes do streaming (Server-Sent Events) de /api/insights-rag/stream e
+/api/analyze-patterns/stream, do stream de texto do Gemini
+(api/llm_client.stream_gemini_text) e da ponte iterador bloqueante -> async
+(api/bq_async.iterate_blocking).
+Não requerem credenciais GCP (BigQuery e Gemini simulados).
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_streaming.py -v
+"""
+
+import sys
+import os
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from api import llm_cache, llm_client
+from api.bq_async import iterate_blocking
+from api.llm_client import ModelHealthRegistry
+from api.response_cache import ResponseCache
+from api.single_flight import SingleFlight
+from api.tiered_cache import TieredCache
+import api.endpoints.insights_rag as insights_rag
+
+
+def _parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _chunk(text):
+    return MagicMock(text=text)
+
+
+@pytest.fixture()
+def registro():
+    registry = ModelHealthRegistry()
+    with patch.object(llm_client, "LLM_HEALTH", registry), \
+            patch.dict(os.environ, {"USE_VERTEX_AI": "false", "GEMINI_MODEL_FALLBACKS": ""}):
+        yield registry
+
+
+def _stream_models(behaviour):
+    """behaviour[modelo] = lista de pedaços (Exception no meio = falha ali)."""
+    def api_key_model(api_key, name):
+        def generate_content(prompt, stream=False, **kwargs):
+            assert stream is True
+            for item in behaviour.get(name, [RuntimeError("503 unavailable")]):
+                if isinstance(item, Exception):
+                    raise item
+                yield _chunk(item)
+
+        model = MagicMock()
+        model.generate_content.side_effect = generate_content
+        return model
+    return api_key_model
+
+
+def _stream(**kwargs):
+    return list(llm_client.stream_gemini_text(
+        "prompt", model_name="primario", api_key="k", project_id=None, location=None, **kwargs,
+    ))
+
+
+class TestStreamGemini:
+    def test_tokens_e_resultado_final(self, registro):
+        with patch.object(registro, "api_key_model", _stream_models({"primario": ["VITO", "RIAS:", "\n- a"]})):
+            events = _stream()
+        assert [e["text"] for e in events if e["type"] == "token"] == ["VITO", "RIAS:", "\n- a"]
+        assert events[-1] == {
+            "type": "result", "ok": True, "text": "VITORIAS:\n- a",
+            "provider": "gemini_api_key", "model": "primario", "error": "",
+        }
+
+    def test_falha_antes_do_primeiro_pedaco_troca_de_modelo(self, registro):
+        behaviour = {"primario": [RuntimeError("429 quota")], "gemini-2.5-pro": ["ok"]}
+        with patch.object(registro, "api_key_model", _stream_models(behaviour)):
+            events = _stream()
+        assert events[-1]["ok"] and events[-1]["model"] == "gemini-2.5-pro"
+        assert registro.stats()["gemini_api_key/primario"]["consecutive_failures"] == 1
+
+    def test_falha_no_meio_nao_troca_de_modelo(self, registro):
+        behaviour = {"primario": ["parte", RuntimeError("reset")], "gemini-2.5-pro": ["ok"]}
+        with patch.object(registro, "api_key_model", _stream_models(behaviour)):
+            events = _stream()
+        assert events[-1]["ok"] is False and events[-1]["text"] == "parte"
+        assert [e["text"] for e in events if e["type"] == "token"] == ["parte"]
+
+    def test_cliente_desconecta_libera_sonda(self, registro):
+        registro._entry("gemini_api_key", "primario").state = "half_open"
+        with patch.object(registro, "api_key_model", _stream_models({"primario": ["a", "b", "c"]})):
+            gen = llm_client.stream_gemini_text(
+                "prompt", model_name="primario", api_key="k", project_id=None, location=None,
+            )
+            assert next(gen) == {"type": "token", "text": "a"}
+            gen.close()
+        health = registro._entry("gemini_api_key", "primario")
+        assert health.probing is False and health.state == "half_open"
+        assert registro.order("gemini_api_key", ["primario", "m2"]) == ["m2", "primario"]
+
+    def test_resposta_gravada_vem_em_um_token(self, registro):
+        with patch.object(llm_cache, "_LLM_RESPONSE_CACHE", TieredCache("llm", ResponseCache(max_bytes=0), l2=None)), \
+                patch.object(llm_cache, "_LLM_FLIGHTS", SingleFlight()), \
+                patch.object(registro, "api_key_model", _stream_models({"primario": ["a", "b"]})) as fake:
+            kwargs = dict(prompt_version="v1", model_name="primario", api_key="k", project_id=None, location=None)
+            first = list(llm_cache.stream_cached_text("prompt", **kwargs))
+            second = list(llm_cache.stream_cached_text("prompt", **kwargs))
+            third = llm_cache.generate_cached_text("prompt", **kwargs)
+        assert [e["type"] for e in first] == ["token", "token", "result"]
+        assert second[0] == {"type": "token", "text": "ab"} and second[-1]["cached"] is True
+        assert third["cached"] is True and third["text"] == "ab"
+
+
+class TestIterateBlocking:
+    def test_entrega_itens_e_propaga_erro(self):
+        def produce(n):
+            for i in range(n):
+                yield i
+            raise ValueError("fim")
+
+        async def consume():
+            items = []
+            with pytest.raises(ValueError):
+                async for item in iterate_blocking(produce, 3):
+                    items.append(item)
+            return items
+
+        assert asyncio.run(consume()) == [0, 1, 2]
+
+
+@pytest.fixture()
+def insights_app():
+    app = FastAPI()
+    app.include_router(insights_rag.router, prefix="/api")
+    deals = [{"deal_id": "1", "source": "won", "similarity": 0.9}]
+
+    async def retrieve(client, **kwargs):
+        kwargs["timings_ms"]["retrieval"] = 5
+        return {"deals": deals, "raw_retrieved_count": 1, "threshold_relaxed": False}
+
+    async def collect(client, deals, **kwargs):
+        return {
+            "stats": {"total": 1}, "wins_stats": {"total": 1}, "losses_stats": {"total": 0},
+            "adaptive": {"enabled": False}, "business_highlights": {"top_wins": []},
+        }
+
+    def stream_insights(query, deals, stats, **kwargs):
+        yield {"type": "token", "text": "VITORIAS:"}
+        yield {"type": "token", "text": "\n- a"}
+        yield {"type": "insights", "data": {"status": "rag", "wins": "- a"}}
+
+    cache = TieredCache("insights_rag", ResponseCache(max_bytes=0), l2=None)
+    with patch.object(insights_rag, "_retrieve_ranked_deals", retrieve), \
+            patch.object(insights_rag, "_collect_stats", collect), \
+            patch.object(insights_rag, "stream_ai_insights", stream_insights), \
+            patch.object(insights_rag, "get_embeddings_freshness", return_value={}), \
+            patch.object(insights_rag, "get_bq_client", return_value=MagicMock()), \
+            patch.object(insights_rag, "_INSIGHTS_CACHE", cache):
+        yield TestClient(app)
+
+
+class TestInsightsRagStream:
+    def test_eventos_em_ordem(self, insights_app):
+        resp = insights_app.get("/api/insights-rag/stream?query=x")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = _parse_sse(resp.text)
+        assert [name for name, _ in events] == ["retrieval", "stats", "token", "token", "insights", "done"]
+        assert events[0][1]["quality"]["retrieved_count_post_filter"] == 1
+        assert events[4][1] == {"status": "rag", "wins": "- a"}
+        done = events[-1][1]
+        assert done["success"] and done["aiInsights"]["status"] == "rag" and len(done["deals"]) == 1
+
+    def test_segunda_chamada_sai_do_cache(self, insights_app):
+        insights_app.get("/api/insights-rag/stream?query=x")
+        events = _parse_sse(insights_app.get("/api/insights-rag/stream?query=x").text)
+        assert [name for name, _ in events] == ["retrieval", "stats", "insights", "done"]
+        assert events[-1][1]["rag"]["cache_hit"] is True
+
+    def test_erro_vira_evento(self, insights_app):
+        async def broken(client, **kwargs):
+            raise RuntimeError("bq down")
+
+        with patch.object(insights_rag, "_retrieve_ranked_deals", broken):
+            events = _parse_sse(insights_app.get("/api/insights-rag/stream?query=y").text)
+        assert events == [("error", {"success": False, "error": "Insights RAG temporariamente indisponível."})]
+
+
+class TestAnalyzePatternsStream:
+    def test_tokens_e_payload_final(self):
+        import app.simple_api as simple_api
+
+        def stream(prompt, **kwargs):
+            yield {"type": "token", "text": '{"win_insights": "w", '}
+            yield {"type": "token", "text": '"loss_insights": "l", "recommendations": ["r"]}'}
+            yield {"type": "result", "ok": True, "text": '{"win_insights": "w", "loss_insights": "l", "recommendations": ["r"]}'}
+
+        with patch.object(simple_api, "GEMINI_API_KEY", "k"), \
+                patch.object(simple_api, "_build_analyze_patterns_prompt", return_value=("p", {"won": 2, "lost": 1})), \
+                patch.object(simple_api, "stream_cached_text", stream):
+            resp = TestClient(simple_api.app).get("/api/analyze-patterns/stream?year=2026")
+        events = _parse_sse(resp.text)
+        assert [name for name, _ in events] == ["deals", "token", "token", "done"]
+        assert events[-1][1]["status"] == "gemini"
+        assert events[-1][1]["deals_analyzed"] == {"won": 2, "lost": 1}
@@ -0,0 +1,221 @@
+"""
+Testes do índice vetorial local do RAG (api/rag/vector_index.py).
+O top-k filtrado é comparado com o cosseno calculado linha a linha, como o
+VECTOR_SEARCH(distance_type => 'COSINE') sobre deal_embeddings.
+Não requerem credenciais GCP.
+
+Rodar:
+    cd cloud-run
+    pytest tests/test_vector_index.py -v
+"""
+
+import math
+import random
+import sys
+import os
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Garante que app/ está no PYTHONPATH ao rodar de cloud-run/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from api.rag import build_index_filters, query_embeddings, retriever
+from api.response_cache import ResponseCache
+from api.tiered_cache import TieredCache
+from api.rag.vector_index import DealVectorIndex
+
+DIM = 16
+
+
+def _rows(seed, n):
+    rng = random.Random(seed)
+    return [
+        {
+            "deal_id": f"D-{index:04d}",
+            "source": rng.choice(["won", "lost", "pipeline"]),
+            "Oportunidade": f"OP-{index:04d}",
+            "Vendedor": rng.choice(["Alex", "Bia", "Carlos", None]),
+            "Fiscal_Q": rng.choice(["FY26-Q1", "FY26-Q2", "FY25-Q4", None]),
+            "Fase": rng.choice(["Proposta", "Negociação", None]),
+            "Gross": round(rng.uniform(0, 1000), 2),
+            "content": f"deal {index}",
+            "embedding": [rng.uniform(-1, 1) for _ in range(DIM)],
+        }
+        for index in range(n)
+    ]
+
+
+def _cosine_distance(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    return 1.0 - dot / (math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b)))
+
+
+def _expected(rows, query, top_k, year=None, quarter=None, sellers=None, source=None):
+    def match(row):
+        if year:
+            prefix = f"FY{year[-2:]}-"
+            if quarter and row["Fiscal_Q"] != f"{prefix}Q{quarter}":
+                return False
+            if not quarter and not str(row["Fiscal_Q"] or "").startswith(prefix):
+                return False
+        if sellers and row["Vendedor"] not in sellers:
+            return False
+        if source and row["source"] != source:
+            return False
+        return True
+
+    scored = sorted((_cosine_distance(row["embedding"], query), row["deal_id"]) for row in rows if match(row))
+    return scored[:top_k]
+
+
+@pytest.fixture(scope="module")
+def base():
+    rows = _rows(11, 400)
+    return rows, DealVectorIndex(rows)
+
+
+class TestDealVectorIndex:
+    @pytest.mark.parametrize("year,quarter,seller,source,top_k", [
+        (None, None, None, None, 10),
+        ("2026", None, None, None, 5),
+        ("2026", "2", "Alex, Bia", None, 8),
+        (None, None, "Carlos", "won", 40),
+        ("2025", "4", None, "lost", 1000),
+    ])
+    def test_top_k_filtrado_igual_ao_cosseno_direto(self, base, year, quarter, seller, source, top_k):
+        rows, index = base
+        query = [random.Random(top_k).uniform(-1, 1) for _ in range(DIM)]
+        filters = build_index_filters(year, quarter, seller, source)
+        result = index.search(query, top_k, index.mask(**filters))
+        sellers = [s.strip() for s in seller.split(",")] if seller else None
+        expected = _expected(rows, query, top_k, year, quarter, sellers, source)
+
+        assert [row["deal_id"] for row in result] == [deal_id for _, deal_id in expected]
+        for row, (distance, _) in zip(result, expected):
+            assert row["distance"] == pytest.approx(distance, abs=1e-5)
+
+    def test_int8_preserva_vizinhos_proximos(self, base):
+        rows, index = base
+        quantized = DealVectorIndex(rows, quantize=True)
+        query = rows[0]["embedding"]
+        exact = [row["deal_id"] for row in index.search(query, 10)]
+        approx = quantized.search(query, 10)
+        assert approx[0]["deal_id"] == "D-0000"
+        assert len(set(exact) & {row["deal_id"] for row in approx}) >= 8
+        assert quantized.nbytes < index.nbytes
+
+    def test_colunas_e_linhas_sem_embedding(self):
+        rows = _rows(3, 5)
+        rows[1]["embedding"] = []
+        rows[2]["embedding"] = [0.0] * DIM
+        index = DealVectorIndex(rows)
+        result = index.search(rows[0]["embedding"], 10, columns=("deal_id", "Gross"))
+        assert index.row_count == 3
+        assert {row["deal_id"] for row in result} == {"D-0000", "D-0003", "D-0004"}
+        assert set(result[0]) == {"deal_id", "Gross", "distance"}
+
+    def test_busca_em_lote_igual_a_buscas_individuais(self, base):
+        rows, index = base
+        queries = [rows[i]["embedding"] for i in (3, 50, 3)]
+        mask = index.mask(sources=["won", "lost"])
+        batch = index.search_many(queries, 4, mask, columns=("deal_id",))
+        single = [index.search(q, 4, mask, columns=("deal_id",)) for q in queries]
+        assert [[r["deal_id"] for r in rows] for rows in batch] == [[r["deal_id"] for r in rows] for rows in single]
+        for got, want in zip(batch, single):
+            assert [r["distance"] for r in got] == pytest.approx([r["distance"] for r in want], abs=1e-6)
+        assert index.search_many([], 4) == []
+
+    def test_dimensao_diferente_falha(self, base):
+        _, index = base
+        with pytest.raises(ValueError):
+            index.search([1.0, 0.0], 3)
+
+
+class TestRetrieverIndexLocal:
+    @pytest.fixture(autouse=True)
+    def _isolado(self):
+        with patch.object(retriever, "_INDEX_STORES", {}):
+            yield
+
+    def _freshness(self, version):
+        return {"deal_embeddings_last_modified": version}
+
+    def test_usa_indice_local_e_recarrega_quando_embeddings_mudam(self):
+        rows = _rows(5, 50)
+        versions = {"current": datetime(2026, 1, 1).isoformat()}
+        client = MagicMock()
+        client.query.return_value.result.side_effect = lambda: iter(rows)
+
+        with patch.object(retriever, "embeddings_freshness", side_effect=lambda *a, **k: self._freshness(versions["current"])), \
+                patch.object(retriever, "embed_query_text", return_value=rows[7]["embedding"]), \
+                patch.object(retriever, "RAG_VECTOR_INDEX_CHECK_SECONDS", 0):
+            # carga em segundo plano: a primeira requisição usa VECTOR_SEARCH
+            assert retriever.get_deal_index(client, project_id="p", dataset_id="d") is None
+            store = retriever._INDEX_STORES[("p", "d")]
+            assert store.wait("deal_embeddings", timeout=5)
+            kwargs = dict(project_id="p", dataset_id="d", query_text="q", top_k=3, where_clause="")
+            deals = retriever.retrieve_similar_deals(client, index_filters={}, **kwargs)
+            assert deals[0]["deal_id"] == "D-0007"
+            first = retriever.get_deal_index(client, project_id="p", dataset_id="d")
+
+            versions["current"] = datetime(2026, 1, 2).isoformat()
+            assert retriever.get_deal_index(client, project_id="p", dataset_id="d") is None
+            assert store.wait("deal_embeddings", timeout=5)
+            second = retriever.get_deal_index(client, project_id="p", dataset_id="d")
+            assert second is not first and second.version == versions["current"]
+
+        assert retriever.deal_index_stats()["indexes"]["p.d"]["loads"] == 2
+
+    def test_falha_no_indice_cai_para_vector_search(self):
+        client = MagicMock()
+        vector_search_rows = [{"deal_id": "BQ-1", "distance": 0.1}]
+        client.query.return_value.result.return_value = vector_search_rows
+
+        with patch.object(retriever, "load_deal_index", side_effect=RuntimeError("sem acesso")):
+            deals = retriever.retrieve_similar_deals(
+                client, project_id="p", dataset_id="d", query_text="q", top_k=3, where_clause="",
+                index_filters={"sources": ["won"]},
+            )
+        assert deals == vector_search_rows
+        assert "VECTOR_SEARCH" in client.query.call_args[0][0]
+
+
+class TestBuscaEmLoteNoBigQuery:
+    @pytest.fixture(autouse=True)
+    def _isolado(self):
+        cache = TieredCache("rag_query_embeddings", ResponseCache(max_bytes=1024 * 1024), l2=None)
+        with patch.object(query_embeddings, "_EMBEDDING_CACHE", cache), \
+                patch.object(retriever, "RAG_VECTOR_INDEX_ENABLED", False):
+            yield
+
+    def test_um_job_para_todas_as_perguntas(self):
+        model = query_embeddings.embedding_model_id("p", "d")
+        query_embeddings.set_cached_embedding(model, "deal B", [0.5, 0.5])
+        client = MagicMock()
+        client.query.return_value.result.return_value = [
+            {"query_id": 0, "deal_id": "X", "distance": 0.1, "query_embedding": [1.0, 0.0]},
+            {"query_id": 0, "deal_id": "Y", "distance": 0.3, "query_embedding": None},
+            {"query_id": 1, "deal_id": "Z", "distance": 0.2, "query_embedding": None},
+        ]
+
+        results = retriever.retrieve_similar_deals_batch(
+            client, project_id="p", dataset_id="d", query_texts=["deal A", "deal B", " deal  A"],
+            top_k=2, where_clause="WHERE source IN ('won', 'lost')",
+        )
+
+        assert client.query.call_count == 1
+        assert [[d["deal_id"] for d in deals] for deals in results] == [["X", "Y"], ["Z"], ["X", "Y"]]
+        params = {p.name: p for p in client.query.call_args[1]["job_config"].query_parameters}
+        assert params["query_texts"].values == ["deal A", "deal B"]
+        assert params["uncached_ids"].values == [0]
+        assert len(params["cached_embeddings"].values) == 1
+        assert query_embeddings.get_cached_embedding(model, "deal A") == [1.0, 0.0]
+
+    def test_lista_vazia_nao_consulta(self):
+        client = MagicMock()
+        assert retriever.retrieve_similar_deals_batch(
+            client, project_id="p", dataset_id="d", query_texts=[], top_k=3, where_clause="",
+        ) == []
+        client.query.assert_not_called()